@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""Time building the duration index of a catalog and drawing lists
+that fit a time budget from it::
+
+    python benchmarks/bench_budget.py 10000 100000 1000000
+"""
+
+import sys
+import random
+
+from common import generate_descriptions, parse_sizes, time_it
+
+from budget import BudgetIndex
+from exercises import Exercise
+
+BUDGETS = (30, 90, 480)
+DRAWS = 100
+
+def generate_timed_exercises(n):
+    """Synthetic exercises with durations from 5 to 120 minutes"""
+    rng = random.Random(0)
+    return [Exercise(desc, rng.randint(5, 120))
+            for desc in generate_descriptions(n)]
+
+def main(argv):
+    header = "{:>10} {:>12}".format('size', 'index (ms)')
+    for minutes in BUDGETS:
+        header += " {:>14}".format('{} min (us)'.format(minutes))
+    print header
+
+    for n in parse_sizes(argv):
+        exercises = generate_timed_exercises(n)
+        build = time_it(lambda: BudgetIndex(exercises), repeat=1)
+        index = BudgetIndex(exercises)
+
+        row = "{:>10} {:>12.1f}".format(n, build * 1000)
+        for minutes in BUDGETS:
+            rng = random.Random(minutes)
+            draw = lambda: [index.select(minutes, rng) for _ in xrange(DRAWS)]
+            row += " {:>14.1f}".format(time_it(draw) * 1e6 / DRAWS)
+        print row
+
+if __name__ == '__main__':
+    main(sys.argv)
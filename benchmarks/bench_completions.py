@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+"""Time reports on a completion log holding years of entries, from
+the incremental aggregates and by rescanning the log::
+
+    python benchmarks/bench_completions.py 10000 100000
+"""
+
+import sys
+import os
+import json
+import random
+import shutil
+import tempfile
+
+from common import parse_sizes, time_it
+
+from completions import CompletionLog, DurationStats
+
+# NOTE: 2016-10-18 00:00:00 UTC
+START = 1476748800.0
+
+def write_log(path, n):
+    """Log n completions of 500 exercises, 20 a day"""
+    rng = random.Random(0)
+    with open(path, 'wb') as f:
+        for i in xrange(n):
+            start = START + (i // 20) * 86400 + (i % 20) * 1800
+            event = {'id': rng.randint(1, 500), 'start': start,
+                     'end': start + rng.randint(300, 5400)}
+            f.write(json.dumps(event, sort_keys=True,
+                               separators=(',', ':')) + '\n')
+
+def rescan_report(path, exercise_id):
+    """Report computed by reading the whole log"""
+    stats = DurationStats()
+    with open(path, 'rb') as f:
+        for line in f:
+            event = json.loads(line)
+            if event['id'] == exercise_id:
+                stats.add(event['end'] - event['start'])
+    return stats.report()
+
+def main(argv):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print "{:>10} {:>12} {:>14} {:>14}".format(
+            'entries', 'open (ms)', 'rescan (ms)', 'report (ms)')
+        for n in parse_sizes(argv):
+            path = os.path.join(tmpdir, 'log_{}.completions'.format(n))
+            write_log(path, n)
+            # NOTE: the first open folds the log into the aggregates
+            CompletionLog(path, limit=1 << 40).close()
+
+            log = CompletionLog(path, limit=1 << 40)
+            opened = time_it(lambda: CompletionLog(path, limit=1 << 40))
+            rescan = time_it(lambda: rescan_report(path, 42), repeat=1)
+            report = time_it(lambda: (log.report(exercise_id=42),
+                                      log.report(day='2017-01-01'),
+                                      log.report()))
+            print "{:>10} {:>12.2f} {:>14.1f} {:>14.3f}".format(
+                n, opened * 1000, rescan * 1000, report * 1000)
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main(sys.argv)
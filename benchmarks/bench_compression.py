@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+"""Compare the codecs a catalog can be compressed with by the time to
+save and load it, the size of the file and the throughput of the
+uncompressed records, next to the time the codec alone takes to
+compress them::
+
+    python benchmarks/bench_compression.py 10000 100000 1000000
+
+Records are compressed while they are pickled, so saving takes about
+the longer of pickling and compressing rather than both added up.
+"""
+
+import sys
+import os
+
+from common import generate_exercises, parse_sizes, time_it
+
+from compression import CODECS, NO_COMPRESSION
+from records import dump_exercises, load_exercises
+
+PATH = '_bench_compression.pkl'
+
+def load(path):
+    with open(path, 'rb') as f:
+        return load_exercises(f)
+
+def compress_alone(name, data):
+    """Compress data in one go with the named codec"""
+    compressor = CODECS[name].compressor()
+    compressor.compress(data)
+    compressor.flush()
+
+def main(argv):
+    print "{:>10} {:>6} {:>10} {:>10} {:>10} {:>7} {:>10} {:>10} {:>10}".format(
+        'size', 'codec', 'save (ms)', 'load (ms)', 'file (MB)', 'ratio',
+        'save MB/s', 'load MB/s', 'alone (ms)')
+    for n in parse_sizes(argv):
+        exercises = generate_exercises(n)
+        dump_exercises(exercises, PATH)
+        with open(PATH, 'rb') as f:
+            data = f.read()
+        raw = len(data) / float(1 << 20)
+
+        for name in [NO_COMPRESSION] + sorted(CODECS):
+            try:
+                save = time_it(lambda: dump_exercises(exercises, PATH,
+                                                      compression=name),
+                               repeat=1)
+                size = os.path.getsize(PATH) / float(1 << 20)
+                loaded = time_it(lambda: load(PATH), repeat=1)
+            finally:
+                if os.path.isfile(PATH):
+                    os.remove(PATH)
+            alone = 0.0
+            if name != NO_COMPRESSION:
+                alone = time_it(lambda: compress_alone(name, data), repeat=1)
+
+            print ("{:>10} {:>6} {:>10.1f} {:>10.1f} {:>10.1f} {:>7.2f} "
+                   "{:>10.1f} {:>10.1f} {:>10.1f}").format(
+                n, name, save * 1000, loaded * 1000, size, raw / size,
+                raw / save, raw / loaded, alone * 1000)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""Time comparing two catalogs that differ in their last exercise,
+by their items as before and by digest, and finding 10 changes
+between them by set differences and by digest trees::
+
+    python benchmarks/bench_digest.py 10000 100000 1000000
+"""
+
+import sys
+
+from common import Exercise, generate_exercises, parse_sizes, time_it
+
+CHANGES = 10
+
+def set_diff(ours, theirs):
+    """Added and removed exercises from sets of both catalogs"""
+    ours, theirs = set(ours), set(theirs)
+    return list(theirs - ours), list(ours - theirs)
+
+def main(argv):
+    print "{:>10} {:>12} {:>12} {:>12} {:>12} {:>12}".format(
+        'size', 'items (ms)', 'digest (us)', 'sets (ms)', 'build (ms)',
+        'tree (us)')
+    for n in parse_sizes(argv):
+        ours = generate_exercises(n)
+        theirs = generate_exercises(n)
+        theirs.update(theirs[-1], Exercise("Changed last exercise"))
+
+        items = time_it(lambda: ours._items == theirs._items)
+        digest = time_it(lambda: ours == theirs)
+
+        for i in xrange(CHANGES - 1):
+            theirs.update(theirs[i * (n // CHANGES)],
+                          Exercise("Changed exercise {}".format(i)))
+        sets = time_it(lambda: set_diff(ours, theirs), repeat=1)
+        build = time_it(lambda: ours.diff(theirs), repeat=1)
+        tree = time_it(lambda: ours.diff(theirs))
+
+        print "{:>10} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f}".format(
+            n, items * 1000, digest * 1e6, sets * 1000, build * 1000,
+            tree * 1e6)
+
+if __name__ == '__main__':
+    main(sys.argv)
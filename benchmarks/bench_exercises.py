@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""Compare append, remove and update on the hash indexed Exercises
+container against the original list backed implementation, and
+removing exercises from the middle of the catalog each followed by
+an index, as sampling does.
+
+Each operation is timed over a fixed number of calls against a
+catalog of the given size and reported in microseconds per call
+so the numbers show how the cost grows with the catalog::
+
+    python benchmarks/bench_exercises.py 10000 100000 1000000
+"""
+
+import sys
+
+from common import Exercise, generate_exercises, parse_sizes, time_it
+
+OPS = 100
+
+class ListExercises(object):
+    """The list backed Exercises implementation this benchmark
+    compares against. Every check is a linear scan of _items"""
+    def __init__(self, items):
+        self._items = list(items)
+
+    def append(self, exercise):
+        if exercise in self._items:
+            raise Exception("Cannot add duplicate exercise")
+        self._items.append(exercise)
+
+    def remove(self, exercise):
+        if exercise not in self._items:
+            raise ValueError("Exercise not in set")
+        self._items.remove(exercise)
+
+    def update(self, old_exercise, new_exercise):
+        if old_exercise not in self._items:
+            raise ValueError("Exercise not in exercises")
+        idx = self._items.index(old_exercise)
+        self._items[idx] = new_exercise
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+def run_ops(exercises, n):
+    """Append, update then remove OPS exercises on a catalog of
+    n exercises. Returns microseconds per call for each operation"""
+    new = [Exercise("benchmark exercise {}".format(i)) for i in xrange(OPS)]
+    updated = [Exercise("updated exercise {}".format(i)) for i in xrange(OPS)]
+
+    def append():
+        for ex in new:
+            exercises.append(ex)
+
+    def update():
+        for old_ex, new_ex in zip(new, updated):
+            exercises.update(old_ex, new_ex)
+
+    def remove():
+        for ex in updated:
+            exercises.remove(ex)
+
+    # NOTE: removes from the middle leave holes that the index right
+    # after each one has to look past
+    middle = [exercises[i] for i in xrange(n // 4, n, max(n // (2 * OPS), 1))]
+
+    def remove_index():
+        for ex in middle[:OPS]:
+            exercises.remove(ex)
+            exercises[5]
+
+    usec = 1e6 / OPS
+    return {'append': time_it(append, repeat=1) * usec,
+            'update': time_it(update, repeat=1) * usec,
+            'remove': time_it(remove, repeat=1) * usec,
+            'remove+index': time_it(remove_index, repeat=1) * usec}
+
+def main(argv):
+    print "{:>10} {:>12} {:>12} {:>12} {:>9}".format(
+        'size', 'op', 'list (us)', 'indexed (us)', 'speedup')
+    for n in parse_sizes(argv):
+        indexed = generate_exercises(n)
+        legacy = ListExercises(indexed)
+        legacy_times = run_ops(legacy, n)
+        indexed_times = run_ops(indexed, n)
+        for op in ('append', 'update', 'remove', 'remove+index'):
+            speedup = legacy_times[op] / max(indexed_times[op], 1e-9)
+            print "{:>10} {:>12} {:>12.1f} {:>12.1f} {:>8.0f}x".format(
+                n, op, legacy_times[op], indexed_times[op], speedup)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+"""Time exporting a catalog to csv, row by row as before and with
+the buffered bulk writer::
+
+    python benchmarks/bench_export.py 10000 100000 1000000
+"""
+
+import sys
+import os
+import csv
+import shutil
+import tempfile
+
+from common import generate_exercises, parse_sizes, time_it
+
+def legacy_to_csv(exercises, filename):
+    """Row by row export as Exercises.to_csv used to write it"""
+    with open(filename, 'wb') as f:
+        writer = csv.writer(f)
+        for ex in exercises:
+            writer.writerow(ex.to_list())
+
+def main(argv):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print "{:>10} {:>12} {:>12}".format('size', 'legacy (ms)', 'bulk (ms)')
+        for n in parse_sizes(argv):
+            exercises = generate_exercises(n)
+            filename = os.path.join(tmpdir, 'export_{}.csv'.format(n))
+            legacy = time_it(lambda: legacy_to_csv(exercises, filename))
+            bulk = time_it(lambda: exercises.to_csv(filename))
+            print "{:>10} {:>12.0f} {:>12.0f}".format(n, legacy * 1000,
+                                                      bulk * 1000)
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main(sys.argv)
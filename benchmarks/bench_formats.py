@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""Compare the formats a catalog can be stored in by the time to save
+and load it, the size of the file and the peak memory of loading it,
+next to the pickle of the whole Exercises written before records::
+
+    python benchmarks/bench_formats.py 10000 100000 1000000
+
+Peak memory is measured in a fresh process and includes the loaded
+catalog itself.
+"""
+
+import sys
+import os
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from common import fresh_peak_mb, generate_exercises, parse_sizes, time_it
+
+from formats import FORMATS
+from journal import atomic_dump
+from records import dump_exercises, load_exercises
+
+PATH = '_bench_formats.pkl'
+
+LOADERS = {'legacy': pickle.load}
+
+def load(path, loader):
+    with open(path, 'rb') as f:
+        return loader(f)
+
+def load_format(path, name):
+    """Load path written in the named format or as legacy"""
+    return load(path, LOADERS.get(name, load_exercises))
+
+def main(argv):
+    print "{:>10} {:>8} {:>12} {:>12} {:>10} {:>10}".format(
+        'size', 'format', 'save (ms)', 'load (ms)', 'file (MB)', 'peak (MB)')
+    writers = [('legacy', lambda exercises: atomic_dump(exercises, PATH))]
+    for name in sorted(FORMATS):
+        writers.append((name, lambda exercises, name=name:
+                        dump_exercises(exercises, PATH, name)))
+
+    for n in parse_sizes(argv):
+        exercises = generate_exercises(n)
+        # NOTE: a tenth of the catalog carries durations and weights
+        for exercise_id, exercise in list(exercises.items())[::10]:
+            exercises.update_by_id(exercise_id,
+                                   type(exercise)(exercise.description, 30))
+            exercises.set_weight(exercise_id, 2.5)
+
+        for name, write in writers:
+            try:
+                save = time_it(lambda: write(exercises), repeat=1)
+                size = os.path.getsize(PATH) / float(1 << 20)
+                loaded = time_it(lambda: load_format(PATH, name), repeat=1)
+                peak = fresh_peak_mb('bench_formats', 'load_format', PATH, name)
+            finally:
+                if os.path.isfile(PATH):
+                    os.remove(PATH)
+
+            print "{:>10} {:>8} {:>12.1f} {:>12.1f} {:>10.1f} {:>10.1f}".format(
+                n, name, save * 1000, loaded * 1000, size, peak)
+
+if __name__ == '__main__':
+    main(sys.argv)
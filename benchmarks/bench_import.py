@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+"""Time the streaming csv import into Exercises and into a Trainer,
+which also persists the imported exercises once::
+
+    python benchmarks/bench_import.py 1000000 2000000
+"""
+
+import sys
+import os
+import csv
+import shutil
+import tempfile
+
+from common import Exercises, generate_descriptions, parse_sizes, time_it
+
+from trainer import Trainer
+from records import dump_exercises
+
+def write_csv(filename, n):
+    with open(filename, 'wb') as f:
+        writer = csv.writer(f)
+        writer.writerows([desc] for desc in generate_descriptions(n))
+
+def main(argv):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print "{:>10} {:>14} {:>14}".format('rows', 'Exercises (s)', 'Trainer (s)')
+        for n in parse_sizes(argv):
+            filename = os.path.join(tmpdir, 'exercises.csv')
+            conn = os.path.join(tmpdir, 'data.pkl')
+            write_csv(filename, n)
+
+            def import_exercises():
+                Exercises().add_exercises_from_csv(filename)
+
+            def import_trainer():
+                dump_exercises(Exercises(), conn)
+                Trainer(conn=conn).add_exercises_from_csv(filename)
+
+            print "{:>10} {:>14.2f} {:>14.2f}".format(
+                n, time_it(import_exercises, repeat=1),
+                time_it(import_trainer, repeat=1))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main(sys.argv)
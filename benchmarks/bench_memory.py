@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""Report the memory used per exercise by the previous dictionary
+based Exercise, the slotted Exercise and PackedExercises::
+
+    python benchmarks/bench_memory.py 10000 100000 1000000
+
+Python 2 has no tracemalloc so allocations are counted by walking
+the containers with sys.getsizeof. Shared objects such as the class
+and interned strings are only counted once.
+"""
+
+import sys
+
+from common import Exercises, Exercise, generate_descriptions, parse_sizes
+
+from exercises import PackedExercises
+
+class DictExercise(object):
+    """Exercise as it was before it used slots"""
+    def __init__(self, description):
+        self._description = description
+
+def deep_size(*objects):
+    """Bytes allocated for objects and everything they reference"""
+    seen = set()
+    size = 0
+    stack = list(objects)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif isinstance(obj, DictExercise):
+            stack.append(obj.__dict__)
+        elif isinstance(obj, Exercise):
+            stack.append(obj.description)
+            stack.append(hash(obj))
+    return size
+
+def main(argv):
+    print "{:>10} {:>14} {:>14} {:>14}".format(
+        'size', 'dict (B/ex)', 'slots (B/ex)', 'packed (B/ex)')
+    for n in parse_sizes(argv):
+        descriptions = list(generate_descriptions(n))
+
+        legacy = [DictExercise(desc) for desc in descriptions]
+        positions = dict((ex, i) for i, ex in enumerate(legacy))
+        legacy_size = deep_size(legacy, positions)
+        del legacy, positions
+
+        exercises = Exercises()
+        for desc in descriptions:
+            exercises.append(Exercise(desc))
+        slots_size = deep_size(exercises._items, exercises._positions)
+
+        packed = PackedExercises(exercises)
+        packed_size = sum(sys.getsizeof(column) for column in (
+            packed._buffer, packed._offsets, packed._ids, packed._durations,
+            packed._slots))
+        del exercises
+
+        print "{:>10} {:>14.1f} {:>14.1f} {:>14.1f}".format(
+            n, float(legacy_size) / n, float(slots_size) / n,
+            float(packed_size) / n)
+
+if __name__ == '__main__':
+    main(sys.argv)
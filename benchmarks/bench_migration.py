@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""Time loading and saving a catalog as a pickle of the whole
+Exercises as before and as versioned records, and migrating it from
+the pickle. Also report the peak memory of a fresh process that
+migrates a records file through one more version, which streams the
+records instead of holding them::
+
+    python benchmarks/bench_migration.py 10000 100000 1000000
+"""
+
+import sys
+import os
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from common import fresh_peak_mb, generate_exercises, parse_sizes, time_it
+
+import records
+import migrations
+from journal import atomic_dump
+from records import SCHEMA_VERSION, dump_exercises, load_exercises
+
+def load_pickle(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def load_records(path):
+    with open(path, 'rb') as f:
+        return load_exercises(f)
+
+def migrate_to_next_version(path):
+    """Migrate path from the current version to the next with a
+    migration that changes nothing"""
+    records.SCHEMA_VERSION = migrations.SCHEMA_VERSION = SCHEMA_VERSION + 1
+    migrations.migration(SCHEMA_VERSION)(lambda record: record)
+    migrations.migrate(path)
+
+def main(argv):
+    legacy = '_bench_legacy.pkl'
+    current = '_bench_records.pkl'
+    print "{:>10} {:>12} {:>12} {:>12} {:>12} {:>12} {:>12}".format(
+        'size', 'load (ms)', 'records (ms)', 'save (ms)', 'records (ms)',
+        'migrate (ms)', 'stream (MB)')
+    for n in parse_sizes(argv):
+        exercises = generate_exercises(n)
+        try:
+            save = time_it(lambda: atomic_dump(exercises, legacy), repeat=1)
+            save_records = time_it(lambda: dump_exercises(exercises, current),
+                                   repeat=1)
+            load = time_it(lambda: load_pickle(legacy), repeat=1)
+            load_current = time_it(lambda: load_records(current), repeat=1)
+            migrate = time_it(lambda: migrations.migrate(legacy), repeat=1)
+            peak = fresh_peak_mb('bench_migration', 'migrate_to_next_version',
+                                 current)
+        finally:
+            for path in (legacy, current):
+                if os.path.isfile(path):
+                    os.remove(path)
+
+        print "{:>10} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f}".format(
+            n, load * 1000, load_current * 1000, save * 1000,
+            save_records * 1000, migrate * 1000, peak)
+
+if __name__ == '__main__':
+    main(sys.argv)
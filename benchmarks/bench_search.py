@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+"""Time building, saving and loading the search index of a catalog,
+and queries on it against a scan of every description::
+
+    python benchmarks/bench_search.py 10000 100000 1000000
+"""
+
+import sys
+import os
+import random
+import tempfile
+
+from common import parse_sizes, time_it
+
+from search import SearchIndex, parse_query, tokenize
+
+WORDS = ('build write create sort search balance merge parse load print '
+         'binary tree list heap graph queue stack table string file csv '
+         'console script class test repo logging socket thread cache '
+         'matrix').split()
+# NOTE: descriptions mix the common words with a long tail of topics
+TOPICS = ['topic{}'.format(i) for i in xrange(5000)]
+QUERIES = ('topic42', 'heap topic7', 'binary tree', 'topic123*', 'pars* csv')
+
+def generate_items(n):
+    """Yield ids and descriptions of two common words, four topics
+    and a number"""
+    rng = random.Random(0)
+    for i in xrange(1, n + 1):
+        words = ([rng.choice(WORDS) for _ in xrange(2)] +
+                 [rng.choice(TOPICS) for _ in xrange(4)])
+        yield i, "{} {}".format(' '.join(words), i)
+
+def scan(items, query):
+    """Ids matching every term of query, by reading every
+    description"""
+    terms = parse_query(query)
+    ids = []
+    for exercise_id, description in items:
+        tokens = tokenize(description)
+        if all(any(token == term or (is_prefix and token.startswith(term))
+                   for token in tokens)
+               for term, is_prefix in terms):
+            ids.append(exercise_id)
+    return ids
+
+def main(argv):
+    print "{:>10} {:>12} {:>10} {:>10} {:>16} {:>12} {:>10}".format(
+        'size', 'build (s)', 'save (s)', 'load (s)', 'query', 'index (ms)',
+        'scan (ms)')
+    path = os.path.join(tempfile.mkdtemp(), 'bench.search')
+    for n in parse_sizes(argv):
+        items = list(generate_items(n))
+        build = time_it(lambda: SearchIndex(items), repeat=1)
+        index = SearchIndex(items)
+        save = time_it(lambda: index.save(path, 'stamp'), repeat=1)
+        load = time_it(lambda: SearchIndex.load(path, 'stamp'), repeat=1)
+
+        for query in QUERIES:
+            indexed = time_it(lambda: index.search(query, limit=20))
+            scanned = time_it(lambda: scan(items, query), repeat=1)
+            print "{:>10} {:>12.2f} {:>10.2f} {:>10.2f} {:>16} {:>12.2f} {:>10.1f}".format(
+                n, build, save, load, query, indexed * 1000, scanned * 1000)
+
+    for name in os.listdir(os.path.dirname(path)):
+        os.remove(os.path.join(os.path.dirname(path), name))
+    os.rmdir(os.path.dirname(path))
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+"""Time opening a catalog and listing it or drawing a new list of
+ten exercises, from the pickle and from the memory-mapped snapshot,
+and looking up the id of the last exercise in the snapshot::
+
+    python benchmarks/bench_snapshot.py 1000 100000 1000000
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+
+from common import generate_exercises, parse_sizes, time_it
+
+from records import dump_exercises
+from storage import PickleStorage
+
+def main(argv):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print "{:>10} {:>14} {:>14} {:>14} {:>14} {:>14}".format(
+            'size', 'list pkl (ms)', 'list snap (ms)',
+            'new pkl (ms)', 'new snap (ms)', 'id snap (ms)')
+        for n in parse_sizes(argv):
+            conn = os.path.join(tmpdir, 'data_{}.pkl'.format(n))
+            exercises = generate_exercises(n)
+            last = exercises[-1]
+            dump_exercises(exercises, conn)
+            # NOTE: the first open builds the index and the snapshot
+            PickleStorage(conn, lazy=True, snapshot=True).close()
+
+            def run(snapshot, action):
+                def bench():
+                    storage = PickleStorage(conn, journal=True, lazy=True,
+                                            snapshot=snapshot)
+                    action(storage)
+                    storage.close()
+                return time_it(bench) * 1000
+
+            listing = lambda storage: sum(1 for _ in storage)
+            new_list = lambda storage: storage.sample(10)
+            id_of = lambda storage: storage.id_of(last)
+            print ("{:>10} {:>14.1f} {:>14.1f} {:>14.1f} {:>14.1f} "
+                   "{:>14.1f}").format(
+                n, run(False, listing), run(True, listing),
+                run(False, new_list), run(True, new_list),
+                run(True, id_of))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main(sys.argv)
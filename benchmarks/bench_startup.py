@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""Time the trainer command line entry point adding one exercise,
+with the catalog loaded up front as before, with lazy loading and
+through a running ``--serve`` daemon::
+
+    python benchmarks/bench_startup.py 1000 100000 1000000
+
+Each run is a fresh interpreter so the numbers include interpreter
+start up, as a user of the command line would see them.
+"""
+
+import sys
+import os
+import time
+import signal
+import shutil
+import tempfile
+import subprocess
+
+from common import generate_exercises, parse_sizes, time_it
+
+from records import dump_exercises
+from daemon import socket_path, ping
+
+TRAINER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', 'trainer', 'trainer.py')
+
+EAGER = """
+import sys
+sys.path.insert(0, {trainer_dir!r})
+from trainer import Trainer
+from exercises import Exercise
+Trainer(conn={conn!r}, journal=True).add_exercise(Exercise({desc!r}))
+"""
+
+def main(argv):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print "{:>10} {:>12} {:>12} {:>12}".format(
+            'size', 'eager (ms)', 'lazy (ms)', 'daemon (ms)')
+        for n in parse_sizes(argv):
+            conn = os.path.join(tmpdir, 'data_{}.pkl'.format(n))
+            dump_exercises(generate_exercises(n), conn)
+            # NOTE: the first lazy run builds the index of the snapshot
+            with open(os.devnull, 'w') as devnull:
+                subprocess.check_call([sys.executable, TRAINER, '-c', conn],
+                                      stdout=devnull)
+
+            runs = iter(xrange(1000))
+            def eager():
+                code = EAGER.format(trainer_dir=os.path.dirname(TRAINER),
+                                    conn=conn, desc='eager {}'.format(next(runs)))
+                subprocess.check_call([sys.executable, '-c', code])
+
+            def lazy():
+                subprocess.check_call([sys.executable, TRAINER, '-c', conn,
+                                       '-a', 'lazy {}'.format(next(runs))])
+
+            eager_time = time_it(eager)
+            lazy_time = time_it(lazy)
+
+            daemon = subprocess.Popen([sys.executable, TRAINER, '-c', conn,
+                                       '--serve'])
+            while not ping(socket_path(conn)):
+                time.sleep(0.05)
+            try:
+                daemon_time = time_it(lazy)
+            finally:
+                daemon.send_signal(signal.SIGTERM)
+                daemon.wait()
+
+            print "{:>10} {:>12.0f} {:>12.0f} {:>12.0f}".format(
+                n, eager_time * 1000, lazy_time * 1000, daemon_time * 1000)
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main(sys.argv)
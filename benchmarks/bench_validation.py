@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""Time validating exercises one at a time, several at a time and
+again from the cache::
+
+    python benchmarks/bench_validation.py 8 32 128
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import multiprocessing
+
+from common import parse_sizes, time_it
+
+from validation import Validation, ValidationRunner
+
+SOLUTION = """
+def fib(n):
+    return n if n < 2 else fib(n - 1) + fib(n - 2)
+"""
+
+TESTS = """
+import unittest
+from solution import fib
+
+class FibTestCases(unittest.TestCase):
+    def test_fib(self):
+        self.assertEqual(fib(22), 17711)
+"""
+
+def write_validations(tmpdir, n):
+    """Write n distinct solutions with their tests"""
+    validations = []
+    for i in xrange(n):
+        path = os.path.join(tmpdir, str(i))
+        os.mkdir(path)
+        with open(os.path.join(path, 'solution.py'), 'w') as f:
+            f.write(SOLUTION + '# {}\n'.format(i))
+        with open(os.path.join(path, 'test_solution.py'), 'w') as f:
+            f.write(TESTS)
+        validations.append((i, Validation(os.path.join(path, 'solution.py'),
+                                          os.path.join(path, 'test_solution.py'))))
+    return validations
+
+def main(argv):
+    jobs = multiprocessing.cpu_count()
+    print "{:>10} {:>12} {:>16} {:>12}".format(
+        'size', 'serial (s)', '{} jobs (s)'.format(jobs), 'cached (ms)')
+    for n in parse_sizes(argv):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            validations = write_validations(tmpdir, n)
+            cache = os.path.join(tmpdir, 'cache')
+            serial = time_it(lambda: list(
+                ValidationRunner(jobs=1).run(validations)), repeat=1)
+            parallel = time_it(lambda: list(
+                ValidationRunner(cache, jobs=jobs).run(validations)), repeat=1)
+            cached = time_it(lambda: list(
+                ValidationRunner(cache).run(validations)))
+            print "{:>10} {:>12.2f} {:>16.2f} {:>12.1f}".format(
+                n, serial, parallel, cached * 1000)
+        finally:
+            shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+"""Time taking every exercise of a catalog and a page of 20 from its
+middle, as a copy as before and as a read-only view::
+
+    python benchmarks/bench_views.py 10000 100000 1000000
+"""
+
+import sys
+
+from common import generate_exercises, parse_sizes, time_it
+
+from exercises import Exercises, ExercisesView
+
+PAGE = 20
+
+def main(argv):
+    print "{:>10} {:>12} {:>12} {:>16} {:>16}".format(
+        'size', 'copy (ms)', 'view (us)', 'copy page (ms)', 'view page (us)')
+    for n in parse_sizes(argv):
+        exercises = generate_exercises(n)
+        middle = n // 2
+
+        copy = time_it(lambda: Exercises(exercises))
+        view = time_it(lambda: ExercisesView(exercises))
+        copy_page = time_it(
+            lambda: list(Exercises(exercises))[middle:middle + PAGE])
+        view_page = time_it(
+            lambda: list(ExercisesView(exercises)[middle:middle + PAGE]))
+
+        print "{:>10} {:>12.1f} {:>12.1f} {:>16.1f} {:>16.1f}".format(
+            n, copy * 1000, view * 1e6, copy_page * 1000, view_page * 1e6)
+
+if __name__ == '__main__':
+    main(sys.argv)
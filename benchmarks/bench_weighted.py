@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+"""Time building the weighted sampler of a catalog, updating weights
+and drawing weighted lists of ten exercises::
+
+    python benchmarks/bench_weighted.py 10000 100000 1000000
+"""
+
+import sys
+import random
+
+from common import generate_exercises, parse_sizes, time_it
+
+from sampling import WeightedSampler
+
+OPS = 1000
+
+def main(argv):
+    print "{:>10} {:>12} {:>14} {:>14}".format(
+        'size', 'build (ms)', 'update (us)', 'sample (us)')
+    for n in parse_sizes(argv):
+        exercises = generate_exercises(n)
+        rng = random.Random(0)
+        weights = dict((i, rng.uniform(0.25, 4)) for i in xrange(1, n + 1, 3))
+        build = time_it(lambda: WeightedSampler(exercises.items(), weights),
+                        repeat=1)
+
+        sampler = WeightedSampler(exercises.items(), weights)
+        ids = [rng.randint(1, n) for _ in xrange(OPS)]
+        update = time_it(lambda: [sampler.set_weight(i, rng.uniform(0.25, 4))
+                                  for i in ids])
+        sample = time_it(lambda: [sampler.sample(10, rng) for _ in xrange(OPS)])
+        print "{:>10} {:>12.1f} {:>14.2f} {:>14.2f}".format(
+            n, build * 1000, update * 1e6 / OPS, sample * 1e6 / OPS)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+"""Helpers shared by the trainer benchmarks"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'trainer'))
+
+import subprocess
+import timeit
+
+from exercises import Exercises, Exercise
+
+SIZES = (10000, 100000, 1000000)
+
+def generate_descriptions(n, start=0):
+    """Yield ``n`` unique synthetic exercise descriptions"""
+    for i in xrange(start, start + n):
+        yield "Synthetic programming exercise number {}".format(i)
+
+def generate_exercises(n):
+    """Build an Exercises catalog of ``n`` synthetic exercises"""
+    exercises = Exercises()
+    for desc in generate_descriptions(n):
+        exercises.append(Exercise(desc))
+    return exercises
+
+def time_it(func, repeat=3):
+    """Best wall clock time in seconds of ``repeat`` calls to func"""
+    best = None
+    for _ in xrange(repeat):
+        start = timeit.default_timer()
+        func()
+        elapsed = timeit.default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+# NOTE: the peak is read from /proc as ru_maxrss is carried over from
+# the parent through fork and exec
+_PEAK_CODE = """
+import sys
+sys.path[:0] = {path!r}
+import {module}
+
+def peak():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+
+before = peak()
+{module}.{function}(*{args!r})
+print peak() - before
+"""
+
+def fresh_peak_mb(module, function, *args):
+    """Peak resident memory in MB that calling function of the
+    benchmark module with args adds to a fresh interpreter. A forked
+    child would reuse memory its parent freed and understate it.
+    Linux only"""
+    code = _PEAK_CODE.format(path=sys.path, module=module,
+                             function=function, args=args)
+    kilobytes = int(subprocess.check_output([sys.executable, '-c', code]))
+    return kilobytes / 1024.0
+
+def parse_sizes(argv):
+    """Catalog sizes from the command line or the default sizes"""
+    if len(argv) > 1:
+        return [int(arg) for arg in argv[1:]]
+    return SIZES
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+"""Time the hot paths of Exercises and Trainer on synthetic catalogs
+and compare the results against a stored baseline::
+
+    python benchmarks/suite.py
+    python benchmarks/suite.py 1000 10000 --output results.json
+    python benchmarks/suite.py --save-baseline
+
+Each catalog size runs in a fresh interpreter so the peak memory it
+reports belongs to that size alone. The results are written as JSON
+and every metric that is more than --threshold worse than the
+baseline is reported as a regression, with a non zero exit status so
+the suite can gate a release.
+"""
+
+import sys
+import os
+import json
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+
+from common import Exercise, generate_exercises, time_it
+
+from exercises import Exercises, write_csv
+from records import dump_exercises
+from storage import PickleStorage
+from trainer import Trainer
+
+SIZES = (1000, 10000, 100000, 1000000)
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+# NOTE: calls per timing of the operations reported per call
+OPS = 1000
+
+# NOTE: metric names end in their unit. Lower is better for all
+METRICS = (
+    'append_us', 'remove_us', 'update_us', 'getitem_us',
+    'csv_import_s', 'csv_export_s',
+    'trainer_load_s', 'trainer_save_s', 'new_list_us',
+    'peak_memory_mb',
+)
+
+def per_call_us(func, repeat=1):
+    """Microseconds per call of func, which makes OPS calls"""
+    return time_it(func, repeat=repeat) * 1e6 / OPS
+
+def bench_exercises(exercises):
+    """Per call cost of the Exercises operations on a full catalog"""
+    new = [Exercise("suite exercise {}".format(i)) for i in xrange(OPS)]
+    updated = [Exercise("suite updated {}".format(i)) for i in xrange(OPS)]
+    step = max(len(exercises) // OPS, 1)
+    indices = [(i * step) % len(exercises) for i in xrange(OPS)]
+
+    def getitem():
+        for i in indices:
+            exercises[i]
+
+    def append():
+        for ex in new:
+            exercises.append(ex)
+
+    def update():
+        for old_ex, new_ex in zip(new, updated):
+            exercises.update(old_ex, new_ex)
+
+    def remove():
+        for ex in updated:
+            exercises.remove(ex)
+
+    # NOTE: getitem runs first as the removals leave holes that the
+    # next getitem compacts
+    return {'getitem_us': per_call_us(getitem, repeat=3),
+            'append_us': per_call_us(append),
+            'update_us': per_call_us(update),
+            'remove_us': per_call_us(remove)}
+
+def bench_csv(exercises, tmpdir):
+    """Time exporting the catalog to csv and importing it back"""
+    filename = os.path.join(tmpdir, 'exercises.csv')
+    results = {'csv_export_s': time_it(lambda: write_csv(exercises, filename))}
+    results['csv_import_s'] = time_it(
+        lambda: Exercises().add_exercises_from_csv(filename))
+    return results
+
+def bench_trainer(exercises, tmpdir):
+    """Time loading and saving a pickled catalog and drawing lists"""
+    conn = os.path.join(tmpdir, 'data.pkl')
+    dump_exercises(exercises, conn)
+
+    results = {'trainer_load_s': time_it(lambda: Trainer(conn=conn))}
+    storage = PickleStorage(conn)
+    results['trainer_save_s'] = time_it(storage.save)
+
+    trainer = Trainer(conn=conn)
+    seeds = iter(xrange(OPS))
+    results['new_list_us'] = per_call_us(
+        lambda: [trainer.get_new_list(10, next(seeds)) for _ in xrange(OPS)])
+    return results
+
+def run_size(n):
+    """All metrics for a catalog of n exercises"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        exercises = generate_exercises(n)
+        results = {}
+        results.update(bench_csv(exercises, tmpdir))
+        results.update(bench_trainer(exercises, tmpdir))
+        results.update(bench_exercises(exercises))
+    finally:
+        shutil.rmtree(tmpdir)
+
+    # NOTE: ru_maxrss is in kilobytes on Linux and bytes on OS X
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        maxrss /= 1024
+    results['peak_memory_mb'] = maxrss / 1024.0
+    return results
+
+def run_suite(sizes):
+    """Run each size in a child interpreter and collect the results"""
+    results = {'python': platform.python_version(),
+               'platform': platform.platform(),
+               'sizes': {}}
+    for n in sizes:
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), '--worker', str(n)])
+        results['sizes'][str(n)] = json.loads(output)
+        print >>sys.stderr, "{:>10} done".format(n)
+    return results
+
+def write_json(results, filename):
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True, separators=(',', ': '))
+        f.write('\n')
+
+def compare(results, baseline, threshold):
+    """Metrics more than threshold worse than the baseline
+
+    Returns
+    -------
+    list of tuple
+        size, metric, baseline value and current value of each
+        regression
+    """
+    regressions = []
+    for size, metrics in sorted(results['sizes'].items(), key=lambda x: int(x[0])):
+        expected = baseline.get('sizes', {}).get(size)
+        if expected is None:
+            continue
+
+        for metric in METRICS:
+            if metric not in metrics or metric not in expected:
+                continue
+            if metrics[metric] > expected[metric] * (1 + threshold):
+                regressions.append((size, metric, expected[metric],
+                                    metrics[metric]))
+    return regressions
+
+def report(results, baseline):
+    print "{:>10} {:>16} {:>12} {:>12} {:>8}".format(
+        'size', 'metric', 'current', 'baseline', 'change')
+    for size, metrics in sorted(results['sizes'].items(), key=lambda x: int(x[0])):
+        expected = baseline.get('sizes', {}).get(size, {})
+        for metric in METRICS:
+            current = metrics[metric]
+            if metric in expected:
+                change = "{:+.0%}".format(current / max(expected[metric], 1e-12) - 1)
+                print "{:>10} {:>16} {:>12.4g} {:>12.4g} {:>8}".format(
+                    size, metric, current, expected[metric], change)
+            else:
+                print "{:>10} {:>16} {:>12.4g} {:>12} {:>8}".format(
+                    size, metric, current, '-', '-')
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=list(SIZES),
+            help='catalog sizes to run')
+    parser.add_argument('-o', '--output',
+            help='write the results as JSON to this file')
+    parser.add_argument('-b', '--baseline', default=BASELINE,
+            help='baseline JSON file to compare against')
+    parser.add_argument('-t', '--threshold', type=float, default=0.5,
+            help='relative slow down reported as a regression')
+    parser.add_argument('--save-baseline', action='store_true',
+            help='store the results as the new baseline')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv[1:])
+
+    if args.worker is not None:
+        print json.dumps(run_size(args.worker))
+        return 0
+
+    results = run_suite(args.sizes)
+    if args.output:
+        write_json(results, args.output)
+
+    if args.save_baseline:
+        write_json(results, args.baseline)
+        print "Baseline saved to {}".format(args.baseline)
+        return 0
+
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    report(results, baseline)
+    regressions = compare(results, baseline, args.threshold)
+    for size, metric, expected, current in regressions:
+        print "REGRESSION {} at {}: {:.4g} -> {:.4g}".format(
+            metric, size, expected, current)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -33,8 +33,9 @@ class FunctionalTestCase1(unittest.TestCase):
         self.trainer = Trainer(conn=self._TMP_DATA_FILE)
 
     def tearDown(self):
-        if os.path.isfile(self._TMP_DATA_FILE):
-            os.remove(self._TMP_DATA_FILE)
+        for suffix in ('', '.lock'):
+            if os.path.isfile(self._TMP_DATA_FILE + suffix):
+                os.remove(self._TMP_DATA_FILE + suffix)
 
     def test_user_bulk_add_exercises(self):
         """A user wants to load more than one programming
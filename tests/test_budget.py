@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('../trainer'))
+sys.path.insert(0, os.path.abspath('./trainer'))
+
+import unittest
+import random
+
+from budget import BudgetIndex
+from exercises import Exercise
+
+class BudgetIndexTestCases(unittest.TestCase):
+    def setUp(self):
+        self.exercises = [Exercise("Exercise {}".format(i), 5 + i % 40)
+                          for i in range(500)]
+        self.index = BudgetIndex(self.exercises)
+
+    def test_len(self):
+        self.assertEqual(len(self.index), 500)
+
+    def test_select_fits_budget(self):
+        for minutes in (5, 17, 60, 90, 240):
+            drawn = self.index.select(minutes, random.Random(minutes))
+            self.assertEqual(len(set(drawn)), len(drawn))
+            self.assertEqual(sum(ex.duration for ex in drawn), minutes)
+
+    def test_select_is_random(self):
+        first = self.index.select(120, random.Random(1))
+        second = self.index.select(120, random.Random(2))
+        self.assertNotEqual(first, second)
+
+    def test_select_with_seed(self):
+        self.assertEqual(self.index.select(120, random.Random(3)),
+                         self.index.select(120, random.Random(3)))
+
+    def test_select_nothing_fits(self):
+        self.assertEqual(self.index.select(4), [])
+
+    def test_select_budget_above_total(self):
+        index = BudgetIndex(self.exercises[:10])
+        drawn = index.select(10000, random.Random(1))
+        self.assertEqual(set(drawn), set(self.exercises[:10]))
+
+    def test_select_closest_fit(self):
+        exercises = [Exercise("long", 50), Exercise("short", 30),
+                     Exercise("other short", 30)]
+        drawn = BudgetIndex(exercises).select(70, random.Random(1))
+        self.assertEqual(sum(ex.duration for ex in drawn), 60)
+
+    def test_select_invalid_budget(self):
+        for minutes in (0, -5, 1.5, '60'):
+            with self.assertRaises(ValueError):
+                self.index.select(minutes)
+
+    def test_exercises_without_duration(self):
+        exercises = [Exercise("timed", 20), Exercise("untimed")]
+        self.assertEqual(len(BudgetIndex(exercises)), 1)
+        self.assertEqual(BudgetIndex(exercises).select(100), [exercises[0]])
+
+        index = BudgetIndex(exercises, default_duration=30)
+        self.assertEqual(set(index.select(50)), set(exercises))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('../trainer'))
+sys.path.insert(0, os.path.abspath('./trainer'))
+
+import unittest
+import glob
+
+from completions import (CompletionLog, DurationStats, completion_day,
+                         completion_weight, recency_factor)
+
+# NOTE: 2016-10-18 00:00:00 UTC
+DAY = 1476748800.0
+
+class DurationStatsTestCases(unittest.TestCase):
+    def test_empty(self):
+        report = DurationStats().report()
+        self.assertEqual(report.count, 0)
+        self.assertIsNone(report.mean)
+        self.assertIsNone(report.p50)
+
+    def test_report(self):
+        stats = DurationStats()
+        for seconds in range(1, 1001):
+            stats.add(seconds)
+
+        report = stats.report()
+        self.assertEqual(report.count, 1000)
+        self.assertEqual(report.total, 500500)
+        self.assertEqual(report.mean, 500.5)
+        self.assertEqual((report.minimum, report.maximum), (1, 1000))
+        self.assertAlmostEqual(report.p50, 500, delta=10)
+        self.assertAlmostEqual(report.p90, 900, delta=18)
+        self.assertAlmostEqual(report.p99, 990, delta=20)
+
+    def test_single_duration_is_exact(self):
+        stats = DurationStats()
+        stats.add(1800)
+        self.assertEqual(stats.percentile(50), 1800)
+
+    def test_state_round_trip(self):
+        stats = DurationStats()
+        for seconds in (0.5, 30, 3600):
+            stats.add(seconds)
+        self.assertEqual(DurationStats.from_state(stats.state()).report(),
+                         stats.report())
+
+class WeightTestCases(unittest.TestCase):
+    def test_completion_weight(self):
+        overall = DurationStats()
+        stats = DurationStats()
+        for seconds in (600, 1800):
+            overall.add(seconds)
+        stats.add(1800)
+        self.assertEqual(completion_weight(stats.report(), overall.report()),
+                         1.5)
+        stats.add(36000)
+        self.assertEqual(completion_weight(stats.report(), overall.report()),
+                         4.0)
+
+    def test_recency_factor(self):
+        self.assertEqual(recency_factor(0), 0.5)
+        self.assertEqual(recency_factor(-60), 0.5)
+        self.assertAlmostEqual(recency_factor(86400), 0.75)
+        self.assertTrue(recency_factor(3600) < recency_factor(7200) < 1)
+        self.assertEqual(recency_factor(30 * 86400), 1.0)
+
+class CompletionLogTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_LOG = "_tmp_data.pkl.completions"
+        self.log = CompletionLog(self._TMP_LOG)
+
+    def tearDown(self):
+        self.log.close()
+        for path in glob.glob(self._TMP_LOG + '*'):
+            os.remove(path)
+
+    def record_days(self, days, log=None):
+        for day in range(days):
+            for exercise_id in (1, 2):
+                start = DAY + day * 86400 + exercise_id * 3600
+                (log or self.log).record(exercise_id, start,
+                                         start + 600 * exercise_id)
+
+    def test_completion_day(self):
+        self.assertEqual(completion_day(DAY + 3600), '2016-10-18')
+
+    def test_report(self):
+        self.record_days(3)
+        self.assertEqual(self.log.report().count, 6)
+        self.assertEqual(self.log.report(exercise_id=2).mean, 1200)
+        self.assertEqual(self.log.report(day='2016-10-19').total, 1800)
+        self.assertEqual(self.log.report(exercise_id=3).count, 0)
+
+        with self.assertRaises(ValueError):
+            self.log.report(exercise_id=1, day='2016-10-19')
+
+    def test_reports_grouped(self):
+        self.record_days(3)
+        self.assertEqual(sorted(self.log.reports_by_exercise()), [1, 2])
+        self.assertEqual(sorted(self.log.reports_by_day()),
+                         ['2016-10-18', '2016-10-19', '2016-10-20'])
+
+    def test_record_ends_before_start(self):
+        with self.assertRaises(ValueError):
+            self.log.record(1, DAY, DAY - 1)
+
+    def test_log_is_json_lines(self):
+        self.log.record(1, DAY, DAY + 60)
+        with open(self._TMP_LOG) as f:
+            self.assertEqual(f.read(),
+                             '{"end":1476748860.0,"id":1,"start":1476748800.0}\n')
+
+    def test_aggregates_survive_reopen(self):
+        self.record_days(2)
+        self.log.close()
+        log = CompletionLog(self._TMP_LOG)
+        self.assertEqual(log.report(), self.log.report())
+        log.close()
+
+    def test_lines_past_saved_aggregates_are_folded_in(self):
+        self.record_days(2)
+        self.log.close()
+        self.record_days(2)
+
+        log = CompletionLog(self._TMP_LOG)
+        self.assertEqual(log.report().count, 8)
+        log.close()
+
+    def test_torn_line_is_dropped(self):
+        self.record_days(1)
+        with open(self._TMP_LOG, 'ab') as f:
+            f.write('{"end":1476')
+
+        log = CompletionLog(self._TMP_LOG)
+        self.assertEqual(log.report().count, 2)
+        log.record(1, DAY, DAY + 60)
+        log.close()
+        log = CompletionLog(self._TMP_LOG)
+        self.assertEqual(log.report().count, 3)
+        log.close()
+
+    def test_rotation_keeps_aggregates(self):
+        self.log.close()
+        self.log = CompletionLog(self._TMP_LOG, limit=1000)
+        self.record_days(30)
+        self.assertTrue(len(self.log.archives()) > 1)
+        self.assertTrue(os.path.getsize(self._TMP_LOG) <= 1000)
+        self.assertEqual(self.log.report().count, 60)
+
+        self.log.close()
+        log = CompletionLog(self._TMP_LOG)
+        self.assertEqual(log.report(), self.log.report())
+        log.close()
+
+    def test_interrupted_rotation(self):
+        self.record_days(2)
+        self.log.close()
+        # NOTE: the rename of a rotation without the aggregates saved
+        os.rename(self._TMP_LOG, self._TMP_LOG + '.0')
+
+        log = CompletionLog(self._TMP_LOG)
+        self.assertEqual(log.report().count, 4)
+        self.record_days(1, log)
+        self.assertEqual(log.report().count, 6)
+        log.close()
+
+    def test_lost_aggregates_are_rebuilt(self):
+        self.log.close()
+        self.log = CompletionLog(self._TMP_LOG, limit=1000)
+        self.record_days(30)
+        self.log.close()
+        os.remove(self._TMP_LOG + '.agg')
+
+        log = CompletionLog(self._TMP_LOG)
+        self.assertEqual(log.report(), self.log.report())
+        self.assertEqual(log.reports_by_day(), self.log.reports_by_day())
+        log.close()
+
+    def test_recency_factors(self):
+        self.log.record(1, DAY, DAY + 60)
+        self.log.record(2, DAY - 30 * 86400, DAY - 30 * 86400 + 60)
+        self.log.record(1, DAY - 86400, DAY - 86400 + 60)
+        self.assertEqual(self.log.recency_factors(now=DAY + 60), {1: 0.5})
+        self.log.close()
+
+        log = CompletionLog(self._TMP_LOG)
+        factors = log.recency_factors(now=DAY + 86400 + 60)
+        self.assertEqual(factors.keys(), [1])
+        self.assertAlmostEqual(factors[1], 0.75)
+        self.assertEqual(log.recency_factors(now=DAY + 30 * 86400), {})
+        log.close()
+
+    def test_records_of_other_logs_are_folded_in(self):
+        other = CompletionLog(self._TMP_LOG)
+        self.log.record(1, DAY, DAY + 60)
+        other.record(2, DAY, DAY + 120)
+        self.log.record(1, DAY, DAY + 60)
+        self.assertEqual(self.log.report().count, 3)
+        self.assertEqual(self.log.report(exercise_id=2).count, 1)
+
+        # NOTE: the stale instance closing last must not lose a line
+        self.log.close()
+        other.close()
+        log = CompletionLog(self._TMP_LOG)
+        self.assertEqual(log.report().count, 3)
+        log.close()
+
+    def test_rotations_of_other_logs_are_folded_in(self):
+        self.log.close()
+        self.log = CompletionLog(self._TMP_LOG, limit=1000)
+        other = CompletionLog(self._TMP_LOG, limit=1000)
+        self.record_days(15)
+        self.record_days(15, other)
+        self.record_days(1)
+        self.assertEqual(self.log.report().count, 62)
+
+        other.close()
+        self.log.close()
+        log = CompletionLog(self._TMP_LOG)
+        self.assertEqual(log.report(), self.log.report())
+        log.close()
+
+    def test_archives_are_pruned(self):
+        self.log.close()
+        self.log = CompletionLog(self._TMP_LOG, limit=200, keep=2)
+        self.record_days(30)
+        archives = self.log.archives()
+        self.assertEqual(len(archives), 2)
+        generations = [int(path.rsplit('.', 1)[1]) for path in archives]
+        self.assertEqual(generations[1], generations[0] + 1)
+        self.assertFalse(os.path.isfile(self._TMP_LOG + '.0'))
+        self.assertEqual(self.log.report().count, 60)
+
+        self.log.close()
+        os.remove(self._TMP_LOG + '.agg')
+        log = CompletionLog(self._TMP_LOG)
+        self.assertTrue(0 < log.report().count < 60)
+        log.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('../trainer'))
+sys.path.insert(0, os.path.abspath('./trainer'))
+
+import gzip
+import unittest
+
+from compression import (CODECS, NO_COMPRESSION, get_codec, compressed,
+                         decompressed)
+from formats import FORMATS
+from records import (file_compression, file_format, file_version,
+                     read_records, write_records, dump_exercises,
+                     load_exercises, SCHEMA_VERSION)
+from migrations import migrate
+from storage import PickleStorage
+from exercises import Exercises, Exercise
+
+class CompressionTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DATA_FILE = "_tmp_data.pkl"
+        i = 0
+        while os.path.isfile(self._TMP_DATA_FILE):
+            self._TMP_DATA_FILE = "_tmp_data_{}.pkl".format(i)
+            i += 1
+
+        self.exercises = Exercises()
+        for i in xrange(3000):
+            self.exercises.append(Exercise("Exercise {}".format(i), i % 7 or None))
+        self.exercises.set_weight(5, 2.5)
+
+    def tearDown(self):
+        for suffix in ('', '.lock'):
+            if os.path.isfile(self._TMP_DATA_FILE + suffix):
+                os.remove(self._TMP_DATA_FILE + suffix)
+
+    def _load(self):
+        with open(self._TMP_DATA_FILE, 'rb') as f:
+            return load_exercises(f)
+
+    def test_codecs_round_trip(self):
+        for name in CODECS:
+            for format in FORMATS:
+                dump_exercises(self.exercises, self._TMP_DATA_FILE, format, name)
+                self.assertEqual(file_compression(self._TMP_DATA_FILE), name)
+                self.assertEqual(file_format(self._TMP_DATA_FILE), format)
+                self.assertEqual(file_version(self._TMP_DATA_FILE),
+                                 SCHEMA_VERSION)
+
+                exercises = self._load()
+                self.assertEqual(list(exercises.items()),
+                                 list(self.exercises.items()), (name, format))
+                self.assertEqual([ex.duration for ex in exercises],
+                                 [ex.duration for ex in self.exercises])
+                self.assertEqual(exercises.weights(), {5: 2.5})
+
+    def test_files_are_compressed(self):
+        dump_exercises(self.exercises, self._TMP_DATA_FILE)
+        size = os.path.getsize(self._TMP_DATA_FILE)
+        self.assertEqual(file_compression(self._TMP_DATA_FILE), NO_COMPRESSION)
+        for name in CODECS:
+            dump_exercises(self.exercises, self._TMP_DATA_FILE,
+                           compression=name)
+            self.assertLess(os.path.getsize(self._TMP_DATA_FILE), size, name)
+
+    def test_gzip_file_is_readable_by_gzip(self):
+        dump_exercises(self.exercises, self._TMP_DATA_FILE, 'jsonl', 'gzip')
+        f = gzip.open(self._TMP_DATA_FILE, 'rb')
+        try:
+            self.assertTrue(f.readline().startswith('trainer-exercises'))
+        finally:
+            f.close()
+
+    def test_records_are_decompressed_as_iterated(self):
+        for name in CODECS:
+            write_records(self._TMP_DATA_FILE, {'next_id': 1, 'count': 100000},
+                          ((i, str(i), None, None) for i in xrange(100000)),
+                          compression=name)
+            with open(self._TMP_DATA_FILE, 'rb') as f:
+                _, meta, records = read_records(f)
+                self.assertEqual(next(records), (0, '0', None, None))
+                self.assertLess(os.lseek(f.fileno(), 0, os.SEEK_CUR),
+                                os.path.getsize(self._TMP_DATA_FILE), name)
+                self.assertEqual(len(list(records)), 99999)
+
+    def test_truncated_file_raises(self):
+        for name in CODECS:
+            for format in FORMATS:
+                dump_exercises(self.exercises, self._TMP_DATA_FILE, format,
+                               name)
+                size = os.path.getsize(self._TMP_DATA_FILE)
+                with open(self._TMP_DATA_FILE, 'r+b') as f:
+                    f.truncate(size // 2)
+
+                with self.assertRaises(IOError):
+                    self._load()
+
+    def test_failed_compression_raises(self):
+        class Broken(object):
+            name = 'broken'
+            def write(self, data):
+                raise IOError("No space left on device")
+
+        with self.assertRaises(IOError):
+            with compressed(Broken(), 'zlib') as f:
+                for _ in xrange(100):
+                    f.write(os.urandom(64 * 1024))
+
+    def test_decompressed_file_outlives_source(self):
+        with open(self._TMP_DATA_FILE, 'wb') as raw:
+            with compressed(raw, 'bz2') as f:
+                f.write('x' * 100000)
+        with open(self._TMP_DATA_FILE, 'rb') as raw:
+            f = decompressed(raw, 'bz2')
+        self.assertEqual(f.read(), 'x' * 100000)
+        f.close()
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            get_codec('zip')
+        with self.assertRaises(ValueError):
+            dump_exercises(self.exercises, self._TMP_DATA_FILE,
+                           compression='zip')
+        self.assertFalse(os.path.isfile(self._TMP_DATA_FILE))
+
+    def test_storage_keeps_compression(self):
+        dump_exercises(self.exercises, self._TMP_DATA_FILE, compression='gzip')
+        storage = PickleStorage(self._TMP_DATA_FILE)
+        storage.add(Exercise("Another exercise"))
+        self.assertEqual(file_compression(self._TMP_DATA_FILE), 'gzip')
+        self.assertIn(Exercise("Another exercise"),
+                      PickleStorage(self._TMP_DATA_FILE))
+
+    def test_storage_converts_compression(self):
+        dump_exercises(self.exercises, self._TMP_DATA_FILE, compression='gzip')
+        storage = PickleStorage(self._TMP_DATA_FILE, compression='bz2')
+        self.assertEqual(file_compression(self._TMP_DATA_FILE), 'gzip')
+        storage.add(Exercise("Another exercise"))
+        self.assertEqual(file_compression(self._TMP_DATA_FILE), 'bz2')
+
+        storage = PickleStorage(self._TMP_DATA_FILE,
+                                compression=NO_COMPRESSION)
+        storage.add(Exercise("Yet another exercise"))
+        self.assertEqual(file_compression(self._TMP_DATA_FILE), NO_COMPRESSION)
+        self.assertEqual(len(self._load()), len(self.exercises) + 2)
+
+    def test_storage_unknown_codec(self):
+        dump_exercises(self.exercises, self._TMP_DATA_FILE)
+        with self.assertRaises(ValueError):
+            PickleStorage(self._TMP_DATA_FILE, compression='zip')
+
+    def test_migrate_converts_compression(self):
+        dump_exercises(self.exercises, self._TMP_DATA_FILE, 'binary')
+        self.assertEqual(migrate(self._TMP_DATA_FILE, compression='zlib'),
+                         SCHEMA_VERSION)
+        self.assertEqual(file_compression(self._TMP_DATA_FILE), 'zlib')
+        self.assertEqual(file_format(self._TMP_DATA_FILE), 'binary')
+
+        migrate(self._TMP_DATA_FILE, format='jsonl')
+        self.assertEqual(file_compression(self._TMP_DATA_FILE), 'zlib')
+        self.assertEqual(file_format(self._TMP_DATA_FILE), 'jsonl')
+        self.assertEqual(list(self._load().items()),
+                         list(self.exercises.items()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('../trainer'))
+sys.path.insert(0, os.path.abspath('./trainer'))
+
+import unittest
+import shutil
+import signal
+import subprocess
+import threading
+import time
+
+from daemon import (TrainerDaemon, RemoteTrainer, connect_daemon, ping,
+                    socket_path)
+from exercises import Exercise
+from trainer import Trainer
+
+DATA_PATH = os.path.dirname(__file__)
+TEST_DATA_FILE = os.path.join(DATA_PATH, 'test_dataset_1.pkl')
+TEST_ADD_DATA = os.path.join(DATA_PATH, 'new_exercises.csv')
+TRAINER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', 'trainer', 'trainer.py')
+
+SUFFIXES = ('', '.lock', '.idx', '.snap', '.journal', '.journal.old',
+            '.search', '.search.journal', '.completions', '.completions.agg',
+            '.completions.lock', '.sock')
+
+class TrainerDaemonTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DATA_FILE = "_tmp_data.pkl"
+        i = 0
+        while os.path.isfile(self._TMP_DATA_FILE):
+            self._TMP_DATA_FILE = "_tmp_data_{}.pkl".format(i)
+            i += 1
+
+        shutil.copyfile(TEST_DATA_FILE, self._TMP_DATA_FILE)
+        self.trainer = Trainer(conn=self._TMP_DATA_FILE, journal=True)
+        self.start(flush_interval=60)
+
+    def tearDown(self):
+        self.stop()
+        self.trainer.close()
+        for suffix in SUFFIXES:
+            if os.path.exists(self._TMP_DATA_FILE + suffix):
+                os.remove(self._TMP_DATA_FILE + suffix)
+
+    def start(self, **kwargs):
+        self.daemon = TrainerDaemon(self.trainer,
+                                    socket_path(self._TMP_DATA_FILE), **kwargs)
+        self.thread = threading.Thread(target=self.daemon.serve)
+        self.thread.start()
+        self.client = connect_daemon(self._TMP_DATA_FILE)
+
+    def stop(self):
+        if self.thread.is_alive():
+            self.client.request('stop')
+            self.thread.join()
+
+    def stored(self):
+        """Exercises a new run reads from the data file"""
+        trainer = Trainer(conn=self._TMP_DATA_FILE, journal=True)
+        exercises = set(trainer.get_all_exercises())
+        trainer.close()
+        return exercises
+
+    def test_connect_daemon(self):
+        self.assertIsInstance(self.client, RemoteTrainer)
+        self.stop()
+        self.assertIsNone(connect_daemon(self._TMP_DATA_FILE))
+        self.assertFalse(os.path.exists(socket_path(self._TMP_DATA_FILE)))
+
+    def test_list(self):
+        self.assertEqual(list(self.client.iter_exercises_with_ids()),
+                         list(self.trainer.iter_exercises_with_ids()))
+
+    def test_add(self):
+        exercise = Exercise("build a heap", 25)
+        exercise_id = self.client.add_exercise(exercise)
+        self.assertEqual(self.client.get_exercise(exercise_id), exercise)
+        self.assertEqual(self.client.get_exercise(exercise_id).duration, 25)
+        self.assertEqual(self.client.search("heap"), [(exercise_id, exercise)])
+
+    def test_unicode(self):
+        exercise = Exercise(u"écrire un arbre".encode('utf-8'))
+        exercise_id = self.client.add_exercise(exercise)
+        self.assertEqual(self.client.get_exercise(exercise_id), exercise)
+
+    def test_remove_and_update(self):
+        exercise = self.trainer.get_exercise(1)
+        self.assertEqual(self.client.remove_exercise_by_id(1), exercise)
+        self.assertFalse(exercise in self.trainer.get_all_exercises())
+        self.client.update_exercise_by_id(2, Exercise("build a heap"))
+        self.client.remove_exercise(Exercise("build a heap"))
+        self.assertEqual(len(list(self.client.iter_exercises_with_ids())), 8)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.client.remove_exercise_by_id(99)
+        with self.assertRaises(TypeError):
+            self.client.request('add')
+        with self.assertRaises(ValueError):
+            self.client.request('format')
+        with self.assertRaises(Exception):
+            self.client.add_exercise(Exercise("create a git repo"))
+        self.assertTrue(ping(socket_path(self._TMP_DATA_FILE)))
+
+    def test_lists(self):
+        self.assertEqual(self.client.get_new_list(3, seed=1),
+                         list(self.trainer.get_new_list(3, seed=1)))
+        self.assertEqual(self.client.get_list_for_budget(60, seed=1),
+                         list(self.trainer.get_list_for_budget(60, seed=1)))
+
+    def test_import(self):
+        result = self.client.add_exercises_from_csv(TEST_ADD_DATA)
+        self.assertEqual(result.accepted,
+                         len(list(self.client.iter_exercises_with_ids())) - 10)
+
+    def test_failed_request_in_batch(self):
+        self.client.search('graph')
+        csv_path = self._TMP_DATA_FILE + '.csv'
+        with open(csv_path, 'wb') as f:
+            f.write('delta tree\nbroken\x00row\n')
+        try:
+            self.client.add_exercise(Exercise("beta graph"))
+            with self.assertRaises(Exception):
+                self.client.add_exercises_from_csv(csv_path)
+            self.client.add_exercise(Exercise("gamma heap"))
+            self.client.request('flush')
+        finally:
+            os.remove(csv_path)
+        self.stop()
+
+        stored = self.stored()
+        self.assertIn(Exercise("beta graph"), stored)
+        self.assertIn(Exercise("gamma heap"), stored)
+        self.assertNotIn(Exercise("delta tree"), stored)
+        trainer = Trainer(conn=self._TMP_DATA_FILE, journal=True)
+        self.assertEqual([exercise for _, exercise in trainer.search('beta')],
+                         [Exercise("beta graph")])
+        self.assertEqual(trainer.search('delta'), [])
+        trainer.close()
+
+    def test_completions(self):
+        self.client.log_completion(1, 0.0, 600.0)
+        reports = self.client.get_completion_reports()
+        self.assertEqual(reports.values()[0].count, 1)
+
+    def test_writes_persisted_on_flush(self):
+        self.client.add_exercise(Exercise("build a heap"))
+        self.assertEqual(self.daemon._pending, 1)
+        self.client.flush()
+        self.assertIsNone(self.daemon._batch)
+        self.assertTrue(Exercise("build a heap") in self.stored())
+
+    def test_writes_persisted_after_batch_size(self):
+        self.stop()
+        self.start(flush_interval=60, batch_size=2)
+        self.client.add_exercise(Exercise("build a heap"))
+        self.client.add_exercise(Exercise("build a tree"))
+        self.client.request('ping')
+        self.assertIsNone(self.daemon._batch)
+        self.assertTrue(Exercise("build a tree") in self.stored())
+
+    def test_writes_persisted_after_interval(self):
+        self.stop()
+        self.start(flush_interval=0.1)
+        self.client.add_exercise(Exercise("build a heap"))
+        time.sleep(0.5)
+        self.assertIsNone(self.daemon._batch)
+        self.assertTrue(Exercise("build a heap") in self.stored())
+
+    def test_stop_persists_writes(self):
+        self.client.add_exercise(Exercise("build a heap"))
+        self.stop()
+        self.assertTrue(Exercise("build a heap") in self.stored())
+
+    def test_reads_follow_other_processes(self):
+        trainer = Trainer(conn=self._TMP_DATA_FILE, journal=True)
+        trainer.add_exercise(Exercise("build a heap"))
+        trainer.close()
+        self.assertEqual([ex for _, ex in self.client.search("heap")],
+                         [Exercise("build a heap")])
+
+    def test_already_served(self):
+        with self.assertRaises(IOError):
+            TrainerDaemon(self.trainer, socket_path(self._TMP_DATA_FILE))
+
+    def test_stale_socket_replaced(self):
+        self.stop()
+        open(socket_path(self._TMP_DATA_FILE), 'w').close()
+        self.assertIsNone(connect_daemon(self._TMP_DATA_FILE))
+        self.start()
+        self.assertTrue(ping(socket_path(self._TMP_DATA_FILE)))
+
+class CommandLineTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DATA_FILE = os.path.abspath("_tmp_cli_data.pkl")
+        shutil.copyfile(TEST_DATA_FILE, self._TMP_DATA_FILE)
+
+    def tearDown(self):
+        for suffix in SUFFIXES:
+            if os.path.exists(self._TMP_DATA_FILE + suffix):
+                os.remove(self._TMP_DATA_FILE + suffix)
+
+    def run_trainer(self, *args):
+        return subprocess.check_output(
+            [sys.executable, TRAINER, '-c', self._TMP_DATA_FILE] + list(args))
+
+    def test_migrate(self):
+        self.assertTrue("Already at version" in self.run_trainer('--migrate'))
+
+        output = self.run_trainer('--migrate', '--format', 'jsonl',
+                                  '--compression', 'gzip')
+        self.assertFalse("Already at version" in output)
+        self.assertTrue("Converted from" in output)
+        self.assertTrue("Stored as jsonl, compression gzip" in output)
+        self.assertTrue("Already at version" in
+                        self.run_trainer('--migrate', '--format', 'jsonl'))
+
+    def test_serve(self):
+        daemon = subprocess.Popen([sys.executable, TRAINER, '-c',
+                                   self._TMP_DATA_FILE, '--serve'])
+        try:
+            while not ping(socket_path(self._TMP_DATA_FILE)):
+                self.assertIsNone(daemon.poll())
+                time.sleep(0.05)
+
+            self.run_trainer('-a', 'build a heap')
+            self.assertTrue("11: build a heap" in self.run_trainer())
+            self.assertTrue("build a heap" in self.run_trainer('-f', 'heap'))
+        finally:
+            daemon.send_signal(signal.SIGTERM)
+            daemon.wait()
+
+        self.assertFalse(os.path.exists(socket_path(self._TMP_DATA_FILE)))
+        self.assertTrue("11: build a heap" in self.run_trainer())
+
+if __name__ == '__main__':
+    unittest.main()
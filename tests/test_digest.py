@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('..'))
+sys.path.insert(0, os.path.abspath('.'))
+
+import unittest
+
+from trainer.digest import DigestTree, CatalogDiff, exercise_digest
+from trainer.exercises import Exercise
+
+def _exercises(n):
+    return [Exercise("Exercise {}".format(i)) for i in xrange(n)]
+
+class DigestTreeTestCases(unittest.TestCase):
+    def setUp(self):
+        self.exercises = _exercises(1000)
+        self.tree = DigestTree(self.exercises)
+
+    def test_empty(self):
+        self.assertEqual(DigestTree().digest, 0)
+        self.assertEqual(DigestTree().diff(DigestTree()),
+                         CatalogDiff([], [], []))
+
+    def test_digest_ignores_order(self):
+        self.assertEqual(DigestTree(reversed(self.exercises)).digest,
+                         self.tree.digest)
+
+    def test_digest_follows_changes(self):
+        tree = DigestTree()
+        for exercise in self.exercises:
+            tree.add(exercise)
+        self.assertEqual(tree.digest, self.tree.digest)
+
+        tree.remove(self.exercises[0])
+        self.assertNotEqual(tree.digest, self.tree.digest)
+        self.assertEqual(tree.digest, DigestTree(self.exercises[1:]).digest)
+
+        tree.add(self.exercises[0])
+        self.assertEqual(tree.digest, self.tree.digest)
+
+    def test_digest_covers_duration(self):
+        self.assertNotEqual(exercise_digest(Exercise("Build a heap")),
+                            exercise_digest(Exercise("Build a heap", 30)))
+
+    def test_diff_identical(self):
+        self.assertEqual(self.tree.differing_leaves(DigestTree(self.exercises)),
+                         [])
+        self.assertEqual(self.tree.diff(DigestTree(self.exercises)),
+                         CatalogDiff([], [], []))
+
+    def test_diff(self):
+        other = DigestTree(self.exercises)
+        other.remove(Exercise("Exercise 10"))
+        other.add(Exercise("Build a heap"))
+        other.remove(Exercise("Exercise 20"))
+        other.add(Exercise("Exercise 20", 30))
+
+        diff = self.tree.diff(other)
+        self.assertEqual(diff.added, [Exercise("Build a heap")])
+        self.assertEqual(diff.removed, [Exercise("Exercise 10")])
+        self.assertEqual(len(diff.changed), 1)
+        old, new = diff.changed[0]
+        self.assertEqual((old.duration, new.duration), (None, 30))
+
+        reverse = other.diff(self.tree)
+        self.assertEqual(reverse.added, diff.removed)
+        self.assertEqual(reverse.removed, diff.added)
+
+    def test_diff_only_visits_differing_leaves(self):
+        other = DigestTree(self.exercises)
+        other.add(Exercise("Build a heap"))
+        self.assertEqual(len(self.tree.differing_leaves(other)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
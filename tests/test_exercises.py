@@ -7,12 +7,15 @@ sys.path.insert(0, os.path.abspath('..'))
 sys.path.insert(0, os.path.abspath('.'))
 
 import unittest
+from StringIO import StringIO
 
-from trainer.exercises import Exercises, Exercise
+from trainer.exercises import (Exercises, Exercise, PackedExercises,
+                               ExercisesView, write_csv)
 
 DATA_PATH = os.path.dirname(__file__)
 TEST_ADD_DATA = os.path.join(DATA_PATH, 'new_exercises.csv')
 TEST_ADD_DATA_COPY = os.path.join(DATA_PATH, 'new_exercises_copy.csv')
+TEST_IMPORT_DATA = os.path.join(DATA_PATH, 'import_exercises.csv')
 
 class ExercisesTestCases(unittest.TestCase):
     def setUp(self):
@@ -34,10 +37,50 @@ class ExercisesTestCases(unittest.TestCase):
         msg = "File '{}' provided is not a csv".format('test.py')
         self.assertTrue(msg in context.exception)
 
+    def test_output_exercises_to_file_object(self):
+        self.exercises.add_exercises_from_csv(TEST_ADD_DATA)
+        out = StringIO()
+        self.exercises.to_csv(out)
+        with open(TEST_ADD_DATA, 'rb') as f:
+            self.assertEqual(out.getvalue(), f.read())
+
+    def test_output_exercises_to_csv_failure_keeps_previous(self):
+        self.exercises.add_exercises_from_csv(TEST_ADD_DATA)
+        self.exercises.to_csv(TEST_ADD_DATA_COPY)
+
+        def failing():
+            yield Exercise("Exercise 1")
+            raise RuntimeError("export failed")
+
+        with self.assertRaises(RuntimeError):
+            write_csv(failing(), TEST_ADD_DATA_COPY)
+
+        self.assertTrue(filecmp.cmp(TEST_ADD_DATA, TEST_ADD_DATA_COPY))
+        self.assertFalse(os.path.isfile(TEST_ADD_DATA_COPY + '.tmp'))
+
     def test_bulk_add_exercises_from_csv(self):
         self.exercises.add_exercises_from_csv(TEST_ADD_DATA)
         self.assertEqual(len(self.exercises), 3)
 
+    def test_bulk_add_exercises_from_csv_reports_counts(self):
+        result = self.exercises.add_exercises_from_csv(TEST_ADD_DATA)
+        self.assertEqual(result, (3, 0, 0))
+
+    def test_bulk_add_exercises_from_csv_skips_duplicates(self):
+        self.exercises.add_exercises_from_csv(TEST_ADD_DATA)
+        result = self.exercises.add_exercises_from_csv(TEST_IMPORT_DATA)
+
+        self.assertEqual(result.accepted, 2)
+        self.assertEqual(result.skipped, 2)
+        self.assertEqual(result.malformed, 2)
+        self.assertEqual(len(self.exercises), 5)
+        self.assertEqual(self.exercises[-1], Exercise("Build a linked list class"))
+
+    def test_bulk_add_exercises_from_csv_calls_on_accept(self):
+        accepted = []
+        self.exercises.add_exercises_from_csv(TEST_IMPORT_DATA, accepted.append)
+        self.assertEqual(accepted, [ex for ex in self.exercises])
+
     def test_bulk_add_exercises_from_csv_no_file(self):
         with self.assertRaises(IOError) as context:
             self.exercises.add_exercises_from_csv('fake.csv')
@@ -117,6 +160,28 @@ class ExercisesTestCases(unittest.TestCase):
         self.assertTrue(msg in context.exception)
 
 
+    def test_exercises_update_to_existing_exercise(self):
+        first = Exercise("First exercise")
+        second = Exercise("Second exercise")
+        self.exercises.append(first)
+        self.exercises.append(second)
+
+        with self.assertRaises(Exception) as context:
+            self.exercises.update(first, Exercise("Second exercise"))
+
+        error_msg = "Cannot add duplicate exercise. Exercise {}".format(second)
+        self.assertTrue(error_msg in context.exception)
+
+    def test_exercises_update_keeps_position(self):
+        for desc in ("First", "Second", "Third"):
+            self.exercises.append(Exercise(desc))
+
+        new_ex = Exercise("New second")
+        self.exercises.update(Exercise("Second"), new_ex)
+
+        self.assertEqual(self.exercises[1], new_ex)
+        self.assertEqual(len(self.exercises), 3)
+
     def test_add_valid_exercise(self):
         ex = Exercise("New exercise")
         self.exercises.append(ex)
@@ -150,6 +215,47 @@ class ExercisesTestCases(unittest.TestCase):
         self.assertEqual(len(self.exercises), 0)
         self.assertNotIn(ex, self.exercises)
 
+    def test_remove_preserves_order(self):
+        exercises = [Exercise("Exercise {}".format(i)) for i in range(5)]
+        for ex in exercises:
+            self.exercises.append(ex)
+
+        self.exercises.remove(exercises[1])
+        self.exercises.remove(exercises[3])
+
+        self.assertEqual(len(self.exercises), 3)
+        self.assertEqual([ex for ex in self.exercises],
+                [exercises[0], exercises[2], exercises[4]])
+        self.assertEqual(self.exercises[-1], exercises[4])
+
+    def test_append_after_remove(self):
+        first = Exercise("First")
+        second = Exercise("Second")
+        self.exercises.append(first)
+        self.exercises.append(second)
+        self.exercises.remove(first)
+        self.exercises.append(first)
+
+        self.assertEqual(self.exercises[0], second)
+        self.assertEqual(self.exercises[1], first)
+
+    def test_contains_non_exercise(self):
+        self.exercises.append(Exercise("New exercise"))
+        self.assertNotIn("New exercise", self.exercises)
+        self.assertNotIn([], self.exercises)
+
+    def test_pickle_round_trip(self):
+        import pickle
+        exercises = [Exercise("Exercise {}".format(i)) for i in range(3)]
+        for ex in exercises:
+            self.exercises.append(ex)
+        self.exercises.remove(exercises[0])
+
+        copy = pickle.loads(pickle.dumps(self.exercises))
+        self.assertEqual(copy, self.exercises)
+        self.assertIn(exercises[2], copy)
+        self.assertNotIn(exercises[0], copy)
+
     def test_remove_exercise_invalid_type(self):
         with self.assertRaises(TypeError) as context:
             self.exercises.remove(1)
@@ -213,6 +319,495 @@ class ExercisesTestCases(unittest.TestCase):
         msg = "{} object is not of type Exercises".format(type('x'))
         self.assertTrue(msg in context.exception)
 
+class ExercisesIdTestCases(unittest.TestCase):
+    def setUp(self):
+        self.exercises = Exercises()
+        self.tasks = [Exercise("Exercise {}".format(i)) for i in range(5)]
+        self.ids = [self.exercises.append(ex) for ex in self.tasks]
+
+    def test_ids_are_allocated_in_order(self):
+        self.assertEqual(self.ids, [1, 2, 3, 4, 5])
+        self.assertEqual(self.exercises.next_id, 6)
+
+    def test_get(self):
+        self.assertEqual(self.exercises.get(3), self.tasks[2])
+
+    def test_get_missing_id(self):
+        with self.assertRaises(ValueError) as context:
+            self.exercises.get(42)
+
+        self.assertTrue("No exercise with id 42" in context.exception)
+
+    def test_id_of(self):
+        self.assertEqual(self.exercises.id_of(self.tasks[4]), 5)
+
+        with self.assertRaises(ValueError):
+            self.exercises.id_of(Exercise("missing"))
+
+    def test_remove_keeps_other_ids(self):
+        self.exercises.remove(self.tasks[1])
+        self.assertEqual(self.exercises[1], self.tasks[2])
+        self.assertEqual([exercise_id for exercise_id, _ in self.exercises.items()],
+                         [1, 3, 4, 5])
+        self.assertEqual(self.exercises.get(5), self.tasks[4])
+
+    def test_ids_are_not_reused(self):
+        self.exercises.remove(self.tasks[4])
+        self.assertEqual(self.exercises.append(Exercise("new")), 6)
+
+    def test_remove_by_id(self):
+        self.assertEqual(self.exercises.remove_by_id(2), self.tasks[1])
+        self.assertNotIn(self.tasks[1], self.exercises)
+
+        with self.assertRaises(ValueError):
+            self.exercises.remove_by_id(2)
+
+    def test_update_keeps_id(self):
+        new_ex = Exercise("updated")
+        self.exercises.update(self.tasks[0], new_ex)
+        self.assertEqual(self.exercises.id_of(new_ex), 1)
+
+        self.exercises.update_by_id(1, self.tasks[0])
+        self.assertEqual(self.exercises.get(1), self.tasks[0])
+
+    def test_append_with_id(self):
+        self.assertEqual(self.exercises.append(Exercise("new"), 10), 10)
+        self.assertEqual(self.exercises.next_id, 11)
+
+        with self.assertRaises(ValueError):
+            self.exercises.append(Exercise("newer"), 3)
+
+    def test_items(self):
+        self.assertEqual(list(self.exercises.items()),
+                         list(zip(self.ids, self.tasks)))
+
+    def test_copy_keeps_ids(self):
+        self.exercises.remove(self.tasks[0])
+        copy = Exercises(self.exercises)
+        self.assertEqual(list(copy.items()), list(self.exercises.items()))
+        self.assertEqual(copy.next_id, 6)
+
+    def test_pickle_keeps_ids(self):
+        import pickle
+        self.exercises.remove(self.tasks[0])
+        self.exercises.remove(self.tasks[4])
+        copy = pickle.loads(pickle.dumps(self.exercises, 2))
+        self.assertEqual(list(copy.items()), list(self.exercises.items()))
+        self.assertEqual(copy.next_id, 6)
+
+    def test_unpickle_without_ids(self):
+        exercises = Exercises.__new__(Exercises)
+        exercises.__setstate__({'_items': self.tasks[:3]})
+        self.assertEqual([exercise_id for exercise_id, _ in exercises.items()],
+                         [1, 2, 3])
+        self.assertEqual(exercises.next_id, 4)
+
+    def test_weights(self):
+        self.assertEqual(self.exercises.weight(2), 1.0)
+        self.exercises.set_weight(2, 3)
+        self.exercises.set_weight(4, 0)
+        self.assertEqual(self.exercises.weight(2), 3.0)
+        self.assertEqual(self.exercises.weights(), {2: 3.0, 4: 0.0})
+
+        self.exercises.set_weight(2, 1.0)
+        self.assertEqual(self.exercises.weights(), {4: 0.0})
+
+    def test_invalid_weights(self):
+        for weight in (-1, float('nan'), float('inf'), '2', None):
+            with self.assertRaises(ValueError):
+                self.exercises.set_weight(2, weight)
+
+        with self.assertRaises(ValueError):
+            self.exercises.set_weight(42, 2.0)
+
+    def test_weights_follow_exercises(self):
+        import pickle
+        self.exercises.set_weight(2, 3.0)
+        self.exercises.set_weight(3, 0.5)
+        self.exercises.update(self.tasks[1], Exercise("updated"))
+        self.exercises.remove(self.tasks[2])
+        self.assertEqual(self.exercises.weights(), {2: 3.0})
+        self.assertEqual(Exercises(self.exercises).weights(), {2: 3.0})
+
+        copy = pickle.loads(pickle.dumps(self.exercises, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(copy.weight(2), 3.0)
+
+    def _state(self):
+        return (list(self.exercises.items()), self.exercises.weights(),
+                self.exercises.next_id, self.exercises.digest,
+                [self.exercises[i] for i in xrange(len(self.exercises))])
+
+    def test_rollback(self):
+        self.exercises.set_weight(3, 2.0)
+        self.exercises.remove(self.tasks[1])
+        before = self._state()
+
+        self.exercises.savepoint()
+        self.exercises.append(Exercise("new"))
+        self.exercises.remove(self.tasks[2])
+        self.exercises.set_weight(4, 0.5)
+        self.exercises.update(self.tasks[3], Exercise("updated", 5))
+        self.exercises.remove(Exercise("new"))
+        self.exercises.set_weight(5, 1.5)
+        self.exercises.remove(self.tasks[4])
+        self.exercises.rollback()
+
+        self.assertEqual(self._state(), before)
+        self.assertEqual(self.exercises.get(3), self.tasks[2])
+        self.exercises.append(Exercise("after"))
+        self.assertEqual(self.exercises.id_of(Exercise("after")), 6)
+
+    def test_rollback_of_trailing_removes(self):
+        before = self._state()
+        self.exercises.savepoint()
+        self.exercises.remove(self.tasks[3])
+        self.exercises.remove(self.tasks[4])
+        self.exercises.append(Exercise("new"))
+        self.exercises.rollback()
+        self.assertEqual(self._state(), before)
+
+    def test_rollback_after_compaction(self):
+        before = self._state()
+        self.exercises.savepoint()
+        for task in self.tasks[:4]:
+            self.exercises.remove(task)
+        self.exercises.append(Exercise("new"))
+        self.exercises.rollback()
+        self.assertEqual(self._state(), before)
+
+    def test_nested_rollback(self):
+        self.exercises.savepoint()
+        self.exercises.remove(self.tasks[0])
+        after_outer = self._state()
+        self.exercises.savepoint()
+        self.exercises.append(Exercise("new"))
+        self.exercises.remove(self.tasks[1])
+        self.exercises.rollback()
+        self.assertEqual(self._state(), after_outer)
+
+        self.exercises.savepoint()
+        self.exercises.set_weight(3, 2.0)
+        self.exercises.release()
+        self.exercises.rollback()
+        self.assertIn(self.tasks[0], self.exercises)
+        self.assertEqual(len(self.exercises), 5)
+        self.assertEqual(self.exercises.weights(), {})
+
+    def test_release_keeps_changes(self):
+        self.exercises.savepoint()
+        self.exercises.remove(self.tasks[0])
+        self.exercises.release()
+        self.exercises.rollback()
+        self.assertNotIn(self.tasks[0], self.exercises)
+        self.assertEqual(len(self.exercises), 4)
+
+class PackedExercisesTestCases(unittest.TestCase):
+    def setUp(self):
+        self.exercises = Exercises()
+        for desc in ("First exercise", "Second exercise", "Third"):
+            self.exercises.append(Exercise(desc))
+        self.packed = PackedExercises(self.exercises)
+
+    def test_packed_length(self):
+        self.assertEqual(len(self.packed), 3)
+        self.assertEqual(len(PackedExercises()), 0)
+
+    def test_packed_get_item(self):
+        self.assertEqual(self.packed[0], Exercise("First exercise"))
+        self.assertEqual(self.packed[-1], Exercise("Third"))
+
+    def test_packed_get_item_out_of_bounds(self):
+        with self.assertRaises(IndexError):
+            self.packed[3]
+
+        with self.assertRaises(IndexError):
+            self.packed[-4]
+
+    def test_packed_get_item_invalid_type(self):
+        with self.assertRaises(TypeError):
+            self.packed['x']
+
+    def test_packed_iteration_preserves_order(self):
+        self.assertEqual(list(self.packed), [ex for ex in self.exercises])
+
+    def test_packed_contains(self):
+        self.assertIn(Exercise("Second exercise"), self.packed)
+        self.assertNotIn(Exercise("exercise"), self.packed)
+        self.assertNotIn(Exercise("Second"), self.packed)
+        self.assertNotIn(Exercise("exerciseSecond"), self.packed)
+        self.assertNotIn("Third", self.packed)
+
+    def test_packed_append(self):
+        self.packed.append(Exercise("Fourth"))
+        self.assertEqual(self.packed[3], Exercise("Fourth"))
+
+    def test_packed_append_duplicate(self):
+        with self.assertRaises(Exception) as context:
+            self.packed.append(Exercise("Third"))
+
+        msg = "Cannot add duplicate exercise. Exercise Third"
+        self.assertTrue(msg in context.exception)
+
+    def test_packed_contains_past_table_growth(self):
+        packed = PackedExercises()
+        for i in xrange(5000):
+            packed.append(Exercise("Exercise {}".format(i)))
+        for i in xrange(5000):
+            self.assertIn(Exercise("Exercise {}".format(i)), packed)
+        self.assertNotIn(Exercise("Exercise 5000"), packed)
+        self.assertNotIn(Exercise("Exercise"), packed)
+        with self.assertRaises(Exception):
+            packed.append(Exercise("Exercise 4999"))
+        self.assertEqual(len(packed), 5000)
+
+    def test_packed_append_invalid_type(self):
+        with self.assertRaises(TypeError):
+            self.packed.append("Fourth")
+
+    def test_packed_unicode_description(self):
+        desc = u"Caf\xe9 exercise"
+        self.packed.append(Exercise(desc))
+        self.assertEqual(self.packed[3].description, desc.encode('utf-8'))
+
+    def test_packed_to_exercises(self):
+        self.assertEqual(self.packed.to_exercises(), self.exercises)
+
+    def test_packed_round_trip_keeps_ids_durations_and_weights(self):
+        self.exercises.append(Exercise("Timed", 25))
+        self.exercises.remove(Exercise("Second exercise"))
+        self.exercises.set_weight(4, 2.5)
+        packed = PackedExercises(self.exercises)
+
+        self.assertEqual(packed[-1].duration, 25)
+        self.assertEqual([ex.duration for ex in packed], [None, None, 25])
+        self.assertEqual(list(packed.items()), list(self.exercises.items()))
+        self.assertEqual(packed.next_id, self.exercises.next_id)
+
+        exercises = packed.to_exercises()
+        self.assertEqual(list(exercises.items()), list(self.exercises.items()))
+        self.assertEqual([ex.duration for ex in exercises], [None, None, 25])
+        self.assertEqual(exercises.weights(), {4: 2.5})
+        self.assertEqual(exercises.next_id, self.exercises.next_id)
+        self.assertEqual(Exercises(packed), exercises)
+
+    def test_packed_ids(self):
+        self.exercises.remove(Exercise("Second exercise"))
+        packed = PackedExercises(self.exercises)
+        self.assertEqual(packed.get(3), Exercise("Third"))
+        self.assertEqual(packed.id_of(Exercise("Third")), 3)
+        with self.assertRaises(ValueError):
+            packed.get(2)
+        with self.assertRaises(ValueError):
+            packed.id_of(Exercise("Second exercise"))
+
+        self.assertEqual(packed.append(Exercise("Fourth")), 4)
+        self.assertEqual(packed.append(Exercise("Fifth"), 10), 10)
+        self.assertEqual(packed.next_id, 11)
+        with self.assertRaises(ValueError):
+            packed.append(Exercise("Sixth"), 9)
+
+    def test_packed_weights(self):
+        self.exercises.set_weight(2, 0.5)
+        packed = PackedExercises(self.exercises)
+        self.assertEqual(packed.weight(2), 0.5)
+        self.assertEqual(packed.weight(1), 1.0)
+        self.assertEqual(packed.weights(), {2: 0.5})
+
+    def test_packed_from_records(self):
+        records = [(i, "Exercise {}".format(i), i % 3 or None,
+                    2.0 if i == 7 else None) for i in xrange(1, 2001)]
+        packed = PackedExercises.from_records(iter(records), 2005)
+        self.assertEqual(len(packed), 2000)
+        self.assertEqual(packed.next_id, 2005)
+        self.assertEqual(packed.weights(), {7: 2.0})
+        self.assertEqual(packed.get(5).duration, 2)
+        for i in xrange(1, 2001):
+            self.assertIn(Exercise("Exercise {}".format(i)), packed)
+        self.assertNotIn(Exercise("Exercise 0"), packed)
+
+class ExercisesIterationTestCases(unittest.TestCase):
+    def setUp(self):
+        self.exercises = Exercises()
+        for i in xrange(10):
+            self.exercises.append(Exercise("Exercise {}".format(i)))
+
+    def test_nested_iteration(self):
+        pairs = [(a, b) for a in self.exercises for b in self.exercises]
+        self.assertEqual(len(pairs), 100)
+
+    def test_iterators_are_independent(self):
+        first = iter(self.exercises)
+        second = iter(self.exercises)
+        next(first)
+        next(first)
+        self.assertEqual(next(second), Exercise("Exercise 0"))
+        self.assertEqual(next(first), Exercise("Exercise 2"))
+
+    def test_iteration_skips_removed(self):
+        self.exercises.remove(Exercise("Exercise 3"))
+        self.assertEqual(len(list(self.exercises)), 9)
+        self.assertNotIn(Exercise("Exercise 3"), list(self.exercises))
+
+    def test_interleaved_remove_and_access(self):
+        expected = list(self.exercises)
+        ids = [exercise_id for exercise_id, _ in self.exercises.items()]
+        for i in (1, 7, 4, 0, 9, 5):
+            self.exercises.remove(Exercise("Exercise {}".format(i)))
+            j = expected.index(Exercise("Exercise {}".format(i)))
+            del expected[j]
+            del ids[j]
+            self.assertEqual([self.exercises[k] for k in xrange(len(expected))],
+                             expected)
+            self.assertEqual([self.exercises[-k - 1]
+                              for k in xrange(len(expected))], expected[::-1])
+            self.assertEqual(list(self.exercises), expected)
+            self.assertEqual(list(self.exercises.items()), zip(ids, expected))
+            self.assertEqual(list(self.exercises[1:]), expected[1:])
+            self.assertEqual(list(self.exercises[::-2]), expected[::-2])
+            for ex in expected:
+                self.assertIn(ex, self.exercises[:])
+            self.assertEqual(self.exercises.get(ids[-1]), expected[-1])
+
+    def test_removing_the_last_drops_trailing_holes(self):
+        self.exercises.remove(Exercise("Exercise 8"))
+        self.exercises.remove(Exercise("Exercise 9"))
+        self.exercises.append(Exercise("Exercise 10"))
+        self.assertEqual(self.exercises[-1], Exercise("Exercise 10"))
+        self.assertEqual(len(list(self.exercises)), 9)
+
+class ExercisesViewTestCases(unittest.TestCase):
+    def setUp(self):
+        self.exercises = Exercises()
+        for i in xrange(10):
+            self.exercises.append(Exercise("Exercise {}".format(i)))
+        self.items = list(self.exercises)
+
+    def check_slices(self, exercises):
+        for index in (slice(None), slice(2, 5), slice(-3, None),
+                      slice(None, None, 3), slice(8, 1, -2), slice(20, 30),
+                      slice(None, None, -1)):
+            view = exercises[index]
+            self.assertIsInstance(view, ExercisesView)
+            self.assertEqual(list(view), self.items[index])
+            self.assertEqual(len(view), len(self.items[index]))
+            self.assertEqual([view[i] for i in xrange(len(view))],
+                             self.items[index])
+
+    def test_slice(self):
+        self.check_slices(self.exercises)
+
+    def test_slice_of_packed(self):
+        self.check_slices(PackedExercises(self.exercises))
+
+    def test_slice_of_view(self):
+        view = self.exercises[1:9]
+        self.assertEqual(list(view[2:5]), self.items[1:9][2:5])
+        self.assertEqual(list(view[::-3]), self.items[1:9][::-3])
+        self.assertEqual(list(view[1:7][::2]), self.items[1:9][1:7][::2])
+
+    def test_view_get_item(self):
+        view = self.exercises[2:8]
+        self.assertEqual(view[-1], Exercise("Exercise 7"))
+        with self.assertRaises(IndexError):
+            view[6]
+        with self.assertRaises(IndexError):
+            view[-7]
+        with self.assertRaises(TypeError):
+            view['x']
+
+    def test_view_contains(self):
+        view = self.exercises[1:8:2]
+        self.assertIn(Exercise("Exercise 3"), view)
+        self.assertNotIn(Exercise("Exercise 2"), view)
+        self.assertNotIn(Exercise("Exercise 9"), view)
+        self.assertNotIn("Exercise 3", view)
+        self.assertIn(Exercise("Exercise 3"),
+                      PackedExercises(self.exercises)[1:8:2])
+
+    def test_view_is_read_only(self):
+        view = ExercisesView(self.exercises)
+        with self.assertRaises(AttributeError):
+            view.append(Exercise("Exercise 10"))
+        with self.assertRaises(AttributeError):
+            view.remove(Exercise("Exercise 1"))
+
+    def test_view_shares_exercises(self):
+        view = self.exercises[:3]
+        self.exercises.update(Exercise("Exercise 1"), Exercise("Updated"))
+        self.assertEqual(view[1], Exercise("Updated"))
+
+    def test_view_equality(self):
+        self.assertEqual(ExercisesView(self.exercises), self.exercises)
+        self.assertEqual(self.exercises, ExercisesView(self.exercises))
+        self.assertEqual(self.exercises[:3], self.exercises[:3])
+        self.assertNotEqual(self.exercises[:3], self.exercises[1:4])
+        self.assertNotEqual(self.exercises[:3], self.items[:3])
+
+class ExercisesDigestTestCases(unittest.TestCase):
+    def setUp(self):
+        self.exercises = Exercises()
+        for i in xrange(100):
+            self.exercises.append(Exercise("Exercise {}".format(i)))
+        self.other = Exercises(self.exercises)
+
+    def test_digest(self):
+        self.assertEqual(self.exercises.digest, self.other.digest)
+        self.assertNotEqual(self.exercises.digest, Exercises().digest)
+
+        self.other.remove(Exercise("Exercise 5"))
+        self.assertNotEqual(self.exercises.digest, self.other.digest)
+        self.other.append(Exercise("Exercise 5"))
+        self.assertEqual(self.exercises.digest, self.other.digest)
+
+    def test_digest_survives_pickle(self):
+        import pickle
+        self.exercises.remove(Exercise("Exercise 5"))
+        copy = pickle.loads(pickle.dumps(self.exercises, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(copy.digest, self.exercises.digest)
+
+    def test_eq_with_different_digests(self):
+        self.other.update(Exercise("Exercise 5"), Exercise("Exercise 500"))
+        self.assertNotEqual(self.exercises, self.other)
+        self.other.update(Exercise("Exercise 500"), Exercise("Exercise 5"))
+        self.assertEqual(self.exercises, self.other)
+
+    def test_eq_checks_order(self):
+        self.other.remove(Exercise("Exercise 5"))
+        self.other.append(Exercise("Exercise 5"))
+        self.assertEqual(self.exercises.digest, self.other.digest)
+        self.assertNotEqual(self.exercises, self.other)
+
+    def test_diff(self):
+        self.other.remove(Exercise("Exercise 5"))
+        self.other.append(Exercise("Build a heap"))
+        self.other.update(Exercise("Exercise 7"), Exercise("Exercise 7", 30))
+        diff = self.exercises.diff(self.other)
+        self.assertEqual(diff.added, [Exercise("Build a heap")])
+        self.assertEqual(diff.removed, [Exercise("Exercise 5")])
+        self.assertEqual([new.duration for _, new in diff.changed], [30])
+
+    def test_diff_follows_changes(self):
+        self.assertEqual(self.exercises.diff(self.other), ([], [], []))
+        self.other.append(Exercise("Build a heap"))
+        self.exercises.remove(Exercise("Exercise 5"))
+        diff = self.exercises.diff(self.other)
+        self.assertEqual(set(diff.added),
+                         set([Exercise("Exercise 5"), Exercise("Build a heap")]))
+        self.assertEqual(diff.removed, [])
+
+    def test_sync(self):
+        self.other.remove(Exercise("Exercise 5"))
+        self.other.update(Exercise("Exercise 7"), Exercise("Exercise 7", 30))
+        self.other.append(Exercise("Build a heap"))
+        self.other.append(Exercise("Build a tree"))
+        exercise_id = self.exercises.id_of(Exercise("Exercise 7"))
+
+        diff = self.exercises.sync(self.other)
+        self.assertEqual(len(diff.added), 2)
+        self.assertEqual(self.exercises, self.other)
+        self.assertEqual(self.exercises.get(exercise_id).duration, 30)
+        self.assertEqual(self.exercises.diff(self.other), ([], [], []))
+
 class ExerciseTestCases(unittest.TestCase):
     def test_create_exercise(self):
         desc = "New Exercise"
@@ -239,6 +834,23 @@ class ExerciseTestCases(unittest.TestCase):
 
         self.assertNotEqual(ex1, ex2)
 
+    def test_exercise_hash_matches_equal_exercises(self):
+        desc = "New Exercise"
+        self.assertEqual(hash(Exercise(desc)), hash(Exercise(desc)))
+        self.assertEqual(len(set([Exercise(desc), Exercise(desc)])), 1)
+
+    def test_exercise_has_no_instance_dict(self):
+        ex = Exercise("New Exercise")
+        self.assertFalse(hasattr(ex, '__dict__'))
+
+    def test_exercise_pickle_round_trip(self):
+        import pickle
+        ex = Exercise("New Exercise")
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            copy = pickle.loads(pickle.dumps(ex, protocol))
+            self.assertEqual(copy, ex)
+            self.assertEqual(hash(copy), hash(ex))
+
     def test_exercise_to_list_returns_list(self):
         desc = 'Build a tree!'
         ex = Exercise(desc)
@@ -251,5 +863,54 @@ class ExerciseTestCases(unittest.TestCase):
         row = ex.to_list()
         self.assertIn(desc, row)
 
+    def test_exercise_duration(self):
+        self.assertIsNone(Exercise("Build a tree!").duration)
+        ex = Exercise("Build a tree!", 30)
+        self.assertEqual(ex.duration, 30)
+        self.assertEqual(ex.to_list(), ["Build a tree!", 30])
+        self.assertEqual(ex, Exercise("Build a tree!"))
+
+    def test_exercise_invalid_duration(self):
+        for duration in (0, -10, 1.5, '30'):
+            with self.assertRaises(ValueError):
+                Exercise("Build a tree!", duration)
+
+    def test_exercise_duration_pickle_round_trip(self):
+        import pickle
+        ex = Exercise("Build a tree!", 30)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertEqual(pickle.loads(pickle.dumps(ex, protocol)).duration, 30)
+
+class ExerciseDurationCsvTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_CSV = "_tmp_durations.csv"
+
+    def tearDown(self):
+        if os.path.isfile(self._TMP_CSV):
+            os.remove(self._TMP_CSV)
+
+    def test_read_durations(self):
+        with open(self._TMP_CSV, 'wb') as f:
+            f.write("Build a tree!,30\r\nBuild a house!\r\n"
+                    "Build a road!,\r\nBuild a boat!,soon\r\n")
+
+        exercises = Exercises()
+        result = exercises.add_exercises_from_csv(self._TMP_CSV)
+        self.assertEqual(tuple(result), (3, 0, 1))
+        self.assertEqual([ex.duration for ex in exercises], [30, None, None])
+
+    def test_write_durations(self):
+        exercises = Exercises()
+        exercises.append(Exercise("Build a tree!", 30))
+        exercises.append(Exercise("Build a house!"))
+        out = StringIO()
+        write_csv(exercises, out)
+        self.assertEqual(out.getvalue(), "Build a tree!,30\r\nBuild a house!\r\n")
+
+        exercises.to_csv(self._TMP_CSV)
+        copy = Exercises()
+        copy.add_exercises_from_csv(self._TMP_CSV)
+        self.assertEqual([ex.duration for ex in copy], [30, None])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('../trainer'))
+sys.path.insert(0, os.path.abspath('./trainer'))
+
+import unittest
+
+from formats import FORMATS, get_format
+from records import (file_format, read_records, write_records,
+                     dump_exercises, load_exercises)
+from exercises import Exercises, Exercise
+
+class FormatsTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DATA_FILE = "_tmp_data.pkl"
+        i = 0
+        while os.path.isfile(self._TMP_DATA_FILE):
+            self._TMP_DATA_FILE = "_tmp_data_{}.pkl".format(i)
+            i += 1
+
+        self.exercises = Exercises()
+        for i in xrange(3000):
+            self.exercises.append(Exercise("Exercise {}".format(i), i % 7 or None))
+        self.exercises.append(Exercise(u"Übung mit Umlauten".encode('utf-8'), 5))
+        self.exercises.append(Exercise("Quote \" and\nnewline"))
+        self.exercises.remove(Exercise("Exercise 10"))
+        self.exercises.set_weight(5, 2.5)
+        self.exercises.set_weight(6, 0)
+
+    def tearDown(self):
+        if os.path.isfile(self._TMP_DATA_FILE):
+            os.remove(self._TMP_DATA_FILE)
+
+    def _load(self):
+        with open(self._TMP_DATA_FILE, 'rb') as f:
+            return load_exercises(f)
+
+    def test_formats_round_trip(self):
+        for name in FORMATS:
+            dump_exercises(self.exercises, self._TMP_DATA_FILE, name)
+            self.assertEqual(file_format(self._TMP_DATA_FILE), name)
+
+            exercises = self._load()
+            self.assertEqual(list(exercises.items()),
+                             list(self.exercises.items()), name)
+            self.assertEqual([ex.duration for ex in exercises],
+                             [ex.duration for ex in self.exercises], name)
+            self.assertEqual(exercises.weights(), {5: 2.5, 6: 0}, name)
+            self.assertEqual(exercises.next_id, self.exercises.next_id, name)
+
+    def test_descriptions_are_read_as_str(self):
+        for name in FORMATS:
+            dump_exercises(self.exercises, self._TMP_DATA_FILE, name)
+            exercises = self._load()
+            self.assertEqual(set(type(ex.description) for ex in exercises),
+                             set([str]), name)
+
+    def test_unicode_descriptions_are_written_as_utf8(self):
+        exercises = Exercises()
+        exercises.append(Exercise(u"Übung"))
+        for name in ('jsonl', 'binary'):
+            dump_exercises(exercises, self._TMP_DATA_FILE, name)
+            self.assertEqual(self._load()[0].description,
+                             u"Übung".encode('utf-8'), name)
+
+    def test_empty_round_trip(self):
+        for name in FORMATS:
+            dump_exercises(Exercises(), self._TMP_DATA_FILE, name)
+            exercises = self._load()
+            self.assertEqual(len(exercises), 0, name)
+            self.assertEqual(exercises.next_id, 1, name)
+
+    def test_records_are_read_as_iterated(self):
+        for name in FORMATS:
+            write_records(self._TMP_DATA_FILE, {'next_id': 1, 'count': 3000},
+                          ((i, str(i), None, None) for i in xrange(3000)),
+                          format=name)
+            with open(self._TMP_DATA_FILE, 'rb') as f:
+                _, meta, records = read_records(f)
+                self.assertEqual(meta['count'], 3000)
+                self.assertEqual(next(records), (0, '0', None, None))
+                self.assertLess(f.tell(), os.path.getsize(self._TMP_DATA_FILE),
+                                name)
+                self.assertEqual(len(list(records)), 2999)
+
+    def test_truncated_file_raises(self):
+        for name in FORMATS:
+            dump_exercises(self.exercises, self._TMP_DATA_FILE, name)
+            size = os.path.getsize(self._TMP_DATA_FILE)
+            with open(self._TMP_DATA_FILE, 'r+b') as f:
+                f.truncate(size - 2)
+
+            with self.assertRaises(IOError):
+                self._load()
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            get_format('xml')
+        with self.assertRaises(ValueError):
+            dump_exercises(self.exercises, self._TMP_DATA_FILE, 'xml')
+        self.assertFalse(os.path.isfile(self._TMP_DATA_FILE))
+
+if __name__ == '__main__':
+    unittest.main()
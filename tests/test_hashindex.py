@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('../trainer'))
+sys.path.insert(0, os.path.abspath('./trainer'))
+
+import unittest
+
+from hashindex import HashIndex, description_digest
+
+class HashIndexTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_SNAPSHOT = "_tmp_snapshot.pkl"
+        self._TMP_INDEX = self._TMP_SNAPSHOT + '.idx'
+        with open(self._TMP_SNAPSHOT, 'wb') as f:
+            f.write('snapshot')
+
+        self.descriptions = ["Exercise {}".format(i) for i in range(100)]
+        HashIndex.write(self._TMP_INDEX, self.descriptions, self._TMP_SNAPSHOT,
+                        next_id=150)
+
+    def tearDown(self):
+        for path in (self._TMP_SNAPSHOT, self._TMP_INDEX):
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def test_digest_is_stable(self):
+        self.assertEqual(description_digest("Exercise"),
+                         description_digest(u"Exercise"))
+        self.assertNotEqual(description_digest("Exercise 1"),
+                            description_digest("Exercise 2"))
+
+    def test_open_index(self):
+        index = HashIndex.open(self._TMP_INDEX, self._TMP_SNAPSHOT)
+        self.assertEqual(len(index), 100)
+
+    def test_next_id(self):
+        index = HashIndex.open(self._TMP_INDEX, self._TMP_SNAPSHOT)
+        self.assertEqual(index.next_id, 150)
+
+    def test_contains(self):
+        index = HashIndex.open(self._TMP_INDEX, self._TMP_SNAPSHOT)
+        for desc in self.descriptions:
+            self.assertIn(desc, index)
+        self.assertNotIn("Exercise 100", index)
+
+    def test_open_missing_index(self):
+        os.remove(self._TMP_INDEX)
+        self.assertIsNone(HashIndex.open(self._TMP_INDEX, self._TMP_SNAPSHOT))
+
+    def test_open_stale_index(self):
+        with open(self._TMP_SNAPSHOT, 'ab') as f:
+            f.write('changed')
+
+        self.assertIsNone(HashIndex.open(self._TMP_INDEX, self._TMP_SNAPSHOT))
+
+    def test_open_truncated_index(self):
+        with open(self._TMP_INDEX, 'r+b') as f:
+            f.truncate(10)
+
+        self.assertIsNone(HashIndex.open(self._TMP_INDEX, self._TMP_SNAPSHOT))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('../trainer'))
+sys.path.insert(0, os.path.abspath('./trainer'))
+
+import unittest
+import shutil
+
+from instrumentation import Metrics, metrics
+from trainer import Trainer
+
+DATA_PATH = os.path.dirname(__file__)
+TEST_DATA_FILE = os.path.join(DATA_PATH, 'test_dataset_1.pkl')
+TEST_ADD_DATA = os.path.join(DATA_PATH, 'new_exercises.csv')
+
+class MetricsTestCases(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_disabled_collects_nothing(self):
+        with self.metrics.timer('load'):
+            self.metrics.count('bytes_read', 10)
+
+        self.assertEqual(self.metrics.as_dict(),
+                         {'timers': {}, 'counters': {}})
+
+    def test_timer(self):
+        self.metrics.enable()
+        for _ in range(3):
+            with self.metrics.timer('load'):
+                pass
+
+        timer = self.metrics.as_dict()['timers']['load']
+        self.assertEqual(timer['calls'], 3)
+        self.assertTrue(timer['seconds'] >= 0)
+
+    def test_timer_counts_failed_calls(self):
+        self.metrics.enable()
+        with self.assertRaises(ValueError):
+            with self.metrics.timer('load'):
+                raise ValueError()
+
+        self.assertEqual(self.metrics.as_dict()['timers']['load']['calls'], 1)
+
+    def test_count(self):
+        self.metrics.enable()
+        self.metrics.count('bytes_read', 10)
+        self.metrics.count('bytes_read', 5)
+        self.metrics.count('records')
+        self.assertEqual(self.metrics.as_dict()['counters'],
+                         {'bytes_read': 15, 'records': 1})
+
+    def test_reset(self):
+        self.metrics.enable()
+        self.metrics.count('bytes_read', 10)
+        self.metrics.reset()
+        self.assertEqual(self.metrics.as_dict()['counters'], {})
+
+    def test_summary(self):
+        self.metrics.enable()
+        with self.metrics.timer('load'):
+            self.metrics.count('bytes_read', 10)
+
+        summary = self.metrics.summary()
+        self.assertTrue('load' in summary)
+        self.assertTrue('bytes_read' in summary)
+
+class TrainerMetricsTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DATA_FILE = "_tmp_data.pkl"
+        i = 0
+        while os.path.isfile(self._TMP_DATA_FILE):
+            self._TMP_DATA_FILE = "_tmp_data_{}.pkl".format(i)
+            i += 1
+
+        shutil.copyfile(TEST_DATA_FILE, self._TMP_DATA_FILE)
+        metrics.reset()
+        metrics.enable()
+
+    def tearDown(self):
+        metrics.disable()
+        metrics.reset()
+        for suffix in ('', '.lock'):
+            if os.path.isfile(self._TMP_DATA_FILE + suffix):
+                os.remove(self._TMP_DATA_FILE + suffix)
+
+    def test_get_metrics(self):
+        trainer = Trainer(conn=self._TMP_DATA_FILE)
+        trainer.get_new_list(3)
+        trainer.add_exercises_from_csv(TEST_ADD_DATA)
+
+        stats = trainer.get_metrics()
+        for name in ('connect', 'load', 'sample', 'import', 'save'):
+            self.assertEqual(stats['timers'][name]['calls'], 1)
+
+        self.assertEqual(stats['counters']['bytes_read'],
+                         os.path.getsize(TEST_DATA_FILE) +
+                         os.path.getsize(TEST_ADD_DATA))
+        self.assertEqual(stats['counters']['bytes_written'],
+                         os.path.getsize(self._TMP_DATA_FILE))
+
+if __name__ == '__main__':
+    unittest.main()
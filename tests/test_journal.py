@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('../trainer'))
+sys.path.insert(0, os.path.abspath('./trainer'))
+
+import unittest
+import pickle
+
+from journal import Journal, apply_record, atomic_dump
+from exercises import Exercises, Exercise
+
+class JournalTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_JOURNAL = "_tmp_data.journal"
+        i = 0
+        while os.path.isfile(self._TMP_JOURNAL):
+            self._TMP_JOURNAL = "_tmp_data_{}.journal".format(i)
+            i += 1
+
+        self.journal = Journal(self._TMP_JOURNAL)
+
+    def tearDown(self):
+        for path in (self.journal.path, self.journal.rotated_path):
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def test_new_journal_is_empty(self):
+        self.assertTrue(self.journal.is_empty())
+        self.assertEqual(list(self.journal.records()), [])
+
+    def test_records_are_read_back_in_order(self):
+        self.journal.append([('add', 'first')])
+        self.journal.append([('add', 'second'), ('remove', 'first')])
+
+        records = list(self.journal.records())
+        self.assertEqual(records, [('add', 'first'), ('add', 'second'),
+                                   ('remove', 'first')])
+
+    def test_torn_record_is_dropped(self):
+        self.journal.append([('add', 'first'), ('add', 'second')])
+        size = self.journal.size()
+        with open(self.journal.path, 'r+b') as f:
+            f.truncate(size - 3)
+
+        self.assertEqual(list(self.journal.records()), [('add', 'first')])
+
+    def test_repair_allows_appends_after_torn_record(self):
+        self.journal.append([('add', 'first'), ('add', 'second')])
+        with open(self.journal.path, 'r+b') as f:
+            f.truncate(self.journal.size() - 3)
+
+        self.journal.repair()
+        self.journal.append([('add', 'third')])
+        self.assertEqual(list(self.journal.records()),
+                         [('add', 'first'), ('add', 'third')])
+
+    def test_rotated_records_come_first(self):
+        self.journal.append([('add', 'first')])
+        self.journal.rotate()
+        self.journal.append([('add', 'second')])
+
+        self.assertFalse(self.journal.is_empty())
+        self.assertEqual(list(self.journal.records()),
+                         [('add', 'first'), ('add', 'second')])
+
+        self.journal.discard_rotated()
+        self.assertEqual(list(self.journal.records()), [('add', 'second')])
+
+    def test_rotate_twice_fails(self):
+        self.journal.append([('add', 'first')])
+        self.journal.rotate()
+        self.journal.append([('add', 'second')])
+
+        with self.assertRaises(IOError):
+            self.journal.rotate()
+
+    def test_clear_removes_all_records(self):
+        self.journal.append([('add', 'first')])
+        self.journal.rotate()
+        self.journal.append([('add', 'second')])
+        self.journal.clear()
+
+        self.assertTrue(self.journal.is_empty())
+
+    def test_replay_is_idempotent(self):
+        self.journal.append([('add', 'first'), ('add', 'second'),
+                             ('update', 'second', 'third'),
+                             ('remove', 'first')])
+        exercises = Exercises()
+        self.journal.replay(exercises)
+        self.journal.replay(exercises)
+
+        self.assertEqual(len(exercises), 1)
+        self.assertEqual(exercises[0], Exercise('third'))
+
+    def test_replay_over_compacted_snapshot_keeps_ids(self):
+        self.journal.append([('add', 'again', 2), ('remove', 'again', 2),
+                             ('add', 'again', 3), ('weight', 3, 2.5),
+                             ('add', 'old', 4), ('update', 'old', 'new', 4),
+                             ('add', 'old', 5), ('remove', 'old', 5),
+                             ('weight', 4, 1.5), ('remove', 'first', 1)])
+        compacted = Exercises()
+        compacted.append(Exercise('first'))
+        self.journal.replay(compacted)
+        self.assertEqual(list(compacted.items()),
+                         [(3, Exercise('again')), (4, Exercise('new'))])
+        self.assertEqual(compacted.weights(), {3: 2.5, 4: 1.5})
+
+        # NOTE: a compaction interrupted after writing the snapshot
+        # leaves the rotated journal to be replayed over it again
+        self.journal.rotate()
+        for _ in range(2):
+            self.journal.replay(compacted)
+            self.assertEqual(list(compacted.items()),
+                             [(3, Exercise('again')), (4, Exercise('new'))])
+            self.assertEqual(compacted.weights(), {3: 2.5, 4: 1.5})
+            self.assertEqual(compacted.next_id, 6)
+
+class ApplyRecordTestCases(unittest.TestCase):
+    def setUp(self):
+        self.exercises = Exercises()
+        self.exercises.append(Exercise('first'))
+
+    def test_apply_add_existing(self):
+        apply_record(self.exercises, ('add', 'first'))
+        self.assertEqual(len(self.exercises), 1)
+
+    def test_apply_remove_missing(self):
+        apply_record(self.exercises, ('remove', 'missing'))
+        self.assertEqual(len(self.exercises), 1)
+
+    def test_apply_update_already_applied(self):
+        apply_record(self.exercises, ('update', 'missing', 'first'))
+        self.assertEqual(len(self.exercises), 1)
+
+    def test_apply_update_with_missing_old(self):
+        apply_record(self.exercises, ('update', 'missing', 'second'))
+        self.assertIn(Exercise('second'), self.exercises)
+
+    def test_apply_add_with_id(self):
+        apply_record(self.exercises, ('add', 'second', 7))
+        self.assertEqual(self.exercises.id_of(Exercise('second')), 7)
+
+    def test_apply_add_without_id_allocates_next(self):
+        apply_record(self.exercises, ('add', 'second', None))
+        apply_record(self.exercises, ('add', 'third'))
+        self.assertEqual(self.exercises.id_of(Exercise('second')), 2)
+        self.assertEqual(self.exercises.id_of(Exercise('third')), 3)
+
+    def test_apply_update_keeps_id(self):
+        apply_record(self.exercises, ('update', 'first', 'second', 1))
+        self.assertEqual(self.exercises.get(1), Exercise('second'))
+
+    def test_apply_records_with_duration(self):
+        apply_record(self.exercises, ('add', 'second', 2, 30))
+        self.assertEqual(self.exercises.get(2).duration, 30)
+
+        apply_record(self.exercises, ('update', 'second', 'second', 2, 45))
+        self.assertEqual(self.exercises.get(2).duration, 45)
+
+        apply_record(self.exercises, ('update', 'second', 'third', 2, None))
+        self.assertIsNone(self.exercises.get(2).duration)
+
+    def test_apply_weight_record(self):
+        apply_record(self.exercises, ('weight', 1, 2.5))
+        self.assertEqual(self.exercises.weight(1), 2.5)
+
+        # NOTE: the exercise was removed since
+        apply_record(self.exercises, ('weight', 9, 2.5))
+        self.assertEqual(self.exercises.weights(), {1: 2.5})
+
+    def test_apply_unknown_record(self):
+        with self.assertRaises(ValueError):
+            apply_record(self.exercises, ('drop', 'first'))
+
+class AtomicDumpTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DATA_FILE = "_tmp_atomic.pkl"
+        self._TMP_FILE = "{}.tmp{}".format(self._TMP_DATA_FILE, os.getpid())
+
+    def tearDown(self):
+        for path in (self._TMP_DATA_FILE, self._TMP_FILE):
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def test_atomic_dump_writes_file(self):
+        atomic_dump(['exercise'], self._TMP_DATA_FILE)
+        with open(self._TMP_DATA_FILE, 'rb') as f:
+            self.assertEqual(pickle.load(f), ['exercise'])
+        self.assertFalse(os.path.isfile(self._TMP_FILE))
+
+    def test_failed_dump_keeps_previous_file(self):
+        atomic_dump(['exercise'], self._TMP_DATA_FILE)
+        with self.assertRaises(Exception):
+            atomic_dump(lambda: None, self._TMP_DATA_FILE)
+
+        with open(self._TMP_DATA_FILE, 'rb') as f:
+            self.assertEqual(pickle.load(f), ['exercise'])
+        self.assertFalse(os.path.isfile(self._TMP_FILE))
+
+if __name__ == '__main__':
+    unittest.main()
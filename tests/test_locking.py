@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('../trainer'))
+sys.path.insert(0, os.path.abspath('./trainer'))
+
+import unittest
+import shutil
+import fcntl
+import multiprocessing
+
+from locking import FileLock, StaleDataError
+from storage import PickleStorage
+from exercises import Exercise
+from trainer import Trainer
+
+DATA_PATH = os.path.dirname(__file__)
+TEST_DATA_FILE = os.path.join(DATA_PATH, 'test_dataset_1.pkl')
+
+SUFFIXES = ('', '.lock', '.idx', '.snap', '.journal', '.journal.old')
+
+def _tmp_data_file():
+    path = "_tmp_data.pkl"
+    i = 0
+    while os.path.isfile(path):
+        path = "_tmp_data_{}.pkl".format(i)
+        i += 1
+    shutil.copyfile(TEST_DATA_FILE, path)
+    return path
+
+def _remove_data_file(path):
+    for suffix in SUFFIXES:
+        if os.path.isfile(path + suffix):
+            os.remove(path + suffix)
+
+def _can_lock(path, mode):
+    """Whether another open file description could take the lock"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT)
+    try:
+        fcntl.flock(fd, mode | fcntl.LOCK_NB)
+        return True
+    except IOError:
+        return False
+    finally:
+        os.close(fd)
+
+class FileLockTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_LOCK = "_tmp_data.lock"
+        self.lock = FileLock(self._TMP_LOCK)
+
+    def tearDown(self):
+        if os.path.isfile(self._TMP_LOCK):
+            os.remove(self._TMP_LOCK)
+
+    def test_version(self):
+        self.assertEqual(self.lock.version(), 0)
+        with self.lock.exclusive():
+            self.assertEqual(self.lock.bump(), 1)
+            self.assertEqual(self.lock.bump(), 2)
+        self.assertEqual(FileLock(self._TMP_LOCK).version(), 2)
+
+    def test_bump_needs_exclusive_lock(self):
+        with self.assertRaises(IOError):
+            self.lock.bump()
+
+        with self.lock.shared():
+            with self.assertRaises(IOError):
+                self.lock.bump()
+
+    def test_shared(self):
+        with self.lock.shared():
+            self.assertTrue(self.lock.is_held)
+            self.assertFalse(self.lock.is_exclusive)
+            self.assertTrue(_can_lock(self._TMP_LOCK, fcntl.LOCK_SH))
+            self.assertFalse(_can_lock(self._TMP_LOCK, fcntl.LOCK_EX))
+        self.assertFalse(self.lock.is_held)
+        self.assertTrue(_can_lock(self._TMP_LOCK, fcntl.LOCK_EX))
+
+    def test_exclusive(self):
+        with self.lock.exclusive():
+            self.assertTrue(self.lock.is_exclusive)
+            self.assertFalse(_can_lock(self._TMP_LOCK, fcntl.LOCK_SH))
+            with self.lock.shared():
+                self.assertTrue(self.lock.is_exclusive)
+            self.assertTrue(self.lock.is_exclusive)
+        self.assertTrue(_can_lock(self._TMP_LOCK, fcntl.LOCK_EX))
+
+    def test_upgrade(self):
+        with self.lock.shared():
+            with self.lock.exclusive():
+                self.assertTrue(self.lock.is_exclusive)
+                self.assertFalse(_can_lock(self._TMP_LOCK, fcntl.LOCK_SH))
+            self.assertFalse(self.lock.is_exclusive)
+            self.assertTrue(_can_lock(self._TMP_LOCK, fcntl.LOCK_SH))
+        self.assertFalse(self.lock.is_held)
+
+    def test_released_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.lock.exclusive():
+                raise ValueError()
+
+        self.assertFalse(self.lock.is_held)
+        self.assertTrue(_can_lock(self._TMP_LOCK, fcntl.LOCK_EX))
+
+class SharedPickleStorageTestCases(unittest.TestCase):
+    """Two storages on one file stand in for two processes"""
+    def setUp(self):
+        self._TMP_DATA_FILE = _tmp_data_file()
+
+    def tearDown(self):
+        _remove_data_file(self._TMP_DATA_FILE)
+
+    def open_pair(self, **kwargs):
+        return (PickleStorage(self._TMP_DATA_FILE, **kwargs),
+                PickleStorage(self._TMP_DATA_FILE, **kwargs))
+
+    def check_changes_are_merged(self, **kwargs):
+        first, second = self.open_pair(**kwargs)
+        first_id = first.add(Exercise("first process"))
+        second_id = second.add(Exercise("second process"))
+        self.assertNotEqual(first_id, second_id)
+        self.assertTrue(Exercise("first process") in second)
+
+        second.remove(Exercise("create a git repo"))
+        with self.assertRaises(ValueError):
+            first.remove(Exercise("create a git repo"))
+        with self.assertRaises(Exception):
+            first.add(Exercise("second process"))
+        first.close()
+        second.close()
+
+        storage = PickleStorage(self._TMP_DATA_FILE)
+        self.assertEqual(len(storage), 11)
+        self.assertEqual(storage.id_of(Exercise("first process")), first_id)
+        self.assertEqual(storage.id_of(Exercise("second process")), second_id)
+
+    def test_changes_are_merged(self):
+        self.check_changes_are_merged()
+
+    def test_journaled_changes_are_merged(self):
+        self.check_changes_are_merged(journal=True)
+
+    def test_lazy_changes_are_merged(self):
+        PickleStorage(self._TMP_DATA_FILE, lazy=True, snapshot=True).close()
+        self.check_changes_are_merged(journal=True, lazy=True, snapshot=True)
+
+    def test_batch_is_merged(self):
+        first, second = self.open_pair(journal=True)
+        first.add(Exercise("first process"))
+        with second.batch():
+            second.add(Exercise("second process"))
+            self.assertTrue(Exercise("first process") in second)
+        self.assertEqual(len(PickleStorage(self._TMP_DATA_FILE)), 12)
+
+    def test_version(self):
+        first, second = self.open_pair()
+        self.assertEqual(first.version, second.version)
+        first.add(Exercise("first process"))
+        self.assertEqual(first.version, second.version + 1)
+
+    def test_refresh(self):
+        first, second = self.open_pair(journal=True)
+        self.assertFalse(second.refresh())
+        first.add(Exercise("first process"))
+        self.assertTrue(Exercise("first process") not in second)
+        self.assertTrue(second.refresh())
+        self.assertTrue(Exercise("first process") in second)
+        self.assertEqual(second.version, first.version)
+
+    def test_stale_save_is_rejected(self):
+        first, second = self.open_pair()
+        first.add(Exercise("first process"))
+        second.exercises.append(Exercise("second process"))
+        with self.assertRaises(StaleDataError):
+            second.save()
+
+        storage = PickleStorage(self._TMP_DATA_FILE)
+        self.assertTrue(Exercise("first process") in storage)
+        self.assertFalse(Exercise("second process") in storage)
+
+    def test_compaction_skipped_after_other_change(self):
+        first, second = self.open_pair(journal=True, journal_limit=1)
+        first.add(Exercise("first process"))
+        second.add(Exercise("second process"))
+        first.close()
+        second.close()
+
+        storage = PickleStorage(self._TMP_DATA_FILE)
+        self.assertEqual(len(storage), 12)
+        self.assertFalse(os.path.isfile(self._TMP_DATA_FILE + '.journal.old'))
+
+def _add_exercises(path, worker, count, kwargs):
+    """Add count exercises one at a time through a Trainer"""
+    trainer = Trainer(conn=path, **kwargs)
+    for i in xrange(count):
+        trainer.add_exercise(Exercise("worker {} exercise {}".format(worker, i)))
+    trainer.close()
+
+def _read_exercises(path, rounds, kwargs):
+    """Open the data file repeatedly and check it only ever grows"""
+    seen = 0
+    for _ in xrange(rounds):
+        trainer = Trainer(conn=path, **kwargs)
+        count = len(trainer.get_all_exercises())
+        trainer.close()
+        if count < seen:
+            raise AssertionError("{} exercises after {}".format(count, seen))
+        seen = count
+
+class ConcurrentProcessesTestCases(unittest.TestCase):
+    """Many writers and readers share one data file"""
+    WRITERS = 8
+    READERS = 2
+    EXERCISES = 25
+
+    def setUp(self):
+        self._TMP_DATA_FILE = _tmp_data_file()
+
+    def tearDown(self):
+        _remove_data_file(self._TMP_DATA_FILE)
+
+    def check_no_update_is_lost(self, **kwargs):
+        processes = [multiprocessing.Process(
+                         target=_add_exercises,
+                         args=(self._TMP_DATA_FILE, worker, self.EXERCISES,
+                               kwargs))
+                     for worker in xrange(self.WRITERS)]
+        processes += [multiprocessing.Process(
+                          target=_read_exercises,
+                          args=(self._TMP_DATA_FILE, 20, kwargs))
+                      for _ in xrange(self.READERS)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+
+        trainer = Trainer(conn=self._TMP_DATA_FILE)
+        pairs = list(trainer.iter_exercises_with_ids())
+        trainer.close()
+        self.assertEqual(len(pairs), 10 + self.WRITERS * self.EXERCISES)
+        self.assertEqual(len(set(exercise_id for exercise_id, _ in pairs)),
+                         len(pairs))
+        for worker in xrange(self.WRITERS):
+            for i in xrange(self.EXERCISES):
+                exercise = Exercise("worker {} exercise {}".format(worker, i))
+                self.assertTrue(exercise in [ex for _, ex in pairs])
+
+    def test_rewrites(self):
+        self.check_no_update_is_lost()
+
+    def test_journal(self):
+        self.check_no_update_is_lost(journal=True, journal_limit=2048)
+
+    def test_lazy_journal(self):
+        Trainer(conn=self._TMP_DATA_FILE, lazy=True, snapshot=True).close()
+        self.check_no_update_is_lost(journal=True, journal_limit=2048,
+                                     lazy=True, snapshot=True)
+
+    def test_sqlite(self):
+        self._TMP_DB = self._TMP_DATA_FILE + '.db'
+        conn = 'sqlite:///' + self._TMP_DB
+        trainer = Trainer(conn=conn)
+        trainer.add_exercises(Trainer(conn=TEST_DATA_FILE).get_all_exercises())
+        trainer.close()
+
+        processes = [multiprocessing.Process(
+                         target=_add_exercises,
+                         args=(conn, worker, self.EXERCISES, {}))
+                     for worker in xrange(self.WRITERS)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+
+        trainer = Trainer(conn=conn)
+        self.assertEqual(len(trainer.get_all_exercises()),
+                         10 + self.WRITERS * self.EXERCISES)
+        trainer.close()
+        os.remove(self._TMP_DB)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('../trainer'))
+sys.path.insert(0, os.path.abspath('./trainer'))
+
+import unittest
+import shutil
+
+import records
+import migrations
+from records import (SCHEMA_VERSION, SchemaVersionError, file_version,
+                     file_format, read_records, write_records,
+                     load_exercises)
+from migrations import MIGRATIONS, migration, migrate
+from storage import PickleStorage, migrate_storage
+from exercises import Exercise
+
+DATA_PATH = os.path.dirname(__file__)
+TEST_LEGACY_DATA_FILE = os.path.join(DATA_PATH, 'test_dataset_legacy.pkl')
+
+class _MigrationTestCase(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DATA_FILE = "_tmp_data.pkl"
+        i = 0
+        while os.path.isfile(self._TMP_DATA_FILE):
+            self._TMP_DATA_FILE = "_tmp_data_{}.pkl".format(i)
+            i += 1
+
+        shutil.copyfile(TEST_LEGACY_DATA_FILE, self._TMP_DATA_FILE)
+        with open(TEST_LEGACY_DATA_FILE, 'rb') as f:
+            _, _, legacy = read_records(f)
+            self.legacy = list(legacy)
+
+    def tearDown(self):
+        records.SCHEMA_VERSION = migrations.SCHEMA_VERSION = SCHEMA_VERSION
+        MIGRATIONS.pop(SCHEMA_VERSION, None)
+        for suffix in ('', '.lock'):
+            if os.path.isfile(self._TMP_DATA_FILE + suffix):
+                os.remove(self._TMP_DATA_FILE + suffix)
+
+    def _load(self):
+        with open(self._TMP_DATA_FILE, 'rb') as f:
+            return load_exercises(f)
+
+    def _bump_schema(self):
+        """Pretend a newer version of the trainer added a field"""
+        records.SCHEMA_VERSION = migrations.SCHEMA_VERSION = SCHEMA_VERSION + 1
+
+class MigrationTestCases(_MigrationTestCase):
+    def test_migrate_legacy_file(self):
+        self.assertEqual(migrate(self._TMP_DATA_FILE), 0)
+        self.assertEqual(file_version(self._TMP_DATA_FILE), SCHEMA_VERSION)
+
+        exercises = self._load()
+        self.assertEqual(list(exercises.items()),
+                         [(i, ex) for i, ex, _ in self.legacy])
+        self.assertEqual(exercises.next_id, 11)
+
+    def test_migrate_current_file_is_noop(self):
+        migrate(self._TMP_DATA_FILE)
+        mtime = os.path.getmtime(self._TMP_DATA_FILE)
+        self.assertEqual(migrate(self._TMP_DATA_FILE), SCHEMA_VERSION)
+        self.assertEqual(os.path.getmtime(self._TMP_DATA_FILE), mtime)
+
+    def test_migrate_to_format(self):
+        self.assertEqual(migrate(self._TMP_DATA_FILE, format='binary'), 0)
+        self.assertEqual(file_format(self._TMP_DATA_FILE), 'binary')
+
+        self.assertEqual(migrate(self._TMP_DATA_FILE), SCHEMA_VERSION)
+        self.assertEqual(file_format(self._TMP_DATA_FILE), 'binary')
+
+        self.assertEqual(migrate(self._TMP_DATA_FILE, format='jsonl'),
+                         SCHEMA_VERSION)
+        self.assertEqual(file_format(self._TMP_DATA_FILE), 'jsonl')
+        self.assertEqual(list(self._load().items()),
+                         [(i, ex) for i, ex, _ in self.legacy])
+
+    def test_migrate_reports_progress(self):
+        calls = []
+        migrate(self._TMP_DATA_FILE, lambda done, total: calls.append((done, total)))
+        self.assertEqual(calls, [(10, 10)])
+
+    def test_migrations_are_chained(self):
+        migrate(self._TMP_DATA_FILE)
+        self._bump_schema()
+
+        @migration(SCHEMA_VERSION)
+        def add_tags(record):
+            return record + ((),)
+
+        self.assertEqual(migrate(self._TMP_DATA_FILE), SCHEMA_VERSION)
+        with open(self._TMP_DATA_FILE, 'rb') as f:
+            version, _, migrated = read_records(f)
+            migrated = list(migrated)
+        self.assertEqual(version, SCHEMA_VERSION + 1)
+        self.assertEqual(migrated[0][-1], ())
+        self.assertEqual(len(migrated), 10)
+
+    def test_missing_migration_keeps_file(self):
+        self._bump_schema()
+        with self.assertRaises(SchemaVersionError):
+            migrate(self._TMP_DATA_FILE)
+        self.assertEqual(file_version(self._TMP_DATA_FILE), 0)
+
+    def test_newer_file_is_refused(self):
+        write_records(self._TMP_DATA_FILE, {'next_id': 1, 'count': 0}, [],
+                      SCHEMA_VERSION + 1)
+        with self.assertRaises(SchemaVersionError):
+            migrate(self._TMP_DATA_FILE)
+
+    def test_duplicate_migration_is_refused(self):
+        with self.assertRaises(ValueError):
+            migration(0)(lambda record: record)
+
+class StorageMigrationTestCases(_MigrationTestCase):
+    def test_storage_migrates_legacy_file(self):
+        storage = PickleStorage(self._TMP_DATA_FILE)
+        self.assertEqual(file_version(self._TMP_DATA_FILE), SCHEMA_VERSION)
+        self.assertEqual(len(storage), 10)
+        storage.add(Exercise("new exercise"))
+        self.assertEqual(len(self._load()), 11)
+
+    def test_storage_refuses_legacy_file(self):
+        with self.assertRaises(SchemaVersionError):
+            PickleStorage(self._TMP_DATA_FILE, auto_migrate=False)
+        self.assertEqual(file_version(self._TMP_DATA_FILE), 0)
+
+    def test_storage_refuses_newer_file(self):
+        write_records(self._TMP_DATA_FILE, {'next_id': 1, 'count': 0}, [],
+                      SCHEMA_VERSION + 1)
+        with self.assertRaises(SchemaVersionError):
+            PickleStorage(self._TMP_DATA_FILE)
+
+    def test_migrate_storage(self):
+        self.assertEqual(migrate_storage(self._TMP_DATA_FILE), 0)
+        self.assertEqual(migrate_storage(self._TMP_DATA_FILE), SCHEMA_VERSION)
+        migrate_storage(self._TMP_DATA_FILE, format='jsonl')
+        self.assertEqual(file_format(self._TMP_DATA_FILE), 'jsonl')
+        self.assertEqual(len(PickleStorage(self._TMP_DATA_FILE,
+                                           auto_migrate=False)), 10)
+
+if __name__ == '__main__':
+    unittest.main()
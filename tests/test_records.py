@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('../trainer'))
+sys.path.insert(0, os.path.abspath('./trainer'))
+
+import unittest
+
+from records import (SCHEMA_VERSION, SchemaVersionError, file_version,
+                     read_records, write_records, dump_exercises,
+                     load_exercises)
+from exercises import Exercises, Exercise
+
+DATA_PATH = os.path.dirname(__file__)
+TEST_DATA_FILE = os.path.join(DATA_PATH, 'test_dataset_1.pkl')
+TEST_LEGACY_DATA_FILE = os.path.join(DATA_PATH, 'test_dataset_legacy.pkl')
+
+class RecordsTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DATA_FILE = "_tmp_data.pkl"
+        i = 0
+        while os.path.isfile(self._TMP_DATA_FILE):
+            self._TMP_DATA_FILE = "_tmp_data_{}.pkl".format(i)
+            i += 1
+
+        self.exercises = Exercises()
+        for i in xrange(3000):
+            self.exercises.append(Exercise("Exercise {}".format(i), i % 7 or None))
+        self.exercises.remove(Exercise("Exercise 10"))
+        self.exercises.set_weight(5, 2.5)
+
+    def tearDown(self):
+        if os.path.isfile(self._TMP_DATA_FILE):
+            os.remove(self._TMP_DATA_FILE)
+
+    def _load(self, path):
+        with open(path, 'rb') as f:
+            return load_exercises(f)
+
+    def test_file_version(self):
+        self.assertEqual(file_version(TEST_DATA_FILE), SCHEMA_VERSION)
+        self.assertEqual(file_version(TEST_LEGACY_DATA_FILE), 0)
+
+    def test_exercises_round_trip(self):
+        dump_exercises(self.exercises, self._TMP_DATA_FILE)
+        self.assertEqual(file_version(self._TMP_DATA_FILE), SCHEMA_VERSION)
+
+        exercises = self._load(self._TMP_DATA_FILE)
+        self.assertEqual(exercises, self.exercises)
+        self.assertEqual(list(exercises.items()), list(self.exercises.items()))
+        self.assertEqual([ex.duration for ex in exercises],
+                         [ex.duration for ex in self.exercises])
+        self.assertEqual(exercises.weights(), {5: 2.5})
+        self.assertEqual(exercises.next_id, self.exercises.next_id)
+
+    def test_empty_exercises_round_trip(self):
+        dump_exercises(Exercises(), self._TMP_DATA_FILE)
+        exercises = self._load(self._TMP_DATA_FILE)
+        self.assertEqual(len(exercises), 0)
+        self.assertEqual(exercises.next_id, 1)
+
+    def test_legacy_file_is_refused(self):
+        with self.assertRaises(SchemaVersionError):
+            self._load(TEST_LEGACY_DATA_FILE)
+
+    def test_legacy_records(self):
+        with open(TEST_LEGACY_DATA_FILE, 'rb') as f:
+            version, meta, records = read_records(f)
+            records = list(records)
+
+        self.assertEqual(version, 0)
+        self.assertEqual(meta, {'next_id': 11, 'count': 10})
+        exercise_id, exercise, weight = records[0]
+        self.assertEqual(exercise_id, 1)
+        self.assertIsInstance(exercise, Exercise)
+        self.assertIsNone(weight)
+
+    def test_records_are_read_as_iterated(self):
+        write_records(self._TMP_DATA_FILE, {'next_id': 1, 'count': 3000},
+                      ((i, str(i), None, None) for i in xrange(3000)), 7)
+        with open(self._TMP_DATA_FILE, 'rb') as f:
+            version, meta, records = read_records(f)
+            self.assertEqual(version, 7)
+            first = next(records)
+            position = f.tell()
+            self.assertEqual(first, (0, '0', None, None))
+            self.assertEqual(len(list(records)), 2999)
+            self.assertGreater(f.tell(), position)
+
+    def test_truncated_file_raises(self):
+        dump_exercises(self.exercises, self._TMP_DATA_FILE)
+        size = os.path.getsize(self._TMP_DATA_FILE)
+        with open(self._TMP_DATA_FILE, 'r+b') as f:
+            f.truncate(size // 2)
+
+        with self.assertRaises(IOError):
+            self._load(self._TMP_DATA_FILE)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('..'))
+sys.path.insert(0, os.path.abspath('.'))
+
+import unittest
+import random
+
+from trainer.sampling import (sample_indices, weighted_sample_indices,
+                              FenwickTree, WeightedSampler)
+
+class SampleIndicesTestCases(unittest.TestCase):
+    def test_sample_returns_k_indices(self):
+        self.assertEqual(len(sample_indices(100, 10)), 10)
+
+    def test_sample_indices_are_distinct_and_in_range(self):
+        indices = sample_indices(50, 50)
+        self.assertEqual(sorted(indices), range(50))
+
+    def test_sample_zero_indices(self):
+        self.assertEqual(sample_indices(10, 0), [])
+
+    def test_sample_negative_indices(self):
+        self.assertEqual(sample_indices(10, -1), [])
+        self.assertEqual(sample_indices(0, -3), [])
+
+    def test_sample_more_than_population(self):
+        with self.assertRaises(ValueError) as context:
+            sample_indices(3, 4)
+
+        msg = "4 samples requested but only 3 available"
+        self.assertTrue(msg in context.exception)
+
+    def test_sample_is_reproducible_with_seeded_rng(self):
+        first = sample_indices(1000000, 5, random.Random(7))
+        second = sample_indices(1000000, 5, random.Random(7))
+        self.assertEqual(first, second)
+
+    def test_sample_is_uniform(self):
+        rng = random.Random(1)
+        counts = [0] * 5
+        for _ in range(5000):
+            for i in sample_indices(5, 2, rng):
+                counts[i] += 1
+
+        for count in counts:
+            self.assertTrue(1800 < count < 2200, counts)
+
+class FenwickTreeTestCases(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(1)
+        self.weights = [rng.choice([0, 0.5, 1, 3]) for _ in range(200)]
+        self.tree = FenwickTree(self.weights)
+
+    def test_prefix_sums(self):
+        for n in range(len(self.weights) + 1):
+            self.assertAlmostEqual(self.tree.prefix_sum(n), sum(self.weights[:n]))
+        self.assertAlmostEqual(self.tree.total(), sum(self.weights))
+
+    def test_append_matches_build(self):
+        tree = FenwickTree()
+        for weight in self.weights:
+            tree.append(weight)
+
+        for n in range(len(self.weights) + 1):
+            self.assertAlmostEqual(tree.prefix_sum(n), self.tree.prefix_sum(n))
+        self.assertEqual(tree.positive, self.tree.positive)
+
+    def test_set_weight(self):
+        self.tree[10] = 7.5
+        self.weights[10] = 7.5
+        self.assertEqual(self.tree[10], 7.5)
+        self.assertAlmostEqual(self.tree.total(), sum(self.weights))
+        self.assertEqual(self.tree.positive, sum(1 for w in self.weights if w > 0))
+
+    def test_find_skips_zero_weights(self):
+        rng = random.Random(2)
+        for _ in range(500):
+            point = rng.random() * self.tree.total()
+            i = self.tree.find(point)
+            self.assertTrue(self.weights[i] > 0)
+            self.assertTrue(sum(self.weights[:i]) <= point + 1e-9)
+            self.assertTrue(point < sum(self.weights[:i + 1]) + 1e-9)
+
+class WeightedSampleIndicesTestCases(unittest.TestCase):
+    def test_draws_are_distinct_and_weighted(self):
+        tree = FenwickTree([1, 0, 4])
+        self.assertEqual(sorted(weighted_sample_indices(tree, 2)), [0, 2])
+
+        rng = random.Random(3)
+        counts = [0, 0, 0]
+        for _ in range(5000):
+            counts[weighted_sample_indices(tree, 1, rng)[0]] += 1
+        self.assertEqual(counts[1], 0)
+        self.assertAlmostEqual(counts[2] / 5000.0, 0.8, delta=0.03)
+
+    def test_weights_are_restored(self):
+        tree = FenwickTree([1, 2, 3])
+        weighted_sample_indices(tree, 3)
+        self.assertEqual([tree[i] for i in range(3)], [1, 2, 3])
+        self.assertEqual(tree.total(), 6)
+
+    def test_extreme_weight_ratio(self):
+        tree = FenwickTree([1e16, 1.0, 0, 1.0])
+        drawn = weighted_sample_indices(tree, 3, random.Random(0))
+        self.assertEqual(sorted(drawn), [0, 1, 3])
+        self.assertEqual([tree[i] for i in range(4)], [1e16, 1.0, 0, 1.0])
+
+    def test_more_than_positive_weights(self):
+        with self.assertRaises(ValueError):
+            weighted_sample_indices(FenwickTree([1, 0, 4]), 3)
+
+    def test_seeded(self):
+        tree = FenwickTree(range(1, 101))
+        self.assertEqual(weighted_sample_indices(tree, 10, random.Random(4)),
+                         weighted_sample_indices(tree, 10, random.Random(4)))
+
+class WeightedSamplerTestCases(unittest.TestCase):
+    def test_sample_by_key(self):
+        sampler = WeightedSampler([(1, 'a'), (5, 'b'), (7, 'c')], {5: 0.0})
+        self.assertEqual(len(sampler), 3)
+        self.assertEqual(sorted(sampler.sample(2)), ['a', 'c'])
+
+        sampler.set_weight(1, 0.0)
+        sampler.set_weight(5, 2.0)
+        self.assertEqual(sorted(sampler.sample(2)), ['b', 'c'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('../trainer'))
+sys.path.insert(0, os.path.abspath('./trainer'))
+
+import unittest
+import shutil
+
+from search import SearchIndex, tokenize, parse_query, log_changes
+from exercises import Exercise
+from trainer import Trainer
+
+DATA_PATH = os.path.dirname(__file__)
+TEST_DATA_FILE = os.path.join(DATA_PATH, 'test_dataset_1.pkl')
+TEST_ADD_DATA = os.path.join(DATA_PATH, 'new_exercises.csv')
+
+class TokenizeTestCases(unittest.TestCase):
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Build a taxi-geometry walker!"),
+                         ['build', 'a', 'taxi', 'geometry', 'walker'])
+
+    def test_tokenize_unicode(self):
+        self.assertEqual(tokenize(u"Écrire un arbre".encode('utf-8')),
+                         [u"écrire".encode('utf-8'), 'un', 'arbre'])
+
+    def test_parse_query(self):
+        self.assertEqual(parse_query("Binary tre*"),
+                         [('binary', False), ('tre', True)])
+        self.assertEqual(parse_query("taxi-geo*"),
+                         [('taxi', False), ('geo', True)])
+        self.assertEqual(parse_query("  "), [])
+
+class SearchIndexTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_INDEX = "_tmp_exercises.search"
+        self.index = SearchIndex([
+            (1, "Build a binary tree"),
+            (2, "Balance a binary search tree, then print the tree"),
+            (3, "Sort a linked list"),
+            (5, "Binary search a sorted list"),
+        ])
+
+    def tearDown(self):
+        for suffix in ('', '.journal'):
+            if os.path.isfile(self._TMP_INDEX + suffix):
+                os.remove(self._TMP_INDEX + suffix)
+
+    def test_len(self):
+        self.assertEqual(len(self.index), 4)
+
+    def test_search_term(self):
+        self.assertEqual(self.index.search("list"), [3, 5])
+        self.assertEqual(self.index.search("LIST"), [3, 5])
+        self.assertEqual(self.index.search("heap"), [])
+        self.assertEqual(self.index.search(""), [])
+
+    def test_search_ranks_by_term_frequency(self):
+        self.assertEqual(self.index.search("tree"), [2, 1])
+
+    def test_search_all_terms(self):
+        self.assertEqual(self.index.search("binary tree"), [2, 1])
+        self.assertEqual(self.index.search("binary list"), [5])
+        self.assertEqual(self.index.search("binary heap"), [])
+
+    def test_search_prefix(self):
+        self.assertEqual(self.index.search("sort*"), [3, 5])
+        self.assertEqual(self.index.search("b*"), [1, 2, 5])
+        self.assertEqual(self.index.search("bin* sort*"), [5])
+        self.assertEqual(self.index.search("sort"), [3])
+
+    def test_search_limit(self):
+        self.assertEqual(self.index.search("b*", limit=2), [1, 2])
+
+    def test_add(self):
+        self.index.add(7, "Build a heap")
+        self.index.add(4, "Heap sort a list")
+        self.assertEqual(self.index.search("heap"), [4, 7])
+        self.assertEqual(self.index.search("list"), [3, 4, 5])
+        self.assertEqual(len(self.index), 6)
+
+    def test_remove(self):
+        self.index.remove(2, "Balance a binary search tree, then print the tree")
+        self.assertEqual(self.index.search("tree"), [1])
+        self.assertEqual(self.index.search("balance"), [])
+        self.assertEqual(self.index.search("bal*"), [])
+        self.assertEqual(len(self.index), 3)
+
+    def test_save_and_load(self):
+        self.index.save(self._TMP_INDEX, 'stamp')
+        index = SearchIndex.load(self._TMP_INDEX, 'stamp')
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.search("b*"), [1, 2, 5])
+
+    def test_load_stale(self):
+        self.index.save(self._TMP_INDEX, 'stamp')
+        self.assertIsNone(SearchIndex.load(self._TMP_INDEX, 'other stamp'))
+        self.assertIsNone(SearchIndex.load("missing.search", 'stamp'))
+
+    def test_load_replays_changes(self):
+        self.index.save(self._TMP_INDEX, 'stamp')
+        log_changes(self._TMP_INDEX, [('add', 7, "Build a heap")], 'stamp 2')
+        log_changes(self._TMP_INDEX, [('remove', 1, "Build a binary tree")],
+                    'stamp 3')
+        self.assertIsNone(SearchIndex.load(self._TMP_INDEX, 'stamp 2'))
+
+        index = SearchIndex.load(self._TMP_INDEX, 'stamp 3')
+        self.assertEqual(index.search("build"), [7])
+
+    def test_log_changes_without_index(self):
+        log_changes(self._TMP_INDEX, [('add', 7, "Build a heap")], 'stamp')
+        self.assertFalse(os.path.isfile(self._TMP_INDEX + '.journal'))
+
+    def test_open_rebuilds_stale_index(self):
+        items = lambda: [(1, Exercise("Build a heap"))]
+        index = SearchIndex.open(self._TMP_INDEX, 'stamp', items)
+        self.assertEqual(index.search("heap"), [1])
+
+        items = lambda: [(2, Exercise("Sort a heap"))]
+        self.assertEqual(
+            SearchIndex.open(self._TMP_INDEX, 'stamp', items).search("heap"),
+            [1])
+        self.assertEqual(
+            SearchIndex.open(self._TMP_INDEX, 'stamp 2', items).search("heap"),
+            [2])
+
+class TrainerSearchTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DATA_FILE = "_tmp_data.pkl"
+        i = 0
+        while os.path.isfile(self._TMP_DATA_FILE):
+            self._TMP_DATA_FILE = "_tmp_data_{}.pkl".format(i)
+            i += 1
+
+        shutil.copyfile(TEST_DATA_FILE, self._TMP_DATA_FILE)
+        self.trainer = Trainer(conn=self._TMP_DATA_FILE)
+
+    def tearDown(self):
+        self.trainer.close()
+        for suffix in ('', '.lock', '.idx', '.snap', '.journal',
+                       '.journal.old', '.search', '.search.journal'):
+            if os.path.isfile(self._TMP_DATA_FILE + suffix):
+                os.remove(self._TMP_DATA_FILE + suffix)
+
+    def descriptions(self, results):
+        return [str(exercise) for _, exercise in results]
+
+    def test_search(self):
+        results = self.trainer.search("calculate powers")
+        self.assertEqual(self.descriptions(results), [
+            "build console app to calculate powers using argparse",
+            "create a user story to calculate powers of two numbers"])
+        for exercise_id, exercise in results:
+            self.assertEqual(self.trainer.get_exercise_id(exercise),
+                             exercise_id)
+
+    def test_search_prefix_and_limit(self):
+        self.assertEqual(len(self.trainer.search("comp*")), 1)
+        self.assertEqual(len(self.trainer.search("c*")), 8)
+        self.assertEqual(len(self.trainer.search("c*", limit=3)), 3)
+
+    def test_search_persists_index(self):
+        self.trainer.search("console")
+        self.assertTrue(os.path.isfile(self._TMP_DATA_FILE + '.search'))
+
+    def test_search_follows_changes(self):
+        self.trainer.search("console")
+        self.trainer.add_exercise(Exercise("build console app for mortgages"))
+        self.trainer.remove_exercise(
+            Exercise("write a script to load a txt file and print to console"))
+        self.trainer.update_exercise(
+            Exercise("build console app to load txt file and implements logging"),
+            Exercise("build web app to load txt file and implements logging"))
+        self.trainer.add_exercises_from_csv(TEST_ADD_DATA)
+
+        expected = ["build console app to calculate powers using argparse",
+                    "build console app for mortgages"]
+        self.assertEqual(self.descriptions(self.trainer.search("console")),
+                         expected)
+        self.assertEqual(len(self.trainer.search("mortgage*")), 2)
+
+        # NOTE: a new run loads the index and its journal
+        trainer = Trainer(conn=self._TMP_DATA_FILE)
+        self.assertEqual(self.descriptions(trainer.search("console")),
+                         expected)
+        self.assertTrue(trainer._search_index.search("mortgage*"))
+        trainer.close()
+
+    def test_index_saved_by_another_run_follows_changes(self):
+        Trainer(conn=self._TMP_DATA_FILE).search("console")
+        exercise_id = self.trainer.add_exercise(Exercise("console heap"))
+        self.trainer.remove_exercise_by_id(1)
+        self.trainer.update_exercise_by_id(exercise_id, Exercise("console tree"))
+
+        trainer = Trainer(conn=self._TMP_DATA_FILE)
+        index = SearchIndex.load(self._TMP_DATA_FILE + '.search',
+                                 trainer._storage.stamp())
+        self.assertIsNotNone(index)
+        self.assertEqual(index.search("console"), [2, 6, exercise_id])
+        self.assertEqual(index.search("heap"), [])
+        trainer.close()
+
+    def test_changes_not_logged_rebuild_index(self):
+        Trainer(conn=self._TMP_DATA_FILE).search("console")
+        self.trainer._storage.add(Exercise("console heap"))
+
+        self.assertEqual(self.descriptions(self.trainer.search("heap")),
+                         ["console heap"])
+
+    def test_batch_rolled_back(self):
+        self.trainer.search("console")
+        with self.assertRaises(Exception):
+            with self.trainer.batch():
+                self.trainer.add_exercise(Exercise("console heap"))
+                self.trainer.add_exercise(Exercise("console heap"))
+
+        self.assertEqual(self.trainer.search("heap"), [])
+        trainer = Trainer(conn=self._TMP_DATA_FILE)
+        self.assertEqual(trainer.search("heap"), [])
+        self.assertEqual(len(trainer.search("console")), 3)
+        trainer.close()
+
+    def test_search_lazy_journal(self):
+        self.trainer.close()
+        Trainer(conn=self._TMP_DATA_FILE, lazy=True, snapshot=True).close()
+        self.trainer = Trainer(conn=self._TMP_DATA_FILE, journal=True,
+                               lazy=True, snapshot=True)
+        self.assertEqual(len(self.trainer.search("console")), 3)
+        self.trainer.add_exercise(Exercise("console heap"))
+        self.trainer.set_exercise_weight(1, 2.0)
+
+        trainer = Trainer(conn=self._TMP_DATA_FILE, journal=True, lazy=True,
+                          snapshot=True)
+        self.assertEqual(self.descriptions(trainer.search("heap")),
+                         ["console heap"])
+        self.assertFalse(trainer._storage.is_loaded)
+        trainer.close()
+
+class TrainerSQLiteSearchTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DB = "_tmp_data.db"
+        i = 0
+        while os.path.isfile(self._TMP_DB):
+            self._TMP_DB = "_tmp_data_{}.db".format(i)
+            i += 1
+
+        self.conn = 'sqlite:///' + self._TMP_DB
+        self.trainer = Trainer(conn=self.conn)
+        self.trainer.add_exercises(Trainer(conn=TEST_DATA_FILE).get_all_exercises())
+
+    def tearDown(self):
+        self.trainer.close()
+        for suffix in ('', '.search', '.search.journal'):
+            if os.path.isfile(self._TMP_DB + suffix):
+                os.remove(self._TMP_DB + suffix)
+
+    def test_search(self):
+        self.assertEqual(len(self.trainer.search("console")), 3)
+        self.trainer.add_exercise(Exercise("console heap"))
+
+        trainer = Trainer(conn=self.conn)
+        self.assertEqual([str(ex) for _, ex in trainer.search("heap")],
+                         ["console heap"])
+        trainer.close()
+
+if __name__ == '__main__':
+    unittest.main()
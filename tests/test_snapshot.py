@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('../trainer'))
+sys.path.insert(0, os.path.abspath('./trainer'))
+
+import unittest
+import random
+
+from snapshot import MappedSnapshot, write_snapshot
+from exercises import Exercises, Exercise
+
+class MappedSnapshotTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_SNAPSHOT = "_tmp_exercises.snap"
+        self.exercises = Exercises()
+        for i in range(100):
+            self.exercises.append(Exercise("Exercise {}".format(i)))
+        self.exercises.append(Exercise(u"Écrire un arbre".encode('utf-8')))
+
+        write_snapshot(self._TMP_SNAPSHOT, self.exercises, (1, 2.5, 3))
+        self.snapshot = MappedSnapshot(self._TMP_SNAPSHOT)
+
+    def tearDown(self):
+        self.snapshot.close()
+        if os.path.isfile(self._TMP_SNAPSHOT):
+            os.remove(self._TMP_SNAPSHOT)
+
+    def test_len(self):
+        self.assertEqual(len(self.snapshot), 101)
+
+    def test_source(self):
+        self.assertEqual(self.snapshot.source, (1, 2.5, 3))
+
+    def test_getitem(self):
+        self.assertEqual(self.snapshot[0], Exercise("Exercise 0"))
+        self.assertEqual(self.snapshot[42], Exercise("Exercise 42"))
+        self.assertEqual(self.snapshot[-1], self.exercises[-1])
+
+    def test_getitem_out_of_range(self):
+        with self.assertRaises(IndexError):
+            self.snapshot[101]
+
+        with self.assertRaises(IndexError):
+            self.snapshot[-102]
+
+    def test_getitem_invalid_type(self):
+        with self.assertRaises(TypeError):
+            self.snapshot['0']
+
+    def test_slice(self):
+        page = self.snapshot[40:60]
+        self.assertEqual(len(page), 20)
+        self.assertEqual(list(page), list(self.exercises)[40:60])
+        self.assertEqual(page[-1], Exercise("Exercise 59"))
+        self.assertIn(Exercise("Exercise 45"), page)
+
+    def test_iter(self):
+        self.assertEqual(list(self.snapshot), list(self.exercises))
+
+    def test_contains(self):
+        self.assertTrue(Exercise("Exercise 7") in self.snapshot)
+        self.assertTrue(self.exercises[-1] in self.snapshot)
+        # NOTE: substrings of stored descriptions are not members
+        self.assertFalse(Exercise("Exercise") in self.snapshot)
+        self.assertFalse(Exercise("cise 7") in self.snapshot)
+        self.assertFalse(Exercise("Exercise 7Exercise 8") in self.snapshot)
+        self.assertFalse("Exercise 7" in self.snapshot)
+
+    def test_every_description_is_found(self):
+        for exercise_id, exercise in self.exercises.items():
+            self.assertEqual(self.snapshot.id_of(exercise), exercise_id)
+
+    def test_ids_default_to_order(self):
+        self.assertEqual(self.snapshot.next_id, 102)
+        self.assertEqual(self.snapshot.get(1), Exercise("Exercise 0"))
+        self.assertEqual(self.snapshot.id_of(Exercise("Exercise 41")), 42)
+
+    def test_ids_of_exercises_are_kept(self):
+        self.exercises.remove(Exercise("Exercise 0"))
+        self.exercises.remove(Exercise("Exercise 50"))
+        write_snapshot(self._TMP_SNAPSHOT, self.exercises)
+        snapshot = MappedSnapshot(self._TMP_SNAPSHOT)
+        self.assertEqual(list(snapshot.items()), list(self.exercises.items()))
+        self.assertEqual(snapshot.next_id, self.exercises.next_id)
+        self.assertEqual(snapshot.get(52), Exercise("Exercise 51"))
+        self.assertIsNone(snapshot.description_for_id(51))
+        snapshot.close()
+
+    def test_durations(self):
+        self.exercises.update(Exercise("Exercise 3"), Exercise("Exercise 3", 25))
+        write_snapshot(self._TMP_SNAPSHOT, self.exercises)
+        snapshot = MappedSnapshot(self._TMP_SNAPSHOT)
+        self.assertEqual(snapshot.duration(3), 25)
+        self.assertIsNone(snapshot.duration(4))
+        self.assertEqual(snapshot[3].duration, 25)
+        self.assertEqual(snapshot.get(4).duration, 25)
+        self.assertEqual([ex.duration for ex in snapshot],
+                         [ex.duration for ex in self.exercises])
+        snapshot.close()
+
+    def test_get_missing_id(self):
+        with self.assertRaises(ValueError):
+            self.snapshot.get(0)
+
+        with self.assertRaises(ValueError):
+            self.snapshot.id_of(Exercise("Exercise"))
+
+    def test_sample(self):
+        drawn = self.snapshot.sample(10, random.Random(3))
+        self.assertEqual(len(set(drawn)), 10)
+        for exercise in drawn:
+            self.assertTrue(exercise in self.exercises)
+
+        self.assertEqual(drawn, self.snapshot.sample(10, random.Random(3)))
+
+    def test_sample_too_many(self):
+        with self.assertRaises(ValueError):
+            self.snapshot.sample(102)
+
+    def test_empty(self):
+        write_snapshot(self._TMP_SNAPSHOT, Exercises())
+        snapshot = MappedSnapshot(self._TMP_SNAPSHOT)
+        self.assertEqual(len(snapshot), 0)
+        self.assertEqual(list(snapshot), [])
+        self.assertFalse(Exercise("Exercise 1") in snapshot)
+        snapshot.close()
+
+    def test_not_a_snapshot(self):
+        with open(self._TMP_SNAPSHOT, 'wb') as f:
+            f.write('not a snapshot at all, just some text')
+
+        with self.assertRaises(IOError):
+            MappedSnapshot(self._TMP_SNAPSHOT)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,694 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('../trainer'))
+sys.path.insert(0, os.path.abspath('./trainer'))
+
+import unittest
+import random
+import shutil
+
+from storage import connect, PickleStorage, SQLiteStorage
+from exercises import Exercises, Exercise, PackedExercises
+from records import dump_exercises, file_format
+
+DATA_PATH = os.path.dirname(__file__)
+TEST_DATA_FILE = os.path.join(DATA_PATH, 'test_dataset_1.pkl')
+TEST_IMPORT_DATA = os.path.join(DATA_PATH, 'import_exercises.csv')
+
+class ConnectTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DB = "_tmp_data.db"
+
+    def tearDown(self):
+        if os.path.isfile(self._TMP_DB):
+            os.remove(self._TMP_DB)
+
+    def test_connect_pickle(self):
+        storage = connect(TEST_DATA_FILE)
+        self.assertIsInstance(storage, PickleStorage)
+        self.assertEqual(len(storage), 10)
+
+    def test_connect_sqlite(self):
+        storage = connect('sqlite:///' + self._TMP_DB)
+        self.assertIsInstance(storage, SQLiteStorage)
+        self.assertEqual(len(storage), 0)
+        storage.close()
+
+    def test_connect_missing_pickle(self):
+        with self.assertRaises(IOError) as context:
+            connect('fail_data')
+
+        self.assertTrue('Could not connect to data' in context.exception)
+
+class LazyPickleStorageTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DATA_FILE = "_tmp_data.pkl"
+        i = 0
+        while os.path.isfile(self._TMP_DATA_FILE):
+            self._TMP_DATA_FILE = "_tmp_data_{}.pkl".format(i)
+            i += 1
+
+        shutil.copyfile(TEST_DATA_FILE, self._TMP_DATA_FILE)
+        self.all_tasks = PickleStorage(TEST_DATA_FILE).exercises
+        # NOTE: the first lazy open builds the index
+        PickleStorage(self._TMP_DATA_FILE, lazy=True)
+        self.storage = PickleStorage(self._TMP_DATA_FILE, journal=True,
+                                     lazy=True)
+
+    def tearDown(self):
+        self.storage.close()
+        for suffix in ('', '.lock', '.idx', '.journal', '.journal.old'):
+            if os.path.isfile(self._TMP_DATA_FILE + suffix):
+                os.remove(self._TMP_DATA_FILE + suffix)
+
+    def test_first_open_builds_index(self):
+        self.assertTrue(os.path.isfile(self._TMP_DATA_FILE + '.idx'))
+        self.assertFalse(self.storage.is_loaded)
+
+    def test_length_without_loading(self):
+        self.assertEqual(len(self.storage), 10)
+        self.assertFalse(self.storage.is_loaded)
+
+    def test_contains_without_loading(self):
+        self.assertIn(self.all_tasks[3], self.storage)
+        self.assertNotIn(Exercise("missing"), self.storage)
+        self.assertNotIn("missing", self.storage)
+        self.assertFalse(self.storage.is_loaded)
+
+    def test_changes_without_loading(self):
+        new_ex = Exercise("new exercise")
+        self.storage.add(new_ex)
+        self.storage.remove(self.all_tasks[0])
+        self.storage.update(self.all_tasks[1], Exercise("updated"))
+
+        self.assertFalse(self.storage.is_loaded)
+        self.assertEqual(len(self.storage), 10)
+        self.assertIn(new_ex, self.storage)
+        self.assertNotIn(self.all_tasks[0], self.storage)
+        self.assertNotIn(self.all_tasks[1], self.storage)
+
+        storage = PickleStorage(self._TMP_DATA_FILE)
+        self.assertEqual(storage.exercises, self.storage.exercises)
+        self.assertTrue(self.storage.is_loaded)
+
+    def test_journal_is_replayed_on_lazy_open(self):
+        self.storage.add(Exercise("new exercise"))
+        self.storage.remove(self.all_tasks[0])
+
+        storage = PickleStorage(self._TMP_DATA_FILE, journal=True, lazy=True)
+        self.assertFalse(storage.is_loaded)
+        self.assertEqual(len(storage), 10)
+        self.assertIn(Exercise("new exercise"), storage)
+        self.assertNotIn(self.all_tasks[0], storage)
+
+    def test_add_duplicate_without_loading(self):
+        with self.assertRaises(Exception) as context:
+            self.storage.add(self.all_tasks[2])
+
+        msg = "Cannot add duplicate exercise. Exercise {}".format(self.all_tasks[2])
+        self.assertTrue(msg in context.exception)
+
+    def test_remove_missing_without_loading(self):
+        with self.assertRaises(ValueError):
+            self.storage.remove(Exercise("missing"))
+
+    def test_update_errors_without_loading(self):
+        with self.assertRaises(ValueError):
+            self.storage.update(Exercise("missing"), Exercise("new"))
+
+        with self.assertRaises(Exception):
+            self.storage.update(self.all_tasks[0], self.all_tasks[1])
+
+        with self.assertRaises(TypeError):
+            self.storage.update(self.all_tasks[0], "new")
+
+        self.assertFalse(self.storage.is_loaded)
+
+    def test_batch_rolls_back_without_loading(self):
+        with self.assertRaises(ValueError):
+            with self.storage.batch():
+                self.storage.add(Exercise("new exercise"))
+                self.storage.remove(Exercise("missing"))
+
+        self.assertNotIn(Exercise("new exercise"), self.storage)
+        self.assertEqual(len(self.storage), 10)
+
+    def test_failed_nested_batch_rolls_back_its_own(self):
+        with self.storage.batch():
+            self.storage.add(Exercise("new exercise"))
+            with self.assertRaises(ValueError):
+                with self.storage.batch():
+                    self.storage.add(Exercise("newer exercise"))
+                    self.storage.remove(Exercise("missing"))
+
+        self.assertFalse(self.storage.is_loaded)
+        storage = PickleStorage(self._TMP_DATA_FILE)
+        self.assertIn(Exercise("new exercise"), storage)
+        self.assertNotIn(Exercise("newer exercise"), storage)
+        self.assertEqual(len(storage), 11)
+
+        with self.storage.batch():
+            self.storage.exercises
+            self.storage.add(Exercise("loaded exercise"))
+            with self.assertRaises(ValueError):
+                with self.storage.batch():
+                    self.storage.remove(Exercise("loaded exercise"))
+                    self.storage.remove(Exercise("missing"))
+        self.assertIn(Exercise("loaded exercise"), self.storage)
+
+    def test_loading_inside_batch_keeps_changes(self):
+        with self.storage.batch():
+            self.storage.add(Exercise("new exercise"))
+            exercises = self.storage.exercises
+
+        self.assertIn(Exercise("new exercise"), exercises)
+        self.assertEqual(len(self.storage), 11)
+
+    def test_save_keeps_index_current(self):
+        self.storage.add(Exercise("new exercise"))
+        self.storage.save()
+
+        storage = PickleStorage(self._TMP_DATA_FILE, lazy=True)
+        self.assertFalse(storage.is_loaded)
+        self.assertEqual(len(storage), 11)
+
+    def test_stale_index_loads_snapshot(self):
+        exercises = PickleStorage(self._TMP_DATA_FILE).exercises
+        exercises.append(Exercise("new exercise"))
+        dump_exercises(exercises, self._TMP_DATA_FILE)
+
+        storage = PickleStorage(self._TMP_DATA_FILE, lazy=True)
+        self.assertTrue(storage.is_loaded)
+        self.assertEqual(len(storage), 11)
+
+class MappedPickleStorageTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DATA_FILE = "_tmp_data.pkl"
+        i = 0
+        while os.path.isfile(self._TMP_DATA_FILE):
+            self._TMP_DATA_FILE = "_tmp_data_{}.pkl".format(i)
+            i += 1
+
+        shutil.copyfile(TEST_DATA_FILE, self._TMP_DATA_FILE)
+        self.all_tasks = PickleStorage(TEST_DATA_FILE).exercises
+        # NOTE: the first open builds the index and the snapshot
+        PickleStorage(self._TMP_DATA_FILE, lazy=True, snapshot=True).close()
+        self.storage = PickleStorage(self._TMP_DATA_FILE, journal=True,
+                                     lazy=True, snapshot=True)
+
+    def tearDown(self):
+        self.storage.close()
+        for suffix in ('', '.lock', '.idx', '.snap', '.journal',
+                       '.journal.old'):
+            if os.path.isfile(self._TMP_DATA_FILE + suffix):
+                os.remove(self._TMP_DATA_FILE + suffix)
+
+    def test_first_open_builds_snapshot(self):
+        self.assertTrue(os.path.isfile(self._TMP_DATA_FILE + '.snap'))
+        self.assertFalse(self.storage.is_loaded)
+
+    def test_iter_without_loading(self):
+        self.assertEqual(list(self.storage), list(self.all_tasks))
+        self.assertFalse(self.storage.is_loaded)
+
+    def test_sample_without_loading(self):
+        drawn = self.storage.sample(5, random.Random(1))
+        self.assertEqual(len(set(drawn)), 5)
+        for exercise in drawn:
+            self.assertIn(exercise, self.all_tasks)
+        self.assertFalse(self.storage.is_loaded)
+
+    def test_weights_without_loading(self):
+        self.storage.set_weight(2, 3.0)
+        self.storage.set_weight(4, 0.5)
+        self.storage.remove_by_id(4)
+        exercise_id = self.storage.add(Exercise("new exercise"))
+        self.storage.set_weight(exercise_id, 2.0)
+        self.assertEqual(self.storage.weight(2), 3.0)
+        self.assertEqual(self.storage.weight(3), 1.0)
+        self.assertEqual(self.storage.weights(), {2: 3.0, exercise_id: 2.0})
+        with self.assertRaises(ValueError):
+            self.storage.weight(4)
+        self.assertFalse(self.storage.is_loaded)
+
+        self.storage.save()
+        storage = PickleStorage(self._TMP_DATA_FILE, lazy=True, snapshot=True)
+        self.assertEqual(storage.weights(), {2: 3.0, exercise_id: 2.0})
+        self.assertEqual(storage.weight(exercise_id), 2.0)
+        self.assertFalse(storage.is_loaded)
+        self.assertEqual(storage.weights(), storage.exercises.weights())
+        storage.close()
+
+    def test_view_without_loading(self):
+        view = self.storage.view()
+        self.assertEqual(list(view), list(self.all_tasks))
+        self.assertEqual(list(view[2:5]), list(self.all_tasks)[2:5])
+        self.assertEqual(view[-1], self.all_tasks[-1])
+        self.assertFalse(self.storage.is_loaded)
+
+        self.storage.add(Exercise("new exercise"))
+        self.assertEqual(self.storage.view()[-1], Exercise("new exercise"))
+
+    def test_sample_with_changes_without_loading(self):
+        self.storage.remove(self.all_tasks[0])
+        self.storage.update(self.all_tasks[1], Exercise("updated"))
+        self.storage.add(Exercise("new exercise"))
+
+        expected = set(self.all_tasks) - set([self.all_tasks[0], self.all_tasks[1]])
+        expected |= set([Exercise("updated"), Exercise("new exercise")])
+        drawn = self.storage.sample(10, random.Random(1))
+        self.assertEqual(set(drawn), expected)
+        self.assertEqual(drawn, self.storage.sample(10, random.Random(1)))
+        self.assertFalse(self.storage.is_loaded)
+
+        with self.assertRaises(ValueError):
+            self.storage.sample(11)
+
+    def test_ids_without_loading(self):
+        self.assertEqual(self.storage.get(4), self.all_tasks[3])
+        self.assertEqual(self.storage.id_of(self.all_tasks[3]), 4)
+
+        new_id = self.storage.add(Exercise("new exercise"))
+        self.assertEqual(new_id, 11)
+        self.assertEqual(self.storage.get(new_id), Exercise("new exercise"))
+
+        self.assertEqual(self.storage.remove_by_id(2), self.all_tasks[1])
+        self.storage.update_by_id(3, Exercise("updated"))
+        self.assertEqual(self.storage.get(3), Exercise("updated"))
+        self.assertEqual(self.storage.id_of(Exercise("updated")), 3)
+        with self.assertRaises(ValueError):
+            self.storage.get(2)
+        self.assertFalse(self.storage.is_loaded)
+
+        storage = PickleStorage(self._TMP_DATA_FILE)
+        self.assertEqual(list(storage.items()), list(self.storage.items()))
+        self.assertEqual(storage.get(3), Exercise("updated"))
+        self.assertEqual(storage.get(11), Exercise("new exercise"))
+
+    def test_ids_after_remove_and_add_again(self):
+        self.storage.remove(self.all_tasks[0])
+        self.assertEqual(self.storage.add(self.all_tasks[0]), 11)
+        with self.assertRaises(ValueError):
+            self.storage.get(1)
+        self.assertEqual(self.storage.get(11), self.all_tasks[0])
+        self.assertFalse(self.storage.is_loaded)
+
+        storage = PickleStorage(self._TMP_DATA_FILE, journal=True, lazy=True,
+                                snapshot=True)
+        self.assertEqual(storage.id_of(self.all_tasks[0]), 11)
+        self.assertFalse(storage.is_loaded)
+        storage.close()
+
+    def test_ids_survive_compaction(self):
+        self.storage.remove_by_id(1)
+        self.storage.add(Exercise("new exercise"))
+        self.storage.save()
+
+        storage = PickleStorage(self._TMP_DATA_FILE, journal=True, lazy=True,
+                                snapshot=True)
+        self.assertEqual(storage.add(Exercise("newer exercise")), 12)
+        self.assertEqual(storage.get(10), self.all_tasks[9])
+        self.assertFalse(storage.is_loaded)
+        storage.close()
+
+    def test_durations_without_loading(self):
+        new_id = self.storage.add(Exercise("new exercise", 30))
+        self.storage.update_by_id(1, Exercise("updated", 45))
+        self.assertEqual(self.storage.get(new_id).duration, 30)
+        self.assertEqual(self.storage.get(1).duration, 45)
+        self.assertIsNone(self.storage.get(2).duration)
+
+        drawn = self.storage.sample(11, random.Random(1))
+        durations = dict((ex.description, ex.duration) for ex in drawn)
+        self.assertEqual(durations["new exercise"], 30)
+        self.assertEqual(durations["updated"], 45)
+        self.assertFalse(self.storage.is_loaded)
+
+        storage = PickleStorage(self._TMP_DATA_FILE)
+        self.assertEqual(storage.get(new_id).duration, 30)
+        self.assertEqual(storage.get(1).duration, 45)
+
+        self.storage.save()
+        storage = PickleStorage(self._TMP_DATA_FILE, lazy=True, snapshot=True)
+        self.assertEqual(storage.get(1).duration, 45)
+        self.assertEqual(list(storage)[-1].duration, 30)
+        self.assertFalse(storage.is_loaded)
+        storage.close()
+
+    def test_weights_journaled_without_loading(self):
+        self.storage.set_weight(3, 2.5)
+        with self.assertRaises(ValueError):
+            self.storage.set_weight(42, 2.5)
+        with self.assertRaises(ValueError):
+            self.storage.set_weight(3, -1)
+        self.assertFalse(self.storage.is_loaded)
+
+        storage = PickleStorage(self._TMP_DATA_FILE)
+        self.assertEqual(storage.weights(), {3: 2.5})
+        self.assertEqual(self.storage.weight(3), 2.5)
+
+    def test_iter_with_changes(self):
+        self.storage.add(Exercise("new exercise"))
+        self.assertEqual(list(self.storage)[-1], Exercise("new exercise"))
+
+    def test_save_keeps_snapshot_current(self):
+        self.storage.add(Exercise("new exercise"))
+        self.storage.save()
+
+        storage = PickleStorage(self._TMP_DATA_FILE, lazy=True, snapshot=True)
+        self.assertFalse(storage.is_loaded)
+        self.assertEqual(list(storage), list(self.storage.exercises))
+        storage.close()
+
+    def test_compaction_keeps_snapshot_current(self):
+        self.storage.add(Exercise("new exercise"))
+        self.storage._compact_journal()
+        self.storage.close()
+
+        storage = PickleStorage(self._TMP_DATA_FILE, lazy=True, snapshot=True)
+        self.assertEqual(list(storage)[-1], Exercise("new exercise"))
+        self.assertFalse(storage.is_loaded)
+        storage.close()
+
+    def test_stale_snapshot_is_rebuilt(self):
+        exercises = PickleStorage(self._TMP_DATA_FILE).exercises
+        exercises.append(Exercise("new exercise"))
+        dump_exercises(exercises, self._TMP_DATA_FILE)
+
+        storage = PickleStorage(self._TMP_DATA_FILE, lazy=True, snapshot=True)
+        storage.close()
+        storage = PickleStorage(self._TMP_DATA_FILE, lazy=True, snapshot=True)
+        self.assertFalse(storage.is_loaded)
+        self.assertEqual(list(storage), list(exercises))
+        storage.close()
+
+class PackedPickleStorageTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DATA_FILE = "_tmp_data.pkl"
+        i = 0
+        while os.path.isfile(self._TMP_DATA_FILE):
+            self._TMP_DATA_FILE = "_tmp_data_{}.pkl".format(i)
+            i += 1
+
+        self.all_tasks = PickleStorage(TEST_DATA_FILE).exercises
+        self.all_tasks.update(self.all_tasks[2], Exercise(
+            self.all_tasks[2].description, 15))
+        self.all_tasks.set_weight(4, 3.0)
+        self.all_tasks.remove(self.all_tasks[1])
+        dump_exercises(self.all_tasks, self._TMP_DATA_FILE)
+
+    def tearDown(self):
+        for suffix in ('', '.lock', '.idx', '.journal', '.journal.old'):
+            if os.path.isfile(self._TMP_DATA_FILE + suffix):
+                os.remove(self._TMP_DATA_FILE + suffix)
+
+    def test_reads_are_served_packed(self):
+        storage = PickleStorage(self._TMP_DATA_FILE, packed=True)
+        self.assertIs(type(storage.exercises), PackedExercises)
+        self.assertEqual(len(storage), len(self.all_tasks))
+        self.assertEqual(list(storage.items()), list(self.all_tasks.items()))
+        self.assertEqual([ex.duration for ex in storage],
+                         [ex.duration for ex in self.all_tasks])
+        self.assertIn(self.all_tasks[3], storage)
+        self.assertEqual(storage.get(4), self.all_tasks.get(4))
+        self.assertEqual(storage.id_of(self.all_tasks[0]), 1)
+        self.assertEqual(storage.weights(), {4: 3.0})
+        self.assertEqual(set(storage.sample(3)) <= set(self.all_tasks), True)
+        self.assertIs(type(storage.exercises), PackedExercises)
+
+    def test_first_change_unpacks(self):
+        storage = PickleStorage(self._TMP_DATA_FILE, packed=True)
+        exercise_id = storage.add(Exercise("new"))
+        self.assertIs(type(storage.exercises), Exercises)
+        self.assertEqual(exercise_id, self.all_tasks.next_id)
+        storage.remove(self.all_tasks[0])
+
+        exercises = PickleStorage(self._TMP_DATA_FILE).exercises
+        self.assertEqual(list(exercises.items())[:-1],
+                         list(self.all_tasks.items())[1:])
+        self.assertEqual(exercises.weights(), {4: 3.0})
+
+    def test_journal_records_are_replayed_unpacked(self):
+        storage = PickleStorage(self._TMP_DATA_FILE, journal=True, lazy=True,
+                                packed=True)
+        storage.add(Exercise("new"))
+
+        storage = PickleStorage(self._TMP_DATA_FILE, journal=True, packed=True)
+        self.assertIs(type(storage.exercises), Exercises)
+        self.assertIn(Exercise("new"), storage)
+
+    def test_batch_rolls_back_after_unpacking(self):
+        storage = PickleStorage(self._TMP_DATA_FILE, packed=True)
+        with self.assertRaises(ValueError):
+            with storage.batch():
+                storage.remove(self.all_tasks[0])
+                raise ValueError()
+        self.assertEqual(list(storage.items()), list(self.all_tasks.items()))
+
+class PickleStorageFormatTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DATA_FILE = "_tmp_data.pkl"
+        i = 0
+        while os.path.isfile(self._TMP_DATA_FILE):
+            self._TMP_DATA_FILE = "_tmp_data_{}.pkl".format(i)
+            i += 1
+
+        self.all_tasks = PickleStorage(TEST_DATA_FILE).exercises
+        dump_exercises(self.all_tasks, self._TMP_DATA_FILE, 'jsonl')
+
+    def tearDown(self):
+        for suffix in ('', '.lock', '.journal'):
+            if os.path.isfile(self._TMP_DATA_FILE + suffix):
+                os.remove(self._TMP_DATA_FILE + suffix)
+
+    def test_format_of_file_is_kept(self):
+        storage = PickleStorage(self._TMP_DATA_FILE)
+        self.assertEqual(storage.exercises, self.all_tasks)
+        storage.add(Exercise("new exercise"))
+        self.assertEqual(file_format(self._TMP_DATA_FILE), 'jsonl')
+        self.assertEqual(len(PickleStorage(self._TMP_DATA_FILE)), 11)
+
+    def test_format_is_converted_on_write(self):
+        storage = PickleStorage(self._TMP_DATA_FILE, format='binary')
+        self.assertEqual(file_format(self._TMP_DATA_FILE), 'jsonl')
+        storage.add(Exercise("new exercise"))
+        self.assertEqual(file_format(self._TMP_DATA_FILE), 'binary')
+        self.assertEqual(len(PickleStorage(self._TMP_DATA_FILE)), 11)
+
+    def test_journal_compaction_writes_format(self):
+        storage = PickleStorage(self._TMP_DATA_FILE, journal=True,
+                                journal_limit=1, format='binary')
+        storage.add(Exercise("new exercise"))
+        storage.close()
+        self.assertEqual(file_format(self._TMP_DATA_FILE), 'binary')
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            PickleStorage(self._TMP_DATA_FILE, format='xml')
+
+class SQLiteStorageTestCases(unittest.TestCase):
+    def setUp(self):
+        self._TMP_DB = "_tmp_data.db"
+        i = 0
+        while os.path.isfile(self._TMP_DB):
+            self._TMP_DB = "_tmp_data_{}.db".format(i)
+            i += 1
+
+        self.storage = SQLiteStorage(self._TMP_DB)
+        self.exercises = [Exercise("Exercise {}".format(i)) for i in range(5)]
+        with self.storage.batch():
+            for ex in self.exercises:
+                self.storage.add(ex)
+
+    def tearDown(self):
+        self.storage.close()
+        if os.path.isfile(self._TMP_DB):
+            os.remove(self._TMP_DB)
+
+    def positions(self):
+        rows = self.storage._db.execute("SELECT pos FROM exercises")
+        return sorted(row[0] for row in rows)
+
+    def test_length(self):
+        self.assertEqual(len(self.storage), 5)
+
+    def test_contains(self):
+        self.assertIn(self.exercises[2], self.storage)
+        self.assertNotIn(Exercise("missing"), self.storage)
+        self.assertNotIn("Exercise 2", self.storage)
+
+    def test_ids(self):
+        self.assertEqual(self.storage.id_of(self.exercises[2]), 3)
+        self.assertEqual(self.storage.get(3), self.exercises[2])
+        self.assertEqual(self.storage.add(Exercise("new exercise")), 6)
+
+        self.assertEqual(self.storage.remove_by_id(6), Exercise("new exercise"))
+        self.assertEqual(self.storage.add(Exercise("newer exercise")), 7)
+
+        self.storage.update_by_id(1, Exercise("updated"))
+        self.assertEqual(self.storage.id_of(Exercise("updated")), 1)
+        self.assertEqual([exercise_id for exercise_id, _ in self.storage.items()],
+                         [1, 2, 3, 4, 5, 7])
+
+        with self.assertRaises(ValueError):
+            self.storage.get(6)
+
+    def test_durations(self):
+        new_id = self.storage.add(Exercise("new exercise", 30))
+        self.storage.update(self.exercises[0], Exercise("updated", 45))
+        self.assertEqual(self.storage.get(new_id).duration, 30)
+        self.assertEqual(self.storage.get(1).duration, 45)
+        self.assertIsNone(self.storage.get(2).duration)
+        self.assertEqual([ex.duration for ex in self.storage],
+                         [45, None, None, None, None, 30])
+        self.assertEqual(sorted(ex.duration for ex in self.storage.sample(6)),
+                         [None, None, None, None, 30, 45])
+
+    def test_weights(self):
+        self.assertEqual(self.storage.weight(2), 1.0)
+        self.storage.set_weight(2, 4)
+        self.storage.set_weight(3, 0)
+        self.assertEqual(self.storage.weights(), {2: 4.0, 3: 0.0})
+        self.assertEqual(self.storage.exercises.weights(), {2: 4.0, 3: 0.0})
+
+        with self.assertRaises(ValueError):
+            self.storage.set_weight(42, 1.0)
+        with self.assertRaises(ValueError):
+            self.storage.set_weight(2, -1.0)
+
+    def test_duration_column_added_to_old_database(self):
+        self.storage.close()
+        os.remove(self._TMP_DB)
+        import sqlite3
+        db = sqlite3.connect(self._TMP_DB)
+        db.execute("CREATE TABLE exercises (id INTEGER PRIMARY KEY "
+                   "AUTOINCREMENT, description TEXT NOT NULL, "
+                   "pos INTEGER NOT NULL)")
+        db.execute("INSERT INTO exercises (description, pos) VALUES ('old', 0)")
+        db.commit()
+        db.close()
+
+        self.storage = SQLiteStorage(self._TMP_DB)
+        self.assertIsNone(self.storage.get(1).duration)
+        self.storage.add(Exercise("new exercise", 30))
+        self.assertEqual(self.storage.get(2).duration, 30)
+        self.assertEqual(self.storage.weight(1), 1.0)
+
+    def test_iteration_in_insertion_order(self):
+        self.assertEqual(list(self.storage), self.exercises)
+
+    def test_exercises(self):
+        exercises = self.storage.exercises
+        self.assertIsInstance(exercises, Exercises)
+        self.assertEqual(len(exercises), 5)
+
+    def test_add_duplicate(self):
+        with self.assertRaises(Exception) as context:
+            self.storage.add(Exercise("Exercise 1"))
+
+        msg = "Cannot add duplicate exercise. Exercise Exercise 1"
+        self.assertTrue(msg in context.exception)
+
+    def test_add_invalid_type(self):
+        with self.assertRaises(TypeError):
+            self.storage.add("Exercise 6")
+
+    def test_remove_keeps_positions_dense(self):
+        self.storage.remove(self.exercises[1])
+        self.storage.remove(self.exercises[4])
+
+        self.assertEqual(len(self.storage), 3)
+        self.assertEqual(self.positions(), [0, 1, 2])
+        self.assertEqual(list(self.storage),
+                         [self.exercises[0], self.exercises[2],
+                          self.exercises[3]])
+
+    def test_remove_missing(self):
+        with self.assertRaises(ValueError) as context:
+            self.storage.remove(Exercise("missing"))
+
+        msg = "Exercise not in set. Exercice: missing"
+        self.assertTrue(msg in context.exception)
+        self.assertEqual(len(self.storage), 5)
+
+    def test_update_keeps_position(self):
+        new_ex = Exercise("Updated exercise")
+        self.storage.update(self.exercises[2], new_ex)
+
+        self.assertEqual(list(self.storage)[2], new_ex)
+        self.assertNotIn(self.exercises[2], self.storage)
+
+    def test_update_missing(self):
+        with self.assertRaises(ValueError) as context:
+            self.storage.update(Exercise("missing"), Exercise("new"))
+
+        self.assertTrue("missing not in exercises" in context.exception)
+
+    def test_update_to_duplicate(self):
+        with self.assertRaises(Exception) as context:
+            self.storage.update(self.exercises[0], self.exercises[1])
+
+        msg = "Cannot add duplicate exercise. Exercise Exercise 1"
+        self.assertTrue(msg in context.exception)
+
+    def test_update_invalid_type(self):
+        with self.assertRaises(TypeError):
+            self.storage.update("Exercise 0", Exercise("new"))
+
+    def test_sample(self):
+        self.storage.remove(self.exercises[0])
+        tasks = self.storage.sample(4)
+        self.assertEqual(set(tasks), set(self.exercises[1:]))
+
+    def test_sample_is_reproducible(self):
+        self.assertEqual(self.storage.sample(3, random.Random(1)),
+                         self.storage.sample(3, random.Random(1)))
+
+    def test_batch_rolls_back(self):
+        with self.assertRaises(ValueError):
+            with self.storage.batch():
+                self.storage.add(Exercise("new"))
+                self.storage.remove(Exercise("missing"))
+
+        self.assertEqual(len(self.storage), 5)
+        self.assertNotIn(Exercise("new"), self.storage)
+
+    def test_nested_batch_rolls_back_outer(self):
+        with self.assertRaises(ValueError):
+            with self.storage.batch():
+                self.storage.add(Exercise("new"))
+                with self.storage.batch():
+                    self.storage.add(Exercise("newer"))
+                raise ValueError()
+
+        self.assertEqual(len(self.storage), 5)
+
+    def test_failed_nested_batch_rolls_back_its_own(self):
+        with self.storage.batch():
+            self.storage.add(Exercise("new"))
+            with self.assertRaises(ValueError):
+                with self.storage.batch():
+                    self.storage.add(Exercise("newer"))
+                    self.storage.remove(Exercise("missing"))
+
+        self.assertIn(Exercise("new"), self.storage)
+        self.assertNotIn(Exercise("newer"), self.storage)
+        self.assertEqual(len(self.storage), 6)
+
+    def test_changes_persist(self):
+        self.storage.add(Exercise("new"))
+        self.storage.remove(self.exercises[0])
+
+        storage = SQLiteStorage(self._TMP_DB)
+        self.assertEqual(list(storage), list(self.storage))
+        storage.close()
+
+    def test_add_from_csv(self):
+        result = self.storage.add_from_csv(TEST_IMPORT_DATA)
+        self.assertEqual(result, (3, 1, 2))
+        self.assertEqual(len(self.storage), 8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,13 +8,16 @@ sys.path.insert(0, os.path.abspath('./trainer'))
 
 import unittest
 import shutil
+import time
 
 from trainer import Trainer
 from exercises import Exercises, Exercise
+from records import load_exercises
 
 DATA_PATH = os.path.dirname(__file__)
 TEST_DATA_FILE = os.path.join(DATA_PATH, 'test_dataset_1.pkl')
 TEST_ADD_DATA = os.path.join(DATA_PATH, 'new_exercises.csv')
+TEST_IMPORT_DATA = os.path.join(DATA_PATH, 'import_exercises.csv')
 TEST_OUT_FILE = os.path.join(DATA_PATH, 'test_dataset_1.csv')
 TEST_OUT_FILE_COPY = os.path.join(DATA_PATH, 'test_dataset_1_copy.csv')
 
@@ -55,8 +58,11 @@ class TrainerTestCases1(unittest.TestCase):
         self.trainer = Trainer(conn=self._TMP_DATA_FILE)
 
     def tearDown(self):
-        if os.path.isfile(self._TMP_DATA_FILE):
-            os.remove(self._TMP_DATA_FILE)
+        self.trainer.close()
+        for suffix in ('', '.lock', '.completions', '.completions.agg',
+                       '.completions.lock'):
+            if os.path.isfile(self._TMP_DATA_FILE + suffix):
+                os.remove(self._TMP_DATA_FILE + suffix)
 
         if os.path.isfile(TEST_OUT_FILE_COPY):
             os.remove(TEST_OUT_FILE_COPY)
@@ -65,6 +71,140 @@ class TrainerTestCases1(unittest.TestCase):
         self.trainer.output_exercises_to_csv(TEST_OUT_FILE_COPY)
         self.assertTrue(filecmp.cmp(TEST_OUT_FILE, TEST_OUT_FILE_COPY))
 
+    def test_trainer_get_list_for_budget(self):
+        all_tasks = self.trainer.get_all_exercises()
+        self.assertEqual(self.trainer.get_list_for_budget(60), [])
+
+        for i, minutes in enumerate((10, 20, 30, 40)):
+            self.trainer.update_exercise(all_tasks[i],
+                                         Exercise(all_tasks[i].description, minutes))
+
+        tasks = self.trainer.get_list_for_budget(60, seed=1)
+        self.assertEqual(sum(task.duration for task in tasks), 60)
+        self.assertEqual(tasks, self.trainer.get_list_for_budget(60, seed=1))
+        for task in tasks:
+            self.assertIn(task, list(all_tasks)[:4])
+
+        self.trainer.remove_exercise(all_tasks[0])
+        tasks = self.trainer.get_list_for_budget(100, seed=1)
+        self.assertEqual(sum(task.duration for task in tasks), 90)
+
+        tasks = self.trainer.get_list_for_budget(110, seed=1,
+                                                 default_duration=5)
+        self.assertTrue(100 <= sum(task.duration or 5 for task in tasks) <= 110)
+        self.assertTrue(any(task.duration is None for task in tasks))
+
+    def test_trainer_log_completion(self):
+        self.trainer.log_completion(1, 1476748800.0, 1476750600.0)
+        self.trainer.log_completion(2, 1476748800.0, 1476749400.0)
+        self.trainer.log_completion(1, 1476835200.0, 1476836400.0)
+
+        report = self.trainer.get_completion_report(exercise_id=1)
+        self.assertEqual((report.count, report.mean), (2, 1500))
+        self.assertEqual(self.trainer.get_completion_report().count, 3)
+        self.assertEqual(
+            self.trainer.get_completion_report(day='2016-10-18').total, 2400)
+        self.assertEqual(sorted(self.trainer.get_completion_reports()), [1, 2])
+        self.assertEqual(sorted(self.trainer.get_completion_reports('day')),
+                         ['2016-10-18', '2016-10-19'])
+
+        self.trainer.close()
+        trainer = Trainer(conn=self._TMP_DATA_FILE)
+        self.assertEqual(trainer.get_completion_report().count, 3)
+        trainer.close()
+
+    def test_trainer_weighted_list(self):
+        all_tasks = self.trainer.get_all_exercises()
+        for exercise_id in range(1, 11):
+            self.trainer.set_exercise_weight(exercise_id, 0)
+        self.trainer.set_exercise_weight(2, 1.5)
+        self.trainer.set_exercise_weight(5, 3)
+
+        tasks = self.trainer.get_new_list(2, seed=1, weighted=True)
+        self.assertEqual(set(tasks), set([all_tasks[1], all_tasks[4]]))
+        with self.assertRaises(ValueError):
+            self.trainer.get_new_list(3, weighted=True)
+
+        self.trainer.set_exercise_weight(7, 1)
+        self.assertEqual(len(self.trainer.get_new_list(3, weighted=True)), 3)
+        self.assertEqual(self.trainer.get_exercise_weight(5), 3.0)
+
+        trainer = Trainer(conn=self._TMP_DATA_FILE)
+        self.assertEqual(trainer.get_exercise_weight(5), 3.0)
+        self.assertEqual(trainer.get_exercise_weight(1), 0.0)
+
+    def test_trainer_weighted_list_after_changes(self):
+        for exercise_id in range(1, 11):
+            self.trainer.set_exercise_weight(exercise_id, 0)
+        self.trainer.get_new_list(0, weighted=True)
+
+        exercise_id = self.trainer.add_exercise(Exercise("new random exercise"))
+        self.assertEqual(self.trainer.get_new_list(1, weighted=True),
+                         [Exercise("new random exercise")])
+        self.trainer.set_exercise_weight(exercise_id, 0)
+        with self.assertRaises(ValueError):
+            self.trainer.get_new_list(1, weighted=True)
+
+    def test_trainer_log_completion_reweights(self):
+        self.trainer.log_completion(1, 1476748800.0, 1476750600.0)
+        self.trainer.log_completion(2, 1476748800.0, 1476749400.0)
+        self.assertTrue(self.trainer.get_exercise_weight(1) >
+                        self.trainer.get_exercise_weight(2))
+
+        self.trainer.set_exercise_weight(4, 2.0)
+        self.trainer.log_completion(4, 1476748800.0, 1476750600.0,
+                                    reweight=False)
+        self.assertEqual(self.trainer.get_exercise_weight(4), 2.0)
+
+    def test_trainer_recent_completions_are_drawn_less(self):
+        for exercise_id in range(3, 11):
+            self.trainer.set_exercise_weight(exercise_id, 0)
+        now = time.time()
+        self.trainer.log_completion(1, now - 600, now, reweight=False)
+        self.trainer.log_completion(2, now - 30 * 86400 - 600,
+                                    now - 30 * 86400, reweight=False)
+
+        first = [self.trainer.get_new_list(1, seed=seed, weighted=True)[0]
+                 for seed in range(300)]
+        all_tasks = self.trainer.get_all_exercises()
+        self.assertLess(first.count(all_tasks[0]), first.count(all_tasks[1]))
+        self.assertEqual(self.trainer.get_exercise_weight(1), 1.0)
+
+        # NOTE: a weight set while the factor applies keeps it
+        self.trainer.set_exercise_weight(2, 0)
+        self.trainer.set_exercise_weight(1, 2.0)
+        self.assertEqual(self.trainer.get_new_list(1, weighted=True),
+                         [all_tasks[0]])
+
+    def test_trainer_log_completion_of_missing_exercise(self):
+        with self.assertRaises(ValueError):
+            self.trainer.log_completion(99, 1476748800.0)
+
+        with self.assertRaises(ValueError):
+            self.trainer.get_completion_reports('week')
+
+    def test_trainer_exercise_ids(self):
+        all_tasks = self.trainer.get_all_exercises()
+        self.assertEqual(self.trainer.get_exercise(1), all_tasks[0])
+        self.assertEqual(self.trainer.get_exercise_id(all_tasks[4]), 5)
+
+        ex = Exercise("new random exercise")
+        self.assertEqual(self.trainer.add_exercise(ex), 11)
+
+        self.assertEqual(self.trainer.remove_exercise_by_id(3), all_tasks[2])
+        self.trainer.update_exercise_by_id(11, Exercise("updated exercise"))
+
+        trainer = Trainer(conn=self._TMP_DATA_FILE)
+        self.assertEqual(trainer.get_exercise(11), Exercise("updated exercise"))
+        self.assertEqual(trainer.get_exercise(4), all_tasks[3])
+        with self.assertRaises(ValueError):
+            trainer.get_exercise(3)
+
+    def test_trainer_iter_exercises_with_ids(self):
+        self.trainer.remove_exercise_by_id(1)
+        ids = [exercise_id for exercise_id, _ in self.trainer.iter_exercises_with_ids()]
+        self.assertEqual(ids, range(2, 11))
+
     def test_trainer_bulk_add_exercises_from_csv(self):
         tasks = self.trainer.get_all_exercises()
         self.assertEqual(len(tasks), 10)
@@ -73,6 +213,50 @@ class TrainerTestCases1(unittest.TestCase):
         new_tasks = self.trainer.get_all_exercises()
         self.assertEqual(len(new_tasks), 13)
 
+    def test_trainer_bulk_add_exercises_from_csv_persists(self):
+        self.trainer.add_exercises_from_csv(TEST_ADD_DATA)
+
+        new_trainer = Trainer(conn=self._TMP_DATA_FILE)
+        self.assertEqual(len(new_trainer.get_all_exercises()), 13)
+
+    def test_trainer_bulk_add_exercises_from_csv_reports_counts(self):
+        self.trainer.add_exercises_from_csv(TEST_ADD_DATA)
+        result = self.trainer.add_exercises_from_csv(TEST_IMPORT_DATA)
+
+        self.assertEqual(result, (2, 2, 2))
+        self.assertEqual(len(self.trainer.get_all_exercises()), 15)
+
+    def test_trainer_sync_exercises_from_csv(self):
+        tasks = self.trainer.get_all_exercises()
+        tasks.remove(tasks[0])
+        tasks.update(tasks[1], Exercise(tasks[1].description, 45))
+        tasks.append(Exercise("build a heap"))
+        tasks.to_csv(TEST_OUT_FILE_COPY)
+
+        diff = self.trainer.sync_exercises_from_csv(TEST_OUT_FILE_COPY)
+        self.assertEqual(map(len, diff), [1, 1, 1])
+        self.assertEqual(self.trainer.get_all_exercises(), tasks)
+        self.assertEqual(self.trainer.sync_exercises_from_csv(TEST_OUT_FILE_COPY),
+                         ([], [], []))
+
+        new_trainer = Trainer(conn=self._TMP_DATA_FILE)
+        self.assertEqual(new_trainer.get_all_exercises(), tasks)
+        self.assertEqual(new_trainer.get_all_exercises()[1].duration, 45)
+        new_trainer.close()
+
+    def test_trainer_packed(self):
+        tasks = self.trainer.get_all_exercises()
+        packed = Trainer(conn=self._TMP_DATA_FILE, packed=True)
+        self.assertEqual(packed.get_all_exercises(), tasks)
+        self.assertEqual(list(packed.get_all_exercises(view=True)), list(tasks))
+
+        tasks.remove(tasks[0])
+        tasks.to_csv(TEST_OUT_FILE_COPY)
+        packed.sync_exercises_from_csv(TEST_OUT_FILE_COPY)
+        self.assertEqual(Trainer(conn=self._TMP_DATA_FILE).get_all_exercises(),
+                         tasks)
+        packed.close()
+
     def test_trainer_bulk_add_exercises_from_csv_no_file(self):
         with self.assertRaises(IOError) as context:
             self.trainer.add_exercises_from_csv('fake.csv')
@@ -133,6 +317,15 @@ class TrainerTestCases1(unittest.TestCase):
         tasks = self.trainer.get_new_list(5)
         self.assertEqual(len(tasks), 5)
 
+    def test_get_new_list_has_no_duplicates(self):
+        for _ in range(20):
+            tasks = self.trainer.get_new_list(10)
+            self.assertEqual(len(set(tasks)), 10)
+
+    def test_get_new_list_with_seed_is_reproducible(self):
+        tasks = self.trainer.get_new_list(5, seed=42)
+        self.assertEqual(tasks, self.trainer.get_new_list(5, seed=42))
+
     def test_not_enough_exercises_to_generate_new_list(self):
         with self.assertRaises(Exception) as context:
             tasks = self.trainer.get_new_list(15)
@@ -188,6 +381,14 @@ class TrainerTestCases1(unittest.TestCase):
         self.assertTrue(old_all_tasks == new_all_tasks,
                 "Changes aren't persisting to data storage")
 
+    def test_get_all_exercises_view(self):
+        view = self.trainer.get_all_exercises(view=True)
+        self.assertEqual(view, self.trainer.get_all_exercises())
+        self.assertEqual(list(view[2:4]),
+                         list(self.trainer.get_all_exercises())[2:4])
+        with self.assertRaises(AttributeError):
+            view.append(Exercise('exercise should not be included'))
+
     def test_get_all_exercises_returns_a_copy_only(self):
         all_tasks = self.trainer.get_all_exercises()
         self.assertEqual(len(all_tasks), 10)
@@ -230,5 +431,360 @@ class TrainerTestCases1(unittest.TestCase):
         self.assertTrue(updated_all_tasks == new_all_tasks,
                 "Changes aren't persisting to data storage")
 
+class TrainerJournalTestCases(unittest.TestCase):
+    """A set of unit tests for the journaled storage mode"""
+    def setUp(self):
+        self._TMP_DATA_FILE = "_tmp_data.pkl"
+        i = 0
+        while os.path.isfile(self._TMP_DATA_FILE):
+            self._TMP_DATA_FILE = "_tmp_data_{}.pkl".format(i)
+            i += 1
+
+        shutil.copyfile(TEST_DATA_FILE, self._TMP_DATA_FILE)
+        self.trainer = Trainer(conn=self._TMP_DATA_FILE, journal=True)
+
+    def tearDown(self):
+        self.trainer.close()
+        for suffix in ('', '.lock', '.journal', '.journal.old'):
+            if os.path.isfile(self._TMP_DATA_FILE + suffix):
+                os.remove(self._TMP_DATA_FILE + suffix)
+
+    def test_changes_do_not_rewrite_data_storage(self):
+        with open(self._TMP_DATA_FILE, 'rb') as f:
+            snapshot = f.read()
+
+        self.trainer.add_exercise(Exercise("new random exercise"))
+
+        with open(self._TMP_DATA_FILE, 'rb') as f:
+            self.assertEqual(f.read(), snapshot)
+        self.assertTrue(os.path.isfile(self._TMP_DATA_FILE + '.journal'))
+
+    def test_changes_are_replayed_on_load(self):
+        all_tasks = self.trainer.get_all_exercises()
+        new_ex = Exercise("Fake update on exercise")
+        self.trainer.add_exercise(Exercise("new random exercise"))
+        self.trainer.remove_exercise(all_tasks[0])
+        self.trainer.update_exercise(all_tasks[1], new_ex)
+
+        new_trainer = Trainer(conn=self._TMP_DATA_FILE)
+        self.assertEqual(self.trainer.get_all_exercises(),
+                         new_trainer.get_all_exercises())
+
+    def test_journal_is_compacted_past_limit(self):
+        trainer = Trainer(conn=self._TMP_DATA_FILE, journal=True,
+                          journal_limit=1)
+        trainer.add_exercise(Exercise("new random exercise"))
+        trainer.close()
+
+        self.assertFalse(os.path.isfile(self._TMP_DATA_FILE + '.journal'))
+        self.assertFalse(os.path.isfile(self._TMP_DATA_FILE + '.journal.old'))
+        with open(self._TMP_DATA_FILE, 'rb') as f:
+            self.assertEqual(len(load_exercises(f)), 11)
+
+    def test_full_save_clears_journal(self):
+        self.trainer.add_exercise(Exercise("new random exercise"))
+
+        trainer = Trainer(conn=self._TMP_DATA_FILE)
+        trainer.add_exercise(Exercise("another random exercise"))
+
+        self.assertFalse(os.path.isfile(self._TMP_DATA_FILE + '.journal'))
+        with open(self._TMP_DATA_FILE, 'rb') as f:
+            self.assertEqual(len(load_exercises(f)), 12)
+
+    def test_interrupted_compaction_is_completed_on_load(self):
+        self.trainer.add_exercise(Exercise("new random exercise"))
+        self.trainer._storage._journal.rotate()
+        self.trainer.add_exercise(Exercise("another random exercise"))
+
+        trainer = Trainer(conn=self._TMP_DATA_FILE, journal=True)
+        self.assertEqual(len(trainer.get_all_exercises()), 12)
+        self.assertFalse(os.path.isfile(self._TMP_DATA_FILE + '.journal.old'))
+
+class TrainerSnapshotTestCases(unittest.TestCase):
+    """A set of unit tests for the memory-mapped snapshot"""
+    def setUp(self):
+        self._TMP_DATA_FILE = "_tmp_data.pkl"
+        i = 0
+        while os.path.isfile(self._TMP_DATA_FILE):
+            self._TMP_DATA_FILE = "_tmp_data_{}.pkl".format(i)
+            i += 1
+
+        shutil.copyfile(TEST_DATA_FILE, self._TMP_DATA_FILE)
+        # NOTE: the first open builds the index and the snapshot
+        Trainer(conn=self._TMP_DATA_FILE, lazy=True, snapshot=True).close()
+        self.trainer = Trainer(conn=self._TMP_DATA_FILE, journal=True,
+                               lazy=True, snapshot=True)
+
+    def tearDown(self):
+        self.trainer.close()
+        for suffix in ('', '.lock', '.idx', '.snap', '.journal',
+                       '.journal.old'):
+            if os.path.isfile(self._TMP_DATA_FILE + suffix):
+                os.remove(self._TMP_DATA_FILE + suffix)
+
+    def test_output_exercises_to_csv_without_loading(self):
+        self.trainer.output_exercises_to_csv(TEST_OUT_FILE_COPY)
+        self.assertTrue(filecmp.cmp(TEST_OUT_FILE, TEST_OUT_FILE_COPY))
+        self.assertFalse(self.trainer._storage.is_loaded)
+        os.remove(TEST_OUT_FILE_COPY)
+
+    def test_iter_exercises(self):
+        all_tasks = Trainer(conn=TEST_DATA_FILE).get_all_exercises()
+        self.assertEqual(list(self.trainer.iter_exercises()), list(all_tasks))
+
+    def test_get_new_list(self):
+        all_tasks = Trainer(conn=TEST_DATA_FILE).get_all_exercises()
+        tasks = self.trainer.get_new_list(5, seed=2)
+        self.assertEqual(tasks, self.trainer.get_new_list(5, seed=2))
+        for task in tasks:
+            self.assertTrue(task in all_tasks)
+
+    def test_get_list_for_budget(self):
+        self.assertEqual(self.trainer.get_list_for_budget(30), [])
+        tasks = self.trainer.get_list_for_budget(30, seed=1, default_duration=3)
+        self.assertEqual(len(tasks), 10)
+        self.assertFalse(self.trainer._storage.is_loaded)
+
+        self.trainer.add_exercise(Exercise("timed exercise", 25))
+        self.assertEqual(self.trainer.get_list_for_budget(30),
+                         [Exercise("timed exercise")])
+
+    def test_export_snapshot(self):
+        from snapshot import MappedSnapshot
+
+        filename = self._TMP_DATA_FILE + '.snap'
+        self.trainer.export_snapshot(filename)
+        snapshot = MappedSnapshot(filename)
+        self.assertEqual(list(snapshot), list(self.trainer.get_all_exercises()))
+        snapshot.close()
+
+class TrainerBatchTestCases(unittest.TestCase):
+    """A set of unit tests for batched changes"""
+    def setUp(self):
+        self._TMP_DATA_FILE = "_tmp_data.pkl"
+        i = 0
+        while os.path.isfile(self._TMP_DATA_FILE):
+            self._TMP_DATA_FILE = "_tmp_data_{}.pkl".format(i)
+            i += 1
+
+        shutil.copyfile(TEST_DATA_FILE, self._TMP_DATA_FILE)
+        self.trainer = Trainer(conn=self._TMP_DATA_FILE)
+
+        self.saves = 0
+        save = self.trainer._storage._save
+        def count_saves():
+            self.saves += 1
+            save()
+        self.trainer._storage._save = count_saves
+
+    def tearDown(self):
+        for suffix in ('', '.lock', '.journal'):
+            if os.path.isfile(self._TMP_DATA_FILE + suffix):
+                os.remove(self._TMP_DATA_FILE + suffix)
+
+    def test_batch_saves_once(self):
+        all_tasks = self.trainer.get_all_exercises()
+        with self.trainer.batch():
+            self.trainer.add_exercise(Exercise("new random exercise"))
+            self.trainer.remove_exercise(all_tasks[0])
+            self.trainer.update_exercise(all_tasks[1], Exercise("updated"))
+            self.assertEqual(self.saves, 0)
+
+        self.assertEqual(self.saves, 1)
+        new_trainer = Trainer(conn=self._TMP_DATA_FILE)
+        self.assertEqual(self.trainer.get_all_exercises(),
+                         new_trainer.get_all_exercises())
+
+    def test_nested_batch_saves_once(self):
+        with self.trainer.batch():
+            self.trainer.add_exercise(Exercise("new random exercise"))
+            with self.trainer.batch():
+                self.trainer.add_exercise(Exercise("another exercise"))
+
+        self.assertEqual(self.saves, 1)
+        self.assertEqual(len(self.trainer.get_all_exercises()), 12)
+
+    def test_batch_rolls_back_on_error(self):
+        all_tasks = self.trainer.get_all_exercises()
+        with self.assertRaises(Exception):
+            with self.trainer.batch():
+                self.trainer.add_exercise(Exercise("new random exercise"))
+                self.trainer.add_exercise(all_tasks[0])
+
+        self.assertEqual(self.saves, 0)
+        self.assertEqual(self.trainer.get_all_exercises(), all_tasks)
+
+    def test_batch_rolls_back_changes_in_place(self):
+        exercises = self.trainer._storage.exercises
+        items = list(exercises.items())
+        with self.assertRaises(ValueError):
+            with self.trainer.batch():
+                self.trainer.remove_exercise(items[3][1])
+                self.trainer.update_exercise(items[5][1], Exercise("updated"))
+                self.trainer._storage.set_weight(items[7][0], 4.0)
+                self.trainer.add_exercise(Exercise("new random exercise"))
+                raise ValueError()
+
+        self.assertIs(self.trainer._storage.exercises, exercises)
+        self.assertEqual(list(exercises.items()), items)
+        self.assertEqual(exercises.weights(), {})
+        self.assertEqual(exercises.next_id, 11)
+
+    def test_add_exercises(self):
+        exercises = [Exercise("exercise {}".format(i)) for i in range(5)]
+        self.trainer.add_exercises(exercises)
+
+        self.assertEqual(self.saves, 1)
+        self.assertEqual(len(self.trainer.get_all_exercises()), 15)
+
+    def test_add_exercises_with_duplicate_adds_nothing(self):
+        exercises = [Exercise("exercise"), Exercise("exercise")]
+        with self.assertRaises(Exception) as context:
+            self.trainer.add_exercises(exercises)
+
+        error_msg = "Exercise already exists. Exercise: exercise"
+        self.assertTrue(error_msg in context.exception)
+        self.assertEqual(self.saves, 0)
+        self.assertEqual(len(self.trainer.get_all_exercises()), 10)
+
+    def test_add_exercises_invalid_type(self):
+        with self.assertRaises(TypeError):
+            self.trainer.add_exercises(["exercise"])
+
+    def test_remove_exercises(self):
+        all_tasks = self.trainer.get_all_exercises()
+        self.trainer.remove_exercises([all_tasks[0], all_tasks[5]])
+
+        self.assertEqual(self.saves, 1)
+        new_all_tasks = self.trainer.get_all_exercises()
+        self.assertEqual(len(new_all_tasks), 8)
+        self.assertNotIn(all_tasks[5], new_all_tasks)
+
+    def test_remove_exercises_not_in_trainer_removes_nothing(self):
+        all_tasks = self.trainer.get_all_exercises()
+        with self.assertRaises(Exception):
+            self.trainer.remove_exercises([all_tasks[0], Exercise("missing")])
+
+        self.assertEqual(self.saves, 0)
+        self.assertEqual(len(self.trainer.get_all_exercises()), 10)
+
+    def test_bulk_add_exercises_from_csv_saves_once(self):
+        self.trainer.add_exercises_from_csv(TEST_ADD_DATA)
+        self.assertEqual(self.saves, 1)
+
+    def test_journaled_batch_appends_once(self):
+        trainer = Trainer(conn=self._TMP_DATA_FILE, journal=True)
+        appends = []
+        journal = trainer._storage._journal
+        append = journal.append
+        journal.append = lambda records: (appends.append(records),
+                                          append(records))
+
+        trainer.add_exercises([Exercise("exercise {}".format(i))
+                               for i in range(5)])
+
+        self.assertEqual(len(appends), 1)
+        self.assertEqual(len(appends[0]), 5)
+        new_trainer = Trainer(conn=self._TMP_DATA_FILE)
+        self.assertEqual(len(new_trainer.get_all_exercises()), 15)
+
+class TrainerSQLiteTestCases(unittest.TestCase):
+    """A set of unit tests for the trainer on a SQLite database"""
+    def setUp(self):
+        self._TMP_DB = "_tmp_data.db"
+        i = 0
+        while os.path.isfile(self._TMP_DB):
+            self._TMP_DB = "_tmp_data_{}.db".format(i)
+            i += 1
+
+        self.conn = 'sqlite:///' + self._TMP_DB
+        self.trainer = Trainer(conn=self.conn)
+        self.trainer.add_exercises(Trainer(conn=TEST_DATA_FILE).get_all_exercises())
+
+    def tearDown(self):
+        self.trainer.close()
+        if os.path.isfile(self._TMP_DB):
+            os.remove(self._TMP_DB)
+
+    def test_get_all_exercises(self):
+        tasks = self.trainer.get_all_exercises()
+        self.assertEqual(len(tasks), 10)
+        self.assertEqual(tasks, Trainer(conn=TEST_DATA_FILE).get_all_exercises())
+
+    def test_get_new_list_of_exercises(self):
+        tasks = self.trainer.get_new_list(10)
+        self.assertEqual(len(set(tasks)), 10)
+
+    def test_not_enough_exercises_to_generate_new_list(self):
+        with self.assertRaises(Exception) as context:
+            self.trainer.get_new_list(15)
+
+        error_msg = "15 exercises requested but only 10 available"
+        self.assertTrue(error_msg in context.exception)
+
+    def test_add_duplicate_exercise(self):
+        exercise = self.trainer.get_all_exercises()[4]
+        with self.assertRaises(Exception) as context:
+            self.trainer.add_exercise(exercise)
+
+        error_msg = "Exercise already exists. Exercise: {}".format(exercise)
+        self.assertTrue(error_msg in context.exception)
+
+    def test_changes_persist(self):
+        all_tasks = self.trainer.get_all_exercises()
+        self.trainer.add_exercise(Exercise("new random exercise"))
+        self.trainer.remove_exercise(all_tasks[0])
+        self.trainer.update_exercise(all_tasks[1], Exercise("updated"))
+
+        new_trainer = Trainer(conn=self.conn)
+        self.assertEqual(new_trainer.get_all_exercises(),
+                         self.trainer.get_all_exercises())
+        self.assertEqual(len(new_trainer.get_all_exercises()), 10)
+        new_trainer.close()
+
+    def test_remove_exercise_not_in_trainer(self):
+        with self.assertRaises(Exception) as context:
+            self.trainer.remove_exercise("non existent exercise")
+
+        error_msg = "Exercise does not exist. "
+        self.assertTrue(error_msg in context.exception.message)
+
+    def test_update_non_existent_exercise(self):
+        old_ex = Exercise("not in set")
+        with self.assertRaises(ValueError) as context:
+            self.trainer.update_exercise(old_ex, Exercise("new"))
+
+        error_msg = "{} not in exercises".format(old_ex)
+        self.assertTrue(error_msg in context.exception)
+
+    def test_bulk_add_exercises_from_csv(self):
+        result = self.trainer.add_exercises_from_csv(TEST_ADD_DATA)
+        self.assertEqual(result, (3, 0, 0))
+        self.assertEqual(len(self.trainer.get_all_exercises()), 13)
+
+    def test_batch_rolls_back_on_error(self):
+        all_tasks = self.trainer.get_all_exercises()
+        with self.assertRaises(Exception):
+            with self.trainer.batch():
+                self.trainer.add_exercise(Exercise("new random exercise"))
+                self.trainer.add_exercise(all_tasks[0])
+
+        self.assertEqual(self.trainer.get_all_exercises(), all_tasks)
+
+    def test_output_exercises_to_csv(self):
+        self.trainer.output_exercises_to_csv(TEST_OUT_FILE_COPY)
+        self.assertTrue(filecmp.cmp(TEST_OUT_FILE, TEST_OUT_FILE_COPY))
+        os.remove(TEST_OUT_FILE_COPY)
+
+    def test_sync_exercises_from_csv(self):
+        tasks = self.trainer.get_all_exercises()
+        tasks.remove(tasks[0])
+        tasks.append(Exercise("build a heap", 20))
+        tasks.to_csv(TEST_OUT_FILE_COPY)
+
+        self.trainer.sync_exercises_from_csv(TEST_OUT_FILE_COPY)
+        os.remove(TEST_OUT_FILE_COPY)
+        self.assertEqual(Trainer(conn=self.conn).get_all_exercises(), tasks)
+
 if __name__ == '__main__':
     unittest.main()
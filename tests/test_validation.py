@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath('../trainer'))
+sys.path.insert(0, os.path.abspath('./trainer'))
+
+import unittest
+import shutil
+import tempfile
+
+from validation import (Validation, ValidationRunner, run_validation,
+                        content_hash, PASSED, FAILED, ERROR, TIMEOUT)
+from trainer import Trainer
+
+DATA_PATH = os.path.dirname(__file__)
+TEST_DATA_FILE = os.path.join(DATA_PATH, 'test_dataset_1.pkl')
+
+SOLUTION = """
+def power(x, n):
+    return x ** n
+"""
+
+WRONG_SOLUTION = """
+def power(x, n):
+    return x * n
+"""
+
+SLOW_SOLUTION = """
+import time
+def power(x, n):
+    time.sleep(60)
+"""
+
+TESTS = """
+import os
+import unittest
+from solution import power
+
+class PowerTestCases(unittest.TestCase):
+    def test_square(self):
+        self.assertEqual(power(3, 2), 9)
+
+    def test_cube(self):
+        self.assertEqual(power(2, 3), 8)
+
+    def test_workdir(self):
+        self.assertFalse(os.path.exists('scratch.txt'))
+        open('scratch.txt', 'w').close()
+"""
+
+def _write_validation(dir, solution, name='solution.py', tests=TESTS):
+    """Write a solution and tests to their own directory under dir"""
+    path = tempfile.mkdtemp(dir=dir)
+    with open(os.path.join(path, name), 'w') as f:
+        f.write(solution)
+    with open(os.path.join(path, 'test_solution.py'), 'w') as f:
+        f.write(tests)
+    return Validation(os.path.join(path, name),
+                      os.path.join(path, 'test_solution.py'))
+
+class ValidationTestCases(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def validation(self, solution, name='solution.py'):
+        return _write_validation(self.dir, solution, name)
+
+    def test_passed(self):
+        result = run_validation(1, self.validation(SOLUTION), 30)
+        self.assertEqual(result.status, PASSED)
+        self.assertEqual((result.exercise_id, result.tests, result.failures,
+                          result.errors), (1, 3, 0, 0))
+        self.assertFalse(result.cached)
+
+    def test_failed(self):
+        result = run_validation(1, self.validation(WRONG_SOLUTION), 30)
+        self.assertEqual(result.status, FAILED)
+        self.assertEqual((result.tests, result.failures), (3, 2))
+        self.assertTrue('test_square' in result.output)
+
+    def test_error(self):
+        result = run_validation(1, self.validation(SOLUTION, 'other.py'), 30)
+        self.assertEqual(result.status, ERROR)
+        self.assertTrue('solution' in result.output)
+
+    def test_timeout(self):
+        result = run_validation(1, self.validation(SLOW_SOLUTION), 1)
+        self.assertEqual(result.status, TIMEOUT)
+        self.assertTrue(result.seconds < 30)
+
+    def test_missing_module(self):
+        validation = Validation(os.path.join(self.dir, 'missing.py'),
+                                os.path.join(self.dir, 'test_missing.py'))
+        result = run_validation(1, validation, 30)
+        self.assertEqual(result.status, ERROR)
+        results = list(ValidationRunner().run([(1, validation)]))
+        self.assertEqual(results[0].status, ERROR)
+
+    def test_content_hash(self):
+        first = self.validation(SOLUTION)
+        second = self.validation(SOLUTION)
+        self.assertEqual(content_hash(first), content_hash(second))
+        self.assertNotEqual(content_hash(first),
+                            content_hash(self.validation(WRONG_SOLUTION)))
+        self.assertNotEqual(content_hash(first),
+                            content_hash(self.validation(SOLUTION, 'other.py')))
+
+class ValidationRunnerTestCases(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = os.path.join(self.dir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def validation(self, solution):
+        return _write_validation(self.dir, solution)
+
+    def test_run(self):
+        validations = [(i, self.validation(SOLUTION if i % 2 else
+                                           WRONG_SOLUTION + '#{}'.format(i)))
+                       for i in xrange(1, 9)]
+        runner = ValidationRunner(self.cache, jobs=4)
+        results = dict((r.exercise_id, r) for r in runner.run(validations))
+        self.assertEqual(sorted(results), range(1, 9))
+        for i, result in results.iteritems():
+            self.assertEqual(result.status, PASSED if i % 2 else FAILED)
+            self.assertFalse(result.cached)
+
+    def test_cached(self):
+        validation = self.validation(SOLUTION)
+        first = list(ValidationRunner(self.cache).run([(1, validation)]))
+        self.assertFalse(first[0].cached)
+
+        second = list(ValidationRunner(self.cache).run([(2, validation)]))
+        self.assertEqual(second[0].status, PASSED)
+        self.assertEqual(second[0].exercise_id, 2)
+        self.assertTrue(second[0].cached)
+
+        with open(validation.solution, 'w') as f:
+            f.write(WRONG_SOLUTION)
+        third = list(ValidationRunner(self.cache).run([(1, validation)]))
+        self.assertEqual(third[0].status, FAILED)
+        self.assertFalse(third[0].cached)
+
+    def test_timeout_not_cached(self):
+        validation = self.validation(SLOW_SOLUTION)
+        runner = ValidationRunner(self.cache, timeout=1)
+        self.assertEqual(list(runner.run([(1, validation)]))[0].status, TIMEOUT)
+        self.assertFalse(list(runner.run([(1, validation)]))[0].cached)
+
+class TrainerValidationTestCases(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self._TMP_DATA_FILE = os.path.join(self.dir, 'data.pkl')
+        shutil.copyfile(TEST_DATA_FILE, self._TMP_DATA_FILE)
+        self.trainer = Trainer(conn=self._TMP_DATA_FILE)
+
+    def tearDown(self):
+        self.trainer.close()
+        shutil.rmtree(self.dir)
+
+    def validation(self, solution):
+        return _write_validation(self.dir, solution)
+
+    def test_set_exercise_validation(self):
+        validation = self.validation(SOLUTION)
+        self.trainer.set_exercise_validation(1, *validation)
+        self.assertEqual(self.trainer.get_exercise_validation(1), validation)
+        self.assertIsNone(self.trainer.get_exercise_validation(2))
+
+        with self.assertRaises(ValueError):
+            self.trainer.set_exercise_validation(99, *validation)
+        with self.assertRaises(IOError):
+            self.trainer.set_exercise_validation(
+                2, validation.solution, os.path.join(self.dir, 'missing.py'))
+
+    def test_validate_exercises(self):
+        self.trainer.set_exercise_validation(1, *self.validation(SOLUTION))
+        self.trainer.set_exercise_validation(3, *self.validation(WRONG_SOLUTION))
+        self.trainer.remove_exercise_by_id(3)
+        results = list(self.trainer.validate_exercises())
+        self.assertEqual([(r.exercise_id, r.status) for r in results],
+                         [(1, PASSED)])
+
+        trainer = Trainer(conn=self._TMP_DATA_FILE)
+        results = list(trainer.validate_exercises([1]))
+        self.assertTrue(results[0].cached)
+        trainer.close()
+
+        with self.assertRaises(ValueError):
+            self.trainer.validate_exercises([2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.budget
+==============
+
+Random lists of programming exercises whose estimated durations add
+up to a time budget.
+
+The exercises are indexed by duration once. A list is drawn with a
+randomized greedy pass, which keeps picking an exercise uniformly at
+random among those that still fit the remaining time, followed by an
+improvement pass that swaps picked exercises for longer ones while
+that fills more of the budget. Both passes work on the sorted
+durations with binary searches, so drawing a list costs about
+``O(k log n)`` for k exercises picked out of n.
+"""
+
+import random
+from bisect import bisect_left, bisect_right, insort
+
+class BudgetIndex(object):
+    """Exercises sorted by their estimated duration
+
+    Examples
+    --------
+    >>> from trainer.budget import BudgetIndex
+    >>> index = BudgetIndex(exercises)
+    >>> sum(ex.duration for ex in index.select(60))
+    60
+
+    Parameters
+    ----------
+    exercises : iterable of :obj:`Exercise`
+        exercises to draw lists from
+    default_duration : int, optional
+        minutes assumed for exercises without an estimate. Without
+        it those exercises are left out of the index
+    """
+    # NOTE: independent draws per list, the closest fit is kept
+    ATTEMPTS = 3
+
+    def __init__(self, exercises, default_duration=None):
+        pairs = []
+        for exercise in exercises:
+            duration = exercise.duration or default_duration
+            if duration is not None:
+                pairs.append((duration, exercise))
+
+        # NOTE: a stable sort on the duration alone keeps the catalog
+        # order within a duration, so seeded lists are reproducible
+        pairs.sort(key=lambda pair: pair[0])
+        self._durations = [duration for duration, _ in pairs]
+        self._exercises = [exercise for _, exercise in pairs]
+
+    def __len__(self):
+        """Returns number of exercises with a duration"""
+        return len(self._exercises)
+
+    def select(self, minutes, rng=None):
+        """Draw distinct exercises whose durations add up to at most
+        minutes, as close to it as the draws allow
+
+        Parameters
+        ----------
+        minutes : int
+            time budget in minutes
+        rng : :obj:`random.Random`, optional
+            source of randomness, the random module by default
+
+        Returns
+        -------
+        list of :obj:`Exercise`
+            exercises in the order they were drawn. Empty when no
+            exercise fits the budget
+        """
+        if not isinstance(minutes, (int, long)) or minutes <= 0:
+            msg = "Budget must be a positive number of minutes, not {}"
+            raise ValueError(msg.format(minutes))
+
+        rng = rng or random
+        best, best_left = [], minutes
+        for _ in xrange(self.ATTEMPTS):
+            picks, left = self._draw(minutes, rng)
+            if left < best_left:
+                best, best_left = picks, left
+            if best_left == 0:
+                break
+        return [self._exercises[pos] for pos in best]
+
+    def _draw(self, minutes, rng):
+        """Positions of one list of exercises and the minutes left"""
+        durations = self._durations
+        chosen = []
+        picks = []
+        left = minutes
+        while True:
+            end = bisect_right(durations, left)
+            free = end - bisect_left(chosen, end)
+            if not free:
+                break
+
+            pos = self._nth_free(chosen, 0, rng.randrange(free))
+            insort(chosen, pos)
+            picks.append(pos)
+            left -= durations[pos]
+
+        improved = True
+        while improved and left:
+            improved = False
+            for j in rng.sample(xrange(len(picks)), len(picks)):
+                pos = picks[j]
+                start = bisect_right(durations, durations[pos])
+                end = bisect_right(durations, durations[pos] + left)
+                free = ((end - start) -
+                        (bisect_left(chosen, end) - bisect_left(chosen, start)))
+                if not free:
+                    continue
+
+                new_pos = self._nth_free(chosen, start, rng.randrange(free))
+                del chosen[bisect_left(chosen, pos)]
+                insort(chosen, new_pos)
+                picks[j] = new_pos
+                left -= durations[new_pos] - durations[pos]
+                improved = True
+                if not left:
+                    break
+        return picks, left
+
+    def _nth_free(self, chosen, start, n):
+        """Position of the n-th exercise from start, counting from 0,
+        that is not in the sorted list of chosen positions"""
+        skipped = bisect_left(chosen, start)
+        lo = start + n
+        hi = lo + len(chosen) - skipped
+        while lo < hi:
+            mid = (lo + hi) // 2
+            free = mid - start + 1 - (bisect_right(chosen, mid) - skipped)
+            if free > n:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
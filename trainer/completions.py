@@ -0,0 +1,454 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.completions
+===================
+
+Append-only log of completed programming exercises and reports on
+the time they took.
+
+Each completion is one JSON line holding the exercise id and the
+start and end of the attempt in seconds since the epoch::
+
+    {"end": 1476801800.0, "id": 3, "start": 1476800000.0}
+
+Reports are not computed from the log. Every append also updates a
+running count, total and histogram of durations for the exercise,
+the day it was completed and all completions, so a report costs the
+same after years of entries as after one. The aggregates are saved
+in ``<path>.agg`` together with the number of bytes of the log they
+cover, and any lines past that point are folded in when the log is
+opened again.
+
+Once the log grows past its limit it is rotated to
+``<path>.<generation>`` and a fresh log is started. The aggregates
+already hold the rotated lines, which are kept as history only and
+pruned to the latest few generations.
+
+Several processes may record into one log. Records, rotations and
+saves of the aggregates hold an exclusive lock on ``<path>.lock``
+and first fold in whatever the other processes appended, rotated or
+saved since, so no line is skipped and a save never goes back.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import datetime
+from collections import namedtuple
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from journal import atomic_dump, fsync_dir
+from instrumentation import metrics
+from locking import FileLock
+
+CompletionReport = namedtuple('CompletionReport',
+                              'count total mean minimum maximum p50 p90 p99')
+
+# NOTE: ratio between the bounds of a histogram bucket. Percentiles
+# are within 1% of the exact durations
+_GROWTH = 1.02
+_LOG_GROWTH = math.log(_GROWTH)
+_VERSION = 2
+# NOTE: bounds of the weight given by how slow an exercise is, and
+# the factor applied to an exercise that was just completed. The
+# factor goes halfway back to 1 every half-life and counts as 1
+# past the window, where it is within 0.1% of it
+_MIN_WEIGHT = 0.25
+_MAX_WEIGHT = 4.0
+_RECENT_FACTOR = 0.5
+_RECENCY_HALF_LIFE = 24 * 60 * 60.0
+_RECENCY_WINDOW = 10 * _RECENCY_HALF_LIFE
+
+def completion_day(timestamp):
+    """UTC day of a timestamp as ``YYYY-MM-DD``"""
+    return datetime.datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d')
+
+def completion_weight(report, overall):
+    """Sampling weight of an exercise after it was completed
+
+    The weight is the mean duration of the exercise relative to the
+    mean of all completions, bounded to between a quarter and four
+    times, so exercises that are slow to complete come up more often
+    than quick ones. How recently the exercise was done is left to
+    :func:`recency_factor` when sampling.
+
+    Parameters
+    ----------
+    report : :obj:`CompletionReport`
+        completions of the exercise
+    overall : :obj:`CompletionReport`
+        all completions
+    """
+    if not report.count or not overall.mean:
+        return 1.0
+
+    slowness = report.mean / overall.mean
+    return min(max(slowness, _MIN_WEIGHT), _MAX_WEIGHT)
+
+def recency_factor(elapsed):
+    """Factor applied to the weight of an exercise last completed
+    elapsed seconds ago
+
+    The factor is a half right after a completion and goes halfway
+    back to 1 every day, so an exercise that was just done comes up
+    less often than one done days ago or never.
+    """
+    if elapsed >= _RECENCY_WINDOW:
+        return 1.0
+    return 1 - (1 - _RECENT_FACTOR) * 0.5 ** (max(elapsed, 0) /
+                                              _RECENCY_HALF_LIFE)
+
+class DurationStats(object):
+    """Count, total, extremes and a histogram of durations in seconds
+
+    The histogram has logarithmic buckets, so it holds a few hundred
+    counts at most whatever the number of durations added.
+    """
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self._buckets = {}
+
+    def add(self, seconds):
+        """Add one duration"""
+        self.count += 1
+        self.total += seconds
+        if self.minimum is None or seconds < self.minimum:
+            self.minimum = seconds
+        if self.maximum is None or seconds > self.maximum:
+            self.maximum = seconds
+
+        bucket = _bucket(seconds)
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+
+    def percentile(self, p):
+        """Approximate duration below which p percent of the
+        durations fall, or None if there are none"""
+        if not self.count:
+            return None
+
+        rank = max(int(math.ceil(p / 100.0 * self.count)), 1)
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                return min(max(_bucket_value(bucket), self.minimum),
+                           self.maximum)
+        return self.maximum
+
+    def state(self):
+        """Plain tuple of the stats, see :meth:`from_state`"""
+        return (self.count, self.total, self.minimum, self.maximum,
+                dict(self._buckets))
+
+    @classmethod
+    def from_state(cls, state):
+        stats = cls()
+        (stats.count, stats.total, stats.minimum, stats.maximum,
+         stats._buckets) = state
+        return stats
+
+    def report(self):
+        """The stats as a :obj:`CompletionReport`"""
+        mean = self.total / self.count if self.count else None
+        return CompletionReport(self.count, self.total, mean, self.minimum,
+                                self.maximum, self.percentile(50),
+                                self.percentile(90), self.percentile(99))
+
+def _states(table):
+    return dict((key, stats.state()) for key, stats in table.iteritems())
+
+def _from_states(states):
+    return dict((key, DurationStats.from_state(state))
+                for key, state in states.iteritems())
+
+def _bucket(seconds):
+    if seconds < 1:
+        return 0
+    return int(math.log(seconds) / _LOG_GROWTH) + 1
+
+def _bucket_value(bucket):
+    """Middle of the durations that fall in bucket"""
+    if bucket == 0:
+        return 0.5
+    return (_GROWTH ** (bucket - 1) + _GROWTH ** bucket) / 2
+
+class CompletionLog(object):
+    """Completion log at path with its aggregates
+
+    Examples
+    --------
+    >>> from trainer.completions import CompletionLog
+    >>> log = CompletionLog('data.pkl.completions')
+    >>> log.record(3, 1476800000.0, 1476801800.0)
+    >>> log.report(exercise_id=3).mean
+    1800.0
+    >>> log.close()
+
+    Parameters
+    ----------
+    path : str
+        log file, created on the first record
+    limit : int, optional
+        log size in bytes that triggers a rotation
+    keep : int, optional
+        number of rotated logs kept, older ones are removed
+    """
+    LIMIT = 1024 * 1024
+    KEEP = 10
+
+    def __init__(self, path, limit=None, keep=None):
+        self.path = path
+        self._aggregates_path = path + '.agg'
+        self._limit = limit or CompletionLog.LIMIT
+        self._keep = keep or CompletionLog.KEEP
+        self._lock = FileLock(path + '.lock')
+        self._dirty = False
+        # NOTE: version of the lock file when the aggregates were
+        # last read or saved. Another process saved them if it moved
+        self._version = None
+        self._reset()
+        with self._lock.exclusive():
+            self._refresh()
+            self.flush()
+
+    def record(self, exercise_id, start, end=None):
+        """Append a completion and fold it into the aggregates
+
+        Parameters
+        ----------
+        exercise_id : int
+            id of the exercise completed
+        start : float
+            start of the attempt in seconds since the epoch
+        end : float, optional
+            end of the attempt, now by default
+        """
+        if end is None:
+            end = time.time()
+        if end < start:
+            msg = "Completion ends before it starts. Start {}, end {}"
+            raise ValueError(msg.format(start, end))
+
+        line = json.dumps({'id': exercise_id, 'start': start, 'end': end},
+                          sort_keys=True, separators=(',', ':')) + '\n'
+        with self._lock.exclusive():
+            # NOTE: lines other processes appended since are folded in
+            # first, the offset then moves past them and this line
+            self._refresh()
+            with open(self.path, 'ab') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+
+            self._add(exercise_id, start, end)
+            self._offset = size
+            self._dirty = True
+            metrics.count('completion_records')
+            metrics.count('bytes_written', len(line))
+
+            if size > self._limit:
+                self.rotate()
+
+    def report(self, exercise_id=None, day=None):
+        """Report on the completions of an exercise, of a day given as
+        ``YYYY-MM-DD`` in UTC, or of all completions
+
+        Returns
+        -------
+        :obj:`CompletionReport`
+            count and total, mean, minimum, maximum and percentiles of
+            the durations in seconds. All but the count and total are
+            None when there are no completions
+        """
+        if exercise_id is not None and day is not None:
+            raise ValueError("Report on either an exercise or a day, not both")
+
+        if exercise_id is not None:
+            stats = self._by_exercise.get(exercise_id)
+        elif day is not None:
+            stats = self._by_day.get(day)
+        else:
+            stats = self._all
+        return (stats or DurationStats()).report()
+
+    def reports_by_exercise(self):
+        """Dictionary of exercise id to :obj:`CompletionReport`"""
+        return dict((exercise_id, stats.report())
+                    for exercise_id, stats in self._by_exercise.iteritems())
+
+    def reports_by_day(self):
+        """Dictionary of day to :obj:`CompletionReport`"""
+        return dict((day, stats.report())
+                    for day, stats in self._by_day.iteritems())
+
+    def recency_factors(self, now=None):
+        """Dictionary of exercise id to :func:`recency_factor` for the
+        exercises completed recently enough for it to be below 1
+
+        Parameters
+        ----------
+        now : float, optional
+            seconds since the epoch, now by default
+        """
+        if now is None:
+            now = time.time()
+        return dict((exercise_id, recency_factor(now - end))
+                    for exercise_id, end in self._last.iteritems()
+                    if now - end < _RECENCY_WINDOW)
+
+    def rotate(self):
+        """Move the log to ``<path>.<generation>`` and start a new one
+
+        The log is renamed before the aggregates are saved. If the
+        process dies in between, the next open finds the rotated log
+        under the generation the aggregates still name and finishes
+        the rotation. Rotated logs past the number kept are removed
+        once the aggregates are saved.
+        """
+        with self._lock.exclusive():
+            self._refresh()
+            if not os.path.isfile(self.path):
+                return
+
+            os.rename(self.path, self._archive_path(self._generation))
+            fsync_dir(self.path)
+            self._generation += 1
+            self._offset = 0
+            self._save()
+
+            for generation in self._generations():
+                if generation < self._generation - self._keep:
+                    os.remove(self._archive_path(generation))
+
+    def archives(self):
+        """Paths of the rotated logs, oldest first"""
+        return [self._archive_path(generation)
+                for generation in self._generations()]
+
+    def flush(self):
+        """Save the aggregates if records were added since the last
+        save"""
+        if self._dirty:
+            with self._lock.exclusive():
+                self._refresh()
+                self._save()
+
+    def close(self):
+        self.flush()
+
+    def _add(self, exercise_id, start, end):
+        seconds = end - start
+        self._all.add(seconds)
+        if end > self._last.get(exercise_id, end - 1):
+            self._last[exercise_id] = end
+        for key, table in ((exercise_id, self._by_exercise),
+                           (completion_day(end), self._by_day)):
+            stats = table.get(key)
+            if stats is None:
+                stats = table[key] = DurationStats()
+            stats.add(seconds)
+
+    def _reset(self, generation=0):
+        self._generation = generation
+        self._offset = 0
+        self._all = DurationStats()
+        self._by_exercise = {}
+        self._by_day = {}
+        # NOTE: end of the latest completion of each exercise
+        self._last = {}
+
+    def _refresh(self):
+        """Bring the aggregates up to the end of the log. Called with
+        the lock held
+
+        Aggregates another process saved are read again, as they
+        cover at least the lines seen here. Then rotated logs from
+        the current generation on are folded in, which finishes a
+        rotation interrupted after the rename, followed by the lines
+        of the active log past the offset.
+        """
+        version = self._lock.version()
+        if version != self._version:
+            self._version = version
+            state = None
+            if os.path.isfile(self._aggregates_path):
+                with open(self._aggregates_path, 'rb') as f:
+                    state = pickle.load(f)
+
+            if state is None or state['version'] != _VERSION:
+                # NOTE: aggregates lost or from another version. They
+                # are rebuilt from the rotated logs that are left and
+                # the active one
+                generations = self._generations()
+                self._reset(generations[0] if generations else 0)
+            else:
+                self._generation = state['generation']
+                self._offset = state['offset']
+                self._all = DurationStats.from_state(state['all'])
+                self._by_exercise = _from_states(state['by_exercise'])
+                self._by_day = _from_states(state['by_day'])
+                self._last = state['last']
+
+        while os.path.isfile(self._archive_path(self._generation)):
+            self._catch_up(self._archive_path(self._generation))
+            self._generation += 1
+            self._offset = 0
+            self._dirty = True
+
+        if self._catch_up(self.path):
+            self._dirty = True
+
+    def _catch_up(self, path):
+        """Fold the lines of path past the saved offset into the
+        aggregates and truncate a torn final line. Returns the number
+        of lines folded in"""
+        if not os.path.isfile(path):
+            return 0
+
+        count = 0
+        with open(path, 'r+b') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                event = json.loads(line)
+                self._add(event['id'], event['start'], event['end'])
+                self._offset += len(line)
+                count += 1
+
+            if self._offset < os.fstat(f.fileno()).st_size:
+                f.truncate(self._offset)
+                f.flush()
+                os.fsync(f.fileno())
+        return count
+
+    def _save(self):
+        # NOTE: plain tuples and dictionaries so the aggregates do not
+        # depend on the module path the classes were imported from
+        state = {'version': _VERSION, 'generation': self._generation,
+                 'offset': self._offset, 'all': self._all.state(),
+                 'by_exercise': _states(self._by_exercise),
+                 'by_day': _states(self._by_day), 'last': self._last}
+        atomic_dump(state, self._aggregates_path)
+        self._version = self._lock.bump()
+        self._dirty = False
+
+    def _archive_path(self, generation):
+        return '{}.{}'.format(self.path, generation)
+
+    def _generations(self):
+        """Generations of the rotated logs on disk, oldest first"""
+        directory, name = os.path.split(os.path.abspath(self.path))
+        pattern = re.compile(re.escape(name) + r'\.(\d+)$')
+        matches = (pattern.match(entry) for entry in os.listdir(directory))
+        return sorted(int(match.group(1)) for match in matches if match)
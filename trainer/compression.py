@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.compression
+===================
+
+Streaming compression of files of programming exercises, see
+:mod:`records`. The whole file is compressed with one of the stdlib
+codecs, and the codec of a file is detected from the magic bytes it
+starts with::
+
+    zlib    zlib stream, 78 01, 78 5e, 78 9c or 78 da
+    gzip    gzip member readable by gunzip, 1f 8b
+    bz2     bzip2 stream readable by bunzip2, BZh
+    lzma    xz stream readable by unxz, fd 37 7a 58 5a 00. Only
+            where the lzma module or its backport is installed
+
+Data is compressed and decompressed on a background thread that is
+connected to the serializer through a pipe, so the two overlap
+rather than either buffering the whole file. The serializer reads
+and writes the pipe as a real file, which keeps pickling at full
+speed.
+"""
+
+import os
+import bz2
+import zlib
+import threading
+import contextlib
+from collections import namedtuple
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+Codec = namedtuple('Codec', 'magic compressor decompressor')
+
+NO_COMPRESSION = 'none'
+
+_BLOCK = 64 * 1024
+_GZIP_BITS = 16 + zlib.MAX_WBITS
+
+CODECS = {
+    'zlib': Codec(('\x78\x01', '\x78\x5e', '\x78\x9c', '\x78\xda'),
+                  zlib.compressobj, zlib.decompressobj),
+    'gzip': Codec(('\x1f\x8b',),
+                  lambda: zlib.compressobj(6, zlib.DEFLATED, _GZIP_BITS),
+                  lambda: zlib.decompressobj(_GZIP_BITS)),
+    'bz2': Codec(('BZh',), bz2.BZ2Compressor, bz2.BZ2Decompressor),
+}
+if lzma is not None:
+    CODECS['lzma'] = Codec(('\xfd7zXZ\x00',), lzma.LZMACompressor,
+                           lzma.LZMADecompressor)
+
+# NOTE: errors codecs raise on corrupt data besides IOError
+_CODEC_ERRORS = (zlib.error, EOFError, ValueError) + (
+    (lzma.LZMAError,) if lzma is not None else ())
+
+def get_codec(name):
+    """The :obj:`Codec` called name
+
+    Raises
+    ------
+    ValueError
+        if there is no such codec, or it is not installed
+    """
+    try:
+        return CODECS[name]
+    except KeyError:
+        msg = "Unknown compression {!r}, expected one of {}"
+        names = [NO_COMPRESSION] + sorted(CODECS)
+        raise ValueError(msg.format(name, ', '.join(names)))
+
+def detect_compression(f):
+    """Name of the codec of the data at the position of f, or
+    :data:`NO_COMPRESSION`. The position is left unchanged"""
+    position = f.tell()
+    head = f.read(6)
+    f.seek(position)
+    for name, codec in CODECS.iteritems():
+        if head.startswith(codec.magic):
+            return name
+    return NO_COMPRESSION
+
+def decompress_head(f, name, size=4096):
+    """Up to the first size bytes of the data of f decompressed by
+    the named codec, without a thread"""
+    decompressor = get_codec(name).decompressor()
+    head = ''
+    while len(head) < size:
+        data = f.read(_BLOCK)
+        if not data:
+            break
+        try:
+            head += decompressor.decompress(data)
+        except _CODEC_ERRORS:
+            break
+    return head[:size]
+
+@contextlib.contextmanager
+def compressed(f, name):
+    """Context manager yielding a file whose data is written to f
+    compressed by the named codec
+
+    Parameters
+    ----------
+    f : file
+        file opened for writing in binary mode. It is written to on
+        a background thread until the block ends
+    name : str
+        one of :data:`CODECS` or :data:`NO_COMPRESSION`
+
+    Raises
+    ------
+    IOError
+        if compressing or writing to f failed
+    """
+    if name == NO_COMPRESSION:
+        yield f
+        return
+
+    compressor = get_codec(name).compressor()
+    read_fd, write_fd = os.pipe()
+    pipe = os.fdopen(write_fd, 'wb', _BLOCK)
+    errors = []
+    pump = threading.Thread(target=_compress,
+                            args=(read_fd, f, compressor, errors))
+    pump.daemon = True
+    pump.start()
+    try:
+        yield pipe
+    finally:
+        pipe.close()
+        pump.join()
+    if errors:
+        raise IOError("Could not compress {}: {}".format(f.name, errors[0]))
+
+def decompressed(f, name):
+    """File reading the data of f from its position on decompressed
+    by the named codec
+
+    The data is decompressed on a background thread as the file is
+    read. A corrupt or cut short stream ends the file early, which
+    readers of records report as a file cut short.
+
+    Parameters
+    ----------
+    f : file
+        file opened for reading in binary mode. It is not read from
+        again, as the thread reads a duplicate of its descriptor
+    name : str
+        one of :data:`CODECS`
+    """
+    decompressor = get_codec(name).decompressor()
+    # NOTE: the thread reads a duplicate descriptor so f can be closed
+    # while it runs. Both share the position in the file
+    source = os.dup(f.fileno())
+    os.lseek(source, f.tell(), os.SEEK_SET)
+    read_fd, write_fd = os.pipe()
+    pump = threading.Thread(target=_decompress,
+                            args=(source, write_fd, decompressor))
+    pump.daemon = True
+    pump.start()
+    return os.fdopen(read_fd, 'rb', _BLOCK)
+
+def _compress(read_fd, f, compressor, errors):
+    """Compress what is written to the pipe into f until it closes"""
+    compress = compressor.compress
+    try:
+        try:
+            data = os.read(read_fd, _BLOCK)
+            while data:
+                f.write(compress(data))
+                data = os.read(read_fd, _BLOCK)
+            f.write(compressor.flush())
+        except (IOError, OSError) + _CODEC_ERRORS as e:
+            errors.append(e)
+            # NOTE: keep reading so the writer never blocks on a full
+            # pipe. Its data is discarded along with the file
+            while os.read(read_fd, _BLOCK):
+                pass
+    finally:
+        os.close(read_fd)
+
+def _decompress(source, write_fd, decompressor):
+    """Decompress source into the pipe until either ends"""
+    pipe = os.fdopen(write_fd, 'wb', _BLOCK)
+    try:
+        data = os.read(source, _BLOCK)
+        while data:
+            pipe.write(decompressor.decompress(data))
+            data = os.read(source, _BLOCK)
+        flush = getattr(decompressor, 'flush', None)
+        if flush is not None:
+            pipe.write(flush())
+    except (IOError, OSError) + _CODEC_ERRORS:
+        # NOTE: the reader closed the pipe or the stream is corrupt,
+        # in which case the reader finds it cut short
+        pass
+    finally:
+        try:
+            pipe.close()
+        except (IOError, OSError):
+            pass
+        os.close(source)
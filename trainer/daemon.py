@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.daemon
+==============
+
+Long-lived process that keeps a :class:`trainer.Trainer` in memory
+and serves requests from the command line over a Unix socket, so an
+invocation does not pay for loading the exercises.
+
+The socket is kept next to the data storage in ``<path>.sock``. Each
+connection carries one request and one response, both a line of
+JSON::
+
+    {"op": "add", "args": {"description": "Build a tree!"}}
+    {"ok": true, "result": 11}
+    {"ok": false, "error": "ValueError", "message": "No exercise with id 99"}
+
+Requests are served one at a time. Changes are applied in memory and
+acknowledged straight away, and persisted together once
+:attr:`TrainerDaemon.FLUSH_INTERVAL` seconds have passed since the
+first of them or :attr:`TrainerDaemon.BATCH_SIZE` of them are
+pending, whichever comes first. The daemon persists pending changes
+before it exits on a ``stop`` request, SIGTERM or SIGINT. Other
+processes opening the data storage wait while changes are pending.
+"""
+
+import os
+import json
+import time
+import errno
+import signal
+import socket
+import SocketServer
+
+from exercises import Exercise, CsvImport, write_csv
+from completions import CompletionReport
+from storage import sidecar_path
+from instrumentation import metrics
+
+# NOTE: exception types re-raised on the client side. Others are
+# raised as Exception with the message of the original
+_ERRORS = dict((error.__name__, error)
+               for error in (ValueError, TypeError, KeyError, IOError))
+
+def socket_path(conn):
+    """Socket of the daemon serving the data storage selected by conn"""
+    return sidecar_path(conn, '.sock')
+
+def _text(value):
+    """JSON strings decode to unicode, descriptions are utf-8 str"""
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+def _exercise(fields):
+    return Exercise(_text(fields[0]), fields[1])
+
+def _fields(exercise):
+    return [exercise.description, exercise.duration]
+
+class _Handler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+
+        try:
+            request = json.loads(line)
+            result = self.server.dispatch(request['op'],
+                                          request.get('args') or {})
+            response = {'ok': True, 'result': result}
+        except Exception as e:
+            response = {'ok': False, 'error': type(e).__name__,
+                        'message': str(e)}
+        self.wfile.write(json.dumps(response) + '\n')
+
+class TrainerDaemon(SocketServer.UnixStreamServer):
+    """Server of the requests of :class:`RemoteTrainer` clients
+
+    Examples
+    --------
+    >>> from trainer.trainer import Trainer
+    >>> from trainer.daemon import TrainerDaemon, socket_path
+    >>> daemon = TrainerDaemon(Trainer(), socket_path(Trainer._PROD_CONNECTION))
+    >>> daemon.serve()
+
+    Parameters
+    ----------
+    trainer : :obj:`Trainer`
+        trainer to serve, used by the daemon alone while it runs
+    path : str
+        socket to listen on. A socket left behind by a daemon that
+        died is replaced
+    flush_interval : float, optional
+        seconds changes may stay pending
+    batch_size : int, optional
+        number of pending changes that are persisted straight away
+    """
+    FLUSH_INTERVAL = 1.0
+    BATCH_SIZE = 100
+    _WRITES = frozenset(('add', 'remove', 'remove_by_id', 'update',
+                         'update_by_id', 'import', 'log'))
+
+    def __init__(self, trainer, path, flush_interval=None, batch_size=None):
+        if os.path.exists(path):
+            if ping(path):
+                raise IOError("A daemon is already serving {}".format(path))
+            os.remove(path)
+
+        SocketServer.UnixStreamServer.__init__(self, path, _Handler)
+        self.path = path
+        self.trainer = trainer
+        self.flush_interval = flush_interval or self.FLUSH_INTERVAL
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.timeout = self.flush_interval
+        self._batch = None
+        self._pending = 0
+        self._first_pending = None
+        self._running = False
+
+    def serve(self):
+        """Serve requests until stopped, then persist pending changes
+        and remove the socket"""
+        self._running = True
+        try:
+            while self._running:
+                self.handle_request()
+                if self._is_flush_due():
+                    self.flush()
+        finally:
+            try:
+                self.flush()
+            finally:
+                self.server_close()
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+
+    def stop(self, *args):
+        """Stop serving once the current request is answered. Also a
+        signal handler"""
+        self._running = False
+
+    def handle_timeout(self):
+        self.flush()
+
+    def flush(self):
+        """Persist the pending changes"""
+        if self._batch is None:
+            return
+
+        batch, self._batch = self._batch, None
+        self._pending = 0
+        self._first_pending = None
+        with metrics.timer('daemon_flush'):
+            batch.__exit__(None, None, None)
+
+    def dispatch(self, op, args):
+        """Run one request and return its result as plain JSON data"""
+        handler = getattr(self, '_op_' + op, None)
+        if handler is None:
+            raise ValueError("Unknown request {}".format(op))
+
+        metrics.count('daemon_requests')
+        if op not in self._WRITES:
+            if self._batch is None:
+                self.trainer.refresh()
+            return handler(**args)
+
+        if self._batch is None:
+            # NOTE: the batch is entered by hand as it stays open
+            # across requests until the next flush
+            self._batch = self.trainer.batch()
+            self._batch.__enter__()
+            self._first_pending = time.time()
+        # NOTE: a nested batch per request, so a request that fails
+        # takes back its own changes and leaves those of the others
+        # in the open batch
+        with self.trainer.batch():
+            result = handler(**args)
+        self._pending += 1
+        return result
+
+    def _is_flush_due(self):
+        return self._batch is not None and (
+            self._pending >= self.batch_size or
+            time.time() - self._first_pending >= self.flush_interval)
+
+    def _op_ping(self):
+        return True
+
+    def _op_stop(self):
+        self.stop()
+        return True
+
+    def _op_flush(self):
+        self.flush()
+        return True
+
+    def _op_add(self, description, duration=None):
+        return self.trainer.add_exercise(Exercise(_text(description), duration))
+
+    def _op_remove(self, description):
+        self.trainer.remove_exercise(Exercise(_text(description)))
+
+    def _op_remove_by_id(self, id):
+        return _fields(self.trainer.remove_exercise_by_id(id))
+
+    def _op_update(self, old, new):
+        self.trainer.update_exercise(_exercise(old), _exercise(new))
+
+    def _op_update_by_id(self, id, new):
+        self.trainer.update_exercise_by_id(id, _exercise(new))
+
+    def _op_import(self, filename):
+        return list(self.trainer.add_exercises_from_csv(filename))
+
+    def _op_log(self, id, start, end=None):
+        self.trainer.log_completion(id, start, end)
+
+    def _op_get(self, id):
+        return _fields(self.trainer.get_exercise(id))
+
+    def _op_list(self):
+        return [[exercise_id] + _fields(exercise) for exercise_id, exercise
+                in self.trainer.iter_exercises_with_ids()]
+
+    def _op_new_list(self, n, seed=None, weighted=False):
+        return [_fields(exercise) for exercise
+                in self.trainer.get_new_list(n, seed, weighted)]
+
+    def _op_budget(self, minutes, seed=None):
+        return [_fields(exercise) for exercise
+                in self.trainer.get_list_for_budget(minutes, seed)]
+
+    def _op_search(self, query, limit=None):
+        return [[exercise_id] + _fields(exercise) for exercise_id, exercise
+                in self.trainer.search(_text(query), limit)]
+
+    def _op_reports(self, by='exercise'):
+        return [[key, list(report)] for key, report
+                in self.trainer.get_completion_reports(by).iteritems()]
+
+def serve(trainer, path, flush_interval=None, batch_size=None):
+    """Serve trainer on the socket at path until SIGTERM or SIGINT"""
+    daemon = TrainerDaemon(trainer, path, flush_interval, batch_size)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.serve()
+
+def ping(path):
+    """True if a daemon answers on the socket at path"""
+    try:
+        return RemoteTrainer(path).request('ping')
+    except (socket.error, IOError, ValueError):
+        return False
+
+def connect_daemon(conn):
+    """:class:`RemoteTrainer` of the daemon serving the data storage
+    selected by conn, or None if no daemon is running"""
+    path = socket_path(conn)
+    if os.path.exists(path) and ping(path):
+        return RemoteTrainer(path)
+    return None
+
+class RemoteTrainer(object):
+    """Client of a :class:`TrainerDaemon` with the methods of
+    :class:`trainer.Trainer` the command line uses
+
+    Examples
+    --------
+    >>> from trainer.daemon import connect_daemon
+    >>> trainer = connect_daemon('data.pkl')
+    >>> trainer.add_exercise(Exercise("Build a tree!"))
+    11
+
+    Parameters
+    ----------
+    path : str
+        socket of the daemon
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def request(self, op, **args):
+        """Send one request and return its result
+
+        Raises
+        ------
+        socket.error
+            if the daemon cannot be reached
+        Exception
+            the error of the request, as a ValueError, TypeError,
+            KeyError or IOError where it was one of those
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+            sock.sendall(json.dumps({'op': op, 'args': args}) + '\n')
+            f = sock.makefile('rb')
+            line = f.readline()
+            f.close()
+        finally:
+            sock.close()
+
+        if not line:
+            raise IOError(errno.ECONNRESET, "Daemon closed the connection")
+        response = json.loads(line)
+        if not response['ok']:
+            error = _ERRORS.get(response['error'], Exception)
+            raise error(_text(response['message']))
+        return response['result']
+
+    def add_exercise(self, exercise):
+        return self.request('add', description=exercise.description,
+                            duration=exercise.duration)
+
+    def remove_exercise(self, exercise):
+        self.request('remove', description=exercise.description)
+
+    def remove_exercise_by_id(self, exercise_id):
+        return _exercise(self.request('remove_by_id', id=exercise_id))
+
+    def update_exercise(self, old_exercise, new_exercise):
+        self.request('update', old=_fields(old_exercise),
+                     new=_fields(new_exercise))
+
+    def update_exercise_by_id(self, exercise_id, new_exercise):
+        self.request('update_by_id', id=exercise_id, new=_fields(new_exercise))
+
+    def add_exercises_from_csv(self, filename):
+        return CsvImport(*self.request('import',
+                                       filename=os.path.abspath(filename)))
+
+    def get_exercise(self, exercise_id):
+        return _exercise(self.request('get', id=exercise_id))
+
+    def iter_exercises_with_ids(self):
+        return ((fields[0], _exercise(fields[1:]))
+                for fields in self.request('list'))
+
+    def get_new_list(self, n, seed=None, weighted=False):
+        return [_exercise(fields) for fields
+                in self.request('new_list', n=n, seed=seed, weighted=weighted)]
+
+    def get_list_for_budget(self, minutes, seed=None):
+        return [_exercise(fields) for fields
+                in self.request('budget', minutes=minutes, seed=seed)]
+
+    def search(self, query, limit=None):
+        return [(fields[0], _exercise(fields[1:])) for fields
+                in self.request('search', query=query, limit=limit)]
+
+    def output_exercises_to_csv(self, filename):
+        write_csv((exercise for _, exercise in self.iter_exercises_with_ids()),
+                  filename)
+
+    def log_completion(self, exercise_id, start, end=None):
+        self.request('log', id=exercise_id, start=start, end=end)
+
+    def get_completion_reports(self, by='exercise'):
+        return dict((_text(key), CompletionReport(*report))
+                    for key, report in self.request('reports', by=by))
+
+    def flush(self):
+        """Ask the daemon to persist its pending changes now"""
+        self.request('flush')
+
+    def close(self):
+        pass
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.digest
+==============
+
+Digests of sets of programming exercises, to tell cheaply whether two
+catalogs hold the same exercises and which ones differ.
+
+A digest is the sum modulo 2**64 of a hash of every exercise, so it
+is updated in constant time as exercises are added and removed and
+does not depend on the order they were added in.
+
+:class:`DigestTree` spreads the exercises over leaves by the top
+bits of the hash of their description and keeps the digest of every
+leaf and of every group of 16 nodes above them, up to the digest of
+the whole catalog. Two trees are compared from the top, only going
+down into the nodes whose digests differ, so finding c differences
+among n exercises looks at about ``16 c log(n)`` digests and the
+exercises of c leaves.
+"""
+
+from collections import namedtuple
+
+CatalogDiff = namedtuple('CatalogDiff', 'added removed changed')
+
+MASK = (1 << 64) - 1
+# NOTE: leaves are selected by the top LEAF_BITS bits of the hash of
+# a description and each level above groups 2 ** FANOUT_BITS nodes
+LEAF_BITS = 16
+FANOUT_BITS = 4
+_LEVELS = LEAF_BITS // FANOUT_BITS + 1
+_MIX = 0x9E3779B97F4A7C15
+
+def exercise_digest(exercise):
+    """Hash of the description and estimated duration of an exercise"""
+    return hash((exercise.description, exercise.duration)) & MASK
+
+def _leaf(exercise):
+    # NOTE: similar descriptions have hashes with similar top bits,
+    # so the hash is mixed by a multiplication before they are taken
+    return (((hash(exercise) & MASK) * _MIX) & MASK) >> (64 - LEAF_BITS)
+
+class DigestTree(object):
+    """Merkle-style tree of digests over a set of exercises
+
+    Examples
+    --------
+    >>> from trainer.digest import DigestTree
+    >>> ours = DigestTree(exercises)
+    >>> theirs = DigestTree(other_exercises)
+    >>> ours.digest == theirs.digest
+    False
+    >>> ours.diff(theirs)
+    CatalogDiff(added=[Build a heap], removed=[], changed=[])
+
+    Parameters
+    ----------
+    exercises : iterable of :obj:`exercises.Exercise`, optional
+        unique exercises to start from
+    """
+    def __init__(self, exercises=()):
+        self._leaves = {}
+        # NOTE: _levels[0] holds the digest of every leaf and the
+        # last level the digest of the whole tree, under key 0
+        self._levels = [{} for _ in xrange(_LEVELS)]
+        leaves = self._leaves
+        digests = self._levels[0]
+        for exercise in exercises:
+            key = _leaf(exercise)
+            leaf = leaves.get(key)
+            if leaf is None:
+                leaf = leaves[key] = set()
+            leaf.add(exercise)
+            digests[key] = digests.get(key, 0) + exercise_digest(exercise)
+
+        for key, value in digests.iteritems():
+            digests[key] = value & MASK
+        for level in xrange(1, _LEVELS):
+            digests = self._levels[level]
+            for key, value in self._levels[level - 1].iteritems():
+                parent = key >> FANOUT_BITS
+                digests[parent] = (digests.get(parent, 0) + value) & MASK
+
+    @property
+    def digest(self):
+        """Digest of every exercise in the tree"""
+        return self._levels[-1].get(0, 0)
+
+    def add(self, exercise):
+        """Add an exercise that is not in the tree"""
+        key = _leaf(exercise)
+        self._leaves.setdefault(key, set()).add(exercise)
+        self._update(key, exercise_digest(exercise))
+
+    def remove(self, exercise):
+        """Remove an exercise that is in the tree"""
+        key = _leaf(exercise)
+        leaf = self._leaves[key]
+        leaf.remove(exercise)
+        if not leaf:
+            del self._leaves[key]
+        self._update(key, -exercise_digest(exercise))
+
+    def differing_leaves(self, other):
+        """Keys of the leaves whose exercises differ from those of
+        other, found by descending only into nodes that differ"""
+        keys = [0]
+        for level in xrange(_LEVELS - 1, -1, -1):
+            ours = self._levels[level]
+            theirs = other._levels[level]
+            keys = [key for key in keys
+                    if ours.get(key, 0) != theirs.get(key, 0)]
+            if level and keys:
+                keys = [(key << FANOUT_BITS) | child for key in keys
+                        for child in xrange(1 << FANOUT_BITS)]
+        return keys
+
+    def diff(self, other):
+        """Exercises that differ between this tree and other
+
+        Exercises are matched by description, so an exercise whose
+        estimated duration differs is changed rather than removed
+        and added again.
+
+        Parameters
+        ----------
+        other : :obj:`DigestTree`
+
+        Returns
+        -------
+        :obj:`CatalogDiff`
+            exercises only in other as ``added``, only in this tree as
+            ``removed``, and pairs of this tree's and other's version
+            of an exercise whose duration differs as ``changed``
+        """
+        added, removed, changed = [], [], []
+        for key in self.differing_leaves(other):
+            ours = self._leaves.get(key, set())
+            theirs = dict((ex, ex) for ex in other._leaves.get(key, ()))
+            for exercise in ours:
+                match = theirs.pop(exercise, None)
+                if match is None:
+                    removed.append(exercise)
+                elif match.duration != exercise.duration:
+                    changed.append((exercise, match))
+            added.extend(theirs)
+        return CatalogDiff(added, removed, changed)
+
+    def _update(self, key, delta):
+        for digests in self._levels:
+            value = (digests.get(key, 0) + delta) & MASK
+            if value:
+                digests[key] = value
+            else:
+                digests.pop(key, None)
+            key >>= FANOUT_BITS
@@ -9,66 +9,227 @@ and management of programming exercises
 """
 
 import os
+import re
 import csv
+from array import array
+from itertools import islice, izip, imap
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from digest import DigestTree, MASK
+from instrumentation import metrics
+
+CsvImport = namedtuple('CsvImport', ['accepted', 'skipped', 'malformed'])
+
+# NOTE: exports are written through a large buffer as they are
+# dominated by many small writes of one short row each
+CSV_WRITE_BUFFER = 1024 * 1024
+_CSV_CHUNK = 4096
+_NEEDS_QUOTING = re.compile(r'[,"\r]').search
+
+# NOTE: sampling weight of an exercise that was never given one
+DEFAULT_WEIGHT = 1.0
+
+# NOTE: hashes are probed as unsigned, as dictionaries do
+_HASH_MASK = (1 << 64) - 1
 
 # TODO(steve): should this class inherit from
 # list, set of dict class? Initial thoughts no.
 # We want exercises to be SIMPLER than a list
 # object but has some similar attributes.
-# TODO(steve): should we switch from python
-# pickle to json pickle for cross platform
-# compatibility
 # TODO(steve): Should a load method be implemented?
 # This will make Exercises handle it's own data
 # storage implementation. Or is this trainer's role?
 # Current design decision is to have trainer
 # handle the data storage implementation
 class Exercises(object):
-    """Container for programming exercises"""
+    """Container for programming exercises
+
+    Exercises are kept in insertion order in ``_items`` and indexed
+    by their position in ``_positions`` so membership checks, appends,
+    removals and updates are constant time. Removed exercises leave a
+    hole in ``_items`` whose position is kept in the sorted list
+    ``_holes``. Positional access maps an index past the holes with a
+    binary search and iteration skips them, so neither has to compact
+    ``_items``. It is compacted once holes make up half of it, and by
+    the operations that read all of it anyway.
+
+    Every exercise also gets an integer id when it is appended. Ids
+    are allocated in increasing order, are never reused and stay with
+    an exercise when it is updated, so they ascend along ``_items``.
+    ``_ids`` holds the id of each slot of ``_items`` and ``_by_id``
+    maps ids to positions.
+
+    Exercises can be given a weight for weighted sampling. Only the
+    weights that differ from :data:`DEFAULT_WEIGHT` are kept, in
+    ``_weights`` by id.
+
+    ``_digest`` is the sum of the hashes of the descriptions, updated
+    with every change, so containers holding different exercises
+    compare unequal without looking at them. A
+    :class:`digest.DigestTree` of the exercises is built in
+    ``_tree`` the first time two containers are diffed and kept up to
+    date from then on.
+
+    After :meth:`savepoint` every change also records how to undo it
+    in ``_undo``, so :meth:`rollback` can revert a few changes to a
+    large container without having copied it. ``_marks`` holds the
+    length of ``_undo`` at each nested savepoint. ``_compactions``
+    counts the compactions of ``_items``, which move the slots
+    recorded.
+    """
     def __init__(self, exercises=None):
-        self._index = 0
         self._items = []
+        self._ids = []
+        self._positions = {}
+        self._by_id = {}
+        self._next_id = 1
+        self._holes = []
+        self._weights = {}
+        self._digest = 0
+        self._tree = None
+        self._undo = None
+        self._marks = []
+        self._compactions = 0
         if type(exercises) == type(self):
+            exercises._compact()
             self._items = list(exercises._items)
+            self._ids = list(exercises._ids)
+            self._positions = dict(exercises._positions)
+            self._by_id = dict(exercises._by_id)
+            self._next_id = exercises._next_id
+            self._weights = dict(exercises._weights)
+            self._digest = exercises._digest
+        elif type(exercises) is PackedExercises:
+            self.__setstate__({'_items': list(exercises),
+                               '_ids': list(exercises._ids),
+                               '_next_id': exercises.next_id,
+                               '_weights': exercises.weights()})
         elif exercises:
             msg = "{} object is not of type Exercises".format(type(exercises))
             raise TypeError(msg)
 
-    def __iter__(self):
-        """Return class as the iterator"""
-        self._index = 0
-        return self
-
-    def next(self):
-        """Iterator interface method"""
-        if self._index < len(self._items):
-            item = self._items[self._index]
-            self._index += 1
-            return item
+    def __getstate__(self):
+        """Pickle only the ordered exercises. The index is rebuilt
+        on load which keeps the file format unchanged"""
+        self._compact()
+        return {'_items': self._items, '_ids': self._ids,
+                '_next_id': self._next_id, '_weights': self._weights}
+
+    def __setstate__(self, state):
+        """Restore exercises. Those pickled before ids existed are
+        numbered from 1 in order"""
+        self._items = list(state['_items'])
+        if '_ids' in state:
+            self._ids = list(state['_ids'])
+            self._next_id = state['_next_id']
         else:
-            raise StopIteration()
+            self._ids = range(1, len(self._items) + 1)
+            self._next_id = len(self._items) + 1
+        self._weights = dict(state.get('_weights', {}))
+        self._holes = []
+        self._tree = None
+        self._undo = None
+        self._marks = []
+        self._compactions = 0
+        self._reindex()
+        self._digest = sum(ex._hash & MASK for ex in self._items) & MASK
+
+    def _reindex(self):
+        self._positions = {}
+        self._by_id = {}
+        for i, exercise in enumerate(self._items):
+            self._positions[exercise] = i
+            self._by_id[self._ids[i]] = i
+
+    def _compact(self):
+        """Remove the holes left behind by removed exercises"""
+        if not self._holes:
+            return
+
+        kept = [i for i, ex in enumerate(self._items) if ex is not _REMOVED]
+        self._items = [self._items[i] for i in kept]
+        self._ids = [self._ids[i] for i in kept]
+        self._reindex()
+        self._holes = []
+        self._compactions += 1
+
+    def _physical(self, index):
+        """Position in ``_items`` of the exercise at index, counting
+        only exercises that were not removed"""
+        holes = self._holes
+        # NOTE: the number of holes before the position is the number
+        # of holes h at sorted index j with h - j <= index
+        lo, hi = 0, len(holes)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if holes[mid] - mid <= index:
+                lo = mid + 1
+            else:
+                hi = mid
+        return index + lo
+
+    def _logical(self, position):
+        """Index of the exercise at position in ``_items``"""
+        return position - bisect_left(self._holes, position)
+
+    def __iter__(self):
+        """Iterate over the exercises in insertion order. Every call
+        returns its own iterator, so iterations may be nested"""
+        if not self._holes:
+            return iter(self._items)
+        return (ex for ex in self._items if ex is not _REMOVED)
+
+    def __contains__(self, exercise):
+        """Membership operator"""
+        if not isinstance(exercise, Exercise):
+            return False
+
+        return exercise in self._positions
 
     def __eq__(self, other):
         """Comparison operator"""
         if type(self) == type(other):
+            if len(self) != len(other):
+                return False
+
+            if self._digest != other._digest:
+                return False
+
+            self._compact()
+            other._compact()
             return self._items == other._items
+        elif isinstance(other, ExercisesView):
+            return other == self
         else:
             return False
 
+    def __ne__(self, other):
+        return not self == other
+
     def __getitem__(self, index):
-        """Index operator"""
+        """Index operator. A slice gives a read-only
+        :obj:`ExercisesView` rather than a copy"""
+        if isinstance(index, slice):
+            return ExercisesView(self, index)
+
         if not isinstance(index, int):
             msg = 'Indicies must be integers, not {}'.format(type(index))
             raise TypeError(msg)
 
-        if index >= len(self._items) or abs(index) > len(self._items):
+        if index >= len(self) or abs(index) > len(self):
             error_msg = "Index out of range. Index {}".format(index)
             raise IndexError(error_msg)
 
-        return self._items[index]
+        if not self._holes:
+            return self._items[index]
+        if index < 0:
+            index += len(self)
+        return self._items[self._physical(index)]
 
     def update(self, old_exercise, new_exercise):
-        """Update existing exercise
+        """Update existing exercise. The new exercise takes the
+        position of the old one
 
         Examples
         --------
@@ -95,12 +256,25 @@ class Exercises(object):
         if not isinstance(new_exercise, Exercise):
             raise TypeError(msg.format("New", type(new_exercise)))
 
-        if old_exercise not in self._items:
+        if old_exercise not in self._positions:
             error_msg = "{} not in exercises".format(old_exercise)
             raise ValueError(error_msg)
 
-        idx = self._items.index(old_exercise)
+        if new_exercise != old_exercise and new_exercise in self._positions:
+            msg = "Cannot add duplicate exercise. Exercise {}"
+            raise Exception(msg.format(new_exercise))
+
+        idx = self._positions.pop(old_exercise)
+        old_exercise = self._items[idx]
+        if self._undo is not None:
+            self._undo.append(('update', old_exercise, new_exercise))
         self._items[idx] = new_exercise
+        self._positions[new_exercise] = idx
+        self._digest = (self._digest - (old_exercise._hash & MASK) +
+                        (new_exercise._hash & MASK)) & MASK
+        if self._tree is not None:
+            self._tree.remove(old_exercise)
+            self._tree.add(new_exercise)
 
     def remove(self, exercise):
         """Remove exercise from set based on
@@ -112,6 +286,7 @@ class Exercises(object):
         >>> tasks = Exercises()
         >>> ex = Exercise("Calculate powers of two numbers using argparse")
         >>> tasks.append(ex)
+        >>> tasks.remove(ex)
 
         Parameters
         ----------
@@ -122,13 +297,36 @@ class Exercises(object):
             msg = "Invalid type. Must be of type Exercise"
             raise TypeError(msg)
 
-        if exercise not in self._items:
+        if exercise not in self._positions:
             error_msg = "Exercise not in set. Exercice: {}".format(exercise)
             raise ValueError(error_msg)
 
-        return self._items.remove(exercise)
+        idx = self._positions.pop(exercise)
+        exercise_id = self._ids[idx]
+        del self._by_id[exercise_id]
+        weight = self._weights.pop(exercise_id, None)
+        exercise = self._items[idx]
+        if self._undo is not None:
+            self._undo.append(('remove', exercise, exercise_id, weight, idx,
+                               self._logical(idx), self._compactions))
+        self._digest = (self._digest - (exercise._hash & MASK)) & MASK
+        if self._tree is not None:
+            self._tree.remove(exercise)
+        if idx == len(self._items) - 1:
+            self._items.pop()
+            self._ids.pop()
+            # NOTE: holes left at the end are dropped along with it
+            while self._holes and self._holes[-1] == len(self._items) - 1:
+                self._holes.pop()
+                self._items.pop()
+                self._ids.pop()
+        else:
+            self._items[idx] = _REMOVED
+            insort(self._holes, idx)
+            if len(self._holes) * 2 > len(self._items):
+                self._compact()
 
-    def append(self, exercise):
+    def append(self, exercise, exercise_id=None):
         """Add exercise to the set of
         exercises
 
@@ -136,35 +334,308 @@ class Exercises(object):
         -------
         >>> from trainer.trainer import Exercises
         >>> tasks = Exercises()
-        >>> tasks.append("Calculate powers of two numbers using argparse")
+        >>> tasks.append(Exercise("Calculate powers of two numbers using argparse"))
+        1
 
         Parameters
         ----------
         exercise : :obj:`Exercise`
             programming exercise to add to the set of exercises
+        exercise_id : int, optional
+            id to give the exercise, which must be at least
+            :attr:`next_id`. By default the next id is allocated
+
+        Returns
+        -------
+        int
+            id of the exercise
         """
         if not isinstance(exercise, Exercise):
             msg = "Invalid type. Must be of type Exercise"
             raise TypeError(msg)
 
-        if exercise in self._items:
+        if exercise in self._positions:
             msg = "Cannot add duplicate exercise. Exercise {}".format(exercise)
             raise Exception(msg)
 
+        if exercise_id is None:
+            exercise_id = self._next_id
+        elif exercise_id < self._next_id:
+            msg = "Exercise id {} is lower than the next id {}"
+            raise ValueError(msg.format(exercise_id, self._next_id))
+
+        if self._undo is not None:
+            self._undo.append(('append', exercise, self._next_id))
+        self._positions[exercise] = len(self._items)
+        self._by_id[exercise_id] = len(self._items)
         self._items.append(exercise)
+        self._ids.append(exercise_id)
+        self._next_id = exercise_id + 1
+        self._digest = (self._digest + (exercise._hash & MASK)) & MASK
+        if self._tree is not None:
+            self._tree.add(exercise)
+        return exercise_id
+
+    @property
+    def next_id(self):
+        """Id the next appended exercise gets"""
+        return self._next_id
+
+    @property
+    def digest(self):
+        """Digest of the descriptions of the exercises, see
+        :mod:`digest`. Containers holding the same exercises have the
+        same digest"""
+        return self._digest
+
+    def diff(self, other):
+        """Exercises that differ between this container and other
+
+        Exercises are matched by description. The first diff of a
+        container builds a :class:`digest.DigestTree` of it, which
+        later changes keep up to date, so diffing again costs about
+        the number of differences rather than the size of the
+        containers.
+
+        Examples
+        --------
+        >>> from trainer.exercises import Exercises, Exercise
+        >>> ours, theirs = Exercises(), Exercises()
+        >>> ours.append(Exercise("Build a tree!"))
+        1
+        >>> theirs.append(Exercise("Build a tree!", 30))
+        1
+        >>> theirs.append(Exercise("Build a heap"))
+        2
+        >>> ours.diff(theirs)
+        CatalogDiff(added=[Build a heap], removed=[], changed=[(Build a tree!, Build a tree!)])
+
+        Parameters
+        ----------
+        other : :obj:`Exercises`
+
+        Returns
+        -------
+        :obj:`digest.CatalogDiff`
+            exercises only in other as ``added``, only in this
+            container as ``removed``, and pairs of this container's
+            and other's version of an exercise whose estimated
+            duration differs as ``changed``
+        """
+        return self._digest_tree().diff(other._digest_tree())
+
+    def sync(self, other):
+        """Add, remove and update exercises so this container holds
+        the exercises of other
+
+        Exercises that are kept stay in place with their ids and
+        weights. Those only in other are appended in the order they
+        have in other.
+
+        Parameters
+        ----------
+        other : :obj:`Exercises`
+
+        Returns
+        -------
+        :obj:`digest.CatalogDiff`
+            the changes made, see :meth:`diff`
+        """
+        diff = self.diff(other)
+        for exercise in diff.removed:
+            self.remove(exercise)
+        for old_exercise, new_exercise in diff.changed:
+            self.update(old_exercise, new_exercise)
+        for exercise in sorted(diff.added, key=other._positions.get):
+            self.append(exercise)
+        return diff
+
+    def _digest_tree(self):
+        if self._tree is None:
+            self._compact()
+            self._tree = DigestTree(self._items)
+        return self._tree
+
+    def get(self, exercise_id):
+        """Exercise with the given id
+
+        Examples
+        --------
+        >>> from trainer.exercises import Exercises, Exercise
+        >>> tasks = Exercises()
+        >>> tasks.append(Exercise("Build a tree!"))
+        1
+        >>> tasks.get(1)
+        Build a tree!
+
+        Parameters
+        ----------
+        exercise_id : int
+            id returned by :meth:`append`
+        """
+        if exercise_id not in self._by_id:
+            raise ValueError("No exercise with id {}".format(exercise_id))
+        return self._items[self._by_id[exercise_id]]
+
+    def id_of(self, exercise):
+        """Id of an exercise in the set"""
+        if exercise not in self:
+            error_msg = "Exercise not in set. Exercice: {}".format(exercise)
+            raise ValueError(error_msg)
+        return self._ids[self._positions[exercise]]
+
+    def remove_by_id(self, exercise_id):
+        """Remove the exercise with the given id and return it.
+        The ids of the other exercises are unchanged"""
+        exercise = self.get(exercise_id)
+        self.remove(exercise)
+        return exercise
+
+    def update_by_id(self, exercise_id, new_exercise):
+        """Replace the exercise with the given id, which the new
+        exercise keeps"""
+        self.update(self.get(exercise_id), new_exercise)
+
+    def weight(self, exercise_id):
+        """Sampling weight of the exercise with the given id"""
+        self.get(exercise_id)
+        return self._weights.get(exercise_id, DEFAULT_WEIGHT)
+
+    def set_weight(self, exercise_id, weight):
+        """Set the sampling weight of the exercise with the given id
+
+        Parameters
+        ----------
+        exercise_id : int
+            id returned by :meth:`append`
+        weight : float
+            relative chance of the exercise being drawn by a weighted
+            sample. An exercise with a weight of 0 is never drawn
+        """
+        self.get(exercise_id)
+        weight = check_weight(weight)
+        if self._undo is not None:
+            self._undo.append(('weight', exercise_id,
+                               self._weights.get(exercise_id)))
+        if weight == DEFAULT_WEIGHT:
+            self._weights.pop(exercise_id, None)
+        else:
+            self._weights[exercise_id] = weight
+
+    def weights(self):
+        """Dictionary of id to weight of the exercises whose weight
+        is not :data:`DEFAULT_WEIGHT`"""
+        return dict(self._weights)
+
+    def savepoint(self):
+        """Start recording changes so that :meth:`rollback` can undo
+        them. A savepoint taken while another is active nests in it,
+        and is released or rolled back on its own
+
+        Examples
+        --------
+        >>> from trainer.exercises import Exercises, Exercise
+        >>> tasks = Exercises()
+        >>> tasks.savepoint()
+        >>> tasks.append(Exercise("Build a tree!"))
+        1
+        >>> tasks.rollback()
+        >>> len(tasks)
+        0
+        """
+        if self._undo is None:
+            self._undo = []
+        self._marks.append(len(self._undo))
+
+    def release(self):
+        """Keep the changes made since the last :meth:`savepoint`.
+        They stay recorded for an enclosing savepoint, if any"""
+        self._marks.pop()
+        if not self._marks:
+            self._undo = None
+
+    def rollback(self):
+        """Undo the changes made since the last :meth:`savepoint`, in
+        time proportional to their number"""
+        if not self._marks:
+            return
+        mark = self._marks.pop()
+        undo, self._undo = self._undo, None
+        entries = undo[mark:]
+        del undo[mark:]
+        for entry in reversed(entries):
+            op = entry[0]
+            if op == 'append':
+                self.remove(entry[1])
+                self._next_id = entry[2]
+            elif op == 'remove':
+                self._restore(*entry[1:])
+            elif op == 'update':
+                self.update(entry[2], entry[1])
+            elif entry[2] is None:
+                self._weights.pop(entry[1], None)
+            else:
+                self._weights[entry[1]] = entry[2]
+        if self._marks:
+            self._undo = undo
+
+    def _restore(self, exercise, exercise_id, weight, idx, index,
+                 compactions):
+        """Put a removed exercise back at the slot idx it was removed
+        from, or at index if _items was compacted since"""
+        if compactions == self._compactions:
+            # NOTE: the slot is a hole unless the exercise was last,
+            # in which case it and any holes before it were popped
+            if idx < len(self._items):
+                del self._holes[bisect_left(self._holes, idx)]
+            else:
+                for i in xrange(len(self._items), idx):
+                    self._holes.append(i)
+                    self._items.append(_REMOVED)
+                    self._ids.append(None)
+                self._items.append(exercise)
+                self._ids.append(exercise_id)
+            self._items[idx] = exercise
+            self._ids[idx] = exercise_id
+            self._positions[exercise] = idx
+            self._by_id[exercise_id] = idx
+        else:
+            self._compact()
+            self._items.insert(index, exercise)
+            self._ids.insert(index, exercise_id)
+            self._reindex()
+            self._compactions += 1
+        if weight is not None:
+            self._weights[exercise_id] = weight
+        self._digest = (self._digest + (exercise._hash & MASK)) & MASK
+        if self._tree is not None:
+            self._tree.add(exercise)
+
+    def items(self):
+        """Iterate over (id, exercise) pairs in insertion order"""
+        pairs = izip(self._ids, self._items)
+        if not self._holes:
+            return pairs
+        return (pair for pair in pairs if pair[1] is not _REMOVED)
 
     def __len__(self):
         """Returns number of exercises"""
-        return len(self._items)
+        return len(self._positions)
 
-    def add_exercises_from_csv(self, filename):
+    def add_exercises_from_csv(self, filename, on_accept=None):
         """Add one or more exercuses using a csv file
 
+        The file is read one row at a time so memory use does not
+        grow with the size of the file. Rows whose exercise already
+        exists, in the set or earlier in the file, are skipped and
+        empty rows are counted as malformed.
+
         Examples
         --------
         >>> from trainer import Exercises
         >>> exercises = Exercises()
         >>> exercises.add_exercises_from_csv('my_exercises.csv')
+        CsvImport(accepted=3, skipped=0, malformed=0)
         >>> exercises[0]
         'Command line tool to calculate powers of two numbers using argparse'
 
@@ -177,22 +648,27 @@ class Exercises(object):
             programming exercise 1
             programming exercise 2
             programming exercise 3
+        on_accept: callable, optional
+            called with each exercise added to the set
+
+        Returns
+        -------
+        :obj:`CsvImport`
+            number of accepted, skipped and malformed rows
         """
-        if not os.path.isfile(filename):
-            error_msg = "no such file or directory: '{}'".format('fake.csv')
-            raise IOError(error_msg)
-
-        try:
-            tmp = []
-            with open(filename, 'rb') as f:
-                reader = csv.reader(f)
-                for row in reader:
-                    ex = Exercise(row[0])
-                    tmp.append(ex)
-        except:
-            raise
-
-        self._items += tmp
+        accepted = skipped = malformed = 0
+        for ex in read_csv(filename):
+            if ex is None:
+                malformed += 1
+            elif ex in self._positions:
+                skipped += 1
+            else:
+                self.append(ex)
+                accepted += 1
+                if on_accept is not None:
+                    on_accept(ex)
+
+        return CsvImport(accepted, skipped, malformed)
 
     def to_csv(self, filename):
         """Output the set of exercises into a csv file with one row
@@ -215,28 +691,531 @@ class Exercises(object):
 
         Parameters
         ----------
-        filename: str
-            filename (including csv extension) to output the exercises
+        filename: str or file
+            filename (including csv extension) to output the
+            exercises, or a file-like object such as sys.stdout.
+            See :func:`write_csv`
+        """
+        self._compact()
+        write_csv(self._items, filename)
+
+class PackedExercises(object):
+    """Columnar container of programming exercises
+
+    Descriptions are stored back to back as UTF-8 in one buffer with
+    an array of offsets marking where each one starts and ends, next
+    to arrays of the id and the estimated minutes (0 for none) of each
+    exercise. Exercise objects are only created when an item is
+    accessed, so a packed catalog costs about the size of its text
+    plus a few integers per exercise. It is meant for large catalogs
+    that are mostly read, see the ``packed`` option of
+    :class:`storage.PickleStorage`.
+
+    Ids and weights follow :obj:`Exercises`. Ids ascend along the
+    columns, so an exercise is found by id with a binary search, and
+    only the weights that differ from :data:`DEFAULT_WEIGHT` are kept.
+    Packing an :obj:`Exercises` and converting it back keeps them.
+
+    Membership and duplicate checks probe ``_slots``, an open
+    addressing hash table of positions that compares the packed bytes
+    of a candidate rather than keeping a string per exercise. It is
+    probed in the order dictionaries are, so similar descriptions do
+    not cluster, and rebuilt at twice the size once it is half full.
+
+    Examples
+    --------
+    >>> from exercises import Exercises, PackedExercises
+    >>> packed = PackedExercises(exercises)
+    >>> packed[0]
+    Calculate powers of two numbers using argparse
+    >>> exercises = packed.to_exercises()
+
+    Parameters
+    ----------
+    exercises : :obj:`Exercises` or iterable of :obj:`Exercise`, optional
+        unique exercises to pack. The ids and weights of an
+        :obj:`Exercises` are kept, other exercises are numbered from 1
+    """
+    def __init__(self, exercises=None):
+        self._buffer = bytearray()
+        self._offsets = array('l', [0])
+        self._ids = array('l')
+        self._durations = array('l')
+        self._weights = {}
+        self._next_id = 1
+        self._slots = array('l', [-1]) * 8
+        if isinstance(exercises, (Exercises, PackedExercises)):
+            for exercise_id, exercise in exercises.items():
+                self.append(exercise, exercise_id)
+            self._next_id = exercises.next_id
+            self._weights = exercises.weights()
+        elif exercises is not None:
+            for exercise in exercises:
+                self.append(exercise)
+
+    @classmethod
+    def from_records(cls, records, next_id):
+        """Pack ``(id, description, duration, weight)`` records, see
+        :mod:`records`, building the hash table once at the end
+
+        Parameters
+        ----------
+        records : iterable of tuple
+            records of unique exercises in ascending order of id
+        next_id : int
+            id the next appended exercise gets
+        """
+        packed = cls()
+        weights = packed._weights
+        pack = packed._pack
+        for exercise_id, description, duration, weight in records:
+            pack(_encode(description), exercise_id, duration)
+            if weight is not None:
+                weights[exercise_id] = weight
+        packed._next_id = next_id
+
+        size = 8
+        while size < 2 * len(packed._offsets):
+            size *= 2
+        packed._rehash(size)
+        return packed
+
+    def __len__(self):
+        """Returns number of exercises"""
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        """Index operator. Materializes the exercise at index. A
+        slice gives a read-only :obj:`ExercisesView`"""
+        if isinstance(index, slice):
+            return ExercisesView(self, index)
+
+        if not isinstance(index, int):
+            msg = 'Indicies must be integers, not {}'.format(type(index))
+            raise TypeError(msg)
+
+        if index >= len(self) or abs(index) > len(self):
+            error_msg = "Index out of range. Index {}".format(index)
+            raise IndexError(error_msg)
+
+        if index < 0:
+            index += len(self)
+        return self._exercise(index)
+
+    def __iter__(self):
+        buf = self._buffer
+        offsets = self._offsets
+        durations = self._durations
+        for i in xrange(len(offsets) - 1):
+            yield Exercise(str(buf[offsets[i]:offsets[i + 1]]),
+                           durations[i] or None)
+
+    def __contains__(self, exercise):
+        """Membership operator"""
+        if not isinstance(exercise, Exercise):
+            return False
+
+        return self._position(_encode(exercise.description)) is not None
+
+    def append(self, exercise, exercise_id=None):
+        """Add exercise to the end of the packed exercises
+
+        Parameters
+        ----------
+        exercise : :obj:`Exercise`
+            programming exercise to add to the set of exercises
+        exercise_id : int, optional
+            id to give the exercise, which must be at least
+            :attr:`next_id`. By default the next id is allocated
+
+        Returns
+        -------
+        int
+            id of the exercise
         """
-        if len(filename) < 4 or filename[-4:] != '.csv':
-            msg = "File '{}' provided is not a csv".format(filename)
-            raise IOError(msg)
+        if not isinstance(exercise, Exercise):
+            msg = "Invalid type. Must be of type Exercise"
+            raise TypeError(msg)
+
+        data = _encode(exercise.description)
+        slot = self._probe(data)
+        if self._slots[slot] != -1:
+            msg = "Cannot add duplicate exercise. Exercise {}".format(exercise)
+            raise Exception(msg)
+
+        if exercise_id is None:
+            exercise_id = self._next_id
+        elif exercise_id < self._next_id:
+            msg = "Exercise id {} is lower than the next id {}"
+            raise ValueError(msg.format(exercise_id, self._next_id))
+
+        self._pack(data, exercise_id, exercise.duration)
+        self._next_id = exercise_id + 1
+        if len(self._offsets) * 2 > len(self._slots):
+            self._rehash(len(self._slots) * 2)
+        else:
+            self._slots[slot] = len(self._offsets) - 2
+        return exercise_id
+
+    @property
+    def next_id(self):
+        """Id the next appended exercise gets"""
+        return self._next_id
+
+    def get(self, exercise_id):
+        """Exercise with the given id"""
+        i = bisect_left(self._ids, exercise_id)
+        if i == len(self._ids) or self._ids[i] != exercise_id:
+            raise ValueError("No exercise with id {}".format(exercise_id))
+        return self._exercise(i)
+
+    def id_of(self, exercise):
+        """Id of an exercise in the set"""
+        i = None
+        if isinstance(exercise, Exercise):
+            i = self._position(_encode(exercise.description))
+        if i is None:
+            error_msg = "Exercise not in set. Exercice: {}".format(exercise)
+            raise ValueError(error_msg)
+        return self._ids[i]
+
+    def items(self):
+        """Iterate over (id, exercise) pairs in insertion order"""
+        return izip(self._ids, self)
+
+    def weight(self, exercise_id):
+        """Sampling weight of the exercise with the given id"""
+        self.get(exercise_id)
+        return self._weights.get(exercise_id, DEFAULT_WEIGHT)
+
+    def weights(self):
+        """Dictionary of id to weight of the exercises whose weight
+        is not :data:`DEFAULT_WEIGHT`"""
+        return dict(self._weights)
+
+    def to_exercises(self):
+        """Materialize every exercise into an :obj:`Exercises`, keeping
+        their ids and weights"""
+        return Exercises(self)
+
+    def _exercise(self, i):
+        return Exercise(str(self._buffer[self._offsets[i]:
+                                         self._offsets[i + 1]]),
+                        self._durations[i] or None)
+
+    def _pack(self, data, exercise_id, duration):
+        self._buffer += data
+        self._offsets.append(len(self._buffer))
+        self._ids.append(exercise_id)
+        self._durations.append(duration or 0)
+
+    def _probe(self, data):
+        """Slot of the hash table holding the position of the packed
+        bytes data, or the empty slot they would go in"""
+        slots = self._slots
+        mask = len(slots) - 1
+        buf, offsets = self._buffer, self._offsets
+        size = len(data)
+        perturb = hash(data) & _HASH_MASK
+        j = perturb & mask
+        while True:
+            i = slots[j]
+            if i == -1 or (offsets[i + 1] - offsets[i] == size
+                           and buf[offsets[i]:offsets[i + 1]] == data):
+                return j
+            perturb >>= 5
+            j = (5 * j + 1 + perturb) & mask
+
+    def _position(self, data):
+        """Position of the packed bytes data, or None"""
+        i = self._slots[self._probe(data)]
+        return None if i == -1 else i
+
+    def _rehash(self, size):
+        """Rebuild the hash table with size slots, a power of two"""
+        slots = array('l', [-1]) * size
+        mask = size - 1
+        buf, offsets = self._buffer, self._offsets
+        for i in xrange(len(offsets) - 1):
+            perturb = hash(str(buf[offsets[i]:offsets[i + 1]])) & _HASH_MASK
+            j = perturb & mask
+            while slots[j] != -1:
+                perturb >>= 5
+                j = (5 * j + 1 + perturb) & mask
+            slots[j] = i
+        self._slots = slots
+
+class ExercisesView(object):
+    """Read-only view of a range of positions of a container of
+    exercises
+
+    A view keeps no exercises of its own. It reads them from the
+    container when it is indexed or iterated, so taking a page of a
+    large catalog costs the size of the page rather than a copy of
+    the catalog. Slicing a view gives another view of the same
+    container.
+
+    The positions are fixed when the view is taken. Exercises added,
+    removed or updated in the container afterwards show through,
+    like changes to a list seen through its indices.
 
-        try:
-            with open(filename, 'wb') as f:
-                writer = csv.writer(f)
-                for ex in self._items:
-                    writer.writerow(ex.to_list())
-        except:
-            if os.path.isfile(filename):
-                os.remove(filename)
+    Examples
+    --------
+    >>> from exercises import Exercises, ExercisesView
+    >>> page = exercises[20:40]
+    >>> len(page)
+    20
+    >>> page[0] == exercises[20]
+    True
+    >>> everything = ExercisesView(exercises)
 
-            raise
+    Parameters
+    ----------
+    exercises : :obj:`Exercises` or sequence of :obj:`Exercise`
+        container supporting ``len`` and integer indices
+    index : slice, optional
+        positions of the view, all of them by default
+    """
+    __slots__ = ('_exercises', '_start', '_step', '_len')
+
+    def __init__(self, exercises, index=slice(None)):
+        start, stop, step = index.indices(len(exercises))
+        self._exercises = exercises
+        self._start = start
+        self._step = step
+        self._len = len(xrange(start, stop, step))
+
+    def __len__(self):
+        """Returns number of exercises in the view"""
+        return self._len
+
+    def __getitem__(self, index):
+        """Index operator. A slice gives a view of the same
+        container"""
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            view = ExercisesView.__new__(ExercisesView)
+            view._exercises = self._exercises
+            view._start = self._start + start * self._step
+            view._step = self._step * step
+            view._len = len(xrange(start, stop, step))
+            return view
+
+        if not isinstance(index, int):
+            msg = 'Indicies must be integers, not {}'.format(type(index))
+            raise TypeError(msg)
+
+        if index >= self._len or abs(index) > self._len:
+            error_msg = "Index out of range. Index {}".format(index)
+            raise IndexError(error_msg)
+
+        if index < 0:
+            index += self._len
+        return self._exercises[self._start + index * self._step]
+
+    def __iter__(self):
+        stop = self._start + self._len * self._step
+        if type(self._exercises) is not Exercises:
+            return (self._exercises[i]
+                    for i in xrange(self._start, stop, self._step))
+
+        # NOTE: the items of Exercises are read directly, skipping the
+        # checks of the index operator on every exercise
+        exercises = self._exercises
+        indices = xrange(self._start, stop, self._step)
+        if exercises._holes:
+            indices = imap(exercises._physical, indices)
+        return imap(exercises._items.__getitem__, indices)
+
+    def __contains__(self, exercise):
+        """Membership operator. Constant time on :obj:`Exercises`,
+        a scan of the view otherwise"""
+        if not isinstance(exercise, Exercise):
+            return False
+
+        if type(self._exercises) is Exercises:
+            position = self._exercises._positions.get(exercise)
+            if position is None:
+                return False
+            position = self._exercises._logical(position)
+            i, remainder = divmod(position - self._start, self._step)
+            return remainder == 0 and 0 <= i < self._len
+        return any(ex == exercise for ex in self)
+
+    def __eq__(self, other):
+        """Views are equal to views and containers holding the same
+        exercises in the same order"""
+        if not isinstance(other, (ExercisesView, Exercises)):
+            return False
+        return len(self) == len(other) and all(
+            a == b for a, b in izip(self, other))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'ExercisesView({})'.format(list(self))
+
+def read_csv(filename):
+    """Yield an exercise for each row of a csv file, one row at a
+    time. Empty rows and rows with an invalid duration yield None so
+    callers can count them
+
+    Parameters
+    ----------
+    filename: str
+        csv file with one programming exercise per row and an
+        optional second column with its estimated minutes
+    """
+    if not os.path.isfile(filename):
+        error_msg = "no such file or directory: '{}'".format(filename)
+        raise IOError(error_msg)
+
+    with open(filename, 'rb') as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip():
+                yield None
+            elif len(row) < 2 or not row[1].strip():
+                yield Exercise(row[0])
+            else:
+                try:
+                    yield Exercise(row[0], int(row[1]))
+                except ValueError:
+                    yield None
+        metrics.count('bytes_read', f.tell())
+
+def write_csv(exercises, output):
+    """Write one row per exercise to a csv file or file-like object
+
+    A file is written to a temporary file next to it that is renamed
+    over it once complete, so a failure leaves any previous export in
+    place rather than a truncated file.
+
+    Examples
+    --------
+    >>> import sys
+    >>> from exercises import write_csv
+    >>> write_csv(tasks, 'test.csv')
+    >>> write_csv(tasks, sys.stdout)
+    Exercise 1
+    Exercise 2
+
+    Parameters
+    ----------
+    exercises: iterable of :obj:`Exercise`
+        exercises to write, consumed once
+    output: str or file
+        filename (including csv extension) or an open file-like
+        object with a write method
+    """
+    if not isinstance(output, basestring):
+        _write_rows(exercises, output)
+        return
+
+    if len(output) < 4 or output[-4:] != '.csv':
+        msg = "File '{}' provided is not a csv".format(output)
+        raise IOError(msg)
+
+    tmp = output + '.tmp'
+    try:
+        with open(tmp, 'wb', CSV_WRITE_BUFFER) as f:
+            _write_rows(exercises, f)
+            metrics.count('bytes_written', f.tell())
+        os.rename(tmp, output)
+    except:
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+        raise
+
+def _write_rows(exercises, f):
+    """Write exercises as csv rows in chunks. A chunk without
+    durations where no description needs quoting is joined and
+    written in one call, which gives the same output as csv.writer
+    far faster"""
+    writer = csv.writer(f)
+    # NOTE: a generator rather than iter() as an Exercises object
+    # starts over once it is exhausted
+    exercises = (ex for ex in exercises)
+    while True:
+        chunk = list(islice(exercises, _CSV_CHUNK))
+        if not chunk:
+            return
+
+        if any(ex.duration is not None for ex in chunk):
+            writer.writerows(ex.to_list() for ex in chunk)
+            continue
+
+        descriptions = [ex.description for ex in chunk]
+        text = '\n'.join(descriptions)
+        if (all(descriptions) and text.count('\n') == len(chunk) - 1
+                and not _NEEDS_QUOTING(text)):
+            f.write(text.replace('\n', '\r\n'))
+            f.write('\r\n')
+        else:
+            writer.writerows((desc,) for desc in descriptions)
+
+def check_weight(weight):
+    """Weight as a float, raising ValueError unless it is a finite
+    number that is not negative"""
+    try:
+        value = float(weight)
+    except (TypeError, ValueError):
+        value = None
+
+    if (value is None or isinstance(weight, basestring) or not value >= 0
+            or value == float('inf')):
+        msg = "Weight must be a number that is not negative, not {}"
+        raise ValueError(msg.format(weight))
+    return value
+
+def _encode(description):
+    """UTF-8 bytes of a description"""
+    if isinstance(description, unicode):
+        return description.encode('utf-8')
+    return description
 
 class Exercise(object):
-    """Represents a single exercise"""
-    def __init__(self, description):
+    """Represents a single exercise
+
+    Exercises are immutable and use slots rather than a per instance
+    dictionary, as catalogs may hold millions of them.
+
+    An exercise may carry an estimate of the whole minutes it takes
+    to complete. Exercises are identified by their description alone,
+    so two exercises with the same description but different
+    estimates are equal.
+    """
+    __slots__ = ('_description', '_hash', '_duration')
+
+    def __init__(self, description, duration=None):
+        if duration is not None and (not isinstance(duration, (int, long))
+                                     or duration <= 0):
+            msg = "Duration must be a positive number of minutes, not {}"
+            raise ValueError(msg.format(duration))
         self._description = description
+        self._hash = hash(description)
+        self._duration = duration
+
+    def __reduce__(self):
+        if self._duration is None:
+            return (Exercise, (self._description,))
+        return (Exercise, (self._description, self._duration))
+
+    def __setstate__(self, state):
+        """Restore exercises pickled before slots were used"""
+        self._description = state['_description']
+        self._hash = hash(self._description)
+        self._duration = state.get('_duration')
+
+    @property
+    def description(self):
+        """Text of the exercise"""
+        return self._description
+
+    @property
+    def duration(self):
+        """Estimated minutes to complete the exercise, or None"""
+        return self._duration
 
     def __repr__(self):
         return self._description
@@ -250,6 +1229,12 @@ class Exercise(object):
         else:
             return False
 
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return self._hash
+
     def to_list(self):
         """Creates a list object of the properties
         of the exercise
@@ -261,8 +1246,15 @@ class Exercise(object):
         >>> row = ex.to_list()
         >>> row
         >>> ['Build a tree!']
+        >>> Exercise("Build a tree!", duration=30).to_list()
+        >>> ['Build a tree!', 30]
         """
-        return [self._description]
+        if self._duration is None:
+            return [self._description]
+        return [self._description, self._duration]
+
+# Placeholder for the slot of a removed exercise in Exercises._items
+_REMOVED = object()
 
 if __name__ == '__main__':
     pass
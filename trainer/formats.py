@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.formats
+===============
+
+Streaming encodings of the records of a file of programming
+exercises, see :mod:`records`. Each encodes the meta dictionary, the
+records and an end marker, so a file cut short is told apart from a
+complete one::
+
+    pickle    pickles of the meta dictionary and of lists of up to
+              1024 records at the highest protocol, then None
+    jsonl     a JSON object of the meta dictionary and a JSON array
+              per record, one per line, then a null line
+    binary    the next id and count as little endian 64 bit
+              integers, then each record prefixed by its length as a
+              little endian 32 bit integer, then a length of 0
+
+A record is written as a little endian 64 bit id, 64 bit duration
+(0 for none) and 64 bit float weight (-1 for the default) followed by
+the UTF-8 description, so the binary format only holds records of the
+fields of :data:`records.SCHEMA_VERSION` 1.
+
+Descriptions are read back from JSON Lines and binary files as UTF-8
+encoded str, as from csv files.
+"""
+
+import json
+import struct
+from collections import namedtuple
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+Format = namedtuple('Format', 'write read')
+
+DEFAULT_FORMAT = 'pickle'
+
+_CHUNK = 1024
+_BLOCK = 64 * 1024
+_META = struct.Struct('<qq')
+_LENGTH = struct.Struct('<I')
+_FIELDS = struct.Struct('<qqd')
+_RECORD = struct.Struct('<Iqqd')
+
+def _truncated(f):
+    return IOError("{} ends before its last record".format(f.name))
+
+def _write_pickle(f, meta, records):
+    pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+    # NOTE: records hold no shared or recursive references, so the
+    # memo, which would keep every record written alive, is not needed
+    pickler.fast = True
+    pickler.dump(meta)
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == _CHUNK:
+            pickler.dump(chunk)
+            chunk = []
+    if chunk:
+        pickler.dump(chunk)
+    pickler.dump(None)
+
+def _read_pickle(f):
+    unpickler = pickle.Unpickler(f)
+
+    def load():
+        try:
+            return unpickler.load()
+        except EOFError:
+            raise _truncated(f)
+
+    def iter_records():
+        while True:
+            chunk = load()
+            if chunk is None:
+                return
+            for record in chunk:
+                yield record
+
+    return load(), iter_records()
+
+def _write_jsonl(f, meta, records):
+    encode = json.JSONEncoder(separators=(',', ':')).encode
+    f.write(encode(meta) + '\n')
+    lines = []
+    for record in records:
+        lines.append(encode(record))
+        if len(lines) == _CHUNK:
+            lines.append('')
+            f.write('\n'.join(lines))
+            lines = []
+    lines.append('null\n')
+    f.write('\n'.join(lines))
+
+def _utf8(value):
+    if type(value) is unicode:
+        return value.encode('utf-8')
+    return value
+
+def _read_jsonl(f):
+    decode = json.JSONDecoder().decode
+    line = f.readline()
+    if not line:
+        raise _truncated(f)
+
+    def iter_records():
+        try:
+            for line in f:
+                record = decode(line)
+                if record is None:
+                    return
+                yield tuple([_utf8(value) for value in record])
+        except ValueError:
+            # NOTE: a line cut short by a torn write
+            raise IOError("{} holds an invalid record".format(f.name))
+        raise _truncated(f)
+
+    return decode(line), iter_records()
+
+def _write_binary(f, meta, records):
+    f.write(_META.pack(meta['next_id'], meta['count']))
+    pack = _RECORD.pack
+    parts = []
+    for exercise_id, description, duration, weight in records:
+        if type(description) is unicode:
+            description = description.encode('utf-8')
+        parts.append(pack(_FIELDS.size + len(description), exercise_id,
+                          duration or 0, -1.0 if weight is None else weight))
+        parts.append(description)
+        if len(parts) >= 2 * _CHUNK:
+            f.write(''.join(parts))
+            parts = []
+    parts.append(_LENGTH.pack(0))
+    f.write(''.join(parts))
+
+def _read_binary(f):
+    data = f.read(_META.size)
+    if len(data) < _META.size:
+        raise _truncated(f)
+    next_id, count = _META.unpack(data)
+
+    def iter_records():
+        # NOTE: records are parsed out of blocks read ahead rather
+        # than with two reads each
+        unpack_length = _LENGTH.unpack_from
+        unpack_fields = _FIELDS.unpack_from
+        buf, pos = '', 0
+        while True:
+            if len(buf) - pos < _LENGTH.size:
+                buf, pos = buf[pos:] + f.read(_BLOCK), 0
+                if len(buf) < _LENGTH.size:
+                    raise _truncated(f)
+            length, = unpack_length(buf, pos)
+            if not length:
+                return
+
+            start = pos + _LENGTH.size
+            end = start + length
+            if end > len(buf):
+                buf = buf[pos:] + f.read(max(_BLOCK, end - len(buf)))
+                start, end, pos = start - pos, end - pos, 0
+                if end > len(buf):
+                    raise _truncated(f)
+            exercise_id, duration, weight = unpack_fields(buf, start)
+            yield (exercise_id, buf[start + _FIELDS.size:end], duration or None,
+                   None if weight < 0 else weight)
+            pos = end
+
+    return {'next_id': next_id, 'count': count}, iter_records()
+
+FORMATS = {
+    'pickle': Format(_write_pickle, _read_pickle),
+    'jsonl': Format(_write_jsonl, _read_jsonl),
+    'binary': Format(_write_binary, _read_binary),
+}
+
+def get_format(name):
+    """The :obj:`Format` called name
+
+    Raises
+    ------
+    ValueError
+        if there is no such format
+    """
+    try:
+        return FORMATS[name]
+    except KeyError:
+        msg = "Unknown format {!r}, expected one of {}"
+        raise ValueError(msg.format(name, ', '.join(sorted(FORMATS))))
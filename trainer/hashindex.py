@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.hashindex
+=================
+
+On-disk index of description digests used to check whether an
+exercise exists without loading the whole snapshot
+"""
+
+import os
+import struct
+import hashlib
+from array import array
+from bisect import bisect_left
+
+from journal import fsync_dir
+from instrumentation import metrics
+
+_MAGIC = 'TRIDX002'
+_HEADER = struct.Struct('>8sQdQQQ')
+
+def description_digest(description):
+    """Stable 64 bit digest of a description"""
+    if isinstance(description, unicode):
+        description = description.encode('utf-8')
+    return struct.unpack('<q', hashlib.md5(description).digest()[:8])[0]
+
+def fingerprint(path):
+    """Size, modification time and inode of the snapshot at path"""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime, st.st_ino
+
+class HashIndex(object):
+    """Sorted array of the description digests of a snapshot
+
+    The index records the size, modification time and inode of the
+    snapshot it was built from and is ignored once the snapshot
+    changes. A digest match means the exercise exists unless two
+    descriptions share a 64 bit digest, which is vanishingly rare.
+    The index also records the next exercise id of the snapshot.
+
+    Parameters
+    ----------
+    digests : :obj:`array.array`
+        sorted description digests
+    next_id : int, optional
+        id the next exercise added to the snapshot gets
+    """
+    def __init__(self, digests, next_id=1):
+        self._digests = digests
+        self.next_id = next_id
+
+    def __len__(self):
+        return len(self._digests)
+
+    def __contains__(self, description):
+        digest = description_digest(description)
+        i = bisect_left(self._digests, digest)
+        return i < len(self._digests) and self._digests[i] == digest
+
+    @classmethod
+    def open(cls, path, snapshot):
+        """Load the index at path if it matches snapshot, otherwise
+        return None
+
+        Parameters
+        ----------
+        path : str
+            index file
+        snapshot : str
+            snapshot file the index should describe
+        """
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return None
+
+                magic, size, mtime, ino, count, next_id = _HEADER.unpack(header)
+                if magic != _MAGIC or (size, mtime, ino) != fingerprint(snapshot):
+                    return None
+
+                digests = array('l')
+                digests.fromfile(f, count)
+        except (IOError, OSError, EOFError):
+            return None
+
+        return cls(digests, next_id)
+
+    @staticmethod
+    def write(path, descriptions, snapshot, next_id=1):
+        """Build and atomically write the index of snapshot
+
+        Parameters
+        ----------
+        path : str
+            index file
+        descriptions : iterable of str
+            descriptions of every exercise in the snapshot
+        snapshot : str
+            snapshot file the index describes
+        next_id : int, optional
+            id the next exercise added to the snapshot gets
+        """
+        digests = array('l', sorted(description_digest(desc)
+                                    for desc in descriptions))
+        size, mtime, ino = fingerprint(snapshot)
+        tmp = '{}.tmp{}'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, size, mtime, ino, len(digests),
+                                 next_id))
+            digests.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+            metrics.count('bytes_written', f.tell())
+        os.rename(tmp, path)
+        fsync_dir(path)
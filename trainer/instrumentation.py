@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.instrumentation
+=======================
+
+Timers and counters around the expensive operations of the trainer
+app such as loading, saving, sampling, importing and exporting.
+
+Instrumentation is off by default. While off, :meth:`Metrics.timer`
+returns a shared context manager that does nothing and
+:meth:`Metrics.count` returns straight away, so the instrumented code
+pays for one attribute check per operation.
+"""
+
+import timeit
+import contextlib
+
+class _NullTimer(object):
+    """Context manager that does nothing, used while disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class Metrics(object):
+    """Collects the total time and number of calls per timer and a
+    running total per counter
+
+    Examples
+    --------
+    >>> from trainer.instrumentation import Metrics
+    >>> metrics = Metrics()
+    >>> metrics.enable()
+    >>> with metrics.timer('load'):
+    ...     metrics.count('bytes_read', 1024)
+    >>> metrics.as_dict()['counters']
+    {'bytes_read': 1024}
+    """
+    def __init__(self):
+        self.enabled = False
+        self._timers = {}
+        self._counters = {}
+
+    def enable(self):
+        """Start collecting metrics"""
+        self.enabled = True
+
+    def disable(self):
+        """Stop collecting metrics, keeping those collected so far"""
+        self.enabled = False
+
+    def reset(self):
+        """Drop every metric collected so far"""
+        self._timers = {}
+        self._counters = {}
+
+    def timer(self, name):
+        """Context manager timing the block it wraps under name"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return self._time(name)
+
+    @contextlib.contextmanager
+    def _time(self, name):
+        start = timeit.default_timer()
+        try:
+            yield
+        finally:
+            elapsed = timeit.default_timer() - start
+            calls, total = self._timers.get(name, (0, 0.0))
+            self._timers[name] = (calls + 1, total + elapsed)
+
+    def count(self, name, n=1):
+        """Add n to the counter called name"""
+        if self.enabled:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def as_dict(self):
+        """Metrics collected so far
+
+        Returns
+        -------
+        dict
+            ``{'timers': {name: {'calls': int, 'seconds': float}},
+            'counters': {name: int}}``
+        """
+        timers = {}
+        for name, (calls, total) in self._timers.iteritems():
+            timers[name] = {'calls': calls, 'seconds': total}
+        return {'timers': timers, 'counters': dict(self._counters)}
+
+    def summary(self):
+        """Metrics collected so far as a table for the command line"""
+        lines = ["{:<24} {:>8} {:>12}".format('timer', 'calls', 'ms')]
+        for name, (calls, total) in sorted(self._timers.iteritems()):
+            lines.append("{:<24} {:>8} {:>12.2f}".format(name, calls,
+                                                         total * 1000))
+
+        lines.append("{:<24} {:>21}".format('counter', 'total'))
+        for name, value in sorted(self._counters.iteritems()):
+            lines.append("{:<24} {:>21}".format(name, value))
+        return '\n'.join(lines)
+
+# NOTE: shared by every module of the app so a single switch turns
+# instrumentation on for the whole process
+metrics = Metrics()
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.journal
+===============
+
+Crash safe persistence helpers and an append-only write-ahead
+journal of changes made to a set of programming exercises
+"""
+
+import os
+import struct
+import zlib
+import contextlib
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from exercises import Exercise
+from instrumentation import metrics
+
+_HEADER = struct.Struct('>II')
+
+def fsync_dir(path):
+    """Flush the directory entry of path to disk"""
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextlib.contextmanager
+def atomic_file(path):
+    """Write to path through a temporary file that is flushed to disk
+    and renamed over path once the block completes. Readers either
+    see the previous file or the complete new one, never a partial
+    write, and the previous file is kept if the block raises"""
+    tmp = '{}.tmp{}'.format(path, os.getpid())
+    try:
+        with metrics.timer('save'), open(tmp, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+            metrics.count('bytes_written', f.tell())
+        os.rename(tmp, path)
+    except:
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+        raise
+
+    fsync_dir(path)
+
+def atomic_dump(obj, path):
+    """Pickle obj to path through :func:`atomic_file`"""
+    with atomic_file(path) as f:
+        pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+
+def apply_record(exercises, record):
+    """Apply a journal record to a set of exercises
+
+    Records describe the state an exercise should end up in rather
+    than a step that must succeed, so replaying a record that is
+    already reflected in the exercises leaves them unchanged. Ids
+    are never given out twice, so a record whose id is below the
+    next id of the exercises was already applied to them: adds are
+    skipped and removes and updates only touch the exercise held
+    under that id. Replaying a rotated journal over the snapshot a
+    compaction wrote from it keeps the ids of the snapshot.
+
+    Parameters
+    ----------
+    exercises : :obj:`Exercises`
+        the set of exercises to update
+    record : tuple
+        ``('add', description, id, duration)``,
+        ``('remove', description, id)``,
+        ``('update', old_description, new_description, id, duration)``
+        or ``('weight', id, weight)``. The id is that of the exercise
+        added, removed, updated or weighted. It is None when it was
+        not known as the record was written, and missing from records
+        written before ids existed. Adds without an id allocate the
+        next id as they are applied. The duration is the estimate of
+        the added or new exercise, None or missing when it has none
+    """
+    op = record[0]
+    if op == 'add':
+        exercise = Exercise(record[1], record_duration(record))
+        if exercise not in exercises and not _is_given_out(exercises,
+                                                           record, 2):
+            exercises.append(exercise, _record_id(exercises, record, 2))
+    elif op == 'remove':
+        exercise = Exercise(record[1])
+        if _holds(exercises, exercise, record, 2):
+            exercises.remove(exercise)
+    elif op == 'update':
+        old_exercise = Exercise(record[1])
+        new_exercise = Exercise(record[2], record_duration(record))
+        if not _holds(exercises, old_exercise, record, 3):
+            if (new_exercise not in exercises
+                    and not _is_given_out(exercises, record, 3)):
+                exercises.append(new_exercise,
+                                 _record_id(exercises, record, 3))
+        elif old_exercise != new_exercise and new_exercise in exercises:
+            exercises.remove(old_exercise)
+        else:
+            exercises.update(old_exercise, new_exercise)
+    elif op == 'weight':
+        try:
+            exercises.set_weight(record[1], record[2])
+        except ValueError:
+            # NOTE: the exercise was removed after the record was written
+            pass
+    else:
+        raise ValueError("Unknown journal record {}".format(record))
+
+def record_duration(record):
+    """Duration of the exercise an add or update record ends with"""
+    field = 3 if record[0] == 'add' else 4
+    return record[field] if len(record) > field else None
+
+def _record_id(exercises, record, field):
+    """Id carried by a record if it can still be given out"""
+    exercise_id = record[field] if len(record) > field else None
+    if exercise_id is not None and exercise_id >= exercises.next_id:
+        return exercise_id
+    return None
+
+def _is_given_out(exercises, record, field):
+    """True if the id carried by a record was given out before, so
+    the exercises already hold what became of it"""
+    exercise_id = record[field] if len(record) > field else None
+    return exercise_id is not None and exercise_id < exercises.next_id
+
+def _holds(exercises, exercise, record, field):
+    """True if exercises hold exercise under the id carried by a
+    record, or at all when the record carries none"""
+    if exercise not in exercises:
+        return False
+    exercise_id = record[field] if len(record) > field else None
+    return exercise_id is None or exercises.id_of(exercise) == exercise_id
+
+class Journal(object):
+    """Append-only log of changes stored next to a data file
+
+    Each record is written as a length and checksum header followed
+    by a pickled tuple, and every append is flushed to disk before
+    returning. A record that was only partly written when the process
+    died fails its checksum and is discarded on the next read.
+
+    While a compaction is folding the log into a new snapshot the log
+    is rotated to ``<path>.old`` so new records go to a fresh file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.rotated_path = path + '.old'
+
+    def append(self, records):
+        """Append records to the journal with a single flush to disk
+
+        Parameters
+        ----------
+        records : list of tuple
+            journal records, see :func:`apply_record`
+        """
+        chunks = []
+        for record in records:
+            payload = pickle.dumps(record, 2)
+            crc = zlib.crc32(payload) & 0xffffffff
+            chunks.append(_HEADER.pack(len(payload), crc))
+            chunks.append(payload)
+
+        data = ''.join(chunks)
+        with open(self.path, 'ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        metrics.count('journal_records', len(records))
+        metrics.count('bytes_written', len(data))
+
+    def size(self):
+        """Size of the active journal in bytes"""
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def is_empty(self):
+        """True when there are no records waiting to be compacted"""
+        return not (self.size() or os.path.isfile(self.rotated_path))
+
+    def records(self):
+        """Yield the records of the rotated and active journal in
+        the order they were written"""
+        for path in (self.rotated_path, self.path):
+            if os.path.isfile(path):
+                for record in self._read(path):
+                    yield record
+
+    def replay(self, exercises):
+        """Apply every journal record to exercises. Returns the
+        number of records replayed"""
+        count = 0
+        with metrics.timer('journal_replay'):
+            for record in self.records():
+                apply_record(exercises, record)
+                count += 1
+        return count
+
+    def repair(self):
+        """Truncate a torn record left at the end of the active
+        journal so later appends are not hidden behind it"""
+        if not os.path.isfile(self.path):
+            return
+
+        end = 0
+        for end in self._offsets(self.path):
+            pass
+
+        if end < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def rotate(self):
+        """Move the active journal aside so a snapshot can be written
+        from it while new records go to a fresh journal"""
+        if os.path.isfile(self.rotated_path):
+            raise IOError("Journal is already being compacted")
+
+        if os.path.isfile(self.path):
+            os.rename(self.path, self.rotated_path)
+            fsync_dir(self.path)
+
+    def discard_rotated(self):
+        """Remove the rotated journal once its snapshot is on disk"""
+        if os.path.isfile(self.rotated_path):
+            os.remove(self.rotated_path)
+            fsync_dir(self.path)
+
+    def clear(self):
+        """Remove all journal records once a snapshot holding them
+        is safely on disk"""
+        for path in (self.rotated_path, self.path):
+            if os.path.isfile(path):
+                os.remove(path)
+        fsync_dir(self.path)
+
+    def _read(self, path):
+        """Yield records from path, dropping a torn final record"""
+        with open(path, 'rb') as f:
+            for payload, _ in self._payloads(f):
+                yield pickle.loads(payload)
+
+    def _offsets(self, path):
+        """Yield the end offset of each intact record in path"""
+        with open(path, 'rb') as f:
+            for _, end in self._payloads(f):
+                yield end
+
+    def _payloads(self, f):
+        offset = 0
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+
+            length, crc = _HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+
+            if zlib.crc32(payload) & 0xffffffff != crc:
+                return
+
+            offset += _HEADER.size + length
+            yield payload, offset
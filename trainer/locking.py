@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.locking
+===============
+
+Advisory file locks that let several processes share one data file.
+
+Readers hold a shared lock on ``<path>.lock`` while they read the
+data and writers hold an exclusive one while they change it. The
+lock file also holds a version counter that writers increment with
+every change they persist, so a process can tell whether the
+exercises it read are still current before it writes.
+
+Locks use :func:`fcntl.flock` and only track the version where
+:mod:`fcntl` is not available.
+"""
+
+import os
+import struct
+import contextlib
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_VERSION = struct.Struct('>Q')
+_SHARED = 'shared'
+_EXCLUSIVE = 'exclusive'
+
+class StaleDataError(IOError):
+    """Raised when data read before another process changed it is
+    about to be written back"""
+
+class FileLock(object):
+    """Reentrant shared or exclusive lock on a lock file
+
+    Locks are held per instance. Two instances on the same path
+    exclude each other even within one process, so a thread that
+    needs the lock on its own uses its own instance.
+
+    Examples
+    --------
+    >>> from trainer.locking import FileLock
+    >>> lock = FileLock('data.pkl.lock')
+    >>> with lock.exclusive():
+    ...     lock.bump()
+    1
+
+    Parameters
+    ----------
+    path : str
+        lock file, created on first use
+    """
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._mode = None
+        self._depth = 0
+
+    @property
+    def is_held(self):
+        """True while the lock is held in either mode"""
+        return self._depth > 0
+
+    @property
+    def is_exclusive(self):
+        """True while the lock is held exclusively"""
+        return self._mode == _EXCLUSIVE
+
+    def shared(self):
+        """Context manager holding the lock shared. Does nothing more
+        if the lock is already held"""
+        return self._hold(_SHARED)
+
+    def exclusive(self):
+        """Context manager holding the lock exclusively
+
+        A shared lock held by this instance is upgraded for the
+        block and downgraded after it. Another process may take the
+        exclusive lock in between, so check the version again after
+        an upgrade.
+        """
+        return self._hold(_EXCLUSIVE)
+
+    def version(self):
+        """Version counter in the lock file, 0 for a new file"""
+        with self.shared():
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            data = os.read(self._fd, _VERSION.size)
+        if len(data) < _VERSION.size:
+            return 0
+        return _VERSION.unpack(data)[0]
+
+    def bump(self):
+        """Increment the version counter and return the new version.
+        The lock must be held exclusively"""
+        if not self.is_exclusive:
+            raise IOError("Version bumped without the exclusive lock")
+
+        version = self.version() + 1
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, _VERSION.pack(version))
+        os.fsync(self._fd)
+        return version
+
+    @contextlib.contextmanager
+    def _hold(self, mode):
+        if self._depth and (mode == _SHARED or self.is_exclusive):
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+            return
+
+        if self._depth:
+            self._flock(_EXCLUSIVE)
+            self._mode = _EXCLUSIVE
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                self._flock(_SHARED)
+                self._mode = _SHARED
+            return
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0644)
+        try:
+            self._flock(mode)
+        except:
+            os.close(self._fd)
+            self._fd = None
+            raise
+
+        self._mode = mode
+        self._depth = 1
+        try:
+            yield
+        finally:
+            self._depth = 0
+            self._mode = None
+            fd, self._fd = self._fd, None
+            # NOTE: closing the descriptor releases the lock
+            os.close(fd)
+
+    def _flock(self, mode):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if mode == _EXCLUSIVE
+                        else fcntl.LOCK_SH)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.migrations
+==================
+
+Upgrades of files of programming exercises written by older versions
+of the trainer to the current :data:`records.SCHEMA_VERSION`.
+
+A migration is registered with :func:`migration` for the version it
+upgrades from and turns one record of that version into a record of
+the next. :func:`migrate` streams the records of a file through every
+migration up to the current version into a new file, a chunk at a
+time, and renames the new file over the old one once it is complete.
+Version 0 files are pickled :obj:`Exercises` and are unpickled whole.
+"""
+
+from records import (SCHEMA_VERSION, SchemaVersionError, file_format,
+                     file_compression, read_records, write_records)
+
+# NOTE: migrations by the version they upgrade from
+MIGRATIONS = {}
+
+# NOTE: records migrated between calls to a progress callback
+PROGRESS_INTERVAL = 10000
+
+def migration(version):
+    """Register a function that upgrades a record of version to a
+    record of the next version
+
+    Examples
+    --------
+    >>> from trainer.migrations import migration
+    >>> @migration(1)
+    ... def add_tags(record):
+    ...     return record + ((),)
+    """
+    def register(function):
+        if version in MIGRATIONS:
+            msg = "A migration from version {} is already registered"
+            raise ValueError(msg.format(version))
+        MIGRATIONS[version] = function
+        return function
+    return register
+
+@migration(0)
+def _exercise_fields(record):
+    """Version 0 records hold the :obj:`Exercise` itself, version 1
+    records its description and estimated duration"""
+    exercise_id, exercise, weight = record
+    return exercise_id, exercise.description, exercise.duration, weight
+
+def migrate(path, progress=None, format=None, compression=None):
+    """Upgrade the file at path to :data:`records.SCHEMA_VERSION`
+
+    The migrated records are written in the format and compression
+    of the file, or in another one of :data:`formats.FORMATS` and
+    :data:`compression.CODECS`, converting a file that is already at
+    the current version. The file is replaced
+    atomically, so it holds either the old or the migrated records
+    should the migration be interrupted. The caller is responsible
+    for keeping other processes from writing to the file meanwhile.
+
+    Examples
+    --------
+    >>> from trainer.migrations import migrate
+    >>> migrate('data.pkl')
+    0
+
+    Parameters
+    ----------
+    path : str
+    progress : callable, optional
+        called with the number of records migrated so far and the
+        total every :data:`PROGRESS_INTERVAL` records and once done
+    format : str, optional
+        name of the format to write the records in
+    compression : str, optional
+        name of the codec to compress the file with, or
+        :data:`compression.NO_COMPRESSION`
+
+    Returns
+    -------
+    int
+        the version the file was migrated from
+
+    Raises
+    ------
+    SchemaVersionError
+        if the file is newer than this version of the trainer or no
+        migration is registered from one of the versions in between
+    """
+    current = file_format(path), file_compression(path)
+    format = format or current[0]
+    compression = compression or current[1]
+    with open(path, 'rb') as f:
+        version, meta, records = read_records(f)
+        if version > SCHEMA_VERSION:
+            msg = "{} holds records of version {}, newer than {}"
+            raise SchemaVersionError(msg.format(path, version, SCHEMA_VERSION))
+        if version == SCHEMA_VERSION and (format, compression) == current:
+            return version
+
+        steps = []
+        for step in xrange(version, SCHEMA_VERSION):
+            if step not in MIGRATIONS:
+                msg = "No migration from version {} of {}"
+                raise SchemaVersionError(msg.format(step, path))
+            steps.append(MIGRATIONS[step])
+
+        write_records(path, meta,
+                      _migrated(records, steps, meta['count'], progress),
+                      SCHEMA_VERSION, format, compression)
+    return version
+
+def _migrated(records, steps, total, progress):
+    done = 0
+    for record in records:
+        for step in steps:
+            record = step(record)
+        yield record
+
+        done += 1
+        if progress is not None and done % PROGRESS_INTERVAL == 0:
+            progress(done, total)
+    if progress is not None:
+        progress(done, total)
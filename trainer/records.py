@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.records
+===============
+
+Versioned file format of the programming exercises of a
+:class:`storage.PickleStorage`. A file starts with a header line
+naming the version of its records and the format they are encoded
+in, see :mod:`formats`::
+
+    header    ``trainer-exercises <version> <format>`` and a newline
+    meta      dictionary with the next exercise id and the number of
+              exercises
+    records   tuples ``(id, description, duration, weight)`` with a
+              weight of None for exercises with the default weight
+    end       marker after the last record
+
+Files whose header names no format are pickled. Records are written
+and read a few at a time, so a file can be copied from one version
+or format to another without holding all of it in memory, see
+:mod:`migrations`. The whole file may be compressed, see
+:mod:`compression`, in which case it is decompressed as it is read.
+
+Files without the header are pickled :obj:`Exercises` as written
+before records were versioned and are version 0. They are unpickled
+whole and read as records ``(id, exercise, weight)``.
+"""
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+from cStringIO import StringIO
+
+from exercises import Exercises, Exercise, PackedExercises
+from journal import atomic_file
+from formats import DEFAULT_FORMAT, get_format
+from compression import (NO_COMPRESSION, get_codec, detect_compression,
+                         decompress_head, compressed, decompressed)
+
+# NOTE: version of the records written by this version of the trainer.
+# Bumping it requires registering a migration from the previous one
+SCHEMA_VERSION = 1
+
+_MAGIC = 'trainer-exercises '
+
+class SchemaVersionError(IOError):
+    """Raised when a file holds records of another version than
+    :data:`SCHEMA_VERSION` and cannot or may not be migrated"""
+
+def file_version(path):
+    """Version of the records in the file at path"""
+    return _file_header(path)[0]
+
+def file_format(path):
+    """Name of the format of the records in the file at path"""
+    return _file_header(path)[1]
+
+def file_compression(path):
+    """Name of the codec the file at path is compressed with"""
+    with open(path, 'rb') as f:
+        return detect_compression(f)
+
+def read_records(f):
+    """Read the records of an open file
+
+    Parameters
+    ----------
+    f : file
+        file opened for reading in binary mode, compressed or not
+
+    Returns
+    -------
+    tuple
+        the version, the meta dictionary and an iterator over the
+        records of the file. Records are read from f as the iterator
+        advances
+
+    Raises
+    ------
+    IOError
+        if the file ends before the records do
+    """
+    compression = detect_compression(f)
+    if compression != NO_COMPRESSION:
+        f = decompressed(f, compression)
+    version, format = _read_header(f)
+    if version == 0:
+        exercises = pickle.load(f)
+        meta = {'next_id': exercises.next_id, 'count': len(exercises)}
+        weights = exercises.weights()
+        records = ((exercise_id, exercise, weights.get(exercise_id))
+                   for exercise_id, exercise in exercises.items())
+        return version, meta, records
+
+    meta, records = get_format(format).read(f)
+    return version, meta, records
+
+def write_records(path, meta, records, version=SCHEMA_VERSION,
+                  format=DEFAULT_FORMAT, compression=NO_COMPRESSION):
+    """Write records to path through :func:`journal.atomic_file`
+
+    Parameters
+    ----------
+    path : str
+    meta : dict
+        ``next_id`` and ``count`` of the exercises
+    records : iterable of tuple
+        records of the given version, consumed a few at a time
+    version : int, optional
+    format : str, optional
+        name of one of :data:`formats.FORMATS`
+    compression : str, optional
+        name of one of :data:`compression.CODECS` to compress the
+        file with
+    """
+    write = get_format(format).write
+    if compression != NO_COMPRESSION:
+        get_codec(compression)
+    with atomic_file(path) as raw, compressed(raw, compression) as f:
+        f.write('{}{} {}\n'.format(_MAGIC, version, format))
+        write(f, meta, records)
+
+def exercise_records(exercises):
+    """Iterate over the records of exercises"""
+    weights = exercises.weights()
+    for exercise_id, exercise in exercises.items():
+        yield (exercise_id, exercise.description, exercise.duration,
+               weights.get(exercise_id))
+
+def dump_exercises(exercises, path, format=DEFAULT_FORMAT,
+                   compression=NO_COMPRESSION):
+    """Write exercises to path as records of :data:`SCHEMA_VERSION`
+    in the named format, compressed with the named codec"""
+    meta = {'next_id': exercises.next_id, 'count': len(exercises)}
+    write_records(path, meta, exercise_records(exercises), format=format,
+                  compression=compression)
+
+def load_exercises(f, packed=False):
+    """Read :obj:`Exercises` from an open file
+
+    Parameters
+    ----------
+    f : file
+        file opened for reading in binary mode
+    packed : bool, optional
+        read the records straight into a read-mostly
+        :obj:`exercises.PackedExercises` instead
+
+    Raises
+    ------
+    SchemaVersionError
+        if the records are not of :data:`SCHEMA_VERSION`
+    """
+    version, meta, records = read_records(f)
+    if version != SCHEMA_VERSION:
+        msg = "{} holds records of version {}, expected {}"
+        raise SchemaVersionError(msg.format(f.name, version, SCHEMA_VERSION))
+
+    if packed:
+        return PackedExercises.from_records(records, meta['next_id'])
+
+    items, ids, weights = [], [], {}
+    for exercise_id, description, duration, weight in records:
+        items.append(Exercise(description, duration))
+        ids.append(exercise_id)
+        if weight is not None:
+            weights[exercise_id] = weight
+
+    # NOTE: restored the way unpickling does, which indexes the
+    # exercises in one pass instead of appending them one at a time
+    exercises = Exercises.__new__(Exercises)
+    exercises.__setstate__({'_items': items, '_ids': ids,
+                            '_next_id': meta['next_id'], '_weights': weights})
+    return exercises
+
+def _file_header(path):
+    """Version and format of the records in the file at path, only
+    decompressing the start of a compressed file"""
+    with open(path, 'rb') as f:
+        compression = detect_compression(f)
+        if compression == NO_COMPRESSION:
+            return _read_header(f)
+        return _read_header(StringIO(decompress_head(f, compression)))
+
+def _read_header(f):
+    """Version and format of the records of f, leaving f at the
+    first record"""
+    header = f.read(len(_MAGIC))
+    if header != _MAGIC:
+        f.seek(0)
+        return 0, DEFAULT_FORMAT
+
+    line = f.readline()
+    fields = line.split()
+    try:
+        version = int(fields[0])
+    except (IndexError, ValueError):
+        raise IOError("Invalid header {!r} in {}".format(line, f.name))
+    return version, fields[1] if len(fields) > 1 else DEFAULT_FORMAT
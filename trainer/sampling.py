@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.sampling
+================
+
+Random selection of programming exercises, uniform or weighted
+"""
+
+import random
+from itertools import islice
+
+# NOTE: draws in a row that land on an index without weight before
+# weighted_sample_indices scans the weights instead of the tree
+_MAX_MISSES = 16
+
+def sample_indices(n, k, rng=None):
+    """Draw k distinct indices from range(n) in O(k) time and memory
+
+    This is a partial Fisher-Yates shuffle over a virtual index array.
+    Only the swapped slots are recorded in a dictionary so the array
+    itself is never built.
+
+    Examples
+    --------
+    >>> from trainer.sampling import sample_indices
+    >>> sample_indices(10, 3)
+    [7, 2, 9]
+
+    Parameters
+    ----------
+    n : int
+        size of the population
+    k : int
+        number of indices to draw. None are drawn if it is negative
+    rng : :obj:`random.Random`, optional
+        random number generator to draw with
+    """
+    if k <= 0:
+        return []
+
+    if k > n:
+        msg = "{} samples requested but only {} available".format(k, n)
+        raise ValueError(msg)
+
+    return list(islice(iter_sample_indices(n, rng), k))
+
+def iter_sample_indices(n, rng=None):
+    """Yield every index of range(n) once in random order, doing only
+    as much of the shuffle as the caller consumes
+
+    Useful when some draws may be rejected, as the caller can keep
+    drawing until it has enough accepted indices.
+
+    Parameters
+    ----------
+    n : int
+        size of the population
+    rng : :obj:`random.Random`, optional
+        random number generator to draw with
+    """
+    if rng is None:
+        rng = random
+
+    swapped = {}
+    for i in xrange(n):
+        j = rng.randint(i, n - 1)
+        yield swapped.get(j, j)
+        swapped[j] = swapped.get(i, i)
+
+class FenwickTree(object):
+    """Binary indexed tree of weights
+
+    Setting a weight, reading the total and finding the index at a
+    given point of the running sum of the weights all take
+    ``O(log n)`` time.
+
+    Parameters
+    ----------
+    weights : iterable of float, optional
+        initial weights, built into the tree in O(n) time
+    """
+    def __init__(self, weights=()):
+        self._weights = [float(w) for w in weights]
+        self.positive = sum(1 for w in self._weights if w > 0)
+        # NOTE: 1-based, _tree[i] holds the sum of the weights in
+        # (i - lowbit(i), i]
+        tree = [0.0] + self._weights
+        for i in xrange(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+        self._top = 1
+        while self._top * 2 < len(tree):
+            self._top *= 2
+
+    def __len__(self):
+        return len(self._weights)
+
+    def append(self, weight):
+        """Add a weight at the end"""
+        self._weights.append(0.0)
+        i = len(self._weights)
+        # NOTE: the new node covers (i - lowbit(i), i], all but its
+        # own weight of which are already summed in the tree
+        node = self.prefix_sum(i - 1) - self.prefix_sum(i - (i & -i))
+        self._tree.append(node)
+        if self._top * 2 < len(self._tree):
+            self._top *= 2
+        self[i - 1] = float(weight)
+
+    def __getitem__(self, i):
+        """Weight at index i"""
+        return self._weights[i]
+
+    def __setitem__(self, i, weight):
+        """Set the weight at index i"""
+        delta = weight - self._weights[i]
+        self.positive += (weight > 0) - (self._weights[i] > 0)
+        self._weights[i] = weight
+        i += 1
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def total(self):
+        """Sum of all weights"""
+        return self.prefix_sum(len(self._weights))
+
+    def prefix_sum(self, n):
+        """Sum of the first n weights"""
+        total = 0.0
+        tree = self._tree
+        while n > 0:
+            total += tree[n]
+            n -= n & -n
+        return total
+
+    def find(self, point):
+        """Smallest index whose running sum exceeds point, for a point
+        from 0 up to the total. Indices with no weight are never
+        found"""
+        tree = self._tree
+        pos = 0
+        step = self._top if len(tree) > 1 else 0
+        while step:
+            nxt = pos + step
+            if nxt < len(tree) and tree[nxt] <= point:
+                pos = nxt
+                point -= tree[nxt]
+            step //= 2
+        return min(pos, len(self._weights) - 1)
+
+def weighted_sample_indices(tree, k, rng=None):
+    """Draw k distinct indices with a chance proportional to their
+    weight in a :obj:`FenwickTree`, in O(k log n) time
+
+    Each drawn index has its weight set to zero until all k are
+    drawn, so it cannot be drawn twice, and is then restored. Weights
+    far apart enough for the running sums to lose the small ones are
+    drawn by an O(n) scan instead.
+
+    Parameters
+    ----------
+    tree : :obj:`FenwickTree`
+        weights of the population
+    k : int
+        number of indices to draw
+    rng : :obj:`random.Random`, optional
+        random number generator to draw with
+    """
+    if k > tree.positive:
+        msg = "{} samples requested but only {} have a weight"
+        raise ValueError(msg.format(k, tree.positive))
+
+    if rng is None:
+        rng = random
+
+    drawn = []
+    removed = []
+    misses = 0
+    try:
+        while len(drawn) < k:
+            if misses < _MAX_MISSES:
+                i = tree.find(rng.random() * tree.total())
+            else:
+                i = _scan(tree, rng)
+            if tree[i] <= 0:
+                # NOTE: zeroing a weight far larger than the others
+                # can cancel them out of the running sums, which then
+                # lead to drawn indices only. The draw falls back to
+                # the exact weights once this keeps happening
+                misses += 1
+                continue
+
+            misses = 0
+            drawn.append(i)
+            removed.append((i, tree[i]))
+            tree[i] = 0.0
+    finally:
+        for i, weight in reversed(removed):
+            tree[i] = weight
+    return drawn
+
+def _scan(tree, rng):
+    """Draw an index of tree by a linear scan of its weights, exact
+    whatever the rounding of the running sums"""
+    weights = [tree[i] for i in xrange(len(tree))]
+    point = rng.random() * sum(w for w in weights if w > 0)
+    last = None
+    for i, weight in enumerate(weights):
+        if weight > 0:
+            last = i
+            point -= weight
+            if point < 0:
+                return i
+    return last
+
+class WeightedSampler(object):
+    """Keyed items drawn with a chance proportional to their weight
+
+    Examples
+    --------
+    >>> from trainer.sampling import WeightedSampler
+    >>> sampler = WeightedSampler([(1, 'a'), (2, 'b')], {2: 3.0})
+    >>> sampler.set_weight(1, 0.5)
+    >>> sampler.sample(1)
+    ['b']
+
+    Parameters
+    ----------
+    items : iterable of tuple
+        (key, item) pairs
+    weights : dict, optional
+        weight by key of the items whose weight is not default
+    default : float, optional
+        weight of the other items
+    """
+    def __init__(self, items, weights=None, default=1.0):
+        weights = weights or {}
+        self._items = []
+        self._positions = {}
+        tree_weights = []
+        for key, item in items:
+            self._positions[key] = len(self._items)
+            self._items.append(item)
+            tree_weights.append(weights.get(key, default))
+        self._tree = FenwickTree(tree_weights)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def set_weight(self, key, weight):
+        """Set the weight of the item with the given key"""
+        self._tree[self._positions[key]] = weight
+
+    def sample(self, k, rng=None):
+        """Draw k distinct items, see :func:`weighted_sample_indices`"""
+        return [self._items[i]
+                for i in weighted_sample_indices(self._tree, k, rng)]
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.search
+==============
+
+Full-text search over the descriptions of programming exercises.
+
+Descriptions are split into lowercase alphanumeric tokens and an
+inverted index maps each token to the sorted ids of the exercises
+that contain it, together with how often it occurs. A query is a
+list of terms that must all match, where a term ending in ``*``
+matches every token starting with it::
+
+    binary tree
+    sort* list
+
+Results are ranked by the number of times the terms occur in the
+description, then by id, so a query costs time in the number of
+exercises matching its rarest term rather than in the size of the
+catalog.
+
+The index is saved next to the catalog in ``<path>`` together with a
+stamp of the catalog it describes. Changes made afterwards are
+appended to ``<path>.journal`` along with the stamp of the catalog
+once they are persisted. Opening the index replays the journal and
+rebuilds the index from the catalog only when the last stamp no
+longer matches, for example when the catalog was changed by a
+process that did not update the index.
+"""
+
+import os
+import re
+import heapq
+from array import array
+from bisect import bisect_left, insort
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from journal import Journal, atomic_dump
+from instrumentation import metrics
+
+_VERSION = 1
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+# NOTE: each posting is the exercise id shifted left by _TF_BITS
+# with the term frequency, capped at _MAX_TF, in the low bits. The
+# postings of a term sort by id and fit in a single array
+_TF_BITS = 8
+_MAX_TF = (1 << _TF_BITS) - 1
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens of text, as utf-8 strings"""
+    if isinstance(text, str):
+        text = text.decode('utf-8', 'replace')
+    return [token.encode('utf-8') for token in _TOKEN.findall(text.lower())]
+
+def parse_query(query):
+    """List of (token, is_prefix) terms of a query. Only the last
+    token of a word ending in ``*`` is a prefix"""
+    terms = []
+    for word in query.split():
+        tokens = tokenize(word)
+        for i, token in enumerate(tokens):
+            terms.append((token, word.endswith('*') and i == len(tokens) - 1))
+    return terms
+
+def log_changes(path, records, stamp):
+    """Append changes of the catalog to the journal of the index at
+    path, if there is one
+
+    Parameters
+    ----------
+    path : str
+        index file
+    records : list of tuple
+        ``('add', id, description)`` or ``('remove', id, description)``
+    stamp : hashable
+        stamp of the catalog once the changes are persisted
+    """
+    if os.path.isfile(path):
+        Journal(path + '.journal').append(list(records) + [('stamp', stamp)])
+
+class SearchIndex(object):
+    """Inverted index of exercise descriptions
+
+    Examples
+    --------
+    >>> from trainer.search import SearchIndex
+    >>> index = SearchIndex([(1, "Build a binary tree"), (2, "Sort a list")])
+    >>> index.search("tree")
+    [1]
+    >>> index.add(3, "Balance a binary tree")
+    >>> index.search("bin* tree")
+    [1, 3]
+
+    Parameters
+    ----------
+    items : iterable of (int, str), optional
+        ids and descriptions of the exercises to index
+    """
+    # NOTE: journal size in bytes past which opening the index
+    # folds the journal into a new index file
+    LIMIT = 1024 * 1024
+
+    def __init__(self, items=()):
+        postings = {}
+        count = 0
+        for exercise_id, description in items:
+            for term, tf in _term_frequencies(description).iteritems():
+                values = postings.get(term)
+                if values is None:
+                    values = postings[term] = []
+                values.append(_posting(exercise_id, tf))
+            count += 1
+
+        self._postings = {}
+        for term, values in postings.iteritems():
+            values.sort()
+            self._postings[term] = array('l', values)
+        self._terms = sorted(self._postings)
+        self._count = count
+
+    def __len__(self):
+        """Returns number of exercises indexed"""
+        return self._count
+
+    def add(self, exercise_id, description):
+        """Index the description of the exercise with the given id"""
+        for term, tf in _term_frequencies(description).iteritems():
+            value = _posting(exercise_id, tf)
+            postings = self._postings.get(term)
+            if postings is None:
+                self._postings[term] = array('l', [value])
+                insort(self._terms, term)
+            elif postings[-1] < value:
+                # NOTE: ids are allocated in increasing order, so new
+                # exercises are appended
+                postings.append(value)
+            else:
+                postings.insert(bisect_left(postings, value), value)
+        self._count += 1
+
+    def remove(self, exercise_id, description):
+        """Drop the exercise with the given id and description from
+        the index"""
+        for term in set(tokenize(description)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+
+            pos = bisect_left(postings, exercise_id << _TF_BITS)
+            if pos < len(postings) and postings[pos] >> _TF_BITS == exercise_id:
+                del postings[pos]
+                if not postings:
+                    del self._postings[term]
+                    del self._terms[bisect_left(self._terms, term)]
+        self._count -= 1
+
+    def apply(self, record):
+        """Apply an ``add`` or ``remove`` record, see :func:`log_changes`"""
+        op, exercise_id, description = record
+        if op == 'add':
+            self.add(exercise_id, description)
+        elif op == 'remove':
+            self.remove(exercise_id, description)
+        else:
+            raise ValueError("Unknown search record {}".format(record))
+
+    def search(self, query, limit=None):
+        """Ids of the exercises matching every term of the query,
+        best match first
+
+        Parameters
+        ----------
+        query : str
+            terms to match, see :func:`parse_query`
+        limit : int, optional
+            maximum number of ids returned
+
+        Returns
+        -------
+        list of int
+            ids ordered by the total number of times the terms occur
+            in the description, then by id. Empty for an empty query
+        """
+        terms = [self._matches(token, is_prefix)
+                 for token, is_prefix in parse_query(query)]
+        if not terms:
+            return []
+
+        terms.sort(key=lambda postings: sum(len(p) for p in postings))
+        scores = {}
+        for postings in terms[0]:
+            for value in postings:
+                exercise_id = value >> _TF_BITS
+                scores[exercise_id] = (scores.get(exercise_id, 0) +
+                                       (value & _MAX_TF))
+
+        for postings in terms[1:]:
+            if not scores:
+                break
+            if len(postings) == 1:
+                scores = _intersect(scores, postings[0])
+            else:
+                # NOTE: a prefix matching several tokens is merged
+                # once instead of searching each of its lists
+                merged = {}
+                for values in postings:
+                    for value in values:
+                        exercise_id = value >> _TF_BITS
+                        if exercise_id in scores:
+                            merged[exercise_id] = (merged.get(exercise_id, 0)
+                                                   + (value & _MAX_TF))
+                scores = dict((exercise_id, scores[exercise_id] + tf)
+                              for exercise_id, tf in merged.iteritems())
+
+        key = lambda item: (-item[1], item[0])
+        if limit is None:
+            ranked = sorted(scores.iteritems(), key=key)
+        else:
+            ranked = heapq.nsmallest(limit, scores.iteritems(), key=key)
+        return [exercise_id for exercise_id, _ in ranked]
+
+    def save(self, path, stamp):
+        """Atomically write the index to path and drop its journal
+
+        Parameters
+        ----------
+        path : str
+            index file
+        stamp : hashable
+            stamp of the catalog the index describes
+        """
+        # NOTE: raw array bytes unpickle far faster than arrays
+        state = {'version': _VERSION, 'stamp': stamp, 'count': self._count,
+                 'terms': self._terms,
+                 'postings': [self._postings[term].tostring()
+                              for term in self._terms]}
+        atomic_dump(state, path)
+        Journal(path + '.journal').clear()
+
+    @classmethod
+    def load(cls, path, stamp):
+        """Load the index at path and replay its journal. Returns
+        None if there is no index or it does not describe the catalog
+        with the given stamp"""
+        try:
+            with metrics.timer('search_load'), open(path, 'rb') as f:
+                state = pickle.load(f)
+                metrics.count('bytes_read', f.tell())
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        if state.get('version') != _VERSION:
+            return None
+
+        index = cls()
+        index._count = state['count']
+        index._terms = state['terms']
+        for term, data in zip(state['terms'], state['postings']):
+            postings = index._postings[term] = array('l')
+            postings.fromstring(data)
+
+        last_stamp = state['stamp']
+        journal = Journal(path + '.journal')
+        for record in journal.records():
+            if record[0] == 'stamp':
+                last_stamp = record[1]
+            else:
+                index.apply(record)
+
+        if last_stamp != stamp:
+            return None
+        return index
+
+    @classmethod
+    def open(cls, path, stamp, items):
+        """Load the index at path, or build and save it if it is
+        missing or stale
+
+        Parameters
+        ----------
+        path : str
+            index file
+        stamp : hashable
+            stamp of the catalog
+        items : callable
+            returns the (id, :obj:`Exercise`) pairs of the catalog.
+            Only called when the index is rebuilt
+        """
+        index = cls.load(path, stamp)
+        if index is None:
+            with metrics.timer('search_build'):
+                index = cls((exercise_id, exercise.description)
+                            for exercise_id, exercise in items())
+            index.save(path, stamp)
+        elif Journal(path + '.journal').size() > cls.LIMIT:
+            index.save(path, stamp)
+        return index
+
+    def _matches(self, token, is_prefix):
+        """Posting arrays of the tokens a query term matches"""
+        if not is_prefix:
+            postings = self._postings.get(token)
+            return [postings] if postings is not None else []
+
+        matches = []
+        terms = self._terms
+        for pos in xrange(bisect_left(terms, token), len(terms)):
+            if not terms[pos].startswith(token):
+                break
+            matches.append(self._postings[terms[pos]])
+        return matches
+
+def _posting(exercise_id, tf):
+    return (exercise_id << _TF_BITS) | min(tf, _MAX_TF)
+
+def _term_frequencies(description):
+    frequencies = {}
+    for token in tokenize(description):
+        frequencies[token] = frequencies.get(token, 0) + 1
+    return frequencies
+
+def _intersect(scores, postings):
+    """Scores of the ids in scores that also have a posting, plus
+    the term frequency of the posting"""
+    matched = {}
+    size = len(postings)
+    for exercise_id, score in scores.iteritems():
+        pos = bisect_left(postings, exercise_id << _TF_BITS)
+        if pos < size and postings[pos] >> _TF_BITS == exercise_id:
+            matched[exercise_id] = score + (postings[pos] & _MAX_TF)
+    return matched
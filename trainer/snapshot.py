@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.snapshot
+================
+
+Compact read-only snapshot of the programming exercises that is
+read through mmap. The file holds a header, a table of offsets, a
+table of ids, a table of durations, a hash table of the descriptions,
+a table of weights and the UTF-8 descriptions back to back::
+
+    header    magic, version, count, blob size, next id, the
+              fingerprint of the pickle file the snapshot was made
+              from and the number of weights
+    offsets   count + 1 little endian 64 bit offsets into the blob
+    ids       count little endian 64 bit ids in ascending order
+    durations count little endian 64 bit durations in minutes, 0 for
+              exercises without an estimate
+    slots     open addressing table of little endian 64 bit index
+              + 1 of each exercise, 0 for an empty slot, placed by
+              the digest of its description and probed linearly. The
+              number of slots is the power of two from twice count up
+    weights   little endian 64 bit id and double weight of each
+              exercise whose weight is not the default, by id
+    blob      descriptions, the i-th spanning offsets[i:i + 2]
+
+Nothing is decoded when a snapshot is opened. Each exercise is read
+from the mapped file when it is accessed.
+"""
+
+import os
+import mmap
+import struct
+from array import array
+
+from exercises import Exercise, ExercisesView, DEFAULT_WEIGHT
+from journal import fsync_dir
+from hashindex import description_digest
+from sampling import sample_indices
+from instrumentation import metrics
+
+_MAGIC = 'TRSNAP01'
+_VERSION = 5
+_HEADER = struct.Struct('<8sIQQQQdQQ')
+_OFFSET = struct.Struct('<q')
+_BOUNDS = struct.Struct('<qq')
+_WEIGHT = struct.Struct('<qd')
+
+def write_snapshot(path, exercises, source=None):
+    """Atomically write exercises to a snapshot at path
+
+    The descriptions are streamed to the file so only the offsets,
+    ids and durations tables are held in memory.
+
+    Examples
+    --------
+    >>> from trainer.snapshot import write_snapshot, MappedSnapshot
+    >>> write_snapshot('data.snap', exercises)
+    >>> len(MappedSnapshot('data.snap'))
+    10
+
+    Parameters
+    ----------
+    path : str
+        snapshot file to write
+    exercises : :obj:`Exercises` or sized iterable of :obj:`Exercise`
+        exercises in the order they should be stored. The ids and
+        weights of an :obj:`Exercises` are kept, other exercises are
+        numbered from 1
+    source : tuple, optional
+        fingerprint of the file the exercises were loaded from, see
+        :func:`hashindex.fingerprint`
+    """
+    count = len(exercises)
+    if hasattr(exercises, 'items'):
+        items = exercises.items()
+        next_id = exercises.next_id
+        weights = sorted(exercises.weights().iteritems())
+    else:
+        items = enumerate(exercises, 1)
+        next_id = count + 1
+        weights = []
+    src_size, src_mtime, src_ino = source or (0, 0.0, 0)
+    table_start = _HEADER.size
+    mask = _slot_count(count) - 1
+    blob_start = (table_start + _OFFSET.size * (3 * count + mask + 2)
+                  + _WEIGHT.size * len(weights))
+
+    offsets = array('l', [0])
+    ids = array('l')
+    durations = array('l')
+    slots = array('l', [0]) * (mask + 1)
+    tmp = '{}.tmp{}'.format(path, os.getpid())
+    try:
+        with open(tmp, 'wb') as f:
+            f.seek(blob_start)
+            for exercise_id, exercise in items:
+                data = exercise.description
+                if isinstance(data, unicode):
+                    data = data.encode('utf-8')
+                f.write(data)
+                slot = description_digest(data) & mask
+                while slots[slot]:
+                    slot = (slot + 1) & mask
+                slots[slot] = len(ids) + 1
+                offsets.append(offsets[-1] + len(data))
+                ids.append(exercise_id)
+                durations.append(exercise.duration or 0)
+
+            if len(ids) != count:
+                raise ValueError("Exercises changed while writing snapshot")
+
+            f.seek(0)
+            f.write(_HEADER.pack(_MAGIC, _VERSION, count, offsets[-1],
+                                 next_id, src_size, src_mtime, src_ino,
+                                 len(weights)))
+            _write_table(f, offsets)
+            _write_table(f, ids)
+            _write_table(f, durations)
+            _write_table(f, slots)
+            f.write(''.join(_WEIGHT.pack(exercise_id, weight)
+                            for exercise_id, weight in weights))
+            f.flush()
+            os.fsync(f.fileno())
+            metrics.count('bytes_written', blob_start + offsets[-1])
+        os.rename(tmp, path)
+    except:
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+        raise
+
+    fsync_dir(path)
+
+def _slot_count(count):
+    """Number of slots of the hash table of count descriptions"""
+    slots = 1
+    while slots < 2 * count:
+        slots *= 2
+    return slots
+
+def _write_table(f, values):
+    """Write an array of integers as little endian 64 bit values"""
+    if values.itemsize != _OFFSET.size or struct.pack('=l', 1) != _OFFSET.pack(1):
+        f.write(''.join(_OFFSET.pack(value) for value in values))
+    else:
+        values.tofile(f)
+
+class MappedSnapshot(object):
+    """Read-only exercises served straight from a mapped snapshot
+
+    Parameters
+    ----------
+    path : str
+        snapshot file written by :func:`write_snapshot`
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise IOError("Not a trainer snapshot: '{}'".format(path))
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, count, blob_size, next_id, src_size, src_mtime,
+         src_ino, weight_count) = _HEADER.unpack_from(self._map, 0)
+        self._table = _HEADER.size
+        self._id_table = self._table + _OFFSET.size * (count + 1)
+        self._duration_table = self._id_table + _OFFSET.size * count
+        self._slot_table = self._duration_table + _OFFSET.size * count
+        self._mask = _slot_count(count) - 1
+        self._weight_table = self._slot_table + _OFFSET.size * (self._mask + 1)
+        self._weight_count = weight_count
+        self._blob = self._weight_table + _WEIGHT.size * weight_count
+        if (magic != _MAGIC or version != _VERSION
+                or self._blob + blob_size != size):
+            self._map.close()
+            raise IOError("Not a trainer snapshot: '{}'".format(path))
+
+        self._count = count
+        self.next_id = next_id
+        self.source = (src_size, src_mtime, src_ino)
+
+    def __len__(self):
+        """Returns number of exercises"""
+        return self._count
+
+    def __getitem__(self, index):
+        """Index operator. Reads the exercise at index from the map.
+        A slice gives a read-only :obj:`exercises.ExercisesView`"""
+        if isinstance(index, slice):
+            return ExercisesView(self, index)
+
+        if not isinstance(index, int):
+            msg = 'Indicies must be integers, not {}'.format(type(index))
+            raise TypeError(msg)
+
+        if index >= self._count or abs(index) > self._count:
+            error_msg = "Index out of range. Index {}".format(index)
+            raise IndexError(error_msg)
+
+        if index < 0:
+            index += self._count
+        return self._exercise(index)
+
+    def __iter__(self):
+        for i in xrange(self._count):
+            yield self._exercise(i)
+
+    def __contains__(self, exercise):
+        """Membership operator. Scans the mapped descriptions"""
+        if not isinstance(exercise, Exercise):
+            return False
+        return self._index_of(exercise.description) is not None
+
+    def description(self, i):
+        """Description of the i-th exercise"""
+        start, end = self._bounds(i)
+        return self._map[self._blob + start:self._blob + end]
+
+    def duration(self, i):
+        """Estimated minutes of the i-th exercise, or None"""
+        duration = _OFFSET.unpack_from(
+            self._map, self._duration_table + _OFFSET.size * i)[0]
+        return duration or None
+
+    def description_for_id(self, exercise_id):
+        """Description of the exercise with the given id, or None"""
+        i = self._index_of_id(exercise_id)
+        return None if i is None else self.description(i)
+
+    def get(self, exercise_id):
+        """Exercise with the given id"""
+        i = self._index_of_id(exercise_id)
+        if i is None:
+            raise ValueError("No exercise with id {}".format(exercise_id))
+        return self._exercise(i)
+
+    def id_of(self, exercise):
+        """Id of an exercise in the snapshot"""
+        i = None
+        if isinstance(exercise, Exercise):
+            i = self._index_of(exercise.description)
+        if i is None:
+            error_msg = "Exercise not in set. Exercice: {}".format(exercise)
+            raise ValueError(error_msg)
+        return self._id_at(i)
+
+    def weight(self, exercise_id):
+        """Sampling weight of the exercise with the given id. Weights
+        ascend by id so this is a binary search of the weight table"""
+        if self._index_of_id(exercise_id) is None:
+            raise ValueError("No exercise with id {}".format(exercise_id))
+
+        lo, hi = 0, self._weight_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            current, weight = self._weight_at(mid)
+            if current < exercise_id:
+                lo = mid + 1
+            elif current > exercise_id:
+                hi = mid
+            else:
+                return weight
+        return DEFAULT_WEIGHT
+
+    def weights(self):
+        """Dictionary of id to weight of the exercises whose weight
+        is not :data:`exercises.DEFAULT_WEIGHT`"""
+        return dict(self._weight_at(i) for i in xrange(self._weight_count))
+
+    def items(self):
+        """Iterate over (id, exercise) pairs in stored order"""
+        for i in xrange(self._count):
+            yield self._id_at(i), self._exercise(i)
+
+    def sample(self, k, rng=None):
+        """Draw k distinct exercises, reading only those drawn"""
+        return [self._exercise(i)
+                for i in sample_indices(self._count, k, rng)]
+
+    def close(self):
+        self._map.close()
+
+    def _exercise(self, i):
+        return Exercise(self.description(i), self.duration(i))
+
+    def _bounds(self, i):
+        return _BOUNDS.unpack_from(self._map, self._table + _OFFSET.size * i)
+
+    def _weight_at(self, i):
+        return _WEIGHT.unpack_from(self._map,
+                                   self._weight_table + _WEIGHT.size * i)
+
+    def _id_at(self, i):
+        return _OFFSET.unpack_from(self._map, self._id_table + _OFFSET.size * i)[0]
+
+    def _index_of(self, description):
+        """Index of the exercise with description, or None. Probes
+        the slots from the one the digest of description falls in"""
+        if isinstance(description, unicode):
+            description = description.encode('utf-8')
+
+        slot = description_digest(description) & self._mask
+        while True:
+            i = _OFFSET.unpack_from(
+                self._map, self._slot_table + _OFFSET.size * slot)[0] - 1
+            if i < 0:
+                return None
+            if self.description(i) == description:
+                return i
+            slot = (slot + 1) & self._mask
+
+    def _index_of_id(self, exercise_id):
+        """Index of the exercise with the given id, or None. Ids
+        ascend so this is a binary search of the id table"""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            current = self._id_at(mid)
+            if current < exercise_id:
+                lo = mid + 1
+            elif current > exercise_id:
+                hi = mid
+            else:
+                return mid
+        return None
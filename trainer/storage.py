@@ -0,0 +1,1250 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.storage
+===============
+
+Storage backends that persist the programming exercises of a
+Trainer. The backend is selected by the connection string:
+
+    sqlite:///path/to/exercises.db
+        one row per exercise in a SQLite database
+    path/to/data.pkl
+        a snapshot of all exercises as versioned records, see
+        :mod:`records`, optionally with a write-ahead journal
+"""
+
+import os
+import sqlite3
+import functools
+import threading
+import contextlib
+
+from exercises import (Exercises, ExercisesView, Exercise, PackedExercises,
+                       CsvImport, DEFAULT_WEIGHT, read_csv, check_weight)
+from sampling import sample_indices, iter_sample_indices
+from journal import Journal, apply_record, record_duration
+from records import (SCHEMA_VERSION, SchemaVersionError, file_version,
+                     file_format, file_compression, dump_exercises,
+                     load_exercises)
+from formats import get_format
+from compression import NO_COMPRESSION, get_codec
+from migrations import migrate
+from hashindex import HashIndex, fingerprint
+from snapshot import MappedSnapshot, write_snapshot
+from locking import FileLock, StaleDataError
+from instrumentation import metrics
+
+SQLITE_SCHEME = 'sqlite:///'
+
+def connect(conn, journal=False, journal_limit=None, lazy=False,
+            snapshot=False, auto_migrate=True, format=None, compression=None,
+            packed=False):
+    """Open the storage backend selected by conn
+
+    Examples
+    --------
+    >>> from trainer.storage import connect
+    >>> storage = connect('sqlite:///exercises.db')
+    >>> len(storage)
+    0
+
+    Parameters
+    ----------
+    conn : str
+        ``sqlite:///<path>`` for a SQLite database, otherwise the
+        path of a pickled snapshot
+    journal : bool, optional
+        see :class:`PickleStorage`
+    journal_limit : int, optional
+        see :class:`PickleStorage`
+    lazy : bool, optional
+        see :class:`PickleStorage`. SQLite databases are never
+        loaded up front
+    snapshot : bool, optional
+        see :class:`PickleStorage`. Ignored for SQLite databases
+    auto_migrate : bool, optional
+        see :class:`PickleStorage`. Ignored for SQLite databases
+    format : str, optional
+        see :class:`PickleStorage`. Ignored for SQLite databases
+    compression : str, optional
+        see :class:`PickleStorage`. Ignored for SQLite databases
+    packed : bool, optional
+        see :class:`PickleStorage`. Ignored for SQLite databases
+    """
+    if conn.startswith(SQLITE_SCHEME):
+        return SQLiteStorage(conn[len(SQLITE_SCHEME):])
+
+    return PickleStorage(conn, journal=journal, journal_limit=journal_limit,
+                         lazy=lazy, snapshot=snapshot,
+                         auto_migrate=auto_migrate, format=format,
+                         compression=compression, packed=packed)
+
+def migrate_storage(conn, progress=None, format=None, compression=None):
+    """Migrate the pickle file selected by conn to the current
+    version of the records while holding its exclusive lock
+
+    Parameters
+    ----------
+    conn : str
+        path of a pickle file
+    progress : callable, optional
+        see :func:`migrations.migrate`
+    format : str, optional
+        see :func:`migrations.migrate`
+    compression : str, optional
+        see :func:`migrations.migrate`
+
+    Returns
+    -------
+    int
+        the version the file was migrated from
+    """
+    if conn.startswith(SQLITE_SCHEME):
+        raise ValueError("SQLite databases are not versioned")
+
+    lock = FileLock(conn + '.lock')
+    with lock.exclusive():
+        if (file_version(conn) == SCHEMA_VERSION
+                and format in (None, file_format(conn))
+                and compression in (None, file_compression(conn))):
+            return SCHEMA_VERSION
+        with metrics.timer('migrate'):
+            version = migrate(conn, progress, format, compression)
+        lock.bump()
+    return version
+
+def sidecar_path(conn, suffix):
+    """Path of a file kept next to the data storage selected by conn"""
+    if conn.startswith(SQLITE_SCHEME):
+        conn = conn[len(SQLITE_SCHEME):]
+    return conn + suffix
+
+class Storage(object):
+    """Interface of a storage backend
+
+    Backends hold an ordered set of unique exercises, each with an
+    integer id that is allocated in increasing order when it is added
+    and never reused. Changes are persisted as they are made unless
+    they are made inside :meth:`batch`, in which case they are
+    persisted once on exit.
+    """
+    def __len__(self):
+        """Returns number of exercises"""
+        raise NotImplementedError
+
+    def __contains__(self, exercise):
+        """Membership operator"""
+        raise NotImplementedError
+
+    def __iter__(self):
+        """Iterate over the exercises in insertion order"""
+        raise NotImplementedError
+
+    @property
+    def exercises(self):
+        """All exercises as an :obj:`Exercises`"""
+        raise NotImplementedError
+
+    def add(self, exercise):
+        """Add a new exercise and return its id"""
+        raise NotImplementedError
+
+    def remove(self, exercise):
+        """Remove an existing exercise"""
+        raise NotImplementedError
+
+    def update(self, old_exercise, new_exercise):
+        """Replace an existing exercise, keeping its position and id"""
+        raise NotImplementedError
+
+    def get(self, exercise_id):
+        """Exercise with the given id"""
+        raise NotImplementedError
+
+    def id_of(self, exercise):
+        """Id of an existing exercise"""
+        raise NotImplementedError
+
+    def items(self):
+        """Iterate over (id, exercise) pairs in insertion order"""
+        raise NotImplementedError
+
+    def view(self):
+        """Read-only :obj:`exercises.ExercisesView` of all exercises"""
+        return ExercisesView(self.exercises)
+
+    def weight(self, exercise_id):
+        """Sampling weight of the exercise with the given id"""
+        raise NotImplementedError
+
+    def set_weight(self, exercise_id, weight):
+        """Set the sampling weight of the exercise with the given id"""
+        raise NotImplementedError
+
+    def weights(self):
+        """Dictionary of id to weight of the exercises whose weight
+        is not :data:`exercises.DEFAULT_WEIGHT`"""
+        raise NotImplementedError
+
+    def remove_by_id(self, exercise_id):
+        """Remove the exercise with the given id and return it"""
+        exercise = self.get(exercise_id)
+        self.remove(exercise)
+        return exercise
+
+    def update_by_id(self, exercise_id, new_exercise):
+        """Replace the exercise with the given id"""
+        self.update(self.get(exercise_id), new_exercise)
+
+    def sample(self, k, rng=None):
+        """Draw k distinct exercises at random"""
+        raise NotImplementedError
+
+    def batch(self):
+        """Context manager grouping changes into one persisted unit.
+        A nested block that raises rolls back its own changes only"""
+        raise NotImplementedError
+
+    def stamp(self):
+        """Value that changes whenever persisted exercises change,
+        used to tell whether files derived from them are current"""
+        raise NotImplementedError
+
+    def refresh(self):
+        """Read the exercises again if another process changed them.
+        Returns True if they were read again. Backends that read them
+        on every call never do"""
+        return False
+
+    def close(self):
+        """Release any resources held by the backend"""
+        pass
+
+    def add_from_csv(self, filename, on_accept=None):
+        """Add the exercises of a csv file that are not already stored
+
+        Parameters
+        ----------
+        filename : str
+            csv file to read
+        on_accept : callable, optional
+            called with the id and exercise of each exercise added
+
+        Returns
+        -------
+        :obj:`CsvImport`
+            number of accepted, skipped and malformed rows
+        """
+        accepted = skipped = malformed = 0
+        with self.batch():
+            for exercise in read_csv(filename):
+                if exercise is None:
+                    malformed += 1
+                elif exercise in self:
+                    skipped += 1
+                else:
+                    exercise_id = self.add(exercise)
+                    if on_accept is not None:
+                        on_accept(exercise_id, exercise)
+                    accepted += 1
+
+        return CsvImport(accepted, skipped, malformed)
+
+def _writer(method):
+    """Run a method that changes the exercises of a
+    :class:`PickleStorage` while holding its exclusive lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._writing():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class PickleStorage(Storage):
+    """All exercises held in memory and pickled to a file
+
+    The file holds versioned records, see :mod:`records`. A file
+    written by an older version of the trainer is migrated when it is
+    opened unless ``auto_migrate=False``, in which case, as for a file
+    written by a newer version, opening it raises
+    :class:`records.SchemaVersionError`. The records are written in
+    the format the file is in unless another one of
+    :data:`formats.FORMATS` is given, in which case the file is
+    converted the next time it is written. Likewise the file stays
+    compressed as it is, see :mod:`compression`, unless another codec
+    or ``compression='none'`` is given.
+
+    By default every change rewrites the whole file. With
+    ``journal=True`` each change is appended to a journal next to
+    the file instead, and the journal is folded into the file on a
+    background thread once it grows past journal_limit bytes.
+
+    With ``lazy=True`` the snapshot is only unpickled when the
+    exercises are first needed. Until then membership checks use a
+    :class:`HashIndex` of the snapshot kept in ``<path>.idx`` plus
+    the descriptions named in the journal, so journaled adds, removes
+    and updates do not load the snapshot at all. The index also holds
+    the next exercise id, and the ids and durations of journaled
+    changes are tracked alongside the descriptions.
+
+    With ``packed=True`` the file is read into a
+    :class:`exercises.PackedExercises`, which holds a large catalog in
+    a fraction of the memory, as long as the journal holds no records
+    to replay over it. Reads are served from it, and the first change
+    materializes it into :obj:`Exercises`.
+
+    With ``snapshot=True`` a :mod:`snapshot` of the file is also kept
+    in ``<path>.snap`` and rewritten whenever the file is. While the
+    pickle is not loaded, iteration and sampling read the exercises
+    straight from the mapped snapshot instead of unpickling them, and
+    exercises are looked up by id in it.
+
+    Several processes may share the file. Reads hold a shared
+    :class:`locking.FileLock` on ``<path>.lock`` and changes an
+    exclusive one. Each persisted change increments the version in
+    the lock file, and a change made while another process has moved
+    the version on first reads the exercises again, so it is checked
+    against and applied to the latest exercises rather than
+    overwriting them. :meth:`save` refuses to write exercises read
+    before another process changed them.
+
+    Parameters
+    ----------
+    path : str
+        snapshot of the exercises
+    journal : bool, optional
+        append changes to a journal instead of rewriting the file
+    journal_limit : int, optional
+        journal size in bytes that triggers a compaction
+    lazy : bool, optional
+        defer loading the snapshot until it is needed
+    snapshot : bool, optional
+        keep a memory-mapped snapshot next to the file
+    auto_migrate : bool, optional
+        migrate a file written by an older version of the trainer
+    format : str, optional
+        name of the format to write the records in
+    compression : str, optional
+        name of the codec to compress the file with
+    packed : bool, optional
+        hold the exercises packed until they are first changed
+    """
+    JOURNAL_LIMIT = 1024 * 1024
+
+    def __init__(self, path, journal=False, journal_limit=None, lazy=False,
+                 snapshot=False, auto_migrate=True, format=None,
+                 compression=None, packed=False):
+        if not os.path.isfile(path):
+            raise IOError("Could not connect to data")
+        if format is not None:
+            get_format(format)
+        if compression not in (None, NO_COMPRESSION):
+            get_codec(compression)
+
+        self._path = path
+        self._index_path = path + '.idx'
+        self._mapped_path = path + '.snap'
+        self._use_journal = journal
+        self._journal_limit = journal_limit or PickleStorage.JOURNAL_LIMIT
+        self._journal = Journal(path + '.journal')
+        self._lazy = lazy
+        self._use_snapshot = snapshot
+        self._format = format
+        self._compression = compression
+        self._packed = packed
+        self._lock = FileLock(path + '.lock')
+        self._version = 0
+        self._compactor = None
+        self._is_compaction_due = False
+        self._batch = None
+        self._exercises = None
+        self._index = None
+        self._mapped = None
+        self._reset_changes()
+        self._check_version(auto_migrate)
+        self._open()
+
+    def __len__(self):
+        if self._exercises is not None:
+            return len(self._exercises)
+
+        count = len(self._index)
+        for description, present in self._changes.iteritems():
+            if present != (description in self._index):
+                count += 1 if present else -1
+        return count
+
+    def __contains__(self, exercise):
+        if self._exercises is not None:
+            return exercise in self._exercises
+
+        if not isinstance(exercise, Exercise):
+            return False
+
+        present = self._changes.get(exercise.description)
+        if present is None:
+            return exercise.description in self._index
+        return present
+
+    def __iter__(self):
+        if self._exercises is None and self._mapped is not None and not self._changes:
+            return iter(self._mapped)
+        return iter(self.exercises)
+
+    @property
+    def exercises(self):
+        if self._exercises is None:
+            self._load()
+        return self._exercises
+
+    @property
+    def is_loaded(self):
+        """True once the snapshot has been unpickled"""
+        return self._exercises is not None
+
+    @_writer
+    def add(self, exercise):
+        if self._is_journaled_lazily() and self._next_id is not None:
+            if not isinstance(exercise, Exercise):
+                msg = "Invalid type. Must be of type Exercise"
+                raise TypeError(msg)
+
+            if exercise in self:
+                msg = "Cannot add duplicate exercise. Exercise {}".format(exercise)
+                raise Exception(msg)
+            exercise_id = self._next_id
+        else:
+            exercise_id = self.exercises.append(exercise)
+        self._commit(('add', exercise.description, exercise_id,
+                      exercise.duration))
+        return exercise_id
+
+    @_writer
+    def remove(self, exercise):
+        self._remove(exercise)
+
+    @_writer
+    def update(self, old_exercise, new_exercise):
+        self._update(old_exercise, new_exercise)
+
+    @_writer
+    def remove_by_id(self, exercise_id):
+        exercise = self.get(exercise_id)
+        self._remove(exercise, exercise_id)
+        return exercise
+
+    @_writer
+    def update_by_id(self, exercise_id, new_exercise):
+        self._update(self.get(exercise_id), new_exercise, exercise_id)
+
+    def get(self, exercise_id):
+        if self._exercises is None:
+            known, exercise = self._lazy_get(exercise_id)
+            if known:
+                if exercise is None:
+                    raise ValueError("No exercise with id {}".format(exercise_id))
+                return exercise
+        return self.exercises.get(exercise_id)
+
+    def id_of(self, exercise):
+        if self._exercises is None:
+            if exercise not in self:
+                error_msg = "Exercise not in set. Exercice: {}".format(exercise)
+                raise ValueError(error_msg)
+
+            exercise_id = self._lazy_id_of(exercise.description)
+            if exercise_id is not None:
+                return exercise_id
+        return self.exercises.id_of(exercise)
+
+    def items(self):
+        if self._exercises is None and self._mapped is not None and not self._changes:
+            return self._mapped.items()
+        return self.exercises.items()
+
+    def view(self):
+        # NOTE: a view of the mapped snapshot reads only the exercises
+        # it is indexed with, where the catalog would be loaded whole
+        if self._exercises is None and self._mapped is not None and not self._changes:
+            return ExercisesView(self._mapped)
+        return ExercisesView(self.exercises)
+
+    def weight(self, exercise_id):
+        if self._exercises is None:
+            known, exercise = self._lazy_get(exercise_id)
+            if known:
+                if exercise is None:
+                    raise ValueError("No exercise with id {}".format(exercise_id))
+                if exercise_id in self._weight_changes:
+                    return self._weight_changes[exercise_id]
+                try:
+                    return self._mapped.weight(exercise_id)
+                except ValueError:
+                    # NOTE: added since the snapshot
+                    return DEFAULT_WEIGHT
+        return self.exercises.weight(exercise_id)
+
+    @_writer
+    def set_weight(self, exercise_id, weight):
+        if self._is_journaled_lazily():
+            self.get(exercise_id)
+            weight = check_weight(weight)
+        if not self._is_journaled_lazily():
+            self.exercises.set_weight(exercise_id, weight)
+            weight = self.exercises.weight(exercise_id)
+        self._commit(('weight', exercise_id, weight))
+
+    def weights(self):
+        if (self._exercises is None and self._mapped is not None
+                and self._next_id is not None and self._ids_known):
+            # NOTE: the weights of the snapshot and of the journal,
+            # less those of the exercises removed since
+            weights = self._mapped.weights()
+            weights.update(self._weight_changes)
+            return dict((exercise_id, weight)
+                        for exercise_id, weight in weights.iteritems()
+                        if weight != DEFAULT_WEIGHT
+                        and self._lazy_get(exercise_id)[1] is not None)
+        return self.exercises.weights()
+
+    def sample(self, k, rng=None):
+        if self._exercises is None and self._mapped is not None:
+            return self._sample_mapped(k, rng)
+
+        exercises = self.exercises
+        indices = sample_indices(len(exercises), k, rng)
+        return [exercises[i] for i in indices]
+
+    @_writer
+    def add_from_csv(self, filename, on_accept=None):
+        def record(exercise):
+            exercise_id = self._exercises.id_of(exercise)
+            self._commit(('add', exercise.description, exercise_id,
+                          exercise.duration))
+            if on_accept is not None:
+                on_accept(exercise_id, exercise)
+
+        with self.batch():
+            return self.exercises.add_exercises_from_csv(filename, record)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Apply changes in memory and persist them once on exit
+
+        If the block raises, the exercises are rolled back to their
+        state on entry and nothing is persisted. Loaded exercises are
+        rolled back by undoing the changes made in the block, see
+        :meth:`Exercises.savepoint`, so a batch costs about the number
+        of its changes rather than the size of the catalog. Nested
+        blocks are persisted with the outermost one. A nested block
+        that raises rolls back its own changes only.
+        """
+        if self._batch is not None:
+            mark = len(self._batch)
+            backup = self._savepoint()
+            try:
+                yield self
+                self._release(backup)
+            except:
+                del self._batch[mark:]
+                self._rollback(backup)
+                raise
+            return
+
+        with self._writing():
+            backup = self._savepoint()
+            self._batch = []
+            try:
+                yield self
+                records, self._batch = self._batch, None
+                if records:
+                    self._commit(*records)
+                self._release(backup)
+            except:
+                self._batch = None
+                self._rollback(backup)
+                raise
+
+    @property
+    def version(self):
+        """Version of the file the exercises in memory were read at"""
+        return self._version
+
+    def refresh(self):
+        """Read the exercises again if another process changed them
+        since they were read. Returns True if they were read again"""
+        with self._reading():
+            if self._lock.version() == self._version:
+                return False
+            self._refresh()
+        return True
+
+    def stamp(self):
+        """Fingerprint of the file and the size of the journal, after
+        any background compaction has finished"""
+        self._join_compactor()
+        return (fingerprint(self._path), self._journal.size(),
+                os.path.isfile(self._journal.rotated_path))
+
+    def close(self):
+        """Wait for any background compaction of the journal and
+        unmap the snapshot"""
+        self._join_compactor()
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+
+    def save(self):
+        """Write every exercise to the snapshot and drop the journal
+
+        Raises
+        ------
+        StaleDataError
+            if another process changed the exercises since they were
+            read. Changes made through the other methods never are,
+            as they read the exercises again first
+        """
+        if not self._lock.is_held:
+            self._join_compactor()
+        with self._lock.exclusive():
+            if self._lock.version() != self._version:
+                msg = "{} changed since it was read at version {}"
+                raise StaleDataError(msg.format(self._path, self._version))
+            self._save()
+            self._version = self._lock.bump()
+
+    def _save(self):
+        """Write every exercise to the snapshot and drop the journal
+        while holding the exclusive lock"""
+        self.close()
+        exercises = self.exercises
+        dump_exercises(exercises, self._path, self._file_format(),
+                       self._file_compression())
+        if self._index is not None or os.path.isfile(self._index_path):
+            self._write_index(exercises)
+        if os.path.isfile(self._mapped_path):
+            self._write_mapped(exercises)
+        if not self._journal.is_empty():
+            self._journal.clear()
+
+    def _file_format(self):
+        """Format to write the records in"""
+        return self._format or file_format(self._path)
+
+    def _file_compression(self):
+        """Codec to compress the file with"""
+        return self._compression or file_compression(self._path)
+
+    def _check_version(self, auto_migrate):
+        """Migrate the file if it was written by an older version of
+        the trainer, or refuse it"""
+        version = file_version(self._path)
+        if version == SCHEMA_VERSION:
+            return
+
+        if version > SCHEMA_VERSION or not auto_migrate:
+            msg = "{} holds records of version {}, expected {}"
+            raise SchemaVersionError(msg.format(self._path, version,
+                                                SCHEMA_VERSION))
+
+        migrate_storage(self._path)
+
+    def _open(self):
+        """Read the exercises, or only the index and the journal
+        while lazy"""
+        with self._reading():
+            self._version = self._lock.version()
+            if self._lazy and not os.path.isfile(self._journal.rotated_path):
+                self._index = HashIndex.open(self._index_path, self._path)
+
+            if self._index is None:
+                self._load()
+                if self._lazy:
+                    self._write_index(self._exercises)
+            else:
+                if self._use_snapshot:
+                    self._mapped = self._open_mapped()
+                self._next_id = self._index.next_id
+                self._journal.repair()
+                for record in self._journal.records():
+                    self._track(record)
+
+            if self._use_snapshot and self._mapped is None:
+                self._mapped = self._open_mapped()
+                if self._mapped is None:
+                    self._write_mapped(self.exercises)
+                    self._mapped = self._open_mapped()
+
+    def _refresh(self):
+        """Drop the exercises held in memory and read them again"""
+        metrics.count('stale_reads')
+        if self._mapped is not None:
+            self._mapped.close()
+        self._exercises = None
+        self._index = None
+        self._mapped = None
+        self._reset_changes()
+        self._open()
+
+    def _load(self):
+        """Unpickle the snapshot and replay the journal over it"""
+        with self._reading():
+            self._version = self._lock.version()
+            # NOTE: packed exercises cannot be changed, so they are
+            # neither read for a change nor while there are records to
+            # apply to them
+            packed = (self._packed and not self._lock.is_exclusive
+                      and self._batch is None and self._journal.is_empty())
+            with metrics.timer('load'), open(self._path, 'rb') as f:
+                self._exercises = load_exercises(f, packed)
+                metrics.count('bytes_read', f.tell())
+
+            self._reset_changes()
+            if self._journal.replay(self._exercises):
+                self._journal.repair()
+                if os.path.isfile(self._journal.rotated_path):
+                    # NOTE: a compaction was interrupted, as running
+                    # ones hold the exclusive lock. Its records are
+                    # replayed above so a full save completes it
+                    with self._writing():
+                        if os.path.isfile(self._journal.rotated_path):
+                            self._save()
+
+        for record in self._batch or ():
+            apply_record(self._exercises, record)
+
+    @contextlib.contextmanager
+    def _reading(self):
+        """Hold the shared lock while reading the file and journal"""
+        if not self._lock.is_held:
+            self._join_compactor()
+        with self._lock.shared():
+            yield
+
+    @contextlib.contextmanager
+    def _writing(self):
+        """Hold the exclusive lock around changes, first reading the
+        exercises again if another process changed them. A compaction
+        that is due starts once the lock is released"""
+        if self._lock.is_exclusive:
+            yield
+            return
+
+        # NOTE: the compactor takes the lock on its own, so it is
+        # never waited for while the lock is held
+        if not self._lock.is_held:
+            self._join_compactor()
+        with self._lock.exclusive():
+            if self._lock.version() != self._version:
+                self._refresh()
+            if type(self._exercises) is PackedExercises:
+                self._exercises = Exercises(self._exercises)
+            yield
+
+        if self._is_compaction_due and not self._lock.is_held:
+            self._is_compaction_due = False
+            self._compact_journal()
+
+    def _join_compactor(self):
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def _is_journaled_lazily(self):
+        return self._exercises is None and self._use_journal
+
+    def _remove(self, exercise, exercise_id=None):
+        if self._is_journaled_lazily():
+            if not isinstance(exercise, Exercise):
+                msg = "Invalid type. Must be of type Exercise"
+                raise TypeError(msg)
+
+            if exercise not in self:
+                error_msg = "Exercise not in set. Exercice: {}".format(exercise)
+                raise ValueError(error_msg)
+
+            if exercise_id is None:
+                exercise_id = self._desc_ids.get(exercise.description)
+        else:
+            exercises = self.exercises
+            if exercise in exercises:
+                exercise_id = exercises.id_of(exercise)
+            exercises.remove(exercise)
+        self._commit(('remove', exercise.description, exercise_id))
+
+    def _update(self, old_exercise, new_exercise, exercise_id=None):
+        if self._is_journaled_lazily():
+            msg = "{} exercise must be of type Exercise, not {}"
+            if not isinstance(old_exercise, Exercise):
+                raise TypeError(msg.format("Old", type(old_exercise)))
+
+            if not isinstance(new_exercise, Exercise):
+                raise TypeError(msg.format("New", type(new_exercise)))
+
+            if old_exercise not in self:
+                error_msg = "{} not in exercises".format(old_exercise)
+                raise ValueError(error_msg)
+
+            if new_exercise != old_exercise and new_exercise in self:
+                msg = "Cannot add duplicate exercise. Exercise {}"
+                raise Exception(msg.format(new_exercise))
+
+            if exercise_id is None:
+                exercise_id = self._lazy_id_of(old_exercise.description)
+        else:
+            exercises = self.exercises
+            if old_exercise in exercises:
+                exercise_id = exercises.id_of(old_exercise)
+            exercises.update(old_exercise, new_exercise)
+        self._commit(('update', old_exercise.description,
+                      new_exercise.description, exercise_id,
+                      new_exercise.duration))
+
+    def _savepoint(self):
+        """Start recording the changes of a batch, see :meth:`batch`.
+        Returns what :meth:`_rollback` restores"""
+        if self._exercises is not None:
+            self._exercises.savepoint()
+            return self._exercises
+        return (dict(self._changes), dict(self._changed_ids),
+                dict(self._desc_ids), dict(self._durations),
+                dict(self._weight_changes), self._next_id, self._ids_known)
+
+    def _release(self, backup):
+        if isinstance(backup, Exercises):
+            backup.release()
+
+    def _rollback(self, backup):
+        if isinstance(backup, Exercises):
+            backup.rollback()
+            self._exercises = backup
+        else:
+            self._exercises = None
+            (self._changes, self._changed_ids, self._desc_ids,
+             self._durations, self._weight_changes, self._next_id,
+             self._ids_known) = backup
+
+    def _reset_changes(self):
+        # NOTE: description -> present for exercises changed by the
+        # journal since the snapshot, id -> description (None once
+        # removed) and description -> id for the changes whose ids
+        # are known, description -> duration for the exercises added
+        # or updated, id -> weight set by the journal, and the next
+        # id to allocate, None when an add without an id leaves it
+        # unknown. _ids_known is cleared by an update whose id is
+        # unknown. Only used while not loaded
+        self._changes = {}
+        self._changed_ids = {}
+        self._desc_ids = {}
+        self._durations = {}
+        self._weight_changes = {}
+        self._next_id = None
+        self._ids_known = True
+
+    def _track(self, record):
+        """Note the outcome of a journal record while not loaded"""
+        op = record[0]
+        if op == 'add':
+            exercise_id = record[2] if len(record) > 2 else None
+            self._changes[record[1]] = True
+            self._durations[record[1]] = record_duration(record)
+            self._track_id(record[1], exercise_id)
+            if exercise_id is None:
+                self._next_id = None
+            elif self._next_id is not None:
+                self._next_id = max(self._next_id, exercise_id + 1)
+        elif op == 'remove':
+            exercise_id = record[2] if len(record) > 2 else None
+            if exercise_id is None:
+                exercise_id = self._desc_ids.get(record[1])
+            self._changes[record[1]] = False
+            self._desc_ids.pop(record[1], None)
+            self._durations.pop(record[1], None)
+            if exercise_id is not None:
+                self._changed_ids[exercise_id] = None
+        elif op == 'update':
+            exercise_id = record[3] if len(record) > 3 else None
+            if exercise_id is None:
+                exercise_id = self._desc_ids.get(record[1])
+            if exercise_id is None:
+                self._ids_known = False
+            self._changes[record[1]] = False
+            self._changes[record[2]] = True
+            self._desc_ids.pop(record[1], None)
+            self._durations.pop(record[1], None)
+            self._durations[record[2]] = record_duration(record)
+            self._track_id(record[2], exercise_id)
+        elif op == 'weight':
+            self._weight_changes[record[1]] = record[2]
+
+    def _track_id(self, description, exercise_id):
+        if exercise_id is None:
+            self._desc_ids.pop(description, None)
+        else:
+            self._desc_ids[description] = exercise_id
+            self._changed_ids[exercise_id] = description
+
+    def _lazy_id_of(self, description):
+        """Id of a present exercise without loading, or None"""
+        if description in self._desc_ids:
+            return self._desc_ids[description]
+
+        if description not in self._changes and self._mapped is not None:
+            return self._mapped.id_of(Exercise(description))
+        return None
+
+    def _lazy_get(self, exercise_id):
+        """Whether the exercise with the given id can be told
+        without loading, and the exercise or None if there is no
+        such exercise"""
+        if self._mapped is None or self._next_id is None or not self._ids_known:
+            return False, None
+
+        if exercise_id in self._changed_ids:
+            description = self._changed_ids[exercise_id]
+            if description is None:
+                return True, None
+            return True, Exercise(description, self._durations.get(description))
+
+        try:
+            exercise = self._mapped.get(exercise_id)
+        except ValueError:
+            return True, None
+
+        if exercise.description in self._changes:
+            # NOTE: removed, updated or added again under a new id.
+            # Changes that kept this id are in _changed_ids
+            return True, None
+        return True, exercise
+
+    def _write_index(self, exercises):
+        HashIndex.write(self._index_path,
+                        (ex.description for ex in exercises), self._path,
+                        exercises.next_id)
+
+    def _open_mapped(self):
+        """Map the snapshot if it matches the file, otherwise None"""
+        try:
+            mapped = MappedSnapshot(self._mapped_path)
+        except (IOError, OSError, EnvironmentError):
+            return None
+
+        if mapped.source != fingerprint(self._path):
+            mapped.close()
+            return None
+        return mapped
+
+    def _write_mapped(self, exercises):
+        write_snapshot(self._mapped_path, exercises, fingerprint(self._path))
+
+    def _sample_mapped(self, k, rng):
+        """Draw k exercises from the mapped snapshot and the exercises
+        added by the journal since, skipping those removed since"""
+        mapped = self._mapped
+        if not self._changes:
+            return mapped.sample(k, rng)
+
+        total = len(self)
+        if k > total:
+            msg = "{} samples requested but only {} available".format(k, total)
+            raise ValueError(msg)
+
+        # NOTE: sorted so a seeded sample does not depend on dict order
+        added = sorted(desc for desc, present in self._changes.iteritems()
+                       if present and desc not in self._index)
+        n = len(mapped)
+        drawn = []
+        for i in iter_sample_indices(n + len(added), rng):
+            if len(drawn) == k:
+                break
+
+            description = mapped.description(i) if i < n else added[i - n]
+            present = self._changes.get(description)
+            if present is None:
+                drawn.append(Exercise(description, mapped.duration(i)))
+            elif present:
+                drawn.append(Exercise(description,
+                                      self._durations.get(description)))
+        return drawn
+
+    def _commit(self, *records):
+        """Persist changes already applied to the exercises"""
+        if self._exercises is None:
+            for record in records:
+                self._track(record)
+
+        if self._batch is not None:
+            self._batch.extend(records)
+            return
+
+        if not self._use_journal:
+            self._save()
+        else:
+            self._journal.append(records)
+            if self._journal.size() > self._journal_limit:
+                self._is_compaction_due = True
+        self._version = self._lock.bump()
+
+    def _compact_journal(self):
+        """Fold the journal into a new snapshot on a background thread"""
+        self.close()
+        snapshot = Exercises(self.exercises)
+        self._compactor = threading.Thread(target=self._write_snapshot,
+                                           args=(snapshot, self._version))
+        self._compactor.start()
+
+    def _write_snapshot(self, snapshot, version):
+        """Write the exercises read at version as the new snapshot,
+        unless another process changed them since"""
+        lock = FileLock(self._lock.path)
+        with lock.exclusive():
+            if (lock.version() != version
+                    or os.path.isfile(self._journal.rotated_path)):
+                return
+
+            self._journal.rotate()
+            dump_exercises(snapshot, self._path, self._file_format(),
+                           self._file_compression())
+            if os.path.isfile(self._index_path):
+                self._write_index(snapshot)
+            if os.path.isfile(self._mapped_path):
+                self._write_mapped(snapshot)
+            self._journal.discard_rotated()
+
+class SQLiteStorage(Storage):
+    """Exercises stored one row each in a SQLite database
+
+    Descriptions have a unique index so membership checks, adds,
+    removes and updates are single indexed statements. Each row also
+    has a dense ``pos`` number from 0 to n - 1, kept dense by moving
+    the last row into the gap on removal, so random samples are drawn
+    by position without reading the whole table. The AUTOINCREMENT
+    row id is the exercise id. Durations are NULL for exercises
+    without an estimate.
+
+    Columns added since the first release are added to existing
+    databases when they are opened.
+
+    Processes sharing the database rely on the locking of SQLite.
+    Batches take its write lock as they begin, and a process waits up
+    to :attr:`TIMEOUT` seconds for another one to commit.
+
+    Parameters
+    ----------
+    path : str
+        database file, created if it does not exist
+    """
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS exercises (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            description TEXT NOT NULL,
+            pos INTEGER NOT NULL,
+            duration INTEGER,
+            weight REAL NOT NULL DEFAULT 1.0
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS exercises_description
+            ON exercises (description);
+        CREATE UNIQUE INDEX IF NOT EXISTS exercises_pos
+            ON exercises (pos);
+    """
+    _ADDED_COLUMNS = (('duration', 'INTEGER'),
+                      ('weight', 'REAL NOT NULL DEFAULT 1.0'))
+    # NOTE: SQLite limits the number of bound parameters per statement
+    _MAX_PARAMS = 500
+    # NOTE: seconds to wait for another process to commit
+    TIMEOUT = 30.0
+
+    def __init__(self, path):
+        self._path = path
+        self._db = sqlite3.connect(path, timeout=self.TIMEOUT,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+        self._db.text_factory = str
+        self._db.executescript(self._SCHEMA)
+        columns = [row[1] for row in
+                   self._db.execute("PRAGMA table_info(exercises)")]
+        for name, definition in self._ADDED_COLUMNS:
+            if name not in columns:
+                self._db.execute("ALTER TABLE exercises ADD COLUMN {} {}".format(
+                    name, definition))
+        self._depth = 0
+
+    def __len__(self):
+        row = self._db.execute("SELECT max(pos) FROM exercises").fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def __contains__(self, exercise):
+        if not isinstance(exercise, Exercise):
+            return False
+
+        row = self._db.execute("SELECT 1 FROM exercises WHERE description = ?",
+                               (exercise.description,)).fetchone()
+        return row is not None
+
+    def __iter__(self):
+        cursor = self._db.execute(
+            "SELECT description, duration FROM exercises ORDER BY id")
+        for row in cursor:
+            yield Exercise(*row)
+
+    @property
+    def exercises(self):
+        exercises = Exercises()
+        for exercise_id, exercise in self.items():
+            exercises.append(exercise, exercise_id)
+        for exercise_id, weight in self.weights().iteritems():
+            exercises.set_weight(exercise_id, weight)
+        return exercises
+
+    def items(self):
+        cursor = self._db.execute(
+            "SELECT id, description, duration FROM exercises ORDER BY id")
+        for row in cursor:
+            yield row[0], Exercise(row[1], row[2])
+
+    def get(self, exercise_id):
+        row = self._db.execute(
+            "SELECT description, duration FROM exercises WHERE id = ?",
+            (exercise_id,)).fetchone()
+        if row is None:
+            raise ValueError("No exercise with id {}".format(exercise_id))
+        return Exercise(*row)
+
+    def id_of(self, exercise):
+        row = None
+        if isinstance(exercise, Exercise):
+            row = self._db.execute(
+                "SELECT id FROM exercises WHERE description = ?",
+                (exercise.description,)).fetchone()
+        if row is None:
+            error_msg = "Exercise not in set. Exercice: {}".format(exercise)
+            raise ValueError(error_msg)
+        return row[0]
+
+    def weight(self, exercise_id):
+        row = self._db.execute("SELECT weight FROM exercises WHERE id = ?",
+                               (exercise_id,)).fetchone()
+        if row is None:
+            raise ValueError("No exercise with id {}".format(exercise_id))
+        return row[0]
+
+    def set_weight(self, exercise_id, weight):
+        cursor = self._db.execute("UPDATE exercises SET weight = ? WHERE id = ?",
+                                  (check_weight(weight), exercise_id))
+        if cursor.rowcount == 0:
+            raise ValueError("No exercise with id {}".format(exercise_id))
+
+    def weights(self):
+        cursor = self._db.execute(
+            "SELECT id, weight FROM exercises WHERE weight != ?",
+            (DEFAULT_WEIGHT,))
+        return dict(cursor)
+
+    def add(self, exercise):
+        if not isinstance(exercise, Exercise):
+            msg = "Invalid type. Must be of type Exercise"
+            raise TypeError(msg)
+
+        try:
+            cursor = self._db.execute(
+                "INSERT INTO exercises (description, duration, pos) "
+                "SELECT ?, ?, coalesce(max(pos) + 1, 0) FROM exercises",
+                (exercise.description, exercise.duration))
+        except sqlite3.IntegrityError:
+            msg = "Cannot add duplicate exercise. Exercise {}".format(exercise)
+            raise Exception(msg)
+        return cursor.lastrowid
+
+    def remove(self, exercise):
+        if not isinstance(exercise, Exercise):
+            msg = "Invalid type. Must be of type Exercise"
+            raise TypeError(msg)
+
+        with self.batch():
+            row = self._db.execute(
+                "SELECT pos FROM exercises WHERE description = ?",
+                (exercise.description,)).fetchone()
+            if row is None:
+                error_msg = "Exercise not in set. Exercice: {}".format(exercise)
+                raise ValueError(error_msg)
+
+            last = len(self) - 1
+            self._db.execute("DELETE FROM exercises WHERE description = ?",
+                             (exercise.description,))
+            self._db.execute("UPDATE exercises SET pos = ? WHERE pos = ?",
+                             (row[0], last))
+
+    def update(self, old_exercise, new_exercise):
+        msg = "{} exercise must be of type Exercise, not {}"
+        if not isinstance(old_exercise, Exercise):
+            raise TypeError(msg.format("Old", type(old_exercise)))
+
+        if not isinstance(new_exercise, Exercise):
+            raise TypeError(msg.format("New", type(new_exercise)))
+
+        try:
+            cursor = self._db.execute(
+                "UPDATE exercises SET description = ?, duration = ? "
+                "WHERE description = ?",
+                (new_exercise.description, new_exercise.duration,
+                 old_exercise.description))
+        except sqlite3.IntegrityError:
+            msg = "Cannot add duplicate exercise. Exercise {}"
+            raise Exception(msg.format(new_exercise))
+
+        if cursor.rowcount == 0:
+            error_msg = "{} not in exercises".format(old_exercise)
+            raise ValueError(error_msg)
+
+    def sample(self, k, rng=None):
+        indices = sample_indices(len(self), k, rng)
+        found = {}
+        for start in xrange(0, len(indices), self._MAX_PARAMS):
+            chunk = indices[start:start + self._MAX_PARAMS]
+            query = ("SELECT pos, description, duration FROM exercises "
+                     "WHERE pos IN ({})")
+            cursor = self._db.execute(
+                query.format(', '.join('?' * len(chunk))), chunk)
+            for pos, description, duration in cursor:
+                found[pos] = Exercise(description, duration)
+
+        return [found[i] for i in indices]
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Run the changes in one transaction, rolled back if the
+        block raises. Nested blocks join the outermost one under a
+        savepoint, which a nested block that raises rolls back to"""
+        if self._depth:
+            self._depth += 1
+            savepoint = 'batch_{}'.format(self._depth)
+            self._db.execute("SAVEPOINT " + savepoint)
+            try:
+                yield self
+            except:
+                self._db.execute("ROLLBACK TO " + savepoint)
+                raise
+            finally:
+                self._db.execute("RELEASE " + savepoint)
+                self._depth -= 1
+            return
+
+        self._depth = 1
+        # NOTE: taking the write lock up front keeps two processes
+        # from both reading and then failing to upgrade their locks
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self
+        except:
+            self._db.execute("ROLLBACK")
+            raise
+        else:
+            self._db.execute("COMMIT")
+        finally:
+            self._depth = 0
+
+    def stamp(self):
+        return fingerprint(self._path)
+
+    def close(self):
+        self._db.close()
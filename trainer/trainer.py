@@ -12,9 +12,19 @@ Entry point for the trainer app
 
 import os
 import random
-import pickle
-
-from exercises import Exercises, Exercise
+import contextlib
+
+from exercises import Exercises, Exercise, write_csv
+from storage import connect, sidecar_path, migrate_storage
+from snapshot import write_snapshot
+from budget import BudgetIndex
+from completions import CompletionLog, completion_weight
+from sampling import WeightedSampler
+from search import SearchIndex, log_changes
+from validation import (Validation, ValidationRunner, load_validations,
+                        save_validations)
+from exercises import DEFAULT_WEIGHT, check_weight
+from instrumentation import metrics
 
 # TODO(steve): The orchestration layer should handle errors
 # and display it to the users as oppose to raising errors
@@ -25,107 +35,754 @@ class Trainer(object):
     """
     _PROD_CONNECTION = os.path.join(os.path.dirname(__file__), 'data.pkl')
 
-    def __init__(self, conn=None):
+    def __init__(self, conn=None, journal=False, journal_limit=None,
+                 lazy=False, snapshot=False, auto_migrate=True, format=None,
+                 compression=None, packed=False):
         """create the trainer class
 
         Examples
         --------
         >>> from trainer.trainer import Trainer
         >>> trainer = Trainer()
+        >>> trainer = Trainer(conn='sqlite:///exercises.db')
 
         Parameters
         ----------
         conn : :obj:`str`, optional
             connection to the data storage where the
-            programming exercises are stored
+            programming exercises are stored. Either the path
+            of a pickle file or ``sqlite:///<path>``
+        journal : bool, optional
+            append each change to a journal next to a pickle file
+            instead of rewriting it. The journal is folded into the
+            file in the background once it grows past journal_limit
+            bytes
+        journal_limit : int, optional
+            journal size in bytes that triggers a compaction
+        lazy : bool, optional
+            only load a pickle file once the exercises are needed.
+            Adding, removing and updating with a journal check an
+            index of the file instead of loading it
+        snapshot : bool, optional
+            keep a memory-mapped snapshot next to a pickle file so
+            listing and sampling do not have to load it. Best used
+            together with lazy
+        auto_migrate : bool, optional
+            migrate a pickle file written by an older version of
+            Trainer when it is opened. Otherwise opening it raises
+            :class:`records.SchemaVersionError`
+        format : str, optional
+            format to write a pickle file in from its next save on,
+            one of ``pickle``, ``jsonl`` and ``binary``. By default
+            the format the file is in, see :mod:`formats`
+        compression : str, optional
+            codec to compress a pickle file with from its next save
+            on, one of ``zlib``, ``gzip``, ``bz2`` and, where
+            installed, ``lzma``, or ``none``. By default the file is
+            kept compressed as it is, see :mod:`compression`
+        packed : bool, optional
+            hold the exercises of a pickle file packed in a fraction
+            of the memory until they are first changed, see
+            :class:`exercises.PackedExercises`. Best for large
+            catalogs that are mostly read
         """
         if conn:
             self._conn = conn
         else:
             self._conn = Trainer._PROD_CONNECTION
 
-        if not os.path.isfile(self._conn):
-            self._is_data_loaded = False
-            raise IOError("Could not connect to data")
-
         try:
-            with open(self._conn, 'rb') as f:
-                self._exercises = pickle.load(f)
+            with metrics.timer('connect'):
+                self._storage = connect(self._conn, journal=journal,
+                                        journal_limit=journal_limit, lazy=lazy,
+                                        snapshot=snapshot,
+                                        auto_migrate=auto_migrate,
+                                        format=format,
+                                        compression=compression,
+                                        packed=packed)
         except:
             self._is_data_loaded = False
             raise
 
         self._is_data_loaded = True
+        # NOTE: duration index for time budgeted lists and the
+        # default duration it was built with, and the weighted
+        # sampler. Both are dropped when exercises are added, removed
+        # or updated
+        self._budget_index = None
+        self._budget_default = None
+        self._sampler = None
+        # NOTE: recency factors of recently completed exercises
+        # applied to the weights in the sampler
+        self._sampler_factors = {}
+        self._completions_path = sidecar_path(self._conn, '.completions')
+        self._completion_log = None
+        # NOTE: the search index is kept up to date with every change
+        # once it is loaded or saved next to the data storage. Changes
+        # made inside a batch are logged to it when the batch ends
+        self._search_path = sidecar_path(self._conn, '.search')
+        self._search_index = None
+        self._is_searchable = None
+        self._search_changes = []
+        self._is_changed = False
+        self._batch_depth = 0
+
+    @property
+    def _exercises(self):
+        return self._storage.exercises
+
+    @property
+    def _completions(self):
+        """Completion log next to the data storage, opened on first
+        use"""
+        if self._completion_log is None:
+            self._completion_log = CompletionLog(self._completions_path)
+        return self._completion_log
+
+    def get_all_exercises(self, view=False):
+        """Get all programming exercises in Trainer
+
+        Examples
+        --------
+        >>> trainer = Trainer()
+        >>> page = trainer.get_all_exercises(view=True)[100:120]
+
+        Parameters
+        ----------
+        view : bool, optional
+            return a read-only :obj:`exercises.ExercisesView` of the
+            exercises Trainer holds, taken in constant time, rather
+            than a copy. It is meant to be read straight away as
+            later changes may or may not show through it. By default
+            a copy is returned that may be changed without affecting
+            Trainer
+
+        Returns
+        -------
+        :obj:`Exercises` or :obj:`exercises.ExercisesView`
+        """
+        if view:
+            return self._storage.view()
+        return Exercises(self._storage.exercises)
+
+    def iter_exercises(self):
+        """Iterate over all programming exercises in Trainer without
+        copying them"""
+        return iter(self._storage)
+
+    def iter_exercises_with_ids(self):
+        """Iterate over (id, exercise) pairs of all programming
+        exercises in Trainer"""
+        return self._storage.items()
+
+    def get_exercise(self, exercise_id):
+        """Get the programming exercise with the given id
+
+        Examples
+        --------
+        >>> from trainer.trainer import Trainer
+        >>> trainer = Trainer()
+        >>> exercise_id = trainer.add_exercise(Exercise("Build a tree!"))
+        >>> trainer.get_exercise(exercise_id)
+        Build a tree!
+        """
+        return self._storage.get(exercise_id)
 
-    def get_all_exercises(self):
-        """Get all programming exercises in Trainer"""
-        return Exercises(self._exercises)
+    def get_exercise_id(self, exercise):
+        """Get the id of a programming exercise in Trainer"""
+        return self._storage.id_of(exercise)
 
-    def get_new_list(self, n):
-        """Get number of random programming exercises"""
-        total = len(self._exercises)
+    def get_new_list(self, n, seed=None, weighted=False):
+        """Get number of random programming exercises
+
+        Parameters
+        ----------
+        n : int
+            number of distinct exercises to return
+        seed : hashable, optional
+            seed for a reproducible list of exercises
+        weighted : bool, optional
+            draw each exercise with a chance proportional to its
+            weight, see :meth:`set_exercise_weight`, lowered for the
+            exercises completed in the last days, see
+            :func:`completions.recency_factor`. Exercises with a
+            weight of 0 are never drawn
+        """
+        total = len(self._storage)
         if n > total:
             error_msg = "{} exercises requested but only {} available".format(n, total)
             raise Exception(error_msg)
 
-        # TODO(steve): generate a set of test to ensure
-        # no duplicates are being returned!
-        all_exercises = list(self._exercises)
-        new_list = []
-        for i in xrange(n):
-            index = random.randint(0, len(all_exercises) - 1)
-            exercise = all_exercises[index]
+        rng = random.Random(seed) if seed is not None else random
+        with metrics.timer('sample'):
+            if not weighted:
+                return self._storage.sample(n, rng)
+
+            if self._sampler is None:
+                self._sampler = WeightedSampler(self._storage.items(),
+                                                self._storage.weights(),
+                                                DEFAULT_WEIGHT)
+                self._sampler_factors = {}
+            self._apply_recency()
+            return self._sampler.sample(n, rng)
+
+    def get_exercise_weight(self, exercise_id):
+        """Get the sampling weight of the exercise with the given id"""
+        return self._storage.weight(exercise_id)
 
-            new_list.append(exercise)
-            all_exercises.remove(exercise)
+    def set_exercise_weight(self, exercise_id, weight):
+        """Set the sampling weight of the exercise with the given id
 
-        return new_list
+        Examples
+        --------
+        >>> from trainer.trainer import Trainer
+        >>> trainer = Trainer()
+        >>> trainer.set_exercise_weight(1, 4.0)
+        >>> trainer.get_new_list(3, weighted=True)
+
+        Parameters
+        ----------
+        exercise_id : int
+            id of an exercise in Trainer
+        weight : float
+            chance of the exercise being drawn by a weighted list
+            relative to the other exercises. New exercises have a
+            weight of 1
+        """
+        self._storage.set_weight(exercise_id, weight)
+        self._changed()
+        if self._sampler is not None:
+            factor = self._sampler_factors.get(exercise_id, 1.0)
+            self._sampler.set_weight(exercise_id,
+                                     check_weight(weight) * factor)
+
+    def get_list_for_budget(self, minutes, seed=None, default_duration=None):
+        """Get random programming exercises whose estimated durations
+        add up to the time budget as closely as possible
+
+        Examples
+        --------
+        >>> from trainer.trainer import Trainer
+        >>> trainer = Trainer()
+        >>> trainer.add_exercise(Exercise("Build a tree!", duration=45))
+        >>> trainer.get_list_for_budget(60)
+        [Build a tree!]
+
+        Parameters
+        ----------
+        minutes : int
+            time budget in minutes
+        seed : hashable, optional
+            seed for a reproducible list of exercises
+        default_duration : int, optional
+            minutes assumed for exercises without an estimate.
+            Without it those exercises are never picked
+
+        Returns
+        -------
+        list of :obj:`Exercise`
+            distinct exercises whose durations add up to at most
+            minutes. Empty if no exercise fits
+        """
+        rng = random.Random(seed) if seed is not None else random
+        with metrics.timer('budget'):
+            if (self._budget_index is None
+                    or self._budget_default != default_duration):
+                self._budget_index = BudgetIndex(self._storage,
+                                                 default_duration)
+                self._budget_default = default_duration
+            return self._budget_index.select(minutes, rng)
 
     def add_exercise(self, exercise):
-        """Add exercise to Trainer"""
-        if exercise in self._exercises:
+        """Add exercise to Trainer and return its id"""
+        if exercise in self._storage:
             error_msg = "Exercise already exists. Exercise: {}".format(exercise)
             raise Exception(error_msg)
 
-        self._exercises.append(exercise)
-        self._save_exercises()
+        self._drop_indexes()
+        exercise_id = self._storage.add(exercise)
+        self._changed(('add', exercise_id, exercise))
+        return exercise_id
+
+    def add_exercises(self, exercises):
+        """Add several exercises to Trainer and persist them once.
+        Nothing is added if any of the exercises already exists"""
+        exercises = list(exercises)
+        seen = set()
+        for exercise in exercises:
+            if not isinstance(exercise, Exercise):
+                msg = "Invalid type. Must be of type Exercise"
+                raise TypeError(msg)
+
+            if exercise in self._storage or exercise in seen:
+                error_msg = "Exercise already exists. Exercise: {}".format(exercise)
+                raise Exception(error_msg)
+            seen.add(exercise)
+
+        self._drop_indexes()
+        with self.batch():
+            for exercise in exercises:
+                exercise_id = self._storage.add(exercise)
+                self._changed(('add', exercise_id, exercise))
+
+    def remove_exercises(self, exercises):
+        """Remove several exercises from Trainer and persist once.
+        Nothing is removed if any of the exercises does not exist"""
+        exercises = list(exercises)
+        seen = set()
+        for exercise in exercises:
+            if exercise not in self._storage or exercise in seen:
+                error_msg = "Exercise does not exist. "
+                error_msg += "Cannot remove exercise. "
+                error_msg += "Exercise: {}""".format(exercise)
+                raise Exception(error_msg)
+            seen.add(exercise)
+
+        self._drop_indexes()
+        with self.batch():
+            for exercise in exercises:
+                exercise_id = self._id_for_search(exercise)
+                self._storage.remove(exercise)
+                self._changed(('remove', exercise_id, exercise))
 
     def remove_exercise(self, exercise):
         """Remove exercise to Trainer"""
-        if exercise not in self._exercises:
+        if exercise not in self._storage:
             error_msg = "Exercise does not exist. "
             error_msg += "Cannot remove exercise. "
             error_msg += "Exercise: {}""".format(exercise)
             raise Exception(error_msg)
 
-        self._exercises.remove(exercise)
-        self._save_exercises()
+        self._drop_indexes()
+        exercise_id = self._id_for_search(exercise)
+        self._storage.remove(exercise)
+        self._changed(('remove', exercise_id, exercise))
+
+    def remove_exercise_by_id(self, exercise_id):
+        """Remove the exercise with the given id from Trainer and
+        return it. The ids of the other exercises are unchanged"""
+        self._drop_indexes()
+        exercise = self._storage.remove_by_id(exercise_id)
+        self._changed(('remove', exercise_id, exercise))
+        return exercise
 
     # TODO(steve): method needs to be updated when 
     # multiple lists support is enabled
     def update_exercise(self, old_exercise, new_exercise):
         """Update existing exercise in Trainer"""
-        self._exercises.update(old_exercise, new_exercise)
-        self._save_exercises()
+        self._drop_indexes()
+        exercise_id = self._id_for_search(old_exercise)
+        self._storage.update(old_exercise, new_exercise)
+        self._changed(('remove', exercise_id, old_exercise),
+                      ('add', exercise_id, new_exercise))
+
+    def update_exercise_by_id(self, exercise_id, new_exercise):
+        """Update the exercise with the given id, which the new
+        exercise keeps"""
+        self._drop_indexes()
+        old_exercise = None
+        if self._searchable():
+            old_exercise = self._storage.get(exercise_id)
+        self._storage.update_by_id(exercise_id, new_exercise)
+        self._changed(('remove', exercise_id, old_exercise),
+                      ('add', exercise_id, new_exercise))
 
     def add_exercises_from_csv(self, filename):
-        """Add one or more exercises from csv file"""
-        self._exercises.add_exercises_from_csv(filename)
+        """Add one or more exercises from csv file. Exercises that
+        already exist are skipped and the result is persisted once"""
+        def on_accept(exercise_id, exercise):
+            self._changed(('add', exercise_id, exercise))
+
+        self._drop_indexes()
+        with metrics.timer('import'), self.batch():
+            return self._storage.add_from_csv(filename, on_accept)
 
     def output_exercises_to_csv(self, filename):
-        """Output set of exercises to csv"""
-        self._exercises.to_csv(filename)
+        """Output set of exercises to csv
+
+        Parameters
+        ----------
+        filename: str or file
+            csv file to write, or a file-like object such as
+            sys.stdout. See :func:`exercises.write_csv`
+        """
+        with metrics.timer('export'):
+            write_csv(self._storage, filename)
+
+    def sync_exercises_from_csv(self, filename):
+        """Add, remove and update programming exercises so Trainer
+        holds the exercises of a csv file, see
+        :meth:`exercises.Exercises.sync`. The result is persisted
+        once
+
+        Examples
+        --------
+        >>> trainer = Trainer()
+        >>> trainer.output_exercises_to_csv('exercises.csv')
+        >>> # edit exercises.csv
+        >>> trainer.sync_exercises_from_csv('exercises.csv')
+        CatalogDiff(added=[Build a heap], removed=[], changed=[])
+
+        Returns
+        -------
+        :obj:`digest.CatalogDiff`
+            the changes made
+        """
+        target = Exercises()
+        target.add_exercises_from_csv(filename)
+        with metrics.timer('sync'), self.batch():
+            # NOTE: diffed inside the batch, which holds the exercises
+            # as Exercises rather than packed
+            diff = self._storage.exercises.diff(target)
+            for exercise in diff.removed:
+                self.remove_exercise(exercise)
+            for old_exercise, new_exercise in diff.changed:
+                self.update_exercise(old_exercise, new_exercise)
+            for exercise in sorted(diff.added, key=target.id_of):
+                self.add_exercise(exercise)
+        return diff
+
+    def log_completion(self, exercise_id, start, end=None, reweight=True):
+        """Log that the exercise with the given id was completed
+
+        Examples
+        --------
+        >>> import time
+        >>> from trainer.trainer import Trainer
+        >>> trainer = Trainer()
+        >>> start = time.time()
+        >>> trainer.log_completion(1, start)
+        >>> trainer.get_completion_report(exercise_id=1).count
+        1
+
+        Parameters
+        ----------
+        exercise_id : int
+            id of an exercise in Trainer
+        start : float
+            start of the attempt in seconds since the epoch
+        end : float, optional
+            end of the attempt, now by default
+        reweight : bool, optional
+            set the weight of the exercise from how slow its
+            completions are, see :func:`completions.completion_weight`.
+            How recent they are is applied when sampling
+        """
+        self._storage.get(exercise_id)
+        self._completions.record(exercise_id, start, end)
+        if reweight:
+            weight = completion_weight(self._completions.report(exercise_id),
+                                       self._completions.report())
+            self.set_exercise_weight(exercise_id, weight)
+
+    def get_completion_report(self, exercise_id=None, day=None):
+        """Report on the completions of an exercise, of a day given as
+        ``YYYY-MM-DD`` in UTC, or of all completions. See
+        :meth:`completions.CompletionLog.report`"""
+        return self._completions.report(exercise_id, day)
+
+    def get_completion_reports(self, by='exercise'):
+        """Reports on the completions grouped by ``'exercise'`` id or
+        by ``'day'``
+
+        Returns
+        -------
+        dict
+            exercise id or day to :obj:`completions.CompletionReport`
+        """
+        if by == 'exercise':
+            return self._completions.reports_by_exercise()
+        if by == 'day':
+            return self._completions.reports_by_day()
+        msg = "Reports are grouped by 'exercise' or 'day', not {}"
+        raise ValueError(msg.format(by))
+
+    def set_exercise_validation(self, exercise_id, solution, tests):
+        """Validate the exercise with the given id by running the
+        unittest module tests against the solution module
 
-    def _save_exercises(self):
+        Examples
+        --------
+        >>> trainer = Trainer()
+        >>> trainer.set_exercise_validation(1, 'tree.py', 'test_tree.py')
+
+        Parameters
+        ----------
+        exercise_id : int
+        solution : str
+            path of the solution module
+        tests : str
+            path of a unittest module that imports the solution
+
+        Raises
+        ------
+        ValueError
+            if no exercise has the id
+        IOError
+            if either module does not exist
+        """
+        self._storage.get(exercise_id)
+        for path in (solution, tests):
+            if not os.path.isfile(path):
+                raise IOError("No such module {}".format(path))
+
+        path = sidecar_path(self._conn, '.validation')
+        validations = load_validations(path)
+        validations[exercise_id] = Validation(os.path.abspath(solution),
+                                              os.path.abspath(tests))
+        save_validations(validations, path)
+
+    def get_exercise_validation(self, exercise_id):
+        """Validation of the exercise with the given id, or None"""
+        return load_validations(
+            sidecar_path(self._conn, '.validation')).get(exercise_id)
+
+    def validate_exercises(self, exercise_ids=None, jobs=None, timeout=None):
+        """Validate programming exercises, see
+        :class:`validation.ValidationRunner`
+
+        Examples
+        --------
+        >>> trainer = Trainer()
+        >>> for result in trainer.validate_exercises():
+        ...     print result.exercise_id, result.status
+        1 passed
+        3 failed
+
+        Parameters
+        ----------
+        exercise_ids : list of int, optional
+            exercises to validate, every exercise with a validation by
+            default
+        jobs : int, optional
+            validations run at a time
+        timeout : float, optional
+            seconds after which a validation is killed
+
+        Returns
+        -------
+        generator of :obj:`validation.ValidationResult`
+            in the order the validations finish
+
+        Raises
+        ------
+        ValueError
+            if an exercise given has no validation
+        """
+        validations = load_validations(sidecar_path(self._conn, '.validation'))
+        if exercise_ids is None:
+            # NOTE: ids are never reused, so validations of removed
+            # exercises are left in place and skipped
+            ids = set(exercise_id for exercise_id, _
+                      in self._storage.items())
+            exercise_ids = sorted(i for i in validations if i in ids)
+        for exercise_id in exercise_ids:
+            if exercise_id not in validations:
+                msg = "Exercise {} has no validation".format(exercise_id)
+                raise ValueError(msg)
+
+        runner = ValidationRunner(
+            sidecar_path(self._conn, '.validation.cache'), jobs, timeout)
+        return runner.run((exercise_id, validations[exercise_id])
+                          for exercise_id in exercise_ids)
+
+    def search(self, query, limit=None):
+        """Search the descriptions of the programming exercises
+
+        The first search builds an inverted index of the descriptions
+        and saves it next to the data storage. Later searches, also
+        from other runs, load it and only rebuild it if the exercises
+        were changed without it being updated.
+
+        Examples
+        --------
+        >>> from trainer.trainer import Trainer
+        >>> trainer = Trainer()
+        >>> trainer.add_exercise(Exercise("Build a binary tree!"))
+        >>> trainer.search("bin* tree")
+        [(1, Build a binary tree!)]
+
+        Parameters
+        ----------
+        query : str
+            terms that must all occur in the description. A term
+            ending in ``*`` matches any word starting with it
+        limit : int, optional
+            maximum number of exercises returned
+
+        Returns
+        -------
+        list of (int, :obj:`Exercise`)
+            ids and exercises, those where the terms occur most often
+            first
+        """
+        with metrics.timer('search'):
+            if self._search_index is None:
+                self._search_index = SearchIndex.open(
+                    self._search_path, self._storage.stamp(),
+                    self._storage.items)
+                self._is_searchable = True
+            return [(exercise_id, self._storage.get(exercise_id))
+                    for exercise_id in self._search_index.search(query, limit)]
+
+    def refresh(self):
+        """Read the exercises again if another process changed them
+        since they were read. Returns True if they were read again"""
+        if not self._storage.refresh():
+            return False
+
+        self._drop_indexes()
+        self._search_index = None
+        return True
+
+    def export_snapshot(self, filename):
+        """Write all exercises to a memory-mapped snapshot, see
+        :class:`snapshot.MappedSnapshot`"""
+        write_snapshot(filename, self._storage.exercises)
+
+    def _drop_indexes(self):
+        self._budget_index = None
+        self._sampler = None
+
+    def _apply_recency(self):
+        """Lower the sampler weights of the exercises completed in the
+        last days by their recency factor, and restore those whose
+        factor wore off since the last list"""
+        factors = {}
+        if (self._completion_log is not None or
+                os.path.isfile(self._completions_path)):
+            factors = dict((exercise_id, factor) for exercise_id, factor
+                           in self._completions.recency_factors().iteritems()
+                           if exercise_id in self._sampler)
+
+        for exercise_id in self._sampler_factors:
+            if exercise_id not in factors:
+                self._sampler.set_weight(exercise_id,
+                                         self._storage.weight(exercise_id))
+        for exercise_id, factor in factors.iteritems():
+            self._sampler.set_weight(
+                exercise_id, self._storage.weight(exercise_id) * factor)
+        self._sampler_factors = factors
+
+    def _searchable(self):
+        """True when changes have to be applied to a search index"""
+        if self._is_searchable is None:
+            self._is_searchable = os.path.isfile(self._search_path)
+        return self._is_searchable
+
+    def _id_for_search(self, exercise):
+        """Id of an exercise about to be removed or replaced, only
+        looked up when the search index needs it"""
+        if self._searchable():
+            return self._storage.id_of(exercise)
+        return None
+
+    def _changed(self, *records):
+        """Apply changes of the exercises to the search index and log
+        them with the stamp of the data storage once persisted"""
+        if not self._searchable():
+            return
+
+        for op, exercise_id, exercise in records:
+            record = (op, exercise_id, exercise.description)
+            if self._search_index is not None:
+                self._search_index.apply(record)
+            self._search_changes.append(record)
+        self._is_changed = True
+
+        if not self._batch_depth:
+            self._log_changes()
+
+    def _undo_search_changes(self, mark):
+        """Take back the changes of the search index made since
+        mark"""
+        undone = self._search_changes[mark:]
+        del self._search_changes[mark:]
+        if self._search_index is not None:
+            for op, exercise_id, description in reversed(undone):
+                inverse = 'remove' if op == 'add' else 'add'
+                self._search_index.apply((inverse, exercise_id, description))
+
+    def _log_changes(self):
+        if self._is_changed:
+            log_changes(self._search_path, self._search_changes,
+                        self._storage.stamp())
+        self._search_changes = []
+        self._is_changed = False
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Group changes so they are persisted once on exit
+
+        Changes made inside the block are applied straight away. If
+        the block raises, the changes are rolled back and nothing is
+        persisted. Nested blocks join the outermost one, and one that
+        raises rolls back its own changes only.
+
+        Examples
+        --------
+        >>> from trainer.trainer import Trainer
+        >>> trainer = Trainer()
+        >>> with trainer.batch():
+        ...     trainer.add_exercise(Exercise("Build a tree!"))
+        ...     trainer.remove_exercise(Exercise("Build a house!"))
+        """
+        self._batch_depth += 1
+        mark = len(self._search_changes)
+        is_changed = self._is_changed
         try:
-            with open(self._conn, 'wb') as f:
-                pickle.dump(self.get_all_exercises(), f)
+            with self._storage.batch() as storage:
+                yield storage
         except:
+            # NOTE: the indexes may hold changes that were rolled back.
+            # The saved search index never saw them. A nested block
+            # only takes back its own changes of the search index, the
+            # enclosing batch keeps the others
+            self._drop_indexes()
+            if self._batch_depth > 1:
+                self._undo_search_changes(mark)
+                self._is_changed = is_changed
+            else:
+                self._search_index = None
+                self._search_changes = []
+                self._is_changed = False
             raise
+        finally:
+            self._batch_depth -= 1
+
+        if not self._batch_depth:
+            self._log_changes()
+
+    def close(self):
+        """Finish pending writes and release the data storage"""
+        if self._completion_log is not None:
+            self._completion_log.close()
+        self._storage.close()
+
+    def get_metrics(self):
+        """Timers and counters collected while instrumentation is
+        enabled, see :class:`instrumentation.Metrics`
+
+        Examples
+        --------
+        >>> from trainer.instrumentation import metrics
+        >>> metrics.enable()
+        >>> trainer = Trainer()
+        >>> trainer.get_metrics()['timers']['connect']['calls']
+        1
+        """
+        return metrics.as_dict()
 
 if __name__ == '__main__':
+    import sys
+    import time
     import argparse
 
+    from daemon import serve, socket_path, connect_daemon
+    from records import SCHEMA_VERSION, file_format, file_compression
+    from formats import FORMATS
+    from compression import CODECS, NO_COMPRESSION
+
     desc = """
     Hello this is Trainer, your personal programming
     trainer. Trainer will help you improve your
@@ -144,31 +801,218 @@ if __name__ == '__main__':
     actions.add_argument('-a', '--add',
             help='Add a programming exercise to Trainer')
     actions.add_argument('-r', '--remove',
-            help='Remove a programming exercise to Trainer')
+            help='Remove a programming exercise from Trainer by id '
+                 'or description')
     actions.add_argument('-n', '--newlist', type=int,
             help='Generate a list of programming exercises')
+    actions.add_argument('-b', '--budget', type=int, metavar='MINUTES',
+            help='Generate a list of programming exercises that fits '
+                 'in MINUTES')
+    actions.add_argument('-i', '--import', dest='csv',
+            help='Add programming exercises from a csv file to Trainer')
+    actions.add_argument('--sync', metavar='CSV',
+            help='Add, remove and update programming exercises to '
+                 'match a csv file')
+    actions.add_argument('-e', '--export',
+            help='Write all programming exercises to a csv file, '
+                 'or to stdout if -')
+    actions.add_argument('-l', '--log', type=int, nargs=2,
+            metavar=('ID', 'MINUTES'),
+            help='Log that the exercise with ID was just completed in '
+                 'MINUTES')
+    actions.add_argument('--report', choices=('exercise', 'day'),
+            help='Report on the completed exercises by exercise or day')
+    actions.add_argument('-f', '--search', metavar='QUERY',
+            help='Find programming exercises whose description has '
+                 'every word of QUERY. Words ending in * match as a '
+                 'prefix')
+    actions.add_argument('--attach', nargs=3,
+            metavar=('ID', 'SOLUTION', 'TESTS'),
+            help='Validate the exercise with ID by running the unittest '
+                 'module TESTS against the module SOLUTION')
+    actions.add_argument('--validate', type=int, nargs='*', metavar='ID',
+            help='Validate the exercises with ID, or every exercise '
+                 'with a validation')
+    actions.add_argument('--migrate', action='store_true',
+            help='Upgrade the data storage written by an older version '
+                 'of Trainer, or convert it to --format and --compression, '
+                 'reporting progress')
+    actions.add_argument('--serve', action='store_true',
+            help='Keep Trainer running to serve the commands of other '
+                 'runs until interrupted')
+    parser.add_argument('-w', '--weighted', action='store_true',
+            help='Favour exercises by weight in the generated list')
+    parser.add_argument('-d', '--duration', type=int,
+            help='Estimated minutes of the exercise added with --add')
+    parser.add_argument('-s', '--seed', type=int,
+            help='Seed for a reproducible list of programming exercises')
+    parser.add_argument('-j', '--jobs', type=int,
+            help='Validations to run at a time with --validate')
+    parser.add_argument('--format', choices=sorted(FORMATS),
+            help='Format to write a pickle file in, at once with '
+                 '--migrate or otherwise from its next save on')
+    parser.add_argument('--compression',
+            choices=[NO_COMPRESSION] + sorted(CODECS),
+            help='Codec to compress a pickle file with, at once with '
+                 '--migrate or otherwise from its next save on')
+    parser.add_argument('-c', '--conn',
+            help='Data storage to use, a pickle file or sqlite:///<path>')
+    parser.add_argument('--stats', action='store_true',
+            help='Print timings and counters of the run to stderr')
+    parser.add_argument('--profile', metavar='FILE',
+            help='Write a cProfile dump of the run to FILE')
 
     args = parser.parse_args()
 
-    t = Trainer()
-    if args.newlist:
+    if args.stats:
+        metrics.enable()
+
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    # NOTE: a running daemon already has the exercises loaded.
+    # Commands the daemon does not serve run without it
+    conn = args.conn or Trainer._PROD_CONNECTION
+    t = None
+    if not (args.serve or args.attach or args.sync or args.migrate or
+            args.validate is not None):
+        t = connect_daemon(conn)
+    if t is None and not args.migrate:
+        t = Trainer(conn=conn, journal=True, lazy=True, snapshot=True,
+                    format=args.format, compression=args.compression)
+    if args.migrate:
+        shown = []
+        def progress(done, total):
+            shown.append(done)
+            sys.stderr.write("\rMigrated {} of {} exercises".format(done,
+                                                                    total))
+        try:
+            # NOTE: a file already at the current version may still be
+            # converted to another format or compression
+            stored = None
+            if os.path.isfile(conn):
+                stored = (file_format(conn), file_compression(conn))
+            version = migrate_storage(conn, progress, args.format,
+                                      args.compression)
+            if shown:
+                sys.stderr.write("\n")
+            if version != SCHEMA_VERSION:
+                print "Migrated from version {} to {}".format(
+                    version, SCHEMA_VERSION)
+            elif stored != (file_format(conn), file_compression(conn)):
+                print "Converted from {}, compression {}".format(*stored)
+            else:
+                print "Already at version {}".format(version)
+            print "Stored as {}, compression {}".format(
+                file_format(conn), file_compression(conn))
+        except Exception as e:
+            print e
+    elif args.serve:
+        serve(t, socket_path(conn))
+    elif args.newlist:
         try:
-            for i, ex in enumerate(t.get_new_list(args.newlist)):
+            exercises = t.get_new_list(args.newlist, args.seed, args.weighted)
+            for i, ex in enumerate(exercises):
                 print "{}: {}".format(i, ex)
         except Exception as e:
             print e
+    elif args.budget:
+        try:
+            exercises = t.get_list_for_budget(args.budget, args.seed)
+            for i, ex in enumerate(exercises):
+                print "{}: {} ({} min)".format(i, ex, ex.duration)
+            print "Total: {} of {} min".format(
+                sum(ex.duration for ex in exercises), args.budget)
+        except Exception as e:
+            print e
+    elif args.log:
+        try:
+            exercise_id, minutes = args.log
+            end = time.time()
+            t.log_completion(exercise_id, end - minutes * 60, end)
+        except Exception as e:
+            print e
+    elif args.report:
+        row = "{:>10} {:>6} {:>10} {:>10} {:>10} {:>10}"
+        print row.format(args.report, 'count', 'mean (m)', 'p50 (m)',
+                         'p90 (m)', 'total (m)')
+        for key, report in sorted(t.get_completion_reports(args.report).items()):
+            print row.format(key, report.count,
+                             *["{:.1f}".format(value / 60.0) for value in
+                               (report.mean, report.p50, report.p90,
+                                report.total)])
+    elif args.search:
+        for exercise_id, ex in t.search(args.search):
+            print "{}: {}".format(exercise_id, ex)
+    elif args.attach:
+        try:
+            exercise_id, solution, tests = args.attach
+            t.set_exercise_validation(int(exercise_id), solution, tests)
+        except Exception as e:
+            print e
+    elif args.validate is not None:
+        try:
+            for result in t.validate_exercises(args.validate or None,
+                                               args.jobs):
+                print "{}: {} ({} tests, {} failures, {} errors{})".format(
+                    result.exercise_id, result.status, result.tests,
+                    result.failures, result.errors,
+                    ', cached' if result.cached else '')
+        except Exception as e:
+            print e
     elif args.add:
         try:
-            ex = Exercise(args.add)
+            ex = Exercise(args.add, args.duration)
             t.add_exercise(ex)
         except Exception as e:
             print e
+    elif args.csv:
+        try:
+            result = t.add_exercises_from_csv(args.csv)
+            print "{} added, {} skipped, {} malformed".format(*result)
+        except Exception as e:
+            print e
+    elif args.sync:
+        try:
+            diff = t.sync_exercises_from_csv(args.sync)
+            print "{} added, {} removed, {} changed".format(
+                *[len(exercises) for exercises in diff])
+        except Exception as e:
+            print e
+    elif args.export:
+        try:
+            if args.export == '-':
+                t.output_exercises_to_csv(sys.stdout)
+            else:
+                t.output_exercises_to_csv(args.export)
+        except Exception as e:
+            print e
     elif args.remove:
         try:
-            ex = Exercise(args.remove)
-            t.remove_exercise(ex)
+            removed = None
+            if args.remove.isdigit():
+                try:
+                    removed = t.remove_exercise_by_id(int(args.remove))
+                except ValueError:
+                    pass
+
+            if removed is None:
+                t.remove_exercise(Exercise(args.remove))
         except Exception as e:
             print e
     else:
-        for i, ex in enumerate(t.get_all_exercises()):
-            print "{}: {}".format(i, ex)
+        for exercise_id, ex in t.iter_exercises_with_ids():
+            print "{}: {}".format(exercise_id, ex)
+
+    if t is not None:
+        t.close()
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+
+    if args.stats:
+        print >>sys.stderr, metrics.summary()
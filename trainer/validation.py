@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+"""
+trainer.validation
+==================
+
+Validation of programming exercises with python unittest.
+
+An exercise is validated by a solution module and a unittest module
+that imports it. Each validation runs in a fresh interpreter inside
+its own temporary working directory holding copies of the two
+modules, so solutions cannot see or change each other's files, and
+is killed once it runs longer than its timeout. Several validations
+run at a time and results are yielded as each one finishes.
+
+Results are cached by a hash of the content of both modules, so an
+exercise whose modules did not change since it was last validated is
+not run again. Timed out validations are not cached, as they may
+pass on a less busy machine.
+
+The validations of a catalog are kept next to the data storage in
+``<path>.validation``, by exercise id, and the cache in
+``<path>.validation.cache``.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+from collections import namedtuple
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from journal import atomic_dump
+from instrumentation import metrics
+
+Validation = namedtuple('Validation', 'solution tests')
+ValidationResult = namedtuple('ValidationResult',
+                              'exercise_id status tests failures errors '
+                              'seconds output cached')
+
+PASSED = 'passed'
+FAILED = 'failed'
+ERROR = 'error'
+TIMEOUT = 'timeout'
+
+# NOTE: only the end of the output of a validation is kept, which is
+# where unittest reports what failed
+_OUTPUT_LIMIT = 4096
+_SUMMARY = '_summary.json'
+_RUNNER = """
+import sys, json, unittest
+sys.path.insert(0, '.')
+suite = unittest.defaultTestLoader.discover('.', pattern=sys.argv[1])
+result = unittest.TextTestRunner(stream=sys.stdout).run(suite)
+with open(sys.argv[2], 'w') as f:
+    json.dump({'tests': result.testsRun, 'failures': len(result.failures),
+               'errors': len(result.errors)}, f)
+"""
+
+def load_validations(path):
+    """Validations by exercise id saved at path, empty if none were"""
+    if not os.path.isfile(path):
+        return {}
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def save_validations(validations, path):
+    """Save validations by exercise id to path"""
+    atomic_dump(validations, path)
+
+def content_hash(validation):
+    """Hash of the names and content of the modules of a validation,
+    and of the interpreter that runs them
+
+    Raises
+    ------
+    IOError
+        if either module cannot be read
+    """
+    digest = hashlib.sha1(sys.version)
+    for path in validation:
+        with open(path, 'rb') as f:
+            content = f.read()
+        digest.update('{}\0{}\0'.format(os.path.basename(path), len(content)))
+        digest.update(content)
+    return digest.hexdigest()
+
+def run_validation(exercise_id, validation, timeout):
+    """Run the unittest module of a validation against its solution
+
+    Parameters
+    ----------
+    exercise_id : int
+        id of the exercise, copied to the result
+    validation : :obj:`Validation`
+        paths of the solution and unittest modules
+    timeout : float
+        seconds after which the validation is killed
+
+    Returns
+    -------
+    :obj:`ValidationResult`
+    """
+    workdir = tempfile.mkdtemp(prefix='trainer_validation_')
+    start = time.time()
+    try:
+        for path in validation:
+            shutil.copy(path, workdir)
+
+        process = subprocess.Popen(
+            [sys.executable, '-c', _RUNNER,
+             os.path.basename(validation.tests), _SUMMARY],
+            cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        killer = threading.Timer(timeout, process.kill)
+        killer.start()
+        try:
+            output = process.communicate()[0]
+        finally:
+            killer.cancel()
+        seconds = time.time() - start
+
+        summary_path = os.path.join(workdir, _SUMMARY)
+        if not os.path.isfile(summary_path):
+            status = TIMEOUT if seconds >= timeout else ERROR
+            return ValidationResult(exercise_id, status, 0, 0, 0, seconds,
+                                    output[-_OUTPUT_LIMIT:], False)
+
+        with open(summary_path) as f:
+            summary = json.load(f)
+    except (IOError, OSError) as e:
+        return ValidationResult(exercise_id, ERROR, 0, 0, 0,
+                                time.time() - start, str(e), False)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if summary['errors']:
+        status = ERROR
+    elif summary['failures'] or not summary['tests']:
+        status = FAILED
+    else:
+        status = PASSED
+    return ValidationResult(exercise_id, status, summary['tests'],
+                            summary['failures'], summary['errors'], seconds,
+                            output[-_OUTPUT_LIMIT:], False)
+
+class ValidationRunner(object):
+    """Runs the validations of many exercises at a time
+
+    Examples
+    --------
+    >>> from trainer.validation import ValidationRunner, Validation
+    >>> runner = ValidationRunner('data.pkl.validation.cache')
+    >>> validation = Validation('tree.py', 'test_tree.py')
+    >>> for result in runner.run([(1, validation)]):
+    ...     print result.exercise_id, result.status
+    1 passed
+
+    Parameters
+    ----------
+    cache_path : str, optional
+        file keeping the results by content hash across runs. Results
+        are only kept in memory if not given
+    jobs : int, optional
+        validations run at a time, the number of cpus by default
+    timeout : float, optional
+        seconds after which a validation is killed
+    """
+    TIMEOUT = 60.0
+
+    def __init__(self, cache_path=None, jobs=None, timeout=None):
+        self.cache_path = cache_path
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.timeout = timeout or self.TIMEOUT
+        self._cache = {}
+        if cache_path is not None and os.path.isfile(cache_path):
+            with open(cache_path, 'rb') as f:
+                self._cache = pickle.load(f)
+
+    def run(self, validations):
+        """Validate exercises and yield their results in the order
+        they finish. Cached results come first
+
+        Parameters
+        ----------
+        validations : iterable of (int, :obj:`Validation`)
+            exercise ids and their validations
+
+        Returns
+        -------
+        generator of :obj:`ValidationResult`
+        """
+        pending = []
+        for exercise_id, validation in validations:
+            try:
+                key = content_hash(validation)
+            except IOError as e:
+                yield ValidationResult(exercise_id, ERROR, 0, 0, 0, 0.0,
+                                       str(e), False)
+                continue
+
+            if key in self._cache:
+                metrics.count('validations_cached')
+                yield self._cache[key]._replace(exercise_id=exercise_id,
+                                                cached=True)
+            else:
+                pending.append((key, exercise_id, validation))
+
+        if not pending:
+            return
+
+        # NOTE: each validation runs in a child process, so threads
+        # waiting on them are enough to run them in parallel
+        pool = ThreadPool(min(self.jobs, len(pending)))
+        try:
+            for key, result in pool.imap_unordered(self._run, pending):
+                metrics.count('validations_run')
+                if result.status != TIMEOUT:
+                    self._cache[key] = result
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+            self.save()
+
+    def save(self):
+        """Write the cached results to the cache file"""
+        if self.cache_path is not None:
+            atomic_dump(self._cache, self.cache_path)
+
+    def _run(self, task):
+        key, exercise_id, validation = task
+        return key, run_validation(exercise_id, validation, self.timeout)